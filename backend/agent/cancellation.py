@@ -0,0 +1,232 @@
+"""
+Cancellation - Ámbito de cancelación y deadline de cada ejecución
+
+Cada ejecución del agente (process_message, process_approval) lleva un
+RunScope con un deadline opcional. El ámbito vigente viaja en una
+ContextVar, así que lo ven los proveedores de LLM, los tools y las tareas
+que se crean dentro de la ejecución (plan en paralelo, sub-agentes):
+
+- time_left(timeout) acota los timeouts de HTTP, subprocesos y Playwright
+  al tiempo que le queda a la ejecución.
+- cancel() cancela la tarea hija que ejecuta el paso en curso del agente:
+  la llamada HTTP en curso se corta (Ollama deja de generar y libera la
+  GPU) y communicate() mata el subproceso (con todo su grupo de procesos).
+  La tarea que consume los eventos no se cancela, así que sigue para
+  emitir cancelled y done sin Task.uncancel() (que no existe en 3.10).
+
+Si el cliente se desconecta o pide cancelar, la ejecución termina en el
+siguiente punto de espera, no al acabar el paso en curso.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Awaitable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Motivos de cancelación
+CANCEL_CLIENT = "client"
+CANCEL_DISCONNECTED = "disconnected"
+CANCEL_DEADLINE = "deadline"
+
+CANCEL_MESSAGES = {
+    CANCEL_CLIENT: "Ejecución cancelada por el usuario",
+    CANCEL_DISCONNECTED: "Ejecución cancelada: el cliente se desconectó",
+    CANCEL_DEADLINE: "Ejecución cancelada: se superó el tiempo máximo"
+}
+
+# Margen tras el deadline antes de cancelar a la fuerza (la ejecución
+# normalmente ya terminó con una respuesta parcial al agotar el tiempo)
+DEADLINE_GRACE = 10.0
+
+_current_scope: ContextVar[Optional["RunScope"]] = ContextVar("agent_run_scope", default=None)
+
+
+class RunScope:
+    """Ejecución en curso: tarea, deadline y motivo de cancelación"""
+
+    def __init__(self, conversation_id: str, deadline: Optional[float] = None):
+        """
+        Args:
+            conversation_id: Conversación de la ejecución
+            deadline: Instante límite (time.monotonic) o None
+        """
+        self.run_id = uuid.uuid4().hex[:12]
+        self.conversation_id = conversation_id
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self.reason: Optional[str] = None
+        # Tarea hija del paso en curso (None mientras el consumidor procesa un evento)
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        """Segundos hasta el deadline (None = sin deadline)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason: str = CANCEL_CLIENT) -> bool:
+        """
+        Cancela la ejecución
+
+        Si hay un paso en curso se interrumpe ya; si el consumidor está
+        procesando un evento, el agente para antes del siguiente paso.
+
+        Returns:
+            False si ya estaba cancelada
+        """
+        if self.reason is not None:
+            return False
+        self.reason = reason
+        logger.info(f"Cancelando la ejecución {self.run_id} ({self.conversation_id}): {reason}")
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        return True
+
+    async def step(self, awaitable: Awaitable[Any]) -> Any:
+        """
+        Ejecuta un paso del agente en una tarea hija con este ámbito vigente
+
+        Raises:
+            asyncio.CancelledError: Si cancel() interrumpió el paso (o se
+                canceló la tarea que espera)
+        """
+        token = _current_scope.set(self)
+        try:
+            # La tarea hija copia el contexto: ve el ámbito y la prioridad
+            self.task = asyncio.ensure_future(awaitable)
+        finally:
+            _current_scope.reset(token)
+        try:
+            return await self.task
+        finally:
+            self.task = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        remaining = self.remaining()
+        return {
+            "run_id": self.run_id,
+            "conversation_id": self.conversation_id,
+            "elapsed": round(time.monotonic() - self.started, 2),
+            "remaining": round(remaining, 2) if remaining is not None else None,
+            "cancelled": self.reason
+        }
+
+
+def current_scope() -> Optional[RunScope]:
+    """Ámbito de la ejecución en curso (None fuera del agente)"""
+    return _current_scope.get()
+
+
+def time_left(timeout: Optional[float] = None) -> Optional[float]:
+    """
+    Timeout acotado por el deadline de la ejecución en curso
+
+    Args:
+        timeout: Timeout propio de la operación (None = sin timeout)
+
+    Returns:
+        El menor de los dos (None si no hay ninguno)
+    """
+    scope = _current_scope.get()
+    remaining = scope.remaining() if scope is not None else None
+    if remaining is None:
+        return timeout
+    if timeout is None:
+        return remaining
+    return min(timeout, remaining)
+
+
+def kill_process(process: asyncio.subprocess.Process):
+    """Mata un subproceso y, si encabeza su grupo, también a sus hijos"""
+    if process.returncode is not None:
+        return
+    try:
+        if hasattr(os, "killpg") and os.getpgid(process.pid) == process.pid:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def communicate(process: asyncio.subprocess.Process, timeout: Optional[float] = None) -> Tuple[bytes, bytes]:
+    """
+    process.communicate() que no deja procesos huérfanos
+
+    El proceso se mata si vence el timeout (acotado por el deadline de la
+    ejecución) o si se cancela la ejecución.
+
+    Raises:
+        asyncio.TimeoutError: Si venció el timeout
+    """
+    try:
+        return await asyncio.wait_for(process.communicate(), timeout=time_left(timeout))
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        kill_process(process)
+        raise
+
+
+class RunRegistry:
+    """Ejecuciones en curso del agente, para cancelarlas por conversación"""
+
+    def __init__(self):
+        self._runs: Dict[str, RunScope] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self.stats = {"runs": 0, "cancelled": 0}
+
+    def start(self, conversation_id: str, max_seconds: float = 0.0) -> RunScope:
+        """
+        Registra una ejecución
+
+        Args:
+            conversation_id: Conversación de la ejecución
+            max_seconds: Tiempo máximo (0 = sin deadline)
+        """
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+        scope = RunScope(conversation_id, deadline)
+        self._runs[scope.run_id] = scope
+        self.stats["runs"] += 1
+        if max_seconds:
+            self._timers[scope.run_id] = asyncio.get_running_loop().call_later(
+                max_seconds + DEADLINE_GRACE, scope.cancel, CANCEL_DEADLINE
+            )
+        return scope
+
+    def finish(self, scope: RunScope):
+        self._runs.pop(scope.run_id, None)
+        timer = self._timers.pop(scope.run_id, None)
+        if timer is not None:
+            timer.cancel()
+        if scope.cancelled:
+            self.stats["cancelled"] += 1
+
+    def cancel(self, conversation_id: str, reason: str = CANCEL_CLIENT) -> int:
+        """
+        Cancela las ejecuciones en curso de una conversación
+
+        Returns:
+            Ejecuciones canceladas
+        """
+        return sum(
+            scope.cancel(reason) for scope in list(self._runs.values())
+            if scope.conversation_id == conversation_id
+        )
+
+    def active(self, conversation_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [
+            scope.to_dict() for scope in self._runs.values()
+            if conversation_id is None or scope.conversation_id == conversation_id
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "active": len(self._runs)}
@@ -0,0 +1,232 @@
+"""
+Model Cascade - Modelo rápido primero, escalado cuando la salida no sirve
+
+La mayoría de las iteraciones del ciclo Plan & Act solo eligen un tool y
+un modelo pequeño lo hace bien. La cascada prueba primero el modelo
+principal del agente y escala al siguiente nivel (un modelo mayor o uno
+en la nube) cuando la respuesta:
+- intenta un tool call que no se puede interpretar
+- pide un tool que no existe
+- viene vacía o con señales de baja confianza
+
+Cada fase puede empezar en un nivel distinto: "routing" (elegir tools
+tras el mensaje del usuario) y "synthesis" (redactar la respuesta tras
+recibir resultados de tools).
+"""
+
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+from .llm_provider import LLMProvider, LLMResponse, Message
+from .tool_call_parser import extract_tool_calls
+
+logger = logging.getLogger(__name__)
+
+PHASE_ROUTING = "routing"
+PHASE_SYNTHESIS = "synthesis"
+
+# Texto que intenta ser un tool call (JSON con nombre de función)
+_TOOL_CALL_LIKE = re.compile(r'["\'](?:name|tool|function)["\']\s*:|```json|<tool_call>', re.IGNORECASE)
+
+_LOW_CONFIDENCE = re.compile(
+    r"\b(?:no estoy seguro|no sé cómo|no puedo determinar|no tengo suficiente información|"
+    r"i'?m not sure|i don'?t know|as an ai)\b",
+    re.IGNORECASE
+)
+
+
+def parse_cascade(value: Optional[str]) -> List[Dict[str, str]]:
+    """
+    Niveles de escalado desde texto (env LLM_CASCADE)
+
+    Formato: "proveedor:modelo" separados por coma, p. ej.
+    "ollama:qwen2.5:14b,openai:gpt-4o"
+    """
+    tiers = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        provider, _, model = item.partition(":")
+        tiers.append({"provider": provider.strip(), "model": model.strip() or None})
+    return tiers
+
+
+def escalation_reason(response: LLMResponse, known_tools: Iterable[str]) -> Optional[str]:
+    """
+    Motivo para escalar una respuesta al siguiente nivel
+
+    Returns:
+        unparsed_tool_call, unknown_tool, empty, low_confidence o None si es válida
+    """
+    tool_calls = response.tool_calls or []
+    content = response.content or ""
+
+    if not tool_calls and content:
+        tool_calls, _ = extract_tool_calls(content)
+        if not tool_calls and _TOOL_CALL_LIKE.search(content):
+            return "unparsed_tool_call"
+
+    if tool_calls:
+        known = known_tools if isinstance(known_tools, (set, dict)) else set(known_tools)
+        if any(tc.name not in known for tc in tool_calls):
+            return "unknown_tool"
+        return None
+
+    if not content.strip():
+        return "empty"
+    if _LOW_CONFIDENCE.search(content):
+        return "low_confidence"
+    return None
+
+
+@dataclass
+class CascadeAttempt:
+    """Una llamada de la cascada"""
+    tier: int
+    model: str
+    latency: float
+    usage: Optional[Dict[str, Any]] = None
+    reason: Optional[str] = None  # motivo del escalado (None = aceptada)
+
+
+@dataclass
+class CascadeResult:
+    """Respuesta aceptada y llamadas realizadas para obtenerla"""
+    response: LLMResponse
+    tier: int
+    model: str
+    attempts: List[CascadeAttempt] = field(default_factory=list)
+
+    @property
+    def escalated(self) -> bool:
+        return len(self.attempts) > 1
+
+
+class _TierStats:
+    def __init__(self):
+        self.calls = 0
+        self.accepted = 0
+        self.escalated = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.reasons: Dict[str, int] = {}
+
+    def to_dict(self, model: str) -> Dict[str, Any]:
+        return {
+            "model": model,
+            "calls": self.calls,
+            "accepted": self.accepted,
+            "escalated": self.escalated,
+            "errors": self.errors,
+            "escalation_rate": round(self.escalated / self.calls, 4) if self.calls else 0.0,
+            "avg_latency_ms": round(self.latency * 1000 / self.calls, 1) if self.calls else 0.0,
+            "reasons": dict(self.reasons)
+        }
+
+
+class ModelCascade:
+    """
+    Cascada de modelos sobre el proveedor principal del agente
+
+    El nivel 0 es siempre el proveedor principal vigente (se recibe en cada
+    llamada, así sigue a las reconfiguraciones); los niveles 1..n son los
+    de escalado.
+    """
+
+    def __init__(
+        self,
+        tiers: List[LLMProvider],
+        routing_tier: int = 0,
+        synthesis_tier: int = 0,
+        primary_model: str = ""
+    ):
+        """
+        Args:
+            tiers: Proveedores de escalado, del más barato al más capaz
+            primary_model: Modelo del nivel 0 (se actualiza en cada llamada)
+            routing_tier: Nivel inicial para elegir tools
+            synthesis_tier: Nivel inicial para redactar la respuesta final
+        """
+        self.tiers = tiers
+        self.start = {
+            PHASE_ROUTING: min(routing_tier, len(tiers)),
+            PHASE_SYNTHESIS: min(synthesis_tier, len(tiers))
+        }
+        self._stats = [_TierStats() for _ in range(len(tiers) + 1)]
+        self._models = [primary_model] + [tier.model for tier in tiers]
+        self.iterations = {PHASE_ROUTING: 0, PHASE_SYNTHESIS: 0}
+        self.escalated_iterations = 0
+
+    async def chat(
+        self,
+        primary: LLMProvider,
+        messages: List[Message],
+        tools: Optional[List[Dict]],
+        temperature: float,
+        max_tokens: int,
+        phase: str,
+        known_tools: Iterable[str]
+    ) -> CascadeResult:
+        """
+        Llama al nivel inicial de la fase y escala mientras la respuesta no sirva
+
+        El último nivel se acepta siempre. Un error del proveedor también
+        escala; si falla el último nivel se propaga.
+        """
+        chain: List[Tuple[int, LLMProvider]] = [(0, primary)] + list(enumerate(self.tiers, start=1))
+        chain = chain[self.start.get(phase, 0):]
+        self._models[0] = primary.model
+        self.iterations[phase] = self.iterations.get(phase, 0) + 1
+
+        attempts: List[CascadeAttempt] = []
+        for position, (tier, llm) in enumerate(chain):
+            last = position == len(chain) - 1
+            stats = self._stats[tier]
+            stats.calls += 1
+            start = time.perf_counter()
+            try:
+                response = await llm.chat(
+                    messages=messages,
+                    tools=tools,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+            except Exception:
+                latency = time.perf_counter() - start
+                stats.latency += latency
+                stats.errors += 1
+                if last:
+                    raise
+                reason = "error"
+                attempts.append(CascadeAttempt(tier, llm.model, latency, None, reason))
+            else:
+                latency = time.perf_counter() - start
+                stats.latency += latency
+                reason = None if last else escalation_reason(response, known_tools)
+                attempts.append(CascadeAttempt(tier, llm.model, latency, response.usage, reason))
+                if reason is None:
+                    stats.accepted += 1
+                    if len(attempts) > 1:
+                        self.escalated_iterations += 1
+                    return CascadeResult(response, tier, llm.model, attempts)
+
+            stats.escalated += 1
+            stats.reasons[reason] = stats.reasons.get(reason, 0) + 1
+            logger.info(f"Cascada: {llm.model} -> siguiente nivel ({reason}, fase {phase})")
+
+        raise RuntimeError("Cascada sin niveles")  # pragma: no cover
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Latencia y tasa de escalado por nivel"""
+        iterations = sum(self.iterations.values())
+        return {
+            "iterations": dict(self.iterations),
+            "escalated_iterations": self.escalated_iterations,
+            "escalation_rate": round(self.escalated_iterations / iterations, 4) if iterations else 0.0,
+            "start_tier": dict(self.start),
+            "tiers": [stats.to_dict(model) for stats, model in zip(self._stats, self._models)]
+        }
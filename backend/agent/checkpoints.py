@@ -0,0 +1,210 @@
+"""
+Checkpoints - Estado del ciclo Plan & Act para reanudar una ejecución
+
+Cada ejecución guarda, tras cada tool, un checkpoint compacto: iteración,
+tools seleccionados, tool calls pendientes del turno, los mensajes del
+turno (resultados recortados) y los tokens consumidos. Cuando un tool
+requiere aprobación la ejecución se pausa con un checkpoint "approval";
+process_approval continúa desde ahí sin volver a preparar el turno, sin
+una llamada extra al LLM y sin repetir los tools ya ejecutados.
+
+Con el almacén en SQLite el checkpoint sobrevive a un reinicio: la
+aprobación pendiente sigue disponible y un job interrumpido continúa donde
+se quedó (AgentCore.resume_run).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from .llm_provider import ToolCall
+
+logger = logging.getLogger(__name__)
+
+# Estados de un checkpoint (uno de cada por conversación)
+CHECKPOINT_RUNNING = "running"
+CHECKPOINT_APPROVAL = "approval"
+
+
+@dataclass
+class RunCheckpoint:
+    """Estado de una ejecución en un punto en el que se puede reanudar"""
+    conversation_id: str
+    user_message: str
+    status: str = CHECKPOINT_RUNNING
+    iteration: int = 0
+    tool_names: Optional[List[str]] = None  # None = catálogo completo
+    pending: List[Dict[str, Any]] = field(default_factory=list)  # [{"id", "name", "arguments"}]
+    approvals: Dict[str, bool] = field(default_factory=dict)  # respuesta por tool_call_id
+    turn: List[Dict[str, Any]] = field(default_factory=list)  # mensajes tras el del usuario
+    prompt_eval_tokens: List[Optional[int]] = field(default_factory=list)
+    usage: Optional[Dict[str, Any]] = None
+    updated_at: float = field(default_factory=time.time)
+    # Posición del turno en el contexto en memoria (no se guarda)
+    turn_start: int = field(default=0, repr=False, compare=False)
+
+    def tool_calls(self) -> List[ToolCall]:
+        """Tool calls pendientes"""
+        return [ToolCall(id=tc["id"], name=tc["name"], arguments=tc["arguments"]) for tc in self.pending]
+
+    def set_pending(self, tool_calls: List[ToolCall]):
+        self.pending = [{"id": tc.id, "name": tc.name, "arguments": tc.arguments} for tc in tool_calls]
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("turn_start")
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RunCheckpoint":
+        return cls(**data)
+
+
+class CheckpointStore:
+    """Checkpoints en SQLite (o solo en memoria) por conversación y estado"""
+
+    def __init__(self, db_path: Optional[str] = None, max_result_chars: int = 4000):
+        """
+        Args:
+            db_path: Archivo SQLite (None = solo memoria)
+            max_result_chars: Máximo de caracteres de cada resultado guardado
+        """
+        self.db_path = Path(db_path).expanduser() if db_path else None
+        self.max_result_chars = max_result_chars
+        self._checkpoints: Dict[Tuple[str, str], RunCheckpoint] = {}
+        self._lock = threading.Lock()
+        self.stats = {"saved": 0, "resumed": 0, "restored": 0}
+
+        if self.db_path:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._init_database()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10.0)
+
+    def _init_database(self):
+        conn = self._get_connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                conversation_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (conversation_id, status)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def compact_message(self, role: str, content: str, tool_calls=None, tool_call_id=None) -> Dict[str, Any]:
+        """Mensaje del turno tal como se guarda (resultados de tools recortados)"""
+        if role == "tool" and len(content) > self.max_result_chars:
+            content = content[:self.max_result_chars] + f"\n... [recortado: {len(content)} caracteres]"
+        return {"role": role, "content": content, "tool_calls": tool_calls, "tool_call_id": tool_call_id}
+
+    def save(self, checkpoint: RunCheckpoint):
+        """Guarda (o sustituye) el checkpoint de su conversación y estado"""
+        checkpoint.updated_at = time.time()
+        key = (checkpoint.conversation_id, checkpoint.status)
+        with self._lock:
+            self._checkpoints[key] = checkpoint
+            self.stats["saved"] += 1
+            if self.db_path:
+                conn = self._get_connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (conversation_id, status, data, updated_at) VALUES (?, ?, ?, ?)",
+                    (*key, json.dumps(checkpoint.to_dict(), ensure_ascii=False, default=str), checkpoint.updated_at)
+                )
+                conn.commit()
+                conn.close()
+
+    def load(self, conversation_id: str, status: str) -> Optional[RunCheckpoint]:
+        """Checkpoint de una conversación (de memoria o, tras un reinicio, de SQLite)"""
+        with self._lock:
+            checkpoint = self._checkpoints.get((conversation_id, status))
+            if checkpoint is not None or not self.db_path:
+                return checkpoint
+            conn = self._get_connection()
+            row = conn.execute(
+                "SELECT data FROM checkpoints WHERE conversation_id = ? AND status = ?",
+                (conversation_id, status)
+            ).fetchone()
+            conn.close()
+        if row is None:
+            return None
+        try:
+            checkpoint = RunCheckpoint.from_dict(json.loads(row[0]))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Checkpoint ilegible de {conversation_id}: {e}")
+            self.delete(conversation_id, status)
+            return None
+        self.stats["restored"] += 1
+        return checkpoint
+
+    def delete(self, conversation_id: str, status: str) -> bool:
+        with self._lock:
+            found = self._checkpoints.pop((conversation_id, status), None) is not None
+            if self.db_path:
+                conn = self._get_connection()
+                cursor = conn.execute(
+                    "DELETE FROM checkpoints WHERE conversation_id = ? AND status = ?",
+                    (conversation_id, status)
+                )
+                found = found or cursor.rowcount > 0
+                conn.commit()
+                conn.close()
+        return found
+
+    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Resumen de los checkpoints guardados"""
+        with self._lock:
+            if self.db_path:
+                conn = self._get_connection()
+                rows = conn.execute("SELECT data FROM checkpoints ORDER BY updated_at").fetchall()
+                conn.close()
+                checkpoints = [json.loads(row[0]) for row in rows]
+            else:
+                checkpoints = [c.to_dict() for c in self._checkpoints.values()]
+        return [
+            {
+                "conversation_id": c["conversation_id"],
+                "status": c["status"],
+                "iteration": c["iteration"],
+                "pending": [tc["name"] for tc in c["pending"]],
+                "updated_at": c["updated_at"]
+            }
+            for c in checkpoints
+            if status is None or c["status"] == status
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        by_status: Dict[str, int] = {}
+        for checkpoint in self.list():
+            by_status[checkpoint["status"]] = by_status.get(checkpoint["status"], 0) + 1
+        return {**self.stats, "by_status": by_status}
+
+
+_checkpoint_store: Optional[CheckpointStore] = None
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """
+    Almacén de checkpoints del proceso
+
+    Se configura con AGENT_CHECKPOINT_DB (por defecto ~/.agent_data/checkpoints.db).
+    """
+    global _checkpoint_store
+
+    if _checkpoint_store is None:
+        _checkpoint_store = CheckpointStore(
+            db_path=os.getenv("AGENT_CHECKPOINT_DB", "~/.agent_data/checkpoints.db")
+        )
+
+    return _checkpoint_store
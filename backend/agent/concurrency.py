@@ -0,0 +1,332 @@
+"""
+Concurrency - Límite de llamadas simultáneas por proveedor y reintentos
+
+Cada proveedor tiene un semáforo con cola: las peticiones interactivas
+pasan antes que el trabajo en segundo plano y, dentro de la misma
+prioridad, se atienden por orden de llegada. Los errores de sobrecarga
+(429, 503, 529...) se reintentan con backoff exponencial con jitter,
+respetando la cabecera Retry-After si el proveedor la envía.
+
+La prioridad se toma del contexto (contextvars), así que las tareas de
+fondo solo tienen que ejecutarse dentro de `background_priority()`.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Any, List, Optional, AsyncGenerator
+
+from .llm_provider import LLMProvider, LLMResponse, Message
+from .cancellation import time_left
+
+logger = logging.getLogger(__name__)
+
+# Prioridades (menor = antes)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+# Códigos HTTP de sobrecarga que merecen reintento
+RETRYABLE_STATUS = {429, 502, 503, 504, 529}
+
+# Llamadas simultáneas por defecto (Ollama serializa en la GPU)
+DEFAULT_MAX_CONCURRENCY = {
+    "ollama": 2,
+    "openai": 8,
+    "anthropic": 8,
+    "deepseek": 8
+}
+
+
+class LLMRateLimitError(Exception):
+    """El proveedor sigue sobrecargado tras agotar los reintentos"""
+
+    def __init__(self, provider: str, attempts: int, error: Exception):
+        super().__init__(f"{provider} sobrecargado tras {attempts} intentos: {error}")
+        self.provider = provider
+        self.attempts = attempts
+        self.error = error
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """Fija la prioridad de las llamadas al LLM dentro del bloque"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def background_priority():
+    """Prioridad para trabajo en segundo plano (jobs, tareas programadas)"""
+    return llm_priority(PRIORITY_BACKGROUND)
+
+
+class PriorityLimiter:
+    """
+    Semáforo con cola por prioridad
+
+    Al liberar una plaza se entrega directamente al siguiente en la cola,
+    así una petición nueva no puede adelantarse a las que ya esperan.
+    """
+
+    def __init__(self, max_concurrent: int):
+        """
+        Args:
+            max_concurrent: Llamadas simultáneas permitidas
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.active = 0
+        # (prioridad, orden de llegada, future)
+        self._waiters: List[list] = []
+        self._order = itertools.count()
+        self.stats = {
+            "acquired": 0,
+            "queued": 0,
+            "max_queue_depth": 0,
+            "wait_seconds": 0.0,
+            "max_wait_ms": 0.0,
+            "retries": 0,
+            "overloaded": 0,
+            "exhausted": 0
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter[2].done())
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """
+        Espera una plaza
+
+        Returns:
+            Segundos de espera en la cola
+        """
+        start = time.perf_counter()
+        if self.active < self.max_concurrent and self.queue_depth == 0:
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, [priority, next(self._order), future])
+            self.stats["queued"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue_depth)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # La plaza llegó a la vez que la cancelación: devolverla
+                    self.release()
+                raise
+
+        waited = time.perf_counter() - start
+        self.stats["acquired"] += 1
+        self.stats["wait_seconds"] += waited
+        self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], round(waited * 1000, 1))
+        return waited
+
+    def release(self):
+        """Libera una plaza (o la cede al siguiente en la cola)"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None):
+        """Contexto que ocupa una plaza; cede los segundos de espera"""
+        waited = await self.acquire(current_priority() if priority is None else priority)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        by_priority: Dict[int, int] = {}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                by_priority[priority] = by_priority.get(priority, 0) + 1
+        acquired = self.stats["acquired"]
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "queue_depth": sum(by_priority.values()),
+            "queue_by_priority": by_priority,
+            **self.stats,
+            "wait_seconds": round(self.stats["wait_seconds"], 3),
+            "avg_wait_ms": round(self.stats["wait_seconds"] * 1000 / acquired, 1) if acquired else 0.0
+        }
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """Código HTTP de un error de proveedor (openai, anthropic, Ollama)"""
+    for attribute in ("status_code", "status"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Segundos indicados por Retry-After (None si no hay cabecera válida)"""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        if headers is not None:
+            value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        # Retry-After con fecha HTTP: se usa el backoff propio
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    return error_status(error) in RETRYABLE_STATUS or isinstance(error, asyncio.TimeoutError)
+
+
+class LimitedLLMProvider(LLMProvider):
+    """Envuelve un proveedor con límite de concurrencia y reintentos"""
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        limiter: PriorityLimiter,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0
+    ):
+        """
+        Args:
+            provider: Proveedor envuelto
+            limiter: Semáforo compartido del proveedor
+            max_retries: Reintentos ante errores de sobrecarga
+            base_delay: Espera del primer reintento (se duplica en cada uno)
+            max_delay: Espera máxima entre reintentos
+        """
+        super().__init__(provider.model, provider.api_key)
+        self.provider = provider
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @property
+    def provider_name(self) -> str:
+        return getattr(self.provider, "provider_name", self.provider.__class__.__name__)
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Espera antes del reintento `attempt` (Retry-After o exponencial con jitter)"""
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter: reparte los reintentos de muchos clientes
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def chat(
+        self,
+        messages: List[Message],
+        tools: Optional[List[Dict]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000,
+        stream: bool = False
+    ) -> LLMResponse:
+        """Llama al proveedor dentro del límite, reintentando si está sobrecargado"""
+        queued = 0.0
+        attempt = 0
+        while True:
+            async with self.limiter.slot() as waited:
+                queued += waited
+                try:
+                    response = await self.provider.chat(messages, tools, temperature, max_tokens, stream)
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    error = e
+                else:
+                    response.usage = {**(response.usage or {}), "queue_ms": queued * 1000}
+                    return response
+
+            # El reintento espera fuera del semáforo
+            self.limiter.stats["overloaded"] += 1
+            delay = self.backoff(attempt, error)
+            # Sin reintentos que acabarían después del deadline de la ejecución
+            remaining = time_left()
+            if attempt >= self.max_retries or (remaining is not None and remaining <= delay):
+                self.limiter.stats["exhausted"] += 1
+                raise LLMRateLimitError(self.provider_name, attempt + 1, error) from error
+            attempt += 1
+            self.limiter.stats["retries"] += 1
+            logger.warning(f"{self.provider_name} sobrecargado ({error}); reintento {attempt} en {delay:.2f}s")
+            await asyncio.sleep(delay)
+            queued += delay
+
+    async def chat_stream(
+        self,
+        messages: List[Message],
+        tools: Optional[List[Dict]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000
+    ) -> AsyncGenerator[str, None]:
+        """Streaming dentro del límite (sin reintentos)"""
+        async with self.limiter.slot():
+            async for chunk in self.provider.chat_stream(messages, tools, temperature, max_tokens):
+                yield chunk
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas de la cola y del proveedor envuelto"""
+        stats = {}
+        if hasattr(self.provider, "get_stats"):
+            stats.update(self.provider.get_stats())
+        stats["concurrency"] = self.limiter.get_stats()
+        return stats
+
+    def __getattr__(self, item):
+        if item == "provider":
+            raise AttributeError(item)
+        return getattr(self.provider, item)
+
+
+def provider_key(llm: LLMProvider) -> str:
+    """Nombre corto del proveedor (OllamaPoolProvider -> ollama)"""
+    name = llm.__class__.__name__.lower()
+    for key in DEFAULT_MAX_CONCURRENCY:
+        if key in name:
+            return key
+    return name.replace("provider", "")
+
+
+_limiters: Dict[str, PriorityLimiter] = {}
+
+
+def get_limiter(provider: str, hosts: int = 1) -> PriorityLimiter:
+    """
+    Semáforo compartido de un proveedor (sobrevive a las reconfiguraciones)
+
+    Se configura con LLM_MAX_CONCURRENCY_<PROVIDER> o LLM_MAX_CONCURRENCY;
+    por defecto, el valor de DEFAULT_MAX_CONCURRENCY por servidor.
+
+    Args:
+        provider: ollama, openai, anthropic o deepseek
+        hosts: Servidores detrás del proveedor (pool de Ollama)
+    """
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        value = os.getenv(f"LLM_MAX_CONCURRENCY_{provider.upper()}") or os.getenv("LLM_MAX_CONCURRENCY")
+        limit = int(value) if value else DEFAULT_MAX_CONCURRENCY.get(provider, 4) * hosts
+        limiter = PriorityLimiter(limit)
+        _limiters[provider] = limiter
+    return limiter
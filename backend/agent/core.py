@@ -3,7 +3,7 @@ Agent Core - Motor principal del agente autónomo
 Implementa el ciclo Plan & Act
 """
 
-from typing import List, Dict, Any, Optional, AsyncGenerator
+from typing import List, Dict, Any, Optional, AsyncGenerator, Tuple
 import logging
 from dataclasses import dataclass
 
@@ -12,12 +12,51 @@ import json
 import uuid
 import asyncio # Added by user instruction
 import os # Added by user instruction
+import time
 from .llm_provider import LLMProvider, Message, LLMResponse, ToolCall
 from .context import ContextManager
-from .prompts import get_system_prompt
+from .prompts import (
+    get_system_prompt, get_vision_segment, PLAN_INSTRUCTIONS,
+    REPEATED_CALL_HINT, LOOP_HINT_INSTRUCTIONS, PARTIAL_ANSWER_INSTRUCTIONS
+)
+from .tool_selector import ToolSelector, tool_document
+from .tool_call_parser import extract_tool_calls, parse_tool_json
+from .single_flight import SingleFlight, SingleFlightLLMProvider, tool_call_key
+from .usage import UsageTracker, UsageTotals
+from .concurrency import LimitedLLMProvider, LLMRateLimitError, get_limiter, provider_key
+from .cascade import ModelCascade, PHASE_ROUTING, PHASE_SYNTHESIS
+from .planner import PlanError, PlanExecutor, plan_from_response, topological_levels
+from .subagents import SubAgentRunner, SubAgentTool, SUBAGENT_TOOL_NAME
+from .macros import MacroStore, Macro, get_macro_store
+from .tool_cache import ToolResultCache
+from .loop_guard import LoopGuard, CYCLE_WARN, STOP_CYCLE, STOP_ITERATIONS, STOP_MESSAGES
+from .cancellation import RunRegistry, CANCEL_CLIENT, CANCEL_MESSAGES, current_scope
+from .checkpoints import (
+    CheckpointStore, RunCheckpoint, get_checkpoint_store, CHECKPOINT_RUNNING, CHECKPOINT_APPROVAL
+)
 
 logger = logging.getLogger(__name__)
 
+# vision_manager arrastra cv2/numpy: se importa en el primer uso y se reutiliza
+_vision_manager = None
+
+
+def _get_vision_manager():
+    global _vision_manager
+    if _vision_manager is None:
+        from agent.vision_manager import vision_manager
+        _vision_manager = vision_manager
+    return _vision_manager
+
+
+# Modelo por defecto de cada proveedor al reconfigurar sin modelo
+DEFAULT_MODELS = {
+    "ollama": "llama3.2:latest",
+    "openai": "gpt-4",
+    "anthropic": "claude-3-sonnet-20240229",
+    "deepseek": "deepseek-chat"
+}
+
 
 @dataclass
 class AgentConfig:
@@ -30,6 +69,48 @@ class AgentConfig:
     openai_api_key: Optional[str] = None
     anthropic_api_key: Optional[str] = None
     deepseek_api_key: Optional[str] = None
+    temperature: float = 0.7
+    max_tokens: int = 4000
+    # Caché de respuestas exactas del LLM (solo con temperatura 0 salvo forzada)
+    response_cache: bool = False
+    response_cache_force: bool = False
+    # Agrupar llamadas idénticas concurrentes al LLM y a tools de solo lectura
+    single_flight: bool = True
+    # Límite de llamadas simultáneas por proveedor y reintentos ante sobrecarga
+    concurrency_limit: bool = True
+    llm_max_retries: int = 4
+    # Cascada de modelos: niveles de escalado tras el modelo principal
+    # ([{"provider": ..., "model": ...}]) y nivel inicial de cada fase
+    cascade: List[Dict[str, str]] = None
+    cascade_routing_tier: int = 0
+    cascade_synthesis_tier: int = 0
+    # Modo de ejecución: "react" (un tool call por llamada al LLM) o "plan"
+    # (plan completo en una llamada, ejecución en paralelo y síntesis)
+    execution_mode: str = "react"
+    plan_max_parallel: int = 4
+    # Sub-agentes en paralelo con tools acotados (tool delegate_investigation)
+    subagents: bool = False
+    subagent_max_parallel: int = 3
+    subagent_token_budget: int = 8000
+    subagent_timeout: float = 60.0
+    subagent_max_iterations: int = 5
+    # Macros: peticiones repetidas resueltas con tools de solo lectura se
+    # graban y se reproducen sin que el LLM planifique
+    macros: bool = False
+    # Caché con TTL de los tools que la declaran (cache_ttl en el ToolSpec)
+    tool_cache: bool = True
+    # Por ejecución: repeticiones y ciclos de tool calls, y presupuesto de
+    # tiempo (segundos) y tokens (0 = sin límite)
+    loop_detection: bool = True
+    run_max_seconds: float = 0.0
+    run_max_tokens: int = 0
+    # Checkpoints en SQLite: las aprobaciones pendientes y las ejecuciones
+    # interrumpidas sobreviven a un reinicio (False = solo en memoria)
+    checkpoints: bool = False
+    # Selección de tools por petición (0 = enviar siempre el catálogo completo)
+    tool_selection_top_k: int = 6
+    core_tools: List[str] = None  # Tools que se envían siempre
+    recent_tool_messages: int = 20  # Mensajes recientes donde buscar tools usados
     
     def __post_init__(self):
         if self.require_approval_for is None:
@@ -39,17 +120,39 @@ class AgentConfig:
                 "delete_file",
                 "execute_command"
             ]
+        if self.core_tools is None:
+            self.core_tools = [
+                "execute_command",
+                "browser",
+                "get_visual_context"
+            ]
+        if self.cascade is None:
+            self.cascade = []
 
 
 class ToolRegistry:
     """Registro de tools disponibles"""
     
+    # Máximo de subconjuntos de tools serializados en caché por versión
+    MAX_CACHED_SUBSETS = 64
+    
     def __init__(self):
         self.tools: Dict[str, Any] = {}
+        # Versión del catálogo: se incrementa en cada register()
+        self.version = 0
+        self._llm_tools: Optional[List[Dict]] = None
+        self._llm_tools_version = -1
+        self._subsets: Dict[tuple, List[Dict]] = {}
+        self._selector: Optional[ToolSelector] = None
+        self._selector_version = -1
+        # Resultados de tools cacheables (TTL + invalidación por categoría)
+        self.result_cache = ToolResultCache()
     
     def register(self, tool):
-        """Registra un tool"""
+        """Registra un tool (invalida el catálogo serializado)"""
         self.tools[tool.name] = tool
+        self.version += 1
+        self._llm_tools = None
         logger.info(f"Tool registrado: {tool.name}")
     
     def get(self, name: str):
@@ -60,6 +163,79 @@ class ToolRegistry:
         """Obtiene definiciones de todos los tools para el LLM"""
         return [tool.get_definition() for tool in self.tools.values()]
     
+    def get_llm_tools(self, names: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Catálogo de tools en formato OpenAI, calculado una vez por versión.
+        
+        Args:
+            names: Subconjunto de tools (None = todos). Cada subconjunto se
+                   cachea para que llamadas repetidas envíen la misma lista.
+        
+        La lista retornada es compartida: no debe modificarse.
+        """
+        if self._llm_tools is None or self._llm_tools_version != self.version:
+            self._llm_tools = [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": tool_def["name"],
+                        "description": tool_def["description"],
+                        "parameters": tool_def["parameters"]
+                    }
+                }
+                for tool_def in self.get_all_definitions()
+            ]
+            self._llm_tools_version = self.version
+            self._subsets = {}
+        
+        if names is None:
+            return self._llm_tools
+        
+        key = tuple(names)
+        subset = self._subsets.get(key)
+        if subset is None:
+            wanted = set(names)
+            subset = [t for t in self._llm_tools if t["function"]["name"] in wanted]
+            if len(self._subsets) >= self.MAX_CACHED_SUBSETS:
+                self._subsets.clear()
+            self._subsets[key] = subset
+        return subset
+    
+    def select_tools(
+        self,
+        query: str,
+        top_k: int,
+        keep: Optional[List[str]] = None
+    ) -> Optional[List[str]]:
+        """
+        Selecciona los tools relevantes para una petición (BM25)
+        
+        Args:
+            query: Texto de la petición del usuario
+            top_k: Número de tools por relevancia
+            keep: Tools que se incluyen siempre (básicos o usados recientemente)
+        
+        Returns:
+            Nombres en el orden del registro, o None si no hay coincidencias
+            o el subconjunto no reduce el catálogo (usar todos los tools)
+        """
+        if self._selector is None or self._selector_version != self.version:
+            self._selector = ToolSelector()
+            self._selector.index(
+                (name, tool_document(tool.get_definition(), getattr(tool, "category", "")))
+                for name, tool in self.tools.items()
+            )
+            self._selector_version = self.version
+        
+        ranked = self._selector.top(query, top_k)
+        if not ranked:
+            return None
+        
+        selected = set(ranked) | {name for name in (keep or []) if name in self.tools}
+        if len(selected) >= len(self.tools):
+            return None
+        return [name for name in self.tools if name in selected]
+    
     def list_tools(self) -> List[str]:
         """Lista nombres de todos los tools"""
         return list(self.tools.keys())
@@ -81,97 +257,339 @@ class AgentCore:
             llm_provider: Proveedor de LLM
             config: Configuración del agente
         """
-        self.llm = llm_provider
         self.config = config or AgentConfig()
+        # Compartido entre reconfiguraciones del LLM
+        self.llm_flight = SingleFlight()
+        self.tool_flight = SingleFlight()
+        self.llm = self._wrap_llm(llm_provider)
+        # Modelos de escalado (None = solo el modelo principal)
+        self.cascade = self._build_cascade()
+        # Ejecuciones en curso por proveedor (el anterior se cierra al terminar)
+        self._llm_runs: Dict[LLMProvider, int] = {}
         self.context_manager = ContextManager()
+        # Tokens, latencia y throughput de cada llamada al LLM
+        self.usage_tracker = UsageTracker()
         self.tool_registry = ToolRegistry()
         self.system_prompt = get_system_prompt()
+        # Último mensaje de estado volátil (se reutiliza mientras no cambie)
+        self._state_messages: Dict[str, Message] = {}
+        
+        # Overhead de preparación por iteración (prompt + tools) y tokens
+        # de prompt evaluados por el LLM (bajan cuando reutiliza el prefijo)
+        self.loop_stats = {
+            "iterations": 0,
+            "prepare_seconds": 0.0,
+            "last_prepare_ms": 0.0,
+            "llm_calls": 0,
+            "prompt_eval_tokens": 0,
+            "last_prompt_eval_tokens": None,
+            "tool_selections": 0,
+            "tool_selection_misses": 0,
+            "last_tools_sent": 0,
+            "plans": 0,
+            "plan_steps": 0,
+            "plan_fallbacks": 0,
+            "repeated_tool_calls": 0,
+            "cycle_warnings": 0,
+            "run_stops": {}
+        }
+        
+        # Ejecuciones pausadas por una aprobación (su checkpoint)
+        self.pending_approvals: Dict[str, RunCheckpoint] = {}
+        self.checkpoints = get_checkpoint_store() if self.config.checkpoints else CheckpointStore()
+        
+        # Ejecuciones en curso (cancelables por conversación)
+        self.runs = RunRegistry()
+        
+        # Secuencias de tools grabadas (None = desactivadas)
+        self.macros: Optional[MacroStore] = get_macro_store() if self.config.macros else None
         
-        # Estado para aprobaciones pendientes
-        self.pending_approvals: Dict[str, Dict[str, Any]] = {}
+        # Delegación en sub-agentes (se envía siempre, como los tools básicos)
+        self.subagents: Optional[SubAgentRunner] = None
+        if self.config.subagents:
+            self.subagents = SubAgentRunner(
+                self,
+                max_parallel=self.config.subagent_max_parallel,
+                token_budget=self.config.subagent_token_budget,
+                timeout=self.config.subagent_timeout,
+                max_iterations=self.config.subagent_max_iterations
+            )
+            self.register_tool(SubAgentTool(self.subagents))
+            if SUBAGENT_TOOL_NAME not in self.config.core_tools:
+                self.config.core_tools.append(SUBAGENT_TOOL_NAME)
         
         logger.info(f"AgentCore inicializado con {llm_provider.__class__.__name__}")
     
-    def reconfigure_llm(
-        self,
-        provider: str,
-        model: Optional[str] = None,
-        api_key: Optional[str] = None
-    ):
-        """Reconfigura el proveedor de LLM"""
-        from .llm_provider import create_llm_provider
-        
-        self.llm = create_llm_provider(
-            provider,
-            model=model,
-            api_key=api_key
-        )
-        self.config.llm_provider = provider
-        if model:
-            self.config.model = model
-            
-        logger.info(f"AgentCore reconfigurado con {provider} ({model})")
-
     async def process_message(
         self,
         user_message: str,
         conversation_id: str,
-        stream: bool = False
+        stream: bool = False,
+        max_seconds: Optional[float] = None
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         Procesa un mensaje del usuario
         
+        La ejecución completa usa el proveedor vigente al empezar: si el LLM
+        se reconfigura a mitad, esta ejecución termina con el anterior.
+        
         Args:
             user_message: Mensaje del usuario
             conversation_id: ID de la conversación
             stream: Si hacer streaming de la respuesta
+            max_seconds: Tiempo máximo (None = run_max_seconds; 0 = sin límite)
         
         Yields:
             Eventos del procesamiento (thinking, tool_call, message, etc.)
         """
+        llm = self._acquire_llm()
+        try:
+            async for event in self._scoped(
+                conversation_id,
+                self._run(llm, user_message, conversation_id, stream),
+                max_seconds
+            ):
+                yield event
+        finally:
+            self._release_llm(llm)
+    
+    async def _scoped(
+        self,
+        conversation_id: str,
+        events: AsyncGenerator[Dict[str, Any], None],
+        max_seconds: Optional[float] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Ejecuta una ejecución del agente dentro de un ámbito cancelable
+        
+        Si se cancela (cancel_run, desconexión o deadline), lo que esté en
+        curso se interrumpe y se emiten cancelled y done. Las ejecuciones
+        anidadas (aprobación que continúa, sub-agentes) usan el ámbito de
+        la exterior.
+        
+        Args:
+            conversation_id: ID de la conversación
+            events: Eventos de la ejecución
+            max_seconds: Tiempo máximo (None = run_max_seconds)
+        
+        Yields:
+            Los eventos de la ejecución
+        """
+        if current_scope() is not None:
+            async for event in events:
+                yield event
+            return
+        
+        if max_seconds is None:
+            max_seconds = self.config.run_max_seconds
+        scope = self.runs.start(conversation_id, max_seconds)
+        iteration = 0
+        try:
+            while not scope.cancelled:
+                try:
+                    event = await scope.step(events.__anext__())
+                except StopAsyncIteration:
+                    return
+                except asyncio.CancelledError:
+                    if not scope.cancelled:
+                        raise
+                    # Cancelación propia: solo se canceló el paso, el consumidor sigue
+                    break
+                iteration = event.get("iteration", iteration)
+                yield event
+            
+            # Una ejecución cancelada no se reanuda
+            self.checkpoints.delete(conversation_id, CHECKPOINT_RUNNING)
+            yield {
+                "type": "cancelled",
+                "reason": scope.reason,
+                "message": CANCEL_MESSAGES.get(scope.reason, scope.reason)
+            }
+            yield {
+                "type": "done",
+                "iterations": iteration,
+                "prompt_eval_tokens": [],
+                "usage": None,
+                "cancelled": True
+            }
+        finally:
+            self.runs.finish(scope)
+            await events.aclose()
+    
+    def cancel_run(self, conversation_id: str, reason: str = CANCEL_CLIENT) -> int:
+        """
+        Cancela las ejecuciones en curso de una conversación
+        
+        Args:
+            conversation_id: ID de la conversación
+            reason: Motivo (client, disconnected, deadline)
+        
+        Returns:
+            Ejecuciones canceladas
+        """
+        return self.runs.cancel(conversation_id, reason)
+    
+    async def _run(
+        self,
+        llm: LLMProvider,
+        user_message: str,
+        conversation_id: str,
+        stream: bool,
+        resume: Optional[RunCheckpoint] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Ciclo Plan & Act de un mensaje con un proveedor fijo (o su continuación desde un checkpoint)"""
         # Establecer conversación actual
         self.context_manager.set_current_conversation(conversation_id)
         
-        # Agregar mensaje del usuario al contexto
-        self.context_manager.add_message("user", user_message, conversation_id)
+        if resume is None:
+            # Agregar mensaje del usuario al contexto
+            self.context_manager.add_message("user", user_message, conversation_id)
+            
+            # Tools relevantes para esta petición (fijos durante el turno para
+            # no romper el prefijo; None = catálogo completo)
+            tool_names = self._select_tools(user_message, conversation_id)
+            state = RunCheckpoint(conversation_id, user_message, tool_names=tool_names)
+            state.turn_start = len(self.context_manager.get_messages(conversation_id))
+        else:
+            # Continuación del turno: mismos tools, iteración y consumo
+            state = resume
+            tool_names = state.tool_names
+        cascade = self.cascade
         
         # Iniciar ciclo Plan & Act
-        iteration = 0
+        iteration = state.iteration
+        prompt_eval_tokens: List[Optional[int]] = list(state.prompt_eval_tokens)
+        run_usage = UsageTotals()
+        if state.usage:
+            run_usage.add(state.usage)
+        answered = False
+        tools_executed = resume is not None
+        # Tool calls del turno, para grabarlos como macro si todo sale bien
+        recorded_calls: List[ToolCall] = []
+        recordable = self.macros is not None and bool(user_message) and resume is None
+        tool_iterations = 0
+        # Repeticiones, ciclos y presupuesto de esta ejecución (el tiempo
+        # es el que le queda al ámbito: los jobs tienen el suyo)
+        scope = current_scope()
+        guard = LoopGuard(
+            max_seconds=scope.remaining() or 0.0 if scope is not None else self.config.run_max_seconds,
+            max_tokens=self.config.run_max_tokens,
+            detect_loops=self.config.loop_detection
+        )
+        stop_reason: Optional[str] = None
+        loop_hint: Optional[Message] = None
+        
+        # Macro grabada: los tools se ejecutan sin planificar y el LLM solo
+        # redacta la respuesta
+        macro_match = self.macros.match(user_message) if recordable else None
+        if macro_match is not None:
+            replay: Dict[str, Any] = {}
+            async for event in self._run_macro(*macro_match, conversation_id, replay):
+                yield event
+            tools_executed = replay.get("executed", False)
+            recordable = False
+        
+        # Modo plan: una llamada planifica todo; el ciclo solo sintetiza
+        # (o corrige si falló algún paso)
+        if self.config.execution_mode == "plan" and user_message and not tools_executed:
+            plan: Dict[str, Any] = {}
+            async for event in self._run_plan(llm, conversation_id, tool_names, plan):
+                yield event
+            if "usage" in plan:
+                iteration = 1
+                prompt_eval_tokens.append(plan["prompt_tokens"])
+                run_usage.add(plan["usage"])
+            answered = "answer" in plan
+            tools_executed = plan.get("executed", False)
+            recordable = recordable and not tools_executed
+        
+        # Continuación: primero los tool calls que quedaron pendientes
+        if resume is not None and resume.pending:
+            async for event in self._process_checkpointed(state, resume.tool_calls(), guard, record=False):
+                yield event
         
-        while iteration < self.config.max_iterations:
+        # Una aprobación pausa la ejecución hasta que el usuario responda
+        while not answered and state.status != CHECKPOINT_APPROVAL and iteration < self.config.max_iterations:
+            # Presupuesto de la ejecución (antes de cada llamada al LLM)
+            stop_reason = guard.budget_exceeded(run_usage.values["total_tokens"])
+            if stop_reason is not None:
+                break
             iteration += 1
             
-            # Obtener contexto para el LLM
+            # Obtener contexto y definiciones de tools (cacheadas)
+            prepare_start = time.perf_counter()
             messages = self._prepare_messages_for_llm(conversation_id)
-            
-            # Obtener definiciones de tools
-            tools = self._get_tools_for_llm()
+            if loop_hint is not None:
+                messages.append(loop_hint)
+            tools = self._get_tools_for_llm(tool_names)
+            self.loop_stats["last_tools_sent"] = len(tools)
+            prepare_ms = self._record_prepare(time.perf_counter() - prepare_start)
             
             # Yield evento de "thinking"
             yield {
                 "type": "thinking",
                 "iteration": iteration,
-                "message": "Analizando y planificando..."
+                "message": "Analizando y planificando...",
+                "prepare_ms": prepare_ms
             }
             
-            # Llamar al LLM
+            # Llamar al LLM (tras ejecutar tools, el siguiente paso es sintetizar)
+            phase = PHASE_SYNTHESIS if tools_executed else PHASE_ROUTING
             try:
                 logger.debug(f"LLM Request Messages: {json.dumps([{'role': m.role, 'content': m.content} for m in messages], indent=2)}")
-                response = await self.llm.chat(
-                    messages=messages,
-                    tools=tools,
-                    temperature=0.7,
-                    max_tokens=4000
-                )
+                llm_start = time.perf_counter()
+                if cascade is None:
+                    response = await llm.chat(
+                        messages=messages,
+                        tools=tools,
+                        temperature=self.config.temperature,
+                        max_tokens=self.config.max_tokens
+                    )
+                    attempts = [(llm.model, response.usage, time.perf_counter() - llm_start, None)]
+                else:
+                    result = await cascade.chat(
+                        llm,
+                        messages,
+                        tools,
+                        self.config.temperature,
+                        self.config.max_tokens,
+                        phase,
+                        self.tool_registry.tools
+                    )
+                    response = result.response
+                    attempts = [(a.model, a.usage, a.latency, a.reason) for a in result.attempts]
             except Exception as e:
+                # Deadline agotado durante la llamada: se responde con lo obtenido
+                stop_reason = guard.budget_exceeded(run_usage.values["total_tokens"])
+                if stop_reason is not None:
+                    logger.warning(f"Llamada al LLM interrumpida por el presupuesto de la ejecución: {e}")
+                    break
                 logger.error(f"Error en llamada al LLM: {str(e)}", exc_info=True)
                 yield {
                     "type": "error",
                     "error": str(e),
-                    "message": "Error al comunicarse con el LLM"
+                    "message": (
+                        "El proveedor de LLM está sobrecargado, inténtalo de nuevo en unos segundos"
+                        if isinstance(e, LLMRateLimitError)
+                        else "Error al comunicarse con el LLM"
+                    )
                 }
                 break
             
+            prompt_eval_tokens.append(self._record_usage(response))
+            for position, (model, call_usage, latency, reason) in enumerate(attempts):
+                usage = self.usage_tracker.record(conversation_id, model, iteration, call_usage, latency)
+                run_usage.add(usage)
+                if reason is not None:
+                    yield {
+                        "type": "escalation",
+                        "iteration": iteration,
+                        "phase": phase,
+                        "from": model,
+                        "to": attempts[position + 1][0],
+                        "reason": reason
+                    }
+            
             # Intentar extraer tool calls si no vienen nativos
             if response.content:
                 parsed_tool_calls, matched_strings = self._extract_tool_calls_from_content(response.content, return_strings=True)
@@ -212,18 +630,43 @@ class AgentCore:
             
             # Si el LLM quiere usar tools
             if response.tool_calls:
-                # Procesar tool calls
-                async for event in self._process_tool_calls(
-                    response.tool_calls,
-                    conversation_id
-                ):
+                # Tool fuera del subconjunto: el resto del turno va con todos
+                if tool_names is not None and any(tc.name not in tool_names for tc in response.tool_calls):
+                    logger.info("Tool fuera de la selección: se envía el catálogo completo")
+                    self.loop_stats["tool_selection_misses"] += 1
+                    tool_names = None
+                
+                # Procesar tool calls (con checkpoint tras cada resultado)
+                state.iteration = iteration
+                state.tool_names = tool_names
+                state.prompt_eval_tokens = prompt_eval_tokens
+                state.usage = run_usage.to_dict()
+                async for event in self._process_checkpointed(state, response.tool_calls, guard):
+                    if event["type"] == "approval_required" or (event["type"] == "tool_result" and not event["success"]):
+                        recordable = False
                     yield event
+                tools_executed = True
+                tool_iterations += 1
+                recorded_calls.extend(response.tool_calls)
+                
+                # Misma secuencia de tool calls otra vez: primero se avisa al
+                # LLM y, si insiste, se para
+                cycle = guard.end_iteration(response.tool_calls)
+                if cycle == CYCLE_WARN:
+                    self.loop_stats["cycle_warnings"] += 1
+                    cycle_tools = ", ".join(sorted({tc.name for tc in response.tool_calls}))
+                    logger.info(f"Ciclo de tool calls detectado ({cycle_tools}): se avisa al LLM")
+                    loop_hint = Message(role="user", content=LOOP_HINT_INSTRUCTIONS.format(tools=cycle_tools))
+                elif cycle == STOP_CYCLE:
+                    stop_reason = STOP_CYCLE
+                    break
                 
                 # Continuar el ciclo para que el LLM procese los resultados
                 continue
             
             # Si no hay tool calls, el LLM ha terminado
             if response.content:
+                answered = True
                 # Agregar respuesta al contexto
                 self.context_manager.add_message(
                     "assistant",
@@ -235,214 +678,685 @@ class AgentCore:
                 yield {
                     "type": "message",
                     "content": response.content,
-                    "finish_reason": response.finish_reason
+                    "finish_reason": response.finish_reason,
+                    "model": attempts[-1][0],
+                    "usage": usage
                 }
+                
+                # Solo se graban turnos de una llamada con tools de solo lectura:
+                # con más llamadas, los argumentos podían depender de resultados
+                if recordable and tool_iterations == 1 and all(
+                    getattr(self.tool_registry.get(tc.name), "read_only", False) for tc in recorded_calls
+                ):
+                    self.macros.record(
+                        user_message,
+                        [(tc.name, tc.arguments) for tc in recorded_calls],
+                        schemas={
+                            tc.name: self.tool_registry.get(tc.name).get_definition()["parameters"].get("properties", {})
+                            for tc in recorded_calls
+                        }
+                    )
             
             # Terminar ciclo
             break
+        else:
+            # Iteraciones agotadas usando tools y sin respuesta (salvo que
+            # quede una aprobación pendiente)
+            if not answered and tools_executed and state.status != CHECKPOINT_APPROVAL:
+                stop_reason = STOP_ITERATIONS
+        
+        if stop_reason is not None:
+            async for event in self._finish_partial(llm, conversation_id, stop_reason, guard, iteration, run_usage):
+                yield event
+        
+        # Terminada (o pausada con su checkpoint de aprobación)
+        self.checkpoints.delete(conversation_id, CHECKPOINT_RUNNING)
         
         # Yield evento de finalización
         yield {
             "type": "done",
-            "iterations": iteration
+            "iterations": iteration,
+            "prompt_eval_tokens": prompt_eval_tokens,
+            "usage": run_usage.to_dict()
         }
 
-    async def process_approval(
+    async def _finish_partial(
         self,
+        llm: LLMProvider,
         conversation_id: str,
-        approved: bool
+        reason: str,
+        guard: LoopGuard,
+        iteration: int,
+        run_usage: UsageTotals
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
-        Procesa la respuesta del usuario a una solicitud de aprobación
+        Termina una ejecución parada con una respuesta parcial
+        
+        Tras un ciclo o al agotar las iteraciones, el LLM redacta la
+        respuesta sin tools. Si se agotó el presupuesto no se gasta otra
+        llamada: se resumen los resultados obtenidos.
         
         Args:
+            llm: Proveedor fijo de la ejecución
             conversation_id: ID de la conversación
-            approved: True si se aprobó, False si se rechazó
+            reason: Motivo de parada (ver loop_guard)
+            guard: Estado de la ejecución
+            iteration: Iteración en la que se paró
+            run_usage: Uso acumulado de la ejecución
         
         Yields:
-            Eventos de ejecución y continuación
+            run_stopped y el mensaje con la respuesta parcial
         """
-        pending = self.pending_approvals.pop(conversation_id, None)
-        if not pending:
-            yield {"type": "error", "message": "No hay acciones pendientes de aprobación"}
-            return
-
-        tool_call = pending["tool_call"]
+        stops = self.loop_stats["run_stops"]
+        stops[reason] = stops.get(reason, 0) + 1
+        logger.warning(f"Ejecución parada ({reason}) tras {iteration} iteraciones y {guard.elapsed():.1f}s")
+        yield {
+            "type": "run_stopped",
+            "reason": reason,
+            "message": STOP_MESSAGES[reason],
+            "iterations": iteration,
+            "elapsed": round(guard.elapsed(), 2)
+        }
         
-        if approved:
-            # Ejecutar el tool que estaba pausado
-            logger.info(f"Aprobado: Ejecutando {tool_call.name}")
-            
-            # Reutilizamos la lógica de ejecución (pero solo para este tool)
+        content = None
+        model = llm.model
+        usage = None
+        if reason in (STOP_CYCLE, STOP_ITERATIONS):
+            messages = self._prepare_messages_for_llm(conversation_id) + [
+                Message(role="user", content=PARTIAL_ANSWER_INSTRUCTIONS.format(reason=STOP_MESSAGES[reason].lower()))
+            ]
+            llm_start = time.perf_counter()
             try:
-                tool = self.tool_registry.get(tool_call.name)
-                if not tool:
-                    result = {"success": False, "error": f"Tool '{tool_call.name}' no encontrado"}
-                else:
-                    result = await tool.execute(**tool_call.arguments)
-                
-                # Yield resultado
-                yield {
-                    "type": "tool_result",
-                    "tool": tool_call.name,
-                    "tool_call_id": tool_call.id,
-                    "result": result,
-                    "success": result.get("success", True) if isinstance(result, dict) else True
-                }
-                
-                # Guardar resultado en el contexto
-                self.context_manager.add_message(
-                    "tool",
-                    str(result),
-                    conversation_id,
-                    tool_call_id=tool_call.id
+                response = await llm.chat(
+                    messages=messages,
+                    tools=None,
+                    temperature=self.config.temperature,
+                    max_tokens=self.config.max_tokens
                 )
-                
-                # Continuar el ciclo normal (pedir al LLM que procese el resultado)
-                # Llamamos a process_message pasándole un mensaje vacío o indicando que continúe
-                async for event in self.process_message("", conversation_id):
-                    yield event
-                    
             except Exception as e:
-                logger.error(f"Error ejecutando tool aprobado: {e}")
-                yield {"type": "error", "error": str(e)}
-        else:
-            # Rechazado por el usuario
-            logger.info(f"Rechazado: {tool_call.name}")
-            
-            result = "Error: El usuario rechazó la ejecución de esta herramienta por razones de seguridad."
-            
-            yield {
-                "type": "tool_result",
-                "tool": tool_call.name,
-                "tool_call_id": tool_call.id,
-                "result": result,
-                "success": False
-            }
-            
-            # Informar al contexto del rechazo
-            self.context_manager.add_message(
-                "tool",
-                result,
-                conversation_id,
-                tool_call_id=tool_call.id
-            )
-            
-            # Continuar para que el LLM sepa que fue rechazado
-            async for event in self.process_message("", conversation_id):
-                yield event
+                logger.warning(f"Error al redactar la respuesta parcial: {e}")
+            else:
+                self._record_usage(response)
+                usage = self.usage_tracker.record(
+                    conversation_id, model, iteration, response.usage, time.perf_counter() - llm_start
+                )
+                run_usage.add(usage)
+                # Si aun así intenta llamar a tools, se usa el resumen
+                if not response.tool_calls and not self._extract_tool_calls_from_content(response.content or ""):
+                    content = response.content
+        
+        if not content:
+            content = guard.partial_answer(reason)
+            model = None
+        
+        self.context_manager.add_message("assistant", content, conversation_id)
+        yield {
+            "type": "message",
+            "content": content,
+            "finish_reason": reason,
+            "model": model,
+            "usage": usage,
+            "partial": True
+        }
     
-    async def _process_tool_calls(
+    async def _run_macro(
         self,
-        tool_calls: List[ToolCall],
-        conversation_id: str
+        macro: Macro,
+        calls: List[tuple],
+        conversation_id: str,
+        replay: Dict[str, Any]
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
-        Procesa llamadas a tools
+        Reproduce los tool calls de una macro
+        
+        No se reproduce si algún tool ya no existe o requiere aprobación:
+        el turno sigue por el ciclo normal.
         
         Args:
-            tool_calls: Lista de tool calls del LLM
+            macro: Macro que coincide con la petición
+            calls: Tool calls con los parámetros de esta petición
             conversation_id: ID de la conversación
+            replay: Se marca executed=True si se ejecutaron los tools
         
         Yields:
-            Eventos de ejecución de tools
+            Eventos de ejecución de los tools
         """
-        # Agregar tool calls al contexto
+        if any(self.tool_registry.get(name) is None or self._requires_approval(name) for name, _ in calls):
+            logger.info(f"Macro {macro.name} no reproducible ahora: se continúa con el LLM")
+            return
+        
+        tool_calls = [
+            ToolCall(id=f"call_{uuid.uuid4().hex[:8]}", name=name, arguments=arguments)
+            for name, arguments in calls
+        ]
+        yield {
+            "type": "macro",
+            "name": macro.name,
+            "template": macro.template,
+            "tool_calls": [{"tool": tc.name, "arguments": tc.arguments} for tc in tool_calls]
+        }
+        
+        success = True
+        async for event in self._process_tool_calls(tool_calls, conversation_id):
+            if event["type"] == "tool_result" and not event["success"]:
+                success = False
+            yield event
+        self.macros.record_result(macro, success)
+        replay["executed"] = True
+    
+    async def _run_plan(
+        self,
+        llm: LLMProvider,
+        conversation_id: str,
+        tool_names: Optional[List[str]],
+        plan: Dict[str, Any]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Planificación y ejecución del plan (modo plan)
+        
+        Si el LLM no devuelve un plan válido, o el plan incluye tools que
+        requieren aprobación, no se ejecuta nada y el ciclo normal sigue
+        paso a paso.
+        
+        Args:
+            llm: Proveedor fijo de la ejecución
+            conversation_id: ID de la conversación
+            tool_names: Tools seleccionados para el turno (None = todos)
+            plan: Se rellena con usage, prompt_tokens y answer (si el LLM
+                respondió directamente sin tools)
+        
+        Yields:
+            Eventos de planificación y de ejecución de los pasos
+        """
+        prepare_start = time.perf_counter()
+        # Las instrucciones van al final: el prefijo es el mismo que en el ciclo normal
+        messages = self._prepare_messages_for_llm(conversation_id) + [
+            Message(role="user", content=PLAN_INSTRUCTIONS)
+        ]
+        tools = self._get_tools_for_llm(tool_names)
+        prepare_ms = self._record_prepare(time.perf_counter() - prepare_start)
+        
+        yield {
+            "type": "thinking",
+            "iteration": 1,
+            "message": "Planificando la tarea completa...",
+            "prepare_ms": prepare_ms
+        }
+        
+        llm_start = time.perf_counter()
+        try:
+            response = await llm.chat(
+                messages=messages,
+                tools=tools,
+                temperature=self.config.temperature,
+                max_tokens=self.config.max_tokens
+            )
+        except Exception as e:
+            logger.warning(f"Error al planificar, se continúa paso a paso: {e}")
+            return
+        
+        plan["prompt_tokens"] = self._record_usage(response)
+        plan["usage"] = self.usage_tracker.record(
+            conversation_id, llm.model, 1, response.usage, time.perf_counter() - llm_start
+        )
+        
+        try:
+            steps = plan_from_response(response, self.tool_registry.tools)
+        except PlanError as e:
+            logger.info(f"Plan no válido, se continúa paso a paso: {e}")
+            self.loop_stats["plan_fallbacks"] += 1
+            return
+        
+        if steps is None:
+            # Respuesta directa: no hacía falta ningún tool
+            plan["answer"] = response.content
+            self.context_manager.add_message("assistant", response.content, conversation_id)
+            yield {
+                "type": "message",
+                "content": response.content,
+                "finish_reason": response.finish_reason,
+                "model": llm.model,
+                "usage": plan["usage"]
+            }
+            return
+        
+        if any(self._requires_approval(step.tool) for step in steps):
+            logger.info("El plan incluye tools con aprobación: se continúa paso a paso")
+            self.loop_stats["plan_fallbacks"] += 1
+            return
+        
+        self.loop_stats["plans"] += 1
+        self.loop_stats["plan_steps"] += len(steps)
+        yield {
+            "type": "plan",
+            "steps": [step.to_dict() for step in steps],
+            "levels": topological_levels(steps)
+        }
+        
+        call_ids = {step.id: f"call_{uuid.uuid4().hex[:8]}" for step in steps}
+        
+        async def run_step(step, arguments):
+            return await self._execute_tool(ToolCall(id=call_ids[step.id], name=step.tool, arguments=arguments))
+        
+        finished = []
+        async for state in PlanExecutor(steps, run_step, self.config.plan_max_parallel).run():
+            event = {"tool": state.step.tool, "tool_call_id": call_ids[state.step.id], "step": state.step.id}
+            if state.status == "running":
+                yield {"type": "tool_call", **event, "arguments": state.arguments}
+                continue
+            finished.append(state)
+            if state.status == "ok":
+                yield {"type": "tool_result", **event, "result": state.result, "success": True}
+            else:
+                yield {"type": "tool_result", **event, "error": state.error, "success": False, "skipped": state.status == "skipped"}
+        
+        # Contexto para la síntesis: los pasos como tool calls y sus resultados
         self.context_manager.add_message(
             "assistant",
             "",
             conversation_id,
             tool_calls=[
                 {
-                    "id": tc.id,
+                    "id": call_ids[state.step.id],
                     "type": "function",
                     "function": {
-                        "name": tc.name,
-                        "arguments": tc.arguments
+                        "name": state.step.tool,
+                        "arguments": state.arguments if state.arguments is not None else state.step.arguments
                     }
                 }
-                for tc in tool_calls
+                for state in finished
             ]
         )
+        for state in finished:
+            if state.status == "ok":
+                content = str(state.result)
+            elif state.status == "skipped":
+                content = f"Omitido: {state.error}"
+            else:
+                content = f"Error: {state.error}"
+            self.context_manager.add_message("tool", content, conversation_id, tool_call_id=call_ids[state.step.id])
+        plan["executed"] = True
+    
+    async def process_approval(
+        self,
+        conversation_id: str,
+        approved: bool,
+        tool_call_ids: Optional[List[str]] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Procesa la respuesta del usuario a una solicitud de aprobación
         
-        # Ejecutar cada tool
-        for tool_call in tool_calls:
-            # Yield evento de tool call
-            yield {
-                "type": "tool_call",
-                "tool": tool_call.name,
-                "arguments": tool_call.arguments,
-                "tool_call_id": tool_call.id
-            }
-            
-            # Feedback visual para tools de visión (que pueden tardar)
-            if tool_call.name in ["get_visual_context", "point_to_object"]:
-                yield {
-                    "type": "thinking",
-                    "message": "Analizando imagen de la cámara móvil..." if tool_call.name == "get_visual_context" else "Señalando objeto en la pantalla...",
-                    "content": ""
-                }
-            
-            # Verificar si requiere aprobación
-            if self._requires_approval(tool_call.name):
-                # Guardar el tool call para ejecución posterior
-                self.pending_approvals[conversation_id] = {
-                    "tool_call": tool_call,
-                    "timestamp": uuid.uuid4().hex # ID único para esta aprobación
-                }
-                
-                yield {
-                    "type": "approval_required",
-                    "tool": tool_call.name,
-                    "arguments": tool_call.arguments,
-                    "tool_call_id": tool_call.id,
-                    "message": f"⚠️ El tool '{tool_call.name}' requiere tu aprobación antes de ejecutarse."
-                }
-                # Detenemos la ejecución de este tool y del ciclo actual
-                return 
-            
-            # Ejecutar tool
-            try:
-                result = await self._execute_tool(tool_call)
-                
-                # Agregar resultado al contexto
-                self.context_manager.add_message(
-                    "tool",
-                    str(result),
-                    conversation_id,
-                    tool_call_id=tool_call.id
+        La respuesta cubre todos los tools pendientes de aprobación del turno.
+        
+        Args:
+            conversation_id: ID de la conversación
+            approved: True si se aprobó, False si se rechazó
+            tool_call_ids: Aprobar solo estos tool calls (el resto se rechaza);
+                None = aplicar `approved` a todos
+        
+        Yields:
+            Eventos de ejecución y continuación
+        """
+        # El tool aprobado (p. ej. un comando largo) también es cancelable
+        async for event in self._scoped(
+            conversation_id,
+            self._process_approval(conversation_id, approved, tool_call_ids)
+        ):
+            yield event
+    
+    async def _process_approval(
+        self,
+        conversation_id: str,
+        approved: bool,
+        tool_call_ids: Optional[List[str]] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Registra la respuesta y continúa el turno desde su checkpoint"""
+        state = self.pending_approvals.pop(conversation_id, None)
+        if state is None:
+            # Tras un reinicio: el checkpoint guardado
+            state = self.checkpoints.load(conversation_id, CHECKPOINT_APPROVAL)
+            if state is not None:
+                self._restore_turn(state)
+        if state is None or not state.pending:
+            yield {"type": "error", "message": "No hay acciones pendientes de aprobación"}
+            return
+        self.checkpoints.delete(conversation_id, CHECKPOINT_APPROVAL)
+        self.checkpoints.stats["resumed"] += 1
+        
+        # Una respuesta para todo el conjunto: aprobados y rechazados
+        for tool_call in state.pending:
+            if tool_call["id"] not in state.approvals and self._requires_approval(tool_call["name"]):
+                state.approvals[tool_call["id"]] = (
+                    approved if tool_call_ids is None else tool_call["id"] in tool_call_ids
                 )
-                
-                # Yield resultado
+        
+        # El resto del turno: los tools pendientes y el LLM con los resultados,
+        # sin volver a añadir el mensaje del usuario ni preparar el turno
+        state.status = CHECKPOINT_RUNNING
+        llm = self._acquire_llm()
+        try:
+            async for event in self._run(llm, state.user_message, conversation_id, False, resume=state):
+                yield event
+        finally:
+            self._release_llm(llm)
+    
+    async def resume_run(
+        self,
+        conversation_id: str,
+        max_seconds: Optional[float] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Continúa una ejecución interrumpida (p. ej. por un reinicio)
+        
+        Empieza donde se guardó el último checkpoint: los tools ya ejecutados
+        no se repiten.
+        
+        Args:
+            conversation_id: ID de la conversación
+            max_seconds: Tiempo máximo (None = run_max_seconds)
+        
+        Yields:
+            Eventos de la continuación
+        """
+        state = self.checkpoints.load(conversation_id, CHECKPOINT_RUNNING)
+        if state is None:
+            yield {"type": "error", "message": "No hay ninguna ejecución que reanudar"}
+            return
+        self._restore_turn(state)
+        self.checkpoints.stats["resumed"] += 1
+        
+        llm = self._acquire_llm()
+        try:
+            async for event in self._scoped(
+                conversation_id,
+                self._run(llm, state.user_message, conversation_id, False, resume=state),
+                max_seconds
+            ):
+                yield event
+        finally:
+            self._release_llm(llm)
+    
+    def has_checkpoint(self, conversation_id: str, user_message: str) -> bool:
+        """True si hay una ejecución interrumpida de ese mensaje que se puede reanudar"""
+        state = self.checkpoints.load(conversation_id, CHECKPOINT_RUNNING)
+        return state is not None and state.user_message == user_message
+    
+    async def _process_checkpointed(
+        self,
+        state: RunCheckpoint,
+        tool_calls: List[ToolCall],
+        guard: LoopGuard,
+        record: bool = True
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Procesa los tool calls de una iteración guardando el checkpoint
+        
+        Tras cada resultado se guarda lo que queda pendiente; los tools que
+        requieren aprobación dejan la ejecución pausada (status approval)
+        con ellos y los siguientes pendientes.
+        """
+        pending = list(tool_calls)
+        saved = False
+        async for event in self._process_tool_calls(tool_calls, state.conversation_id, guard, record, state.approvals):
+            if event["type"] == "tool_result":
+                pending.pop(0)
+                self._checkpoint(state, pending)
+                saved = True
+            elif event["type"] == "approval_required":
+                state.status = CHECKPOINT_APPROVAL
+                self._checkpoint(state, pending)
+                self.checkpoints.delete(state.conversation_id, CHECKPOINT_RUNNING)
+                self.pending_approvals[state.conversation_id] = state
+            elif not saved:
+                # Tool calls ya en el contexto, ninguno ejecutado
+                self._checkpoint(state, pending)
+                saved = True
+            yield event
+    
+    def _checkpoint(self, state: RunCheckpoint, pending: List[ToolCall]):
+        """Guarda el checkpoint de la ejecución con los mensajes del turno"""
+        state.set_pending(pending)
+        state.turn = [
+            self.checkpoints.compact_message(m.role, m.content, m.tool_calls, m.tool_call_id)
+            for m in self.context_manager.get_messages(state.conversation_id)[state.turn_start:]
+        ]
+        self.checkpoints.save(state)
+    
+    def _restore_turn(self, state: RunCheckpoint):
+        """
+        Deja el contexto como estaba al guardar el checkpoint
+        
+        El historial cargado de la base de datos puede no tener el turno (o
+        tenerlo en otro orden): se sustituye todo lo posterior al mensaje
+        del usuario por los mensajes del checkpoint.
+        """
+        conversation_id = state.conversation_id
+        self.context_manager.set_current_conversation(conversation_id)
+        messages = self.context_manager.get_conversation(conversation_id).messages
+        start = next(
+            (i + 1 for i in range(len(messages) - 1, -1, -1)
+             if messages[i].role == "user" and messages[i].content == state.user_message),
+            None
+        )
+        if start is None:
+            self.context_manager.add_message("user", state.user_message, conversation_id)
+            start = len(messages)
+        del messages[start:]
+        for message in state.turn:
+            self.context_manager.add_message(
+                message["role"],
+                message["content"],
+                conversation_id,
+                tool_calls=message.get("tool_calls"),
+                tool_call_id=message.get("tool_call_id")
+            )
+        state.turn_start = start
+    
+    async def _process_tool_calls(
+        self,
+        tool_calls: List[ToolCall],
+        conversation_id: str,
+        guard: Optional[LoopGuard] = None,
+        record: bool = True,
+        approvals: Optional[Dict[str, bool]] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Procesa llamadas a tools
+        
+        Los tools que requieren aprobación se piden todos juntos en un solo
+        approval_required: se ejecutan los anteriores al primero y el resto
+        queda pendiente. Con la respuesta (approvals), los aprobados se
+        ejecutan (a la vez cuando no se afectan entre sí) y los rechazados
+        se informan al LLM sin ejecutarse.
+        
+        Args:
+            tool_calls: Lista de tool calls del LLM
+            conversation_id: ID de la conversación
+            guard: Estado de la ejecución (repeticiones exactas)
+            record: Agregar los tool calls al contexto (False si ya están,
+                al continuar desde un checkpoint)
+            approvals: Respuesta del usuario por tool_call_id (True = aprobado)
+        
+        Yields:
+            Eventos de ejecución de tools
+        """
+        approvals = approvals or {}
+        
+        # Agregar tool calls al contexto
+        if record:
+            self.context_manager.add_message(
+                "assistant",
+                "",
+                conversation_id,
+                tool_calls=[
+                    {
+                        "id": tc.id,
+                        "type": "function",
+                        "function": {
+                            "name": tc.name,
+                            "arguments": tc.arguments
+                        }
+                    }
+                    for tc in tool_calls
+                ]
+            )
+        
+        # Tools del turno que requieren aprobación y aún no tienen respuesta
+        awaiting = [tc for tc in tool_calls if tc.id not in approvals and self._requires_approval(tc.name)]
+        ready = tool_calls[:tool_calls.index(awaiting[0])] if awaiting else tool_calls
+        
+        # Ejecutar cada tool (los aprobados que no se afectan, en paralelo)
+        for wave in self._approved_waves(ready, approvals):
+            for tool_call in wave:
+                # Yield evento de tool call
                 yield {
-                    "type": "tool_result",
+                    "type": "tool_call",
                     "tool": tool_call.name,
-                    "tool_call_id": tool_call.id,
-                    "result": result,
-                    "success": True
+                    "arguments": tool_call.arguments,
+                    "tool_call_id": tool_call.id
                 }
                 
-            except Exception as e:
-                logger.error(f"Error ejecutando tool {tool_call.name}: {e}")
-                
-                error_message = f"Error: {str(e)}"
-                
-                # Agregar error al contexto
-                self.context_manager.add_message(
-                    "tool",
-                    error_message,
-                    conversation_id,
-                    tool_call_id=tool_call.id
+                # Feedback visual para tools de visión (que pueden tardar)
+                if tool_call.name in ["get_visual_context", "point_to_object"]:
+                    yield {
+                        "type": "thinking",
+                        "message": "Analizando imagen de la cámara móvil..." if tool_call.name == "get_visual_context" else "Señalando objeto en la pantalla...",
+                        "content": ""
+                    }
+            
+            if len(wave) == 1:
+                outcomes = [await self._run_tool_call(wave[0], guard, approvals.get(wave[0].id))]
+            else:
+                outcomes = await asyncio.gather(*(
+                    self._run_tool_call(tool_call, guard, approvals.get(tool_call.id)) for tool_call in wave
+                ))
+            
+            # Resultados al contexto en el orden de los tool calls
+            for tool_call, (content, event) in zip(wave, outcomes):
+                self.context_manager.add_message("tool", content, conversation_id, tool_call_id=tool_call.id)
+                yield event
+        
+        if awaiting:
+            # El checkpoint de la ejecución guarda estos tools y los siguientes
+            names = ", ".join(f"'{tc.name}'" for tc in awaiting)
+            yield {
+                "type": "approval_required",
+                "tool": awaiting[0].name,
+                "arguments": awaiting[0].arguments,
+                "tool_call_id": awaiting[0].id,
+                "approvals": [
+                    {"tool": tc.name, "arguments": tc.arguments, "tool_call_id": tc.id}
+                    for tc in awaiting
+                ],
+                "message": (
+                    f"⚠️ El tool {names} requiere tu aprobación antes de ejecutarse."
+                    if len(awaiting) == 1
+                    else f"⚠️ Los tools {names} requieren tu aprobación antes de ejecutarse."
                 )
-                
-                # Yield error
-                yield {
+            }
+    
+    async def _run_tool_call(
+        self,
+        tool_call: ToolCall,
+        guard: Optional[LoopGuard],
+        approved: Optional[bool] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Ejecuta un tool call (o lo rechaza)
+        
+        Args:
+            tool_call: Tool call a ejecutar
+            guard: Estado de la ejecución (repeticiones exactas)
+            approved: False si el usuario lo rechazó
+        
+        Returns:
+            (contenido para el contexto, evento tool_result)
+        """
+        if approved is False:
+            logger.info(f"Rechazado: {tool_call.name}")
+            content = "Error: El usuario rechazó la ejecución de esta herramienta por razones de seguridad."
+            return content, {
+                "type": "tool_result",
+                "tool": tool_call.name,
+                "tool_call_id": tool_call.id,
+                "result": content,
+                "success": False
+            }
+        
+        # Repetición exacta en esta ejecución: resultado anterior y una nota
+        if guard is not None:
+            repeated, result = guard.lookup(tool_call)
+            if repeated:
+                self.loop_stats["repeated_tool_calls"] += 1
+                logger.info(f"Tool call repetido: {tool_call.name} (se reutiliza el resultado)")
+                return f"{result}\n\n{REPEATED_CALL_HINT.format(tool=tool_call.name)}", {
                     "type": "tool_result",
                     "tool": tool_call.name,
                     "tool_call_id": tool_call.id,
-                    "error": str(e),
-                    "success": False
+                    "result": result,
+                    "success": True,
+                    "repeated": True
                 }
+        read_only = getattr(self.tool_registry.get(tool_call.name), "read_only", False)
+        if approved:
+            logger.info(f"Aprobado: Ejecutando {tool_call.name}")
+        
+        # Ejecutar tool
+        try:
+            result = await self._execute_tool(tool_call)
+            if guard is not None:
+                guard.record(tool_call, result, read_only)
+            return str(result), {
+                "type": "tool_result",
+                "tool": tool_call.name,
+                "tool_call_id": tool_call.id,
+                "result": result,
+                "success": True
+            }
+        except Exception as e:
+            logger.error(f"Error ejecutando tool {tool_call.name}: {e}")
+            if guard is not None:
+                guard.record(tool_call, {"success": False, "error": str(e)}, read_only)
+            return f"Error: {str(e)}", {
+                "type": "tool_result",
+                "tool": tool_call.name,
+                "tool_call_id": tool_call.id,
+                "error": str(e),
+                "success": False
+            }
+    
+    def _approved_waves(self, tool_calls: List[ToolCall], approvals: Dict[str, bool]) -> List[List[ToolCall]]:
+        """
+        Agrupa en tandas los tool calls que pueden ejecutarse a la vez
+        
+        Solo se agrupan tools aprobados consecutivos que no invalidan lo que
+        consulta o modifica el otro; el resto va de uno en uno y en orden.
+        """
+        waves: List[List[ToolCall]] = []
+        for tool_call in tool_calls:
+            if (
+                approvals.get(tool_call.id)
+                and waves
+                and all(approvals.get(other.id) and self._independent(other, tool_call) for other in waves[-1])
+            ):
+                waves[-1].append(tool_call)
+            else:
+                waves.append([tool_call])
+        return waves
+    
+    def _independent(self, first: ToolCall, second: ToolCall) -> bool:
+        """True si dos tool calls no se afectan (según read_only, category e invalidates)"""
+        tools = (self.tool_registry.get(first.name), self.tool_registry.get(second.name))
+        if None in tools:
+            return False
+        for tool, other in (tools, tools[::-1]):
+            invalidates = getattr(tool, "invalidates", None) or ()
+            # Efectos sin declarar (navegador, HTTP...): mejor en orden
+            if not getattr(tool, "read_only", False) and not invalidates:
+                return False
+            if "*" in invalidates or getattr(other, "category", None) in invalidates:
+                return False
+        return True
     
     async def _execute_tool(self, tool_call: ToolCall) -> Any:
         """
@@ -461,8 +1375,32 @@ class AgentCore:
         
         logger.info(f"Ejecutando tool: {tool_call.name} con args: {tool_call.arguments}")
         
-        # Ejecutar tool
-        result = await tool.execute(**tool_call.arguments)
+        cache = self.tool_registry.result_cache if self.config.tool_cache else None
+        cacheable = cache is not None and getattr(tool, "cache_ttl", 0) > 0
+        if cacheable:
+            hit, result, cache_key = cache.get(tool, tool_call.arguments)
+            if hit:
+                logger.info(f"Resultado de {tool_call.name} desde la caché")
+                return result
+        
+        try:
+            # Tools de solo lectura: las llamadas idénticas en curso comparten resultado
+            if self.config.single_flight and getattr(tool, "read_only", False):
+                result = await self.tool_flight.do(
+                    tool_call_key(tool_call.name, tool_call.arguments),
+                    lambda: tool.execute(**tool_call.arguments)
+                )
+            else:
+                result = await tool.execute(**tool_call.arguments)
+        finally:
+            # Un tool con efectos deja obsoletos los resultados que dependen de él
+            # (aunque falle: puede haber cambiado algo antes del error)
+            invalidates = getattr(tool, "invalidates", None)
+            if cache is not None and invalidates:
+                cache.invalidate(invalidates)
+        
+        if cacheable:
+            cache.set(tool, cache_key, result)
         
         return result
     
@@ -470,54 +1408,8 @@ class AgentCore:
         """
         Intenta extraer tool calls de un texto JSON (fallback para modelos que no usan el campo nativo)
         """
-        tool_calls = []
-        matched_strings = []
-        
-        # 1. Intentar encontrar bloques balanceados { ... }
-        potential_blocks = []
-        brace_start_indices = [m.start() for m in re.finditer(r'\{', content)]
-        last_end = -1
+        tool_calls, matched_strings = extract_tool_calls(content)
         
-        for start in brace_start_indices:
-            if start < last_end:
-                continue
-                
-            # Solo procesar si el bloque parece empezar un "name" de tool
-            snippet = content[start:start+100]
-            if not ('"name"' in snippet or "'name'" in snippet):
-                continue
-                
-            # Buscar el cierre balanceado
-            depth = 0
-            for i in range(start, len(content)):
-                if content[i] == '{':
-                    depth += 1
-                elif content[i] == '}':
-                    depth -= 1
-                    if depth == 0:
-                        block = content[start:i+1]
-                        potential_blocks.append(block)
-                        last_end = i + 1
-                        break
-        
-        # Procesar bloques encontrados
-        processed_start_indices = set()
-        for block in potential_blocks:
-            try:
-                data = self._fuzzy_json_parse(block)
-                if data and isinstance(data, dict) and "name" in data:
-                    name = data["name"]
-                    args = data.get("arguments") or data.get("parameters") or {}
-                    
-                    tool_calls.append(ToolCall(
-                        id=f"call_{uuid.uuid4().hex[:8]}",
-                        name=name,
-                        arguments=args
-                    ))
-                    matched_strings.append(block)
-            except Exception:
-                continue
-                
         if return_strings:
             return tool_calls, matched_strings
         return tool_calls
@@ -554,24 +1446,7 @@ class AgentCore:
         """
         Intenta parsear JSON de forma flexible para corregir errores comunes de LLMs pequeños
         """
-        try:
-            return json.loads(s)
-        except:
-            pass
-            
-        try:
-            # 1. Corregir ""clave" -> "clave"
-            fixed = re.sub(r'""([^"]+)":', r'"\1":', s)
-            # 2. Corregir 'clave': -> "clave":
-            fixed = re.sub(r"'([^']+)'\s*:", r'"\1":', fixed)
-            # 3. Corregir : 'valor' -> : "valor"
-            fixed = re.sub(r':\s*\'([^\']*)\'', r': "\1"', fixed)
-            # 4. Eliminar comas finales antes de } o ]
-            fixed = re.sub(r',\s*([\]\}])', r'\1', fixed)
-            
-            return json.loads(fixed)
-        except:
-            return None
+        return parse_tool_json(s)
 
     def _prepare_messages_for_llm(self, conversation_id: str) -> List[Message]:
         """
@@ -583,21 +1458,10 @@ class AgentCore:
         Returns:
             Lista de mensajes formateados
         """
-        # Obtener mensajes del contexto
-        system_prompt = self.system_prompt
-        
-        # Inyectar memoria visual si hay snapshots recientes
-        from agent.vision_manager import vision_manager
-        status = vision_manager.get_status()
-        if status.get("active") and status.get("last_snapshot"):
-            visual_context = f"\n\n## Estado Visual Actual (Cámara Móvil)\n- ESTADO: **ACTIVA**\n- ÚLTIMO SNAPSHOT: {status['last_snapshot']}\n- Estás viendo a través del móvil del usuario.\n- SI EL USUARIO TE PREGUNTA POR ALGO QUE 'VES' O SU ENTORNO: Debes usar la herramienta `get_visual_context` inmediatamente para obtener la descripción actual."
-            system_prompt += visual_context
-        else:
-            system_prompt += "\n\n## Estado Visual\n- Cámara Móvil: Inactiva o sin señal. Si el usuario te pide ver algo, indícale que debe activar la visión con el botón del sidebar."
-
+        # Prefijo estable: system prompt fijo + historial (solo crece al final)
         context_messages = self.context_manager.get_context_for_llm(
             conversation_id,
-            system_prompt=system_prompt
+            system_prompt=self.system_prompt
         )
         
         # Convertir a formato Message
@@ -610,30 +1474,196 @@ class AgentCore:
                 tool_call_id=msg.get("tool_call_id")
             ))
         
+        # Estado volátil (visión) siempre al final para no romper el prefijo
+        messages.append(self._get_state_message(conversation_id))
+        
         return messages
     
-    def _get_tools_for_llm(self) -> List[Dict]:
+    def _get_state_message(self, conversation_id: Optional[str] = None) -> Message:
         """
-        Obtiene definiciones de tools para el LLM
+        Mensaje final con el estado volátil del entorno (cámara).
+        
+        El estado es el de la cámara conectada a la conversación. Se
+        reutiliza el mismo objeto mientras el estado no cambie.
+        """
+        segment = get_vision_segment(_get_vision_manager().get_status(conversation_id=conversation_id))
+        key = conversation_id or ""
+        message = self._state_messages.get(key)
+        if message is None or message.content != segment:
+            message = self._state_messages[key] = Message(role="system", content=segment)
+        return message
+    
+    def _record_usage(self, response: LLMResponse) -> Optional[int]:
+        """Acumula los tokens de prompt evaluados en una llamada al LLM"""
+        usage = response.usage or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        self.loop_stats["llm_calls"] += 1
+        self.loop_stats["last_prompt_eval_tokens"] = prompt_tokens
+        if prompt_tokens:
+            self.loop_stats["prompt_eval_tokens"] += prompt_tokens
+        return prompt_tokens
+    
+    def _record_prepare(self, elapsed: float) -> float:
+        """Registra el overhead de preparación de una iteración (retorna ms)"""
+        prepare_ms = round(elapsed * 1000, 3)
+        self.loop_stats["iterations"] += 1
+        self.loop_stats["prepare_seconds"] += elapsed
+        self.loop_stats["last_prepare_ms"] = prepare_ms
+        return prepare_ms
+    
+    def get_loop_stats(self) -> Dict[str, Any]:
+        """Estadísticas de overhead del ciclo Plan & Act"""
+        iterations = self.loop_stats["iterations"]
+        return {
+            "iterations": iterations,
+            "avg_prepare_ms": round(self.loop_stats["prepare_seconds"] * 1000 / iterations, 3) if iterations else 0.0,
+            "last_prepare_ms": self.loop_stats["last_prepare_ms"],
+            "avg_prompt_eval_tokens": round(self.loop_stats["prompt_eval_tokens"] / self.loop_stats["llm_calls"], 1) if self.loop_stats["llm_calls"] else 0.0,
+            "last_prompt_eval_tokens": self.loop_stats["last_prompt_eval_tokens"],
+            "tool_catalog_version": self.tool_registry.version,
+            "tools": len(self.tool_registry.tools),
+            "tool_selections": self.loop_stats["tool_selections"],
+            "tool_selection_misses": self.loop_stats["tool_selection_misses"],
+            "last_tools_sent": self.loop_stats["last_tools_sent"],
+            "plans": self.loop_stats["plans"],
+            "plan_steps": self.loop_stats["plan_steps"],
+            "plan_fallbacks": self.loop_stats["plan_fallbacks"],
+            "repeated_tool_calls": self.loop_stats["repeated_tool_calls"],
+            "cycle_warnings": self.loop_stats["cycle_warnings"],
+            "run_stops": dict(self.loop_stats["run_stops"]),
+            "tool_single_flight": self.tool_flight.get_stats(),
+            "subagents": self.subagents.get_stats() if self.subagents else None,
+            "macros": self.macros.get_stats() if self.macros is not None else None,
+            "tool_cache": self.tool_registry.result_cache.get_stats(),
+            "runs": self.runs.get_stats(),
+            "checkpoints": self.checkpoints.get_stats()
+        }
+    
+    def get_llm_stats(self) -> Dict[str, Any]:
+        """Estadísticas de las capas del proveedor de LLM (caché, etc.)"""
+        get_stats = getattr(self.llm, "get_stats", None)
+        stats = get_stats() if callable(get_stats) else {}
+        if self.cascade is not None:
+            stats["cascade"] = self.cascade.get_stats()
+        return stats
+    
+    async def warm_up_llm(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Precarga el modelo del proveedor (solo proveedores locales como Ollama)
         
         Returns:
-            Lista de definiciones de tools
+            Resultado por servidor o None si el proveedor no lo soporta
         """
-        tool_definitions = self.tool_registry.get_all_definitions()
-        
-        # Convertir a formato esperado por el LLM (OpenAI format)
-        formatted_tools = []
-        for tool_def in tool_definitions:
-            formatted_tools.append({
-                "type": "function",
-                "function": {
-                    "name": tool_def["name"],
-                    "description": tool_def["description"],
-                    "parameters": tool_def["parameters"]
-                }
-            })
+        warm_up = getattr(self.llm, "warm_up", None)
+        if not callable(warm_up):
+            return None
+        return await warm_up()
+    
+    async def get_llm_model_status(self) -> Optional[Dict[str, Any]]:
+        """Estado de carga del modelo (None si el proveedor no lo informa)"""
+        model_status = getattr(self.llm, "model_status", None)
+        if not callable(model_status):
+            return None
+        return await model_status()
+    
+    def _wrap_llm(self, llm: LLMProvider) -> LLMProvider:
+        """
+        Aplica sobre el proveedor las capas opcionales de la configuración
+        
+        Args:
+            llm: Proveedor base
+        
+        Returns:
+            Proveedor (envuelto si hay capas activas)
+        """
+        if self.config.concurrency_limit:
+            limiter = get_limiter(provider_key(llm), hosts=len(getattr(llm, "hosts", None) or [None]))
+            llm = LimitedLLMProvider(llm, limiter, max_retries=self.config.llm_max_retries)
+        if self.config.single_flight:
+            llm = SingleFlightLLMProvider(llm, self.llm_flight)
+        # La caché va por fuera: un acierto no pasa por la coalescencia
+        if self.config.response_cache:
+            from .response_cache import CachedLLMProvider, get_response_cache
+            llm = CachedLLMProvider(llm, get_response_cache(), force=self.config.response_cache_force)
+        return llm
+    
+    def _build_cascade(self) -> Optional[ModelCascade]:
+        """
+        Construye los niveles de escalado de la configuración
+        
+        Un nivel que no se puede crear (librería o API key ausente) se
+        omite con un aviso en lugar de impedir el arranque del agente.
+        
+        Returns:
+            Cascada o None si no hay niveles de escalado
+        """
+        from .llm_provider import create_llm_provider
+        
+        tiers = []
+        for spec in self.config.cascade:
+            provider = spec.get("provider")
+            model = spec.get("model") or DEFAULT_MODELS.get(provider)
+            api_key = spec.get("api_key") or getattr(self.config, f"{provider}_api_key", None)
+            try:
+                tiers.append(self._wrap_llm(create_llm_provider(provider, model=model, api_key=api_key)))
+            except Exception as e:
+                logger.warning(f"Nivel de cascada {provider}:{model} omitido: {e}")
+        
+        if not tiers:
+            return None
+        logger.info(f"Cascada de modelos: {self.llm.model} -> {' -> '.join(t.model for t in tiers)}")
+        return ModelCascade(
+            tiers,
+            routing_tier=self.config.cascade_routing_tier,
+            synthesis_tier=self.config.cascade_synthesis_tier,
+            primary_model=self.llm.model
+        )
+    
+    def _select_tools(self, user_message: str, conversation_id: str) -> Optional[List[str]]:
+        """
+        Elige los tools a enviar al LLM en este turno
+        
+        Incluye los más relevantes para la petición, los tools básicos y los
+        usados recientemente en la conversación.
+        
+        Args:
+            user_message: Mensaje del usuario (vacío al continuar tras una aprobación)
+            conversation_id: ID de la conversación
+        
+        Returns:
+            Nombres de tools, o None para enviar el catálogo completo
+        """
+        top_k = self.config.tool_selection_top_k
+        if not top_k:
+            return None
+        
+        recent = self.context_manager.get_messages(conversation_id, limit=self.config.recent_tool_messages)
+        query = user_message or next(
+            (m.content for m in reversed(recent) if m.role == "user" and m.content), ""
+        )
         
-        return formatted_tools
+        keep = list(self.config.core_tools)
+        for msg in recent:
+            for tc in msg.tool_calls or []:
+                keep.append(tc.get("function", {}).get("name"))
+        
+        names = self.tool_registry.select_tools(query, top_k, keep)
+        self.loop_stats["tool_selections"] += 1
+        if names is None:
+            self.loop_stats["tool_selection_misses"] += 1
+        return names
+    
+    def _get_tools_for_llm(self, names: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Obtiene definiciones de tools para el LLM (catálogo cacheado del registry)
+        
+        Args:
+            names: Subconjunto de tools (None = todos)
+        
+        Returns:
+            Lista de definiciones de tools
+        """
+        return self.tool_registry.get_llm_tools(names)
     
     def _requires_approval(self, tool_name: str) -> bool:
         """
@@ -684,95 +1714,79 @@ class AgentCore:
     def reconfigure_llm(
         self,
         provider: str,
-        model: str = None,
-        api_key: str = None
+        model: Optional[str] = None,
+        api_key: Optional[str] = None
     ):
         """
         Reconfigura el LLM provider en caliente
         
+        El nuevo proveedor se construye completo antes de sustituir al
+        actual, así que un error deja el agente intacto. Se conservan las
+        conversaciones, las aprobaciones pendientes, la caché y la
+        coalescencia; con Ollama también la sesión HTTP. Las ejecuciones en
+        curso terminan con el proveedor anterior y las nuevas usan el nuevo.
+        
         Args:
             provider: Nombre del provider (ollama, openai, anthropic, deepseek)
             model: Modelo específico a usar
             api_key: API key para el provider (si es necesario)
         """
+        from .llm_provider import create_llm_provider
+        
         logger.info(f"Reconfigurando LLM: {provider} con modelo {model}")
         
+        if provider not in DEFAULT_MODELS:
+            raise ValueError(f"Provider no soportado: {provider}")
+        
+        if provider != "ollama":
+            api_key = api_key or getattr(self.config, f"{provider}_api_key", None)
+            if not api_key:
+                raise ValueError(f"{provider.capitalize()} API key requerida")
+        
+        model = model or DEFAULT_MODELS[provider]
         try:
-            # Importar providers
-            from .llm_provider import OllamaProvider
-            
-            # Crear nuevo provider según el tipo
-            if provider == "ollama":
-                new_llm = OllamaProvider(
-                    model=model or "llama3.2:latest"
-                )
-            
-            elif provider == "openai":
-                try:
-                    from openai import AsyncOpenAI
-                    if not api_key:
-                        api_key = getattr(self.config, 'openai_api_key', None)
-                    if not api_key:
-                        raise ValueError("OpenAI API key requerida")
-                    
-                    # Crear wrapper para OpenAI
-                    from .llm_provider import OpenAIProvider
-                    new_llm = OpenAIProvider(
-                        model=model or "gpt-4",
-                        api_key=api_key
-                    )
-                except ImportError:
-                    raise ValueError("Librería openai no instalada. Ejecuta: pip install openai")
-            
-            elif provider == "anthropic":
-                try:
-                    import anthropic
-                    if not api_key:
-                        api_key = getattr(self.config, 'anthropic_api_key', None)
-                    if not api_key:
-                        raise ValueError("Anthropic API key requerida")
-                    
-                    from .llm_provider import AnthropicProvider
-                    new_llm = AnthropicProvider(
-                        model=model or "claude-3-sonnet-20240229",
-                        api_key=api_key
-                    )
-                except ImportError:
-                    raise ValueError("Librería anthropic no instalada. Ejecuta: pip install anthropic")
-            
-            elif provider == "deepseek":
-                try:
-                    from openai import AsyncOpenAI
-                    if not api_key:
-                        api_key = getattr(self.config, 'deepseek_api_key', None)
-                    if not api_key:
-                        raise ValueError("DeepSeek API key requerida")
-                    
-                    from .llm_provider import DeepSeekProvider
-                    new_llm = DeepSeekProvider(
-                        model=model or "deepseek-chat",
-                        api_key=api_key
-                    )
-                except ImportError:
-                    raise ValueError("Librería openai no instalada. Ejecuta: pip install openai")
-            
-            else:
-                raise ValueError(f"Provider no soportado: {provider}")
-            
-            # Reemplazar el LLM actual
-            old_llm = self.llm
-            self.llm = new_llm
-            
-            # Actualizar config
-            self.config.llm_provider = provider
-            if model:
-                self.config.model = model
-            
-            logger.info(f"LLM reconfigurado exitosamente: {provider} ({model})")
-            
-            # Limpiar el LLM anterior si es necesario
-            del old_llm
-            
-        except Exception as e:
-            logger.error(f"Error reconfigurando LLM: {e}")
-            raise
+            new_llm = create_llm_provider(provider, model=model, api_key=api_key)
+        except ImportError as e:
+            raise ValueError(f"Librería no instalada para {provider}: {e}")
+        
+        old_llm = self.llm
+        adopt = getattr(new_llm, "adopt_connections", None)
+        if callable(adopt):
+            adopt(old_llm)
+        
+        # Sustitución atómica: una sola asignación
+        self.llm = self._wrap_llm(new_llm)
+        self.config.llm_provider = provider
+        self.config.model = model
+        
+        if not self._llm_runs.get(old_llm):
+            self._close_llm(old_llm)
+        
+        logger.info(f"LLM reconfigurado exitosamente: {provider} ({model})")
+    
+    def _acquire_llm(self) -> LLMProvider:
+        """Proveedor vigente para una nueva ejecución"""
+        llm = self.llm
+        self._llm_runs[llm] = self._llm_runs.get(llm, 0) + 1
+        return llm
+    
+    def _release_llm(self, llm: LLMProvider):
+        """Fin de una ejecución; cierra el proveedor si ya fue sustituido"""
+        remaining = self._llm_runs.get(llm, 1) - 1
+        if remaining > 0:
+            self._llm_runs[llm] = remaining
+            return
+        self._llm_runs.pop(llm, None)
+        if llm is not self.llm:
+            self._close_llm(llm)
+    
+    def _close_llm(self, llm: LLMProvider):
+        """Libera las conexiones de un proveedor retirado (si tiene close)"""
+        close = getattr(llm, "close", None)
+        if not callable(close):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        loop.create_task(close())
@@ -0,0 +1,521 @@
+"""
+Jobs - Ejecuciones del agente en segundo plano
+
+Las tareas largas (inventario multi-región, extracciones grandes de
+Dremio, scripts largos) no caben en lo que una pestaña del navegador
+espera. Un job es un mensaje encolado: se responde con su id al momento y
+un pool acotado de workers lo ejecuta después.
+
+- La cola es persistente (SQLite): los jobs en curso al parar el proceso
+  vuelven a la cola al arrancar.
+- Los eventos de cada job se guardan para consultarlos (polling) o
+  seguirlos en vivo (subscribe) desde cualquier punto.
+- El resultado queda en la conversación del job, como si se hubiera
+  enviado por el chat.
+- Los workers llaman al LLM con prioridad de fondo: las peticiones
+  interactivas pasan antes en la cola de cada proveedor.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set, AsyncGenerator, Callable, TYPE_CHECKING
+
+from .concurrency import background_priority
+from .cancellation import CANCEL_CLIENT
+
+if TYPE_CHECKING:
+    from .core import AgentCore
+
+logger = logging.getLogger(__name__)
+
+# Estados de un job
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+JOB_CANCELLED = "cancelled"
+# Terminó esperando la aprobación de un tool (se responde desde el chat)
+JOB_APPROVAL = "approval_required"
+
+FINISHED_STATES = (JOB_DONE, JOB_ERROR, JOB_CANCELLED, JOB_APPROVAL)
+
+
+@dataclass
+class Job:
+    """Mensaje encolado para el agente"""
+    id: str
+    conversation_id: str
+    message: str
+    status: str = JOB_QUEUED
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[str] = None
+    error: Optional[str] = None
+    events: int = 0
+
+    @property
+    def wait_seconds(self) -> Optional[float]:
+        """Tiempo en cola hasta que un worker lo tomó"""
+        if self.started_at is None:
+            return None
+        return self.started_at - self.created_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        wait = self.wait_seconds
+        data["wait_seconds"] = round(wait, 3) if wait is not None else None
+        return data
+
+
+class JobQueue:
+    """Cola persistente de jobs y sus eventos (SQLite)"""
+
+    COLUMNS = "id, conversation_id, message, status, created_at, started_at, finished_at, result, error, events"
+
+    def __init__(self, db_path: str, max_events_per_job: int = 2000):
+        """
+        Args:
+            db_path: Archivo SQLite
+            max_events_per_job: Eventos guardados como máximo por job
+        """
+        self.db_path = Path(db_path).expanduser()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_events_per_job = max_events_per_job
+        self._lock = threading.Lock()
+        # Tiempos de espera en cola de los últimos jobs tomados
+        self._waits: deque = deque(maxlen=200)
+        self._init_database()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10.0)
+
+    def _init_database(self):
+        conn = self._get_connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                conversation_id TEXT NOT NULL,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT,
+                events INTEGER DEFAULT 0
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def _row_to_job(row) -> Job:
+        return Job(*row)
+
+    def submit(self, conversation_id: str, message: str) -> Job:
+        """Encola un mensaje y devuelve su job"""
+        job = Job(uuid.uuid4().hex[:16], conversation_id, message, created_at=time.time())
+        with self._lock:
+            conn = self._get_connection()
+            conn.execute(
+                f"INSERT INTO jobs ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                tuple(asdict(job).values())
+            )
+            conn.commit()
+            conn.close()
+        return job
+
+    def claim(self) -> Optional[Job]:
+        """Toma el job más antiguo de la cola (lo marca en curso)"""
+        with self._lock:
+            conn = self._get_connection()
+            row = conn.execute(
+                f"SELECT {self.COLUMNS} FROM jobs WHERE status = ? ORDER BY created_at, rowid LIMIT 1",
+                (JOB_QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.close()
+                return None
+            job = self._row_to_job(row)
+            job.status, job.started_at = JOB_RUNNING, time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                (job.status, job.started_at, job.id)
+            )
+            conn.commit()
+            conn.close()
+            self._waits.append(job.wait_seconds)
+        return job
+
+    def requeue_interrupted(self) -> int:
+        """Devuelve a la cola los jobs que quedaron en curso (el proceso se paró)"""
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?",
+                (JOB_QUEUED, JOB_RUNNING)
+            )
+            conn.execute(
+                "DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE status = ? AND events > 0)",
+                (JOB_QUEUED,)
+            )
+            conn.execute("UPDATE jobs SET events = 0 WHERE status = ?", (JOB_QUEUED,))
+            conn.commit()
+            conn.close()
+        return cursor.rowcount
+
+    def add_event(self, job: Job, event: Dict[str, Any]) -> Optional[int]:
+        """
+        Guarda un evento del job
+
+        Returns:
+            Número de secuencia (desde 1) o None si se superó el máximo
+        """
+        if job.events >= self.max_events_per_job:
+            return None
+        job.events += 1
+        with self._lock:
+            conn = self._get_connection()
+            conn.execute(
+                "INSERT INTO job_events (job_id, seq, event) VALUES (?, ?, ?)",
+                (job.id, job.events, json.dumps(event, ensure_ascii=False, default=str))
+            )
+            conn.execute("UPDATE jobs SET events = ? WHERE id = ?", (job.events, job.id))
+            conn.commit()
+            conn.close()
+        return job.events
+
+    def finish(self, job: Job, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        job.status, job.result, job.error, job.finished_at = status, result, error, time.time()
+        with self._lock:
+            conn = self._get_connection()
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, result, error, job.finished_at, job.id)
+            )
+            conn.commit()
+            conn.close()
+
+    def cancel_queued(self, job_id: str) -> bool:
+        """Cancela un job que aún no ha empezado"""
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (JOB_CANCELLED, time.time(), job_id, JOB_QUEUED)
+            )
+            conn.commit()
+            conn.close()
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Job]:
+        conn = self._get_connection()
+        row = conn.execute(f"SELECT {self.COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        conn.close()
+        return self._row_to_job(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Job]:
+        conn = self._get_connection()
+        if status:
+            rows = conn.execute(
+                f"SELECT {self.COLUMNS} FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                (status, limit)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f"SELECT {self.COLUMNS} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        conn.close()
+        return [self._row_to_job(row) for row in rows]
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Eventos del job posteriores a la secuencia `after`"""
+        conn = self._get_connection()
+        rows = conn.execute(
+            "SELECT seq, event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, after)
+        ).fetchall()
+        conn.close()
+        return [{"seq": seq, **json.loads(event)} for seq, event in rows]
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Posición en la cola (1 = el siguiente) o None si no está en cola"""
+        conn = self._get_connection()
+        row = conn.execute('''
+            SELECT COUNT(*) FROM jobs
+            WHERE status = ? AND created_at <= (SELECT created_at FROM jobs WHERE id = ? AND status = ?)
+        ''', (JOB_QUEUED, job_id, JOB_QUEUED)).fetchone()
+        conn.close()
+        return row[0] or None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profundidad de la cola, jobs por estado y tiempos de espera"""
+        conn = self._get_connection()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        oldest = conn.execute(
+            "SELECT MIN(created_at) FROM jobs WHERE status = ?", (JOB_QUEUED,)
+        ).fetchone()[0]
+        conn.close()
+        waits = list(self._waits)
+        return {
+            "queue_depth": counts.get(JOB_QUEUED, 0),
+            "running": counts.get(JOB_RUNNING, 0),
+            "by_status": counts,
+            "oldest_queued_seconds": round(time.time() - oldest, 1) if oldest else 0.0,
+            "avg_wait_ms": round(sum(waits) * 1000 / len(waits), 1) if waits else 0.0,
+            "max_wait_ms": round(max(waits) * 1000, 1) if waits else 0.0
+        }
+
+
+class JobRunner:
+    """Pool acotado de workers que ejecutan los jobs de la cola"""
+
+    def __init__(
+        self,
+        agent: "AgentCore",
+        queue: JobQueue,
+        workers: int = 2,
+        storage=None,
+        load_history: Optional[Callable[[str], None]] = None,
+        max_seconds: float = 3600.0
+    ):
+        """
+        Args:
+            agent: Agente que ejecuta los mensajes
+            queue: Cola persistente
+            workers: Jobs simultáneos
+            storage: ConversationStorage donde queda el resultado (opcional)
+            load_history: Carga el historial de una conversación en el agente
+            max_seconds: Tiempo máximo de cada job (0 = sin límite); sustituye
+                al de las peticiones interactivas
+        """
+        self.agent = agent
+        self.queue = queue
+        self.workers = max(1, workers)
+        self.max_seconds = max_seconds
+        self.storage = storage
+        self.load_history = load_history
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # Suscriptores en vivo por job: colas de (seq, evento)
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._running: Dict[str, Job] = {}
+        self.stats = {"completed": 0, "failed": 0, "cancelled": 0, "requeued": 0}
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        """Arranca los workers (los jobs interrumpidos vuelven a la cola)"""
+        if self._tasks:
+            return
+        self.stats["requeued"] += self.queue.requeue_interrupted()
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._tasks = [asyncio.ensure_future(self._worker(n)) for n in range(self.workers)]
+        logger.info(f"Jobs: {self.workers} workers en marcha")
+
+    async def stop(self):
+        """Para los workers; los jobs en curso vuelven a la cola al arrancar"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def submit(self, conversation_id: str, message: str) -> Job:
+        job = self.queue.submit(conversation_id, message)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        logger.info(f"Job {job.id} encolado ({conversation_id})")
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancela un job en cola o en curso
+
+        Returns:
+            False si no existe o ya terminó
+        """
+        if self.queue.cancel_queued(job_id):
+            self.stats["cancelled"] += 1
+            self._publish(job_id, None)
+            return True
+        job = self._running.get(job_id)
+        if job is None:
+            return False
+        return self.agent.cancel_run(job.conversation_id, CANCEL_CLIENT) > 0
+
+    async def subscribe(self, job_id: str, after: int = 0) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Eventos del job: primero los guardados y después los nuevos
+
+        Termina cuando el job termina.
+
+        Args:
+            job_id: ID del job
+            after: Última secuencia ya recibida
+        """
+        live: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(live)
+        try:
+            for event in self.queue.events(job_id, after):
+                after = event["seq"]
+                yield event
+            job = self.queue.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return
+            while True:
+                item = await live.get()
+                if item is None:
+                    return
+                seq, event = item
+                if seq > after:
+                    after = seq
+                    yield {"seq": seq, **event}
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(live)
+                if not subscribers:
+                    del self._subscribers[job_id]
+
+    def _publish(self, job_id: str, item: Optional[tuple]):
+        for live in self._subscribers.get(job_id, ()):
+            live.put_nowait(item)
+
+    async def _worker(self, number: int):
+        # Todo lo que ejecute este worker va detrás de las peticiones interactivas
+        with background_priority():
+            while True:
+                job = self.queue.claim()
+                if job is None:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                self._running[job.id] = job
+                try:
+                    await self._run_job(job)
+                finally:
+                    self._running.pop(job.id, None)
+                    self._publish(job.id, None)
+
+    async def _run_job(self, job: Job):
+        logger.info(f"Job {job.id}: empieza tras {job.wait_seconds:.1f}s en cola")
+        storage = self.storage
+        # Interrumpido por un reinicio: continúa desde su checkpoint
+        resumed = self.agent.has_checkpoint(job.conversation_id, job.message)
+        if storage is not None:
+            if not storage.get_conversation(job.conversation_id):
+                storage.create_conversation(job.conversation_id, title=job.message[:50])
+            if self.load_history is not None:
+                self.load_history(job.conversation_id)
+            if not resumed:
+                storage.save_message(job.conversation_id, "user", job.message)
+
+        content = ""
+        usage = None
+        tool_calls = []
+        status = JOB_DONE
+        error = None
+        try:
+            if resumed:
+                logger.info(f"Job {job.id}: se reanuda desde su checkpoint")
+                events = self.agent.resume_run(job.conversation_id, max_seconds=self.max_seconds)
+            else:
+                events = self.agent.process_message(job.message, job.conversation_id, max_seconds=self.max_seconds)
+            async for event in events:
+                event_type = event.get("type")
+                if event_type == "message":
+                    content = event.get("content", "")
+                elif event_type == "tool_call":
+                    tool_calls.append({
+                        "id": event.get("tool_call_id", ""),
+                        "name": event.get("tool", ""),
+                        "arguments": event.get("arguments", {})
+                    })
+                elif event_type == "tool_result" and storage is not None:
+                    storage.save_message(
+                        job.conversation_id,
+                        "tool",
+                        str(event.get("result") or event.get("error", "Error desconocido")),
+                        tool_call_id=event.get("tool_call_id")
+                    )
+                elif event_type == "approval_required":
+                    status = JOB_APPROVAL
+                elif event_type == "cancelled":
+                    status = JOB_CANCELLED
+                elif event_type == "error" and not content:
+                    status, error = JOB_ERROR, event.get("error") or event.get("message")
+                elif event_type == "done":
+                    usage = event.get("usage")
+
+                seq = self.queue.add_event(job, event)
+                if seq is not None:
+                    self._publish(job.id, (seq, event))
+        except Exception as e:
+            logger.error(f"Job {job.id} falló: {e}", exc_info=True)
+            status, error = JOB_ERROR, str(e)
+
+        if storage is not None and (content or tool_calls):
+            storage.save_message(
+                job.conversation_id,
+                "assistant",
+                content or "Ejecutando herramientas...",
+                tool_calls=tool_calls or None,
+                usage=usage
+            )
+        self.queue.finish(job, status, result=content or None, error=error)
+        if status == JOB_DONE:
+            self.stats["completed"] += 1
+        elif status == JOB_CANCELLED:
+            self.stats["cancelled"] += 1
+        elif status == JOB_ERROR:
+            self.stats["failed"] += 1
+        logger.info(f"Job {job.id}: {status}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.queue.get_stats(),
+            **self.stats,
+            "workers": self.workers,
+            "active_workers": len(self._running),
+            "subscribers": sum(len(s) for s in self._subscribers.values())
+        }
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Cola de jobs del proceso
+
+    Se configura con AGENT_JOBS_DB (por defecto ~/.agent_data/jobs.db).
+    """
+    global _job_queue
+
+    if _job_queue is None:
+        _job_queue = JobQueue(os.getenv("AGENT_JOBS_DB", "~/.agent_data/jobs.db"))
+
+    return _job_queue
@@ -8,6 +8,9 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 import os
 import json
+import uuid
+import time
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,6 +30,22 @@ try:
 except ImportError:
     aiohttp = None
 
+from .cancellation import time_left
+
+
+def _with_deadline(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Timeout de la petición acotado al deadline de la ejecución en curso"""
+    timeout = time_left()
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    return kwargs
+
+
+def _deadline_timeout() -> Dict[str, Any]:
+    """Argumento timeout de aiohttp con el deadline de la ejecución en curso"""
+    timeout = time_left()
+    return {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout is not None else {}
+
 
 @dataclass
 class Message:
@@ -113,6 +132,16 @@ class OpenAIProvider(LLMProvider):
         
         return formatted
     
+    def _usage(self, usage) -> Dict[str, int]:
+        """Uso de tokens, incluyendo los tokens de prompt servidos desde caché"""
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+            "cached_prompt_tokens": getattr(details, "cached_tokens", None) or 0
+        }
+    
     async def chat(
         self,
         messages: List[Message],
@@ -136,7 +165,7 @@ class OpenAIProvider(LLMProvider):
             kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
         
-        response = await self.client.chat.completions.create(**kwargs)
+        response = await self.client.chat.completions.create(**_with_deadline(kwargs))
         
         message = response.choices[0].message
         
@@ -156,11 +185,7 @@ class OpenAIProvider(LLMProvider):
             content=message.content or "",
             tool_calls=tool_calls,
             finish_reason=response.choices[0].finish_reason,
-            usage={
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
+            usage=self._usage(response.usage)
         )
     
     async def chat_stream(
@@ -186,7 +211,7 @@ class OpenAIProvider(LLMProvider):
             kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
         
-        stream = await self.client.chat.completions.create(**kwargs)
+        stream = await self.client.chat.completions.create(**_with_deadline(kwargs))
         
         async for chunk in stream:
             if chunk.choices[0].delta.content:
@@ -210,7 +235,8 @@ class AnthropicProvider(LLMProvider):
         
         for msg in messages:
             if msg.role == "system":
-                system_message = msg.content
+                # Anthropic solo admite un system: se concatenan (el estado volátil va al final)
+                system_message = f"{system_message}\n\n{msg.content}" if system_message else msg.content
             else:
                 formatted.append({"role": msg.role, "content": msg.content})
         
@@ -252,7 +278,7 @@ class AnthropicProvider(LLMProvider):
         if tools:
             kwargs["tools"] = self._convert_tools_to_anthropic(tools)
         
-        response = await self.client.messages.create(**kwargs)
+        response = await self.client.messages.create(**_with_deadline(kwargs))
         
         # Extraer contenido y tool calls
         content = ""
@@ -277,7 +303,8 @@ class AnthropicProvider(LLMProvider):
             usage={
                 "prompt_tokens": response.usage.input_tokens,
                 "completion_tokens": response.usage.output_tokens,
-                "total_tokens": response.usage.input_tokens + response.usage.output_tokens
+                "total_tokens": response.usage.input_tokens + response.usage.output_tokens,
+                "cached_prompt_tokens": getattr(response.usage, "cache_read_input_tokens", None) or 0
             }
         )
     
@@ -305,7 +332,7 @@ class AnthropicProvider(LLMProvider):
         if tools:
             kwargs["tools"] = self._convert_tools_to_anthropic(tools)
         
-        async with self.client.messages.stream(**kwargs) as stream:
+        async with self.client.messages.stream(**_with_deadline(kwargs)) as stream:
             async for text in stream.text_stream:
                 yield text
 
@@ -355,6 +382,15 @@ class DeepSeekProvider(LLMProvider):
         
         return formatted
     
+    def _usage(self, usage) -> Dict[str, int]:
+        """Uso de tokens (DeepSeek reporta los aciertos de su caché de contexto)"""
+        return {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+            "cached_prompt_tokens": getattr(usage, "prompt_cache_hit_tokens", None) or 0
+        }
+    
     async def chat(
         self,
         messages: List[Message],
@@ -378,7 +414,7 @@ class DeepSeekProvider(LLMProvider):
             kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
         
-        response = await self.client.chat.completions.create(**kwargs)
+        response = await self.client.chat.completions.create(**_with_deadline(kwargs))
         
         message = response.choices[0].message
         
@@ -398,11 +434,7 @@ class DeepSeekProvider(LLMProvider):
             content=message.content or "",
             tool_calls=tool_calls,
             finish_reason=response.choices[0].finish_reason,
-            usage={
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
+            usage=self._usage(response.usage)
         )
     
     async def chat_stream(
@@ -428,21 +460,162 @@ class DeepSeekProvider(LLMProvider):
             kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
         
-        stream = await self.client.chat.completions.create(**kwargs)
+        stream = await self.client.chat.completions.create(**_with_deadline(kwargs))
         
         async for chunk in stream:
             if chunk.choices[0].delta.content:
                 yield chunk.choices[0].delta.content
 
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+
+# Tiempo que Ollama mantiene el modelo en memoria tras la última petición
+DEFAULT_OLLAMA_KEEP_ALIVE = "30m"
+
+# Una carga por debajo de este tiempo se considera modelo ya residente
+COLD_LOAD_THRESHOLD_SECONDS = 0.5
+
+
+class OllamaAPIError(Exception):
+    """Respuesta de error (HTTP != 200) de un servidor Ollama"""
+    
+    def __init__(self, status: int, detail: str, retry_after: Optional[str] = None):
+        super().__init__(f"Ollama API Error ({status}): {detail}")
+        self.status = status
+        self.detail = detail
+        # Cabecera Retry-After (p. ej. de un proxy delante de Ollama)
+        self.retry_after = retry_after
+
+
+# Instrucción que acompaña a la salida restringida por JSON schema
+CONSTRAINED_OUTPUT_INSTRUCTIONS = (
+    'Responde SOLO con un objeto JSON. Para usar un tool: '
+    '{"name": "<tool>", "arguments": {...}}. Para responder al usuario: '
+    '{"answer": "<respuesta>"}.'
+)
+
+
+def build_tool_call_schema(tools: List[Dict]) -> Dict[str, Any]:
+    """
+    JSON schema que solo admite una llamada válida a uno de los tools o una
+    respuesta final
+    
+    Args:
+        tools: Tools en formato OpenAI ({"type": "function", "function": {...}})
+    
+    Returns:
+        Schema para el parámetro `format` de Ollama
+    """
+    options = []
+    for tool in tools:
+        function = tool.get("function", tool)
+        options.append({
+            "type": "object",
+            "properties": {
+                "name": {"enum": [function["name"]]},
+                "arguments": function.get("parameters") or {"type": "object"}
+            },
+            "required": ["name", "arguments"]
+        })
+    
+    options.append({
+        "type": "object",
+        "properties": {"answer": {"type": "string"}},
+        "required": ["answer"]
+    })
+    return {"anyOf": options}
+
+
 class OllamaProvider(LLMProvider):
     """Proveedor Ollama (modelos locales)"""
     
-    def __init__(self, model: str = "deepseek-coder:33b", base_url: str = "http://localhost:11434", **kwargs):
+    # Schemas calculados por lista de tools (la lista la cachea el ToolRegistry)
+    MAX_CACHED_SCHEMAS = 16
+    
+    def __init__(
+        self,
+        model: str = "deepseek-coder:33b",
+        base_url: Optional[str] = None,
+        constrained_output: Optional[bool] = None,
+        keep_alive: Optional[str] = None,
+        num_ctx: Optional[int] = None,
+        **kwargs
+    ):
+        """
+        Args:
+            model: Modelo de Ollama
+            base_url: URL del servidor Ollama (None = env OLLAMA_BASE_URL o localhost)
+            constrained_output: Restringir la salida con un JSON schema derivado
+                                de los tools (None = env OLLAMA_CONSTRAINED_OUTPUT)
+            keep_alive: Tiempo de residencia del modelo tras cada petición
+                        (None = env OLLAMA_KEEP_ALIVE o 30m; "-1" = siempre)
+            num_ctx: Tamaño de contexto enviado en todas las peticiones
+                     (None = env OLLAMA_NUM_CTX o el del modelo). Cambiarlo
+                     obliga a Ollama a recargar el modelo.
+        """
         super().__init__(model, None, **kwargs)
-        self.base_url = base_url
+        self.base_url = (base_url or os.getenv("OLLAMA_BASE_URL") or DEFAULT_OLLAMA_URL).rstrip("/")
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE") or DEFAULT_OLLAMA_KEEP_ALIVE
+        if num_ctx is None and os.getenv("OLLAMA_NUM_CTX"):
+            num_ctx = int(os.getenv("OLLAMA_NUM_CTX"))
+        self.num_ctx = num_ctx
+        # Cargas del modelo observadas (load_duration de Ollama)
+        self.residency_stats = {
+            "warmups": 0,
+            "cold_loads": 0,
+            "last_load_seconds": None,
+            "last_warmup_at": None
+        }
+        self._session = None
+        self._session_loop = None
+        if constrained_output is None:
+            constrained_output = os.getenv("OLLAMA_CONSTRAINED_OUTPUT", "").lower() in ("1", "true", "yes")
+        self.constrained_output = constrained_output
+        self._schemas: Dict[int, tuple] = {}
+        # Respuestas restringidas que no se pudieron interpretar
+        self.constrained_parse_failures = 0
         if not aiohttp:
             raise ImportError("aiohttp package not installed. Run: pip install aiohttp")
     
+    def _tool_call_schema(self, tools: List[Dict]) -> Dict[str, Any]:
+        """Schema de salida para una lista de tools (cacheado por identidad)"""
+        cached = self._schemas.get(id(tools))
+        if cached is not None and cached[0] is tools:
+            return cached[1]
+        
+        schema = build_tool_call_schema(tools)
+        if len(self._schemas) >= self.MAX_CACHED_SCHEMAS:
+            self._schemas.clear()
+        # Se guarda la lista para que su id no se reutilice mientras esté en caché
+        self._schemas[id(tools)] = (tools, schema)
+        return schema
+    
+    def _parse_constrained(self, content: str) -> tuple:
+        """
+        Interpreta una respuesta restringida
+        
+        Returns:
+            (contenido, tool_calls)
+        """
+        try:
+            data = json.loads(content)
+        except ValueError:
+            data = None
+        
+        if isinstance(data, dict):
+            if isinstance(data.get("name"), str):
+                arguments = data.get("arguments")
+                return "", [ToolCall(
+                    id=f"call_{uuid.uuid4().hex[:8]}",
+                    name=data["name"],
+                    arguments=arguments if isinstance(arguments, dict) else {}
+                )]
+            if isinstance(data.get("answer"), str):
+                return data["answer"], None
+        
+        self.constrained_parse_failures += 1
+        logger.warning(f"Respuesta restringida no válida: {content[:200]}")
+        return content, None
+    
     def _format_messages(self, messages: List[Message]) -> List[Dict]:
         """Convierte mensajes al formato de Ollama/OpenAI"""
         formatted = []
@@ -465,72 +638,281 @@ class OllamaProvider(LLMProvider):
         
         return formatted
 
-    async def chat(
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        """
+        Sesión HTTP persistente (reutiliza conexiones con el servidor)
+        
+        Se recrea si se cerró o si cambió el event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession()
+            self._session_loop = loop
+        return self._session
+    
+    def adopt_connections(self, other: "LLMProvider"):
+        """
+        Reutiliza la sesión HTTP de otro proveedor Ollama (reconfiguración en caliente)
+        
+        Args:
+            other: Proveedor anterior (puede venir envuelto en capas)
+        """
+        while not isinstance(other, OllamaProvider) and "provider" in vars(other):
+            other = other.provider
+        if not isinstance(other, OllamaProvider) or other is self:
+            return
+        if other._session is not None and not other._session.closed:
+            self._session, self._session_loop = other._session, other._session_loop
+            # El anterior abrirá otra sesión si aún la necesita
+            other._session = None
+    
+    async def close(self):
+        """Cierra la sesión HTTP"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    def _options(self, **options) -> Dict[str, Any]:
+        """Opciones de Ollama con el mismo num_ctx en todas las peticiones"""
+        if self.num_ctx:
+            options["num_ctx"] = self.num_ctx
+        return options
+    
+    def _record_load(self, result: Dict):
+        """Registra el tiempo de carga del modelo informado por Ollama (ns)"""
+        load_seconds = (result.get("load_duration") or 0) / 1e9
+        if load_seconds >= COLD_LOAD_THRESHOLD_SECONDS:
+            self.residency_stats["cold_loads"] += 1
+            self.residency_stats["last_load_seconds"] = round(load_seconds, 3)
+            logger.info(f"Ollama cargó {self.model} en {load_seconds:.1f}s")
+    
+    def _build_payload(
         self,
         messages: List[Message],
-        tools: Optional[List[Dict]] = None,
-        temperature: float = 0.7,
-        max_tokens: int = 4000,
-        stream: bool = False
-    ) -> LLMResponse:
-        """Llamada a Ollama API"""
-        
+        tools: Optional[List[Dict]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool
+    ) -> tuple:
+        """
+        Construye el payload de /api/chat
+        
+        Returns:
+            (payload, constrained)
+        """
         formatted_messages = self._format_messages(messages)
+        constrained = bool(self.constrained_output and tools and not stream)
+        
+        if constrained:
+            # Al final para no alterar el prefijo cacheado del prompt
+            formatted_messages.append({"role": "system", "content": CONSTRAINED_OUTPUT_INSTRUCTIONS})
         
         payload = {
             "model": self.model,
             "messages": formatted_messages,
-            "stream": False,
-            "options": {
-                "temperature": temperature,
-                "num_predict": max_tokens
-            }
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": self._options(temperature=temperature, num_predict=max_tokens)
         }
         
         if tools:
             payload["tools"] = tools
         
-        # DEBUG: Log the request payload
-        logger.debug(f"Ollama Request Payload: {json.dumps(payload)}")
+        if constrained:
+            payload["format"] = self._tool_call_schema(tools)
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/api/chat",
-                json=payload
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Ollama API Error ({response.status}): {error_text}")
-                    
-                result = await response.json()
-                logger.debug(f"Ollama Response: {json.dumps(result)}")
-                
-                # Extraer tool calls si existen
-                tool_calls = None
-                message = result.get("message", {})
+        return payload, constrained
+    
+    async def _post_chat(self, base_url: str, payload: Dict) -> Dict:
+        """POST /api/chat (sin streaming) y retorna el JSON de respuesta"""
+        session = await self._get_session()
+        async with session.post(f"{base_url}/api/chat", json=payload, **_deadline_timeout()) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise OllamaAPIError(response.status, error_text, response.headers.get("Retry-After"))
+            return await response.json()
+    
+    def _parse_chat_result(self, result: Dict, constrained: bool) -> LLMResponse:
+        """Convierte la respuesta de /api/chat en LLMResponse"""
+        logger.debug(f"Ollama Response: {json.dumps(result)}")
+        self._record_load(result)
+        
+        # Extraer tool calls si existen
+        tool_calls = None
+        message = result.get("message", {})
+        
+        if "tool_calls" in message and message["tool_calls"]:
+            tool_calls = []
+            for i, tc in enumerate(message["tool_calls"]):
+                args = tc["function"]["arguments"]
+                if isinstance(args, str):
+                    try:
+                        args = json.loads(args)
+                    except Exception:
+                        logger.error(f"Error parsing tool arguments: {args}")
+                        args = {"raw_arguments": args}
                 
-                if "tool_calls" in message and message["tool_calls"]:
-                    tool_calls = []
-                    for i, tc in enumerate(message["tool_calls"]):
-                        args = tc["function"]["arguments"]
-                        if isinstance(args, str):
-                            try:
-                                args = json.loads(args)
-                            except Exception:
-                                logger.error(f"Error parsing tool arguments: {args}")
-                                args = {"raw_arguments": args}
+                tool_calls.append(ToolCall(
+                    id=tc.get("id", f"call_{i}"),
+                    name=tc["function"]["name"],
+                    arguments=args
+                ))
+        
+        content = message.get("content", "")
+        if constrained and not tool_calls and content:
+            content, tool_calls = self._parse_constrained(content)
+        
+        # prompt_eval_count solo cuenta los tokens evaluados: los que
+        # Ollama reutiliza de su caché de KV no aparecen
+        prompt_tokens = result.get("prompt_eval_count", 0)
+        completion_tokens = result.get("eval_count", 0)
+        
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+        # Duraciones del servidor (ns -> ms): carga, prompt, generación y total
+        for source, target in (
+            ("load_duration", "load_ms"),
+            ("prompt_eval_duration", "prompt_eval_ms"),
+            ("eval_duration", "eval_ms"),
+            ("total_duration", "server_ms")
+        ):
+            if result.get(source) is not None:
+                usage[target] = result[source] / 1e6
+        
+        return LLMResponse(
+            content=content,
+            tool_calls=tool_calls,
+            finish_reason="stop",
+            usage=usage
+        )
+    
+    async def _stream_chat(self, base_url: str, payload: Dict) -> AsyncGenerator[str, None]:
+        """POST /api/chat con streaming; cede los fragmentos de texto"""
+        session = await self._get_session()
+        async with session.post(f"{base_url}/api/chat", json=payload, **_deadline_timeout()) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise OllamaAPIError(response.status, error_text, response.headers.get("Retry-After"))
+            
+            async for line in response.content:
+                if line:
+                    try:
+                        data = json.loads(line)
+                        if data.get("done"):
+                            self._record_load(data)
+                        message = data.get("message", {})
                         
-                        tool_calls.append(ToolCall(
-                            id=tc.get("id", f"call_{i}"),
-                            name=tc["function"]["name"],
-                            arguments=args
-                        ))
-                
-                return LLMResponse(
-                    content=message.get("content", ""),
-                    tool_calls=tool_calls,
-                    finish_reason="stop"
-                )
+                        # Ceder contenido de texto
+                        if "content" in message:
+                            content = message["content"]
+                            if content:
+                                yield content
+                        
+                        # Si hay tool_calls, podríamos ceder una señal o simplemente
+                        # dejar que el llamador lo maneje. Dado que chat_stream solo 
+                        # devuelve str (content), si hay tool_calls avisamos por log
+                        if "tool_calls" in message and message["tool_calls"]:
+                            logger.info(f"Detectados tool_calls en stream de Ollama: {message['tool_calls']}")
+                    except Exception:
+                        continue
+    
+    async def _warm_up_on(self, base_url: str) -> Dict[str, Any]:
+        """Carga el modelo en un servidor (/api/chat sin mensajes)"""
+        payload = {
+            "model": self.model,
+            "messages": [],
+            "keep_alive": self.keep_alive,
+            "options": self._options()
+        }
+        start = time.perf_counter()
+        result = await self._post_chat(base_url, payload)
+        elapsed = time.perf_counter() - start
+        self._record_load(result)
+        self.residency_stats["warmups"] += 1
+        self.residency_stats["last_warmup_at"] = time.time()
+        return {"url": base_url, "model": self.model, "seconds": round(elapsed, 3)}
+    
+    async def warm_up(self) -> List[Dict[str, Any]]:
+        """
+        Precarga el modelo configurado para que la primera petición no pague la carga
+        
+        Returns:
+            Resultado por servidor (url, model, seconds o error)
+        """
+        try:
+            return [await self._warm_up_on(self.base_url)]
+        except Exception as e:
+            logger.warning(f"No se pudo precargar {self.model} en {self.base_url}: {e}")
+            return [{"url": self.base_url, "model": self.model, "error": str(e)}]
+    
+    async def _model_status_on(self, base_url: str) -> Dict[str, Any]:
+        """Estado de residencia del modelo en un servidor (/api/ps)"""
+        status = {"url": base_url, "loaded": False}
+        try:
+            session = await self._get_session()
+            async with session.get(f"{base_url}/api/ps") as response:
+                if response.status != 200:
+                    raise OllamaAPIError(response.status, await response.text())
+                data = await response.json()
+        except Exception as e:
+            status["error"] = str(e)
+            return status
+        
+        wanted = self.model if ":" in self.model else f"{self.model}:latest"
+        for entry in data.get("models", []):
+            if (entry.get("name") or entry.get("model")) == wanted:
+                status.update({
+                    "loaded": True,
+                    "expires_at": entry.get("expires_at"),
+                    "size_vram": entry.get("size_vram"),
+                    "context_length": entry.get("context_length")
+                })
+                break
+        return status
+    
+    async def model_status(self) -> Dict[str, Any]:
+        """
+        Estado de carga del modelo y coste esperado del arranque en frío
+        
+        Returns:
+            Dict con model, keep_alive, num_ctx, servidores y cold_start_seconds
+            estimado (0 si está cargado; última carga medida si no)
+        """
+        hosts = [await self._model_status_on(self.base_url)]
+        return self._residency_report(hosts)
+    
+    def _residency_report(self, hosts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        loaded = any(h["loaded"] for h in hosts)
+        return {
+            "model": self.model,
+            "keep_alive": self.keep_alive,
+            "num_ctx": self.num_ctx,
+            "loaded": loaded,
+            "expected_cold_start_seconds": 0.0 if loaded else self.residency_stats["last_load_seconds"],
+            "hosts": hosts,
+            **self.residency_stats
+        }
+    
+    async def chat(
+        self,
+        messages: List[Message],
+        tools: Optional[List[Dict]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000,
+        stream: bool = False
+    ) -> LLMResponse:
+        """Llamada a Ollama API"""
+        
+        payload, constrained = self._build_payload(messages, tools, temperature, max_tokens, False)
+        
+        # DEBUG: Log the request payload
+        logger.debug(f"Ollama Request Payload: {json.dumps(payload)}")
+        
+        result = await self._post_chat(self.base_url, payload)
+        return self._parse_chat_result(result, constrained)
 
     async def chat_stream(
         self,
@@ -541,50 +923,14 @@ class OllamaProvider(LLMProvider):
     ) -> AsyncGenerator[str, None]:
         """Streaming de respuesta"""
         
-        formatted_messages = self._format_messages(messages)
-        
-        payload = {
-            "model": self.model,
-            "messages": formatted_messages,
-            "stream": True,
-            "options": {
-                "temperature": temperature,
-                "num_predict": max_tokens
-            }
-        }
-        
-        if tools:
-            payload["tools"] = tools
+        payload, _ = self._build_payload(messages, tools, temperature, max_tokens, True)
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/api/chat",
-                json=payload
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    yield f"Error: {error_text}"
-                    return
-
-                async for line in response.content:
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            message = data.get("message", {})
-                            
-                            # Ceder contenido de texto
-                            if "content" in message:
-                                content = message["content"]
-                                if content:
-                                    yield content
-                            
-                            # Si hay tool_calls, podríamos ceder una señal o simplemente
-                            # dejar que el llamador lo maneje. Dado que chat_stream solo 
-                            # devuelve str (content), si hay tool_calls avisamos por log
-                            if "tool_calls" in message and message["tool_calls"]:
-                                logger.info(f"Detectados tool_calls en stream de Ollama: {message['tool_calls']}")
-                        except Exception:
-                            continue
+        try:
+            async for chunk in self._stream_chat(self.base_url, payload):
+                yield chunk
+        except OllamaAPIError as e:
+            yield f"Error: {e.detail}"
+
 
 def create_llm_provider(
     provider_type: str,
@@ -619,6 +965,18 @@ def create_llm_provider(
     
     # Ollama no usa api_key
     if provider_type == "ollama":
+        # Varios servidores (base_urls u OLLAMA_HOSTS): pool con balanceo de carga
+        hosts = kwargs.get("base_urls") or os.getenv("OLLAMA_HOSTS", "")
+        if isinstance(hosts, str):
+            hosts = [h.strip().rstrip("/") for h in hosts.split(",") if h.strip()]
+        kwargs.pop("base_urls", None)
+        if len(hosts) > 1:
+            from .ollama_pool import OllamaPoolProvider
+            kwargs["base_urls"] = hosts
+            provider_class = OllamaPoolProvider
+        elif hosts and "base_url" not in kwargs:
+            kwargs["base_url"] = hosts[0].strip()
+        
         if model:
             return provider_class(model=model, **kwargs)
         else:
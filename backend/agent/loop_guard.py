@@ -0,0 +1,149 @@
+"""
+Loop Guard - Detección de bucles y presupuesto de cada ejecución
+
+Los modelos pequeños repiten a menudo el mismo tool call con los mismos
+argumentos, o alternan entre dos tools hasta agotar max_iterations. Cada
+ejecución de process_message lleva un LoopGuard que:
+
+- Resuelve las repeticiones exactas con el resultado anterior y una nota
+  para el LLM, sin volver a ejecutar el tool (solo si desde entonces no se
+  ejecutó ningún tool con efectos).
+- Detecta ciclos (la misma secuencia de tool calls de periodo 1 a
+  max_period repetida): la primera vez avisa al LLM; si sigue, se para.
+- Aplica un presupuesto de tiempo y de tokens por ejecución.
+
+Al parar, el agente termina con una respuesta parcial en lugar de cortar
+sin respuesta.
+"""
+
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from .llm_provider import ToolCall
+from .single_flight import tool_call_key
+
+# Motivos de parada
+STOP_CYCLE = "cycle"
+STOP_TIME = "time_budget"
+STOP_TOKENS = "token_budget"
+STOP_ITERATIONS = "max_iterations"
+
+# Resultado de end_iteration
+CYCLE_WARN = "warn"
+
+STOP_MESSAGES = {
+    STOP_CYCLE: "El agente repetía las mismas llamadas a tools sin avanzar",
+    STOP_TIME: "Se agotó el tiempo máximo de la petición",
+    STOP_TOKENS: "Se agotó el presupuesto de tokens de la petición",
+    STOP_ITERATIONS: "Se alcanzó el máximo de iteraciones"
+}
+
+
+class LoopGuard:
+    """Estado de bucles y presupuesto de una ejecución"""
+
+    def __init__(
+        self,
+        max_seconds: float = 0.0,
+        max_tokens: int = 0,
+        detect_loops: bool = True,
+        max_period: int = 3,
+        partial_chars: int = 1500
+    ):
+        """
+        Args:
+            max_seconds: Tiempo máximo de la ejecución (0 = sin límite)
+            max_tokens: Tokens máximos de la ejecución (0 = sin límite)
+            detect_loops: Resolver repeticiones y detectar ciclos
+            max_period: Longitud máxima (en iteraciones) de un ciclo
+            partial_chars: Longitud máxima de la respuesta parcial sin LLM
+        """
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.detect_loops = detect_loops
+        self.max_period = max_period
+        self.partial_chars = partial_chars
+        self.started = time.monotonic()
+        # Resultados vigentes por huella del tool call
+        self._results: Dict[str, Any] = {}
+        # Huella de los tool calls de cada iteración
+        self._signatures: List[Tuple[str, ...]] = []
+        # (tool, resultado) de la ejecución, para la respuesta parcial
+        self.results: List[Tuple[str, Any]] = []
+        self.warned = False
+        self.repeats = 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def lookup(self, tool_call: ToolCall) -> Tuple[bool, Any]:
+        """
+        Resultado anterior de un tool call idéntico
+
+        Returns:
+            (encontrado, resultado)
+        """
+        if not self.detect_loops:
+            return False, None
+        key = tool_call_key(tool_call.name, tool_call.arguments)
+        if key not in self._results:
+            return False, None
+        self.repeats += 1
+        return True, self._results[key]
+
+    def record(self, tool_call: ToolCall, result: Any, read_only: bool):
+        """
+        Registra el resultado de un tool ejecutado
+
+        Un tool con efectos deja obsoletos los resultados anteriores: tras
+        él, repetir una consulta es legítimo.
+        """
+        self.results.append((tool_call.name, result))
+        if not read_only:
+            self._results.clear()
+            return
+        if not (isinstance(result, dict) and result.get("success") is False):
+            self._results[tool_call_key(tool_call.name, tool_call.arguments)] = result
+
+    def end_iteration(self, tool_calls: List[ToolCall]) -> Optional[str]:
+        """
+        Registra los tool calls de una iteración y busca ciclos
+
+        Returns:
+            None, CYCLE_WARN (primer ciclo: avisar al LLM) o STOP_CYCLE
+        """
+        if not self.detect_loops:
+            return None
+        self._signatures.append(tuple(sorted(tool_call_key(tc.name, tc.arguments) for tc in tool_calls)))
+        signatures = self._signatures
+        for period in range(1, self.max_period + 1):
+            if len(signatures) >= 2 * period and signatures[-period:] == signatures[-2 * period:-period]:
+                if self.warned:
+                    return STOP_CYCLE
+                self.warned = True
+                return CYCLE_WARN
+        return None
+
+    def budget_exceeded(self, tokens: int) -> Optional[str]:
+        """Motivo de parada si se agotó el tiempo o los tokens"""
+        if self.max_seconds and self.elapsed() >= self.max_seconds:
+            return STOP_TIME
+        if self.max_tokens and tokens >= self.max_tokens:
+            return STOP_TOKENS
+        return None
+
+    def partial_answer(self, reason: str) -> str:
+        """Respuesta parcial con los últimos resultados, sin llamar al LLM"""
+        header = f"{STOP_MESSAGES.get(reason, reason)}. "
+        if not self.results:
+            return header + "No llegué a obtener resultados."
+        # Último resultado de cada tool, en orden de ejecución
+        latest = dict(self.results)
+        per_result = max(100, self.partial_chars // len(latest))
+        lines = []
+        for tool, result in latest.items():
+            text = str(result)
+            if len(text) > per_result:
+                text = text[:per_result - 3] + "..."
+            lines.append(f"- {tool}: {text}")
+        return header + "Resultados obtenidos hasta ahora:\n" + "\n".join(lines)
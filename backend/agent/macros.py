@@ -0,0 +1,454 @@
+"""
+Macros - Secuencias de tools grabadas que se repiten sin planificar
+
+Los operadores repiten a diario las mismas peticiones ("muéstrame las
+alertas de Nagios", "lista instancias AWS en us-east-1"). Cuando un turno
+termina bien con tools de solo lectura pedidos en una sola llamada al LLM,
+la petición y sus tool calls se guardan como macro en SQLite.
+
+Los valores de los argumentos que aparecen literalmente en la petición se
+convierten en parámetros: "lista instancias AWS en {p0}" con
+region="{{p0}}". Cada parámetro acepta la forma del valor grabado (una
+palabra, un número o un texto de tantas palabras como tenía) y nunca un
+valor con conectores ("... us-east-1 y termina la más vieja"). Una petición
+posterior que coincide (exacta o con la plantilla) ejecuta los tools
+directamente y el LLM solo redacta la respuesta.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Valores más cortos no se parametrizan (coincidirían en cualquier sitio)
+MIN_SLOT_CHARS = 2
+
+# Una macro que falla este número de veces seguidas se elimina
+MAX_FAILURES = 2
+
+_EDGE_PUNCTUATION = "¿?¡!.,;: \t\n"
+# Tipos de parámetro: "str" es una sola palabra (el valor grabado no tenía
+# espacios) y "text:N" un texto de hasta N palabras
+_SLOT_PATTERNS = {
+    "str": r"\S+",
+    "int": r"-?\d+",
+    "float": r"-?\d+(?:[.,]\d+)?"
+}
+
+# Palabras que encadenan otra orden ("... us-east-1 y termina la más vieja"):
+# un valor que las contiene no es el parámetro sino una petición compuesta
+_CONNECTORS = frozenset({
+    "y", "e", "o", "u", "ni", "luego", "después", "despues", "entonces", "además", "ademas", "pero",
+    "and", "or", "then", "also", "but"
+})
+_CLAUSE_SEPARATORS = re.compile(r"[,;]")
+
+
+def normalize_request(text: str) -> str:
+    """Petición sin espacios repetidos ni puntuación en los extremos"""
+    return re.sub(r"\s+", " ", text).strip(_EDGE_PUNCTUATION)
+
+
+def _literal(segment: str) -> str:
+    return r"\s+".join(re.escape(part) for part in segment.split(" "))
+
+
+def _slot_kind(value: Any) -> str:
+    """Tipo de parámetro según la forma del valor grabado"""
+    if isinstance(value, (int, float)):
+        return type(value).__name__
+    words = len(str(value).split())
+    return "str" if words <= 1 else f"text:{words}"
+
+
+def _slot_pattern(kind: str) -> str:
+    if kind.startswith("text:"):
+        return rf"\S+(?:\s+\S+){{0,{int(kind[5:]) - 1}}}"
+    return _SLOT_PATTERNS[kind]
+
+
+def _is_clause(raw: str) -> bool:
+    """El valor capturado arrastra otra orden (conector o separador de cláusulas)"""
+    if _CLAUSE_SEPARATORS.search(raw):
+        return True
+    return any(word.lower() in _CONNECTORS for word in raw.split())
+
+
+@dataclass
+class Macro:
+    """Petición parametrizada y los tool calls que la resuelven"""
+    name: str
+    template: str  # petición con {p0}, {p1}...
+    slots: Dict[str, str]  # parámetro -> tipo (str, int, float)
+    steps: List[Dict[str, Any]]  # [{"tool": ..., "arguments": {...con "{{p0}}"}}]
+    iterations: int = 1  # llamadas al LLM que ahorra cada uso
+    hits: int = 0
+    failures: int = 0
+    created_at: float = field(default_factory=time.time)
+    last_used: Optional[float] = None
+    _pattern: Optional[re.Pattern] = field(default=None, repr=False, compare=False)
+
+    @property
+    def pattern(self) -> re.Pattern:
+        if self._pattern is None:
+            parts = re.split(r"\{(p\d+)\}", self.template)
+            regex = "".join(
+                _literal(part) if index % 2 == 0 else f"(?P<{part}>{_slot_pattern(self.slots[part])})"
+                for index, part in enumerate(parts)
+            )
+            self._pattern = re.compile(regex, re.IGNORECASE)
+        return self._pattern
+
+    def match(self, request: str) -> Optional[Dict[str, Any]]:
+        """Valores de los parámetros si la petición coincide (None si no)"""
+        found = self.pattern.fullmatch(normalize_request(request))
+        if not found:
+            return None
+        values = {}
+        for slot, kind in self.slots.items():
+            raw = found.group(slot)
+            if kind == "int":
+                values[slot] = int(raw)
+            elif kind == "float":
+                values[slot] = float(raw.replace(",", "."))
+            elif _is_clause(raw):
+                return None
+            else:
+                values[slot] = raw
+        return values
+
+    def bind(self, values: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Tool calls con los parámetros sustituidos"""
+        def fill(value):
+            if isinstance(value, str):
+                whole = re.fullmatch(r"\{\{(p\d+)\}\}", value)
+                if whole:
+                    return values[whole.group(1)]
+                return re.sub(r"\{\{(p\d+)\}\}", lambda m: str(values[m.group(1)]), value)
+            if isinstance(value, dict):
+                return {k: fill(v) for k, v in value.items()}
+            if isinstance(value, list):
+                return [fill(v) for v in value]
+            return value
+
+        return [(step["tool"], fill(step["arguments"])) for step in self.steps]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "template": self.template,
+            "slots": self.slots,
+            "steps": self.steps,
+            "iterations": self.iterations,
+            "hits": self.hits,
+            "failures": self.failures,
+            "created_at": self.created_at,
+            "last_used": self.last_used
+        }
+
+
+def build_macro(
+    request: str,
+    steps: List[Tuple[str, Dict[str, Any]]],
+    iterations: int = 1,
+    schemas: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Optional[Macro]:
+    """
+    Parametriza una petición y sus tool calls
+
+    Cada valor de argumento (texto o número) que aparece como palabra
+    completa en la petición pasa a ser un parámetro. Un texto que no sale
+    de la petición solo se graba como constante si es un valor fijo del
+    esquema del tool (enum o default): si no, venía de turnos anteriores
+    ("léelo" tras nombrar el archivo) y la petición no sirve como macro.
+
+    Args:
+        request: Mensaje del usuario
+        steps: Tool calls (nombre, argumentos)
+        iterations: Llamadas al LLM que ahorra la macro
+        schemas: Propiedades del esquema de parámetros de cada tool
+
+    Returns:
+        La macro o None si algún argumento no se deduce de la petición
+    """
+    text = normalize_request(request)
+    # valor en texto -> tipo, y argumento del que sale (para el nombre)
+    candidates: Dict[str, str] = {}
+    keys: Dict[str, str] = {}
+
+    def collect(value, key=""):
+        if isinstance(value, bool) or value is None:
+            return
+        if isinstance(value, (str, int, float)):
+            raw = str(value)
+            if len(raw) >= MIN_SLOT_CHARS and raw not in candidates and not _is_clause(raw):
+                candidates[raw] = _slot_kind(value)
+                keys[raw] = key
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                collect(v, k)
+        elif isinstance(value, list):
+            for v in value:
+                collect(v, key)
+
+    for _, arguments in steps:
+        collect(arguments)
+
+    # Posiciones sin solapes, los valores más largos primero
+    spans: List[Tuple[int, int, str]] = []
+    for raw in sorted(candidates, key=len, reverse=True):
+        found = re.search(rf"(?<!\w){_literal(raw)}(?!\w)", text, re.IGNORECASE)
+        if found and not any(start < found.end() and found.start() < end for start, end, _ in spans):
+            spans.append((found.start(), found.end(), raw))
+    spans.sort()
+
+    slots: Dict[str, str] = {}
+    slot_of: Dict[str, str] = {}
+    template, cursor = "", 0
+    for index, (start, end, raw) in enumerate(spans):
+        slot = f"p{index}"
+        slots[slot] = candidates[raw]
+        slot_of[raw] = slot
+        template += text[cursor:start] + "{" + slot + "}"
+        cursor = end
+    template += text[cursor:]
+
+    def fixed(tool: str, key: str, value: str) -> bool:
+        spec = ((schemas or {}).get(tool) or {}).get(key) or {}
+        return value in spec.get("enum", ()) or ("default" in spec and value == spec["default"])
+
+    def unbound(tool: str, value, key: str = "") -> bool:
+        if isinstance(value, str):
+            return value not in slot_of and not fixed(tool, key, value)
+        if isinstance(value, dict):
+            return any(unbound(tool, v, k) for k, v in value.items())
+        if isinstance(value, list):
+            return any(unbound(tool, v, key) for v in value)
+        return False
+
+    if any(unbound(tool, arguments) for tool, arguments in steps):
+        return None
+
+    def parameterize(value):
+        if isinstance(value, bool) or value is None:
+            return value
+        if isinstance(value, (str, int, float)):
+            slot = slot_of.get(str(value))
+            return "{{" + slot + "}}" if slot else value
+        if isinstance(value, dict):
+            return {k: parameterize(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [parameterize(v) for v in value]
+        return value
+
+    name = "+".join(dict.fromkeys(tool for tool, _ in steps))
+    if slots:
+        name += "(" + ",".join(dict.fromkeys(keys[raw] for raw in slot_of)) + ")"
+    return Macro(
+        name=name,
+        template=template,
+        slots=slots,
+        steps=[{"tool": tool, "arguments": parameterize(arguments)} for tool, arguments in steps],
+        iterations=iterations
+    )
+
+
+class MacroStore:
+    """Macros en SQLite (o solo en memoria) con estadísticas de uso"""
+
+    def __init__(self, db_path: Optional[str] = None, max_macros: int = 500):
+        """
+        Args:
+            db_path: Archivo SQLite (None = solo memoria)
+            max_macros: Máximo de macros (se eliminan las menos usadas)
+        """
+        self.db_path = Path(db_path).expanduser() if db_path else None
+        self.max_macros = max_macros
+        self._macros: Dict[str, Macro] = {}  # template -> macro
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "recorded": 0, "saved_iterations": 0, "failures": 0}
+
+        if self.db_path:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._init_database()
+            self._load()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10.0)
+
+    def _init_database(self):
+        conn = self._get_connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS macros (
+                template TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                slots TEXT NOT NULL,
+                steps TEXT NOT NULL,
+                iterations INTEGER DEFAULT 1,
+                hits INTEGER DEFAULT 0,
+                failures INTEGER DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_used REAL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _load(self):
+        conn = self._get_connection()
+        rows = conn.execute(
+            "SELECT template, name, slots, steps, iterations, hits, failures, created_at, last_used FROM macros"
+        ).fetchall()
+        conn.close()
+        for template, name, slots, steps, iterations, hits, failures, created_at, last_used in rows:
+            self._macros[template] = Macro(
+                name, template, json.loads(slots), json.loads(steps), iterations, hits, failures, created_at, last_used
+            )
+
+    def _save(self, macro: Macro):
+        if not self.db_path:
+            return
+        conn = self._get_connection()
+        conn.execute('''
+            INSERT OR REPLACE INTO macros
+            (template, name, slots, steps, iterations, hits, failures, created_at, last_used)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            macro.template, macro.name, json.dumps(macro.slots), json.dumps(macro.steps, ensure_ascii=False),
+            macro.iterations, macro.hits, macro.failures, macro.created_at, macro.last_used
+        ))
+        conn.commit()
+        conn.close()
+
+    def _remove(self, macro: Macro):
+        self._macros.pop(macro.template, None)
+        if self.db_path:
+            conn = self._get_connection()
+            conn.execute("DELETE FROM macros WHERE template = ?", (macro.template,))
+            conn.commit()
+            conn.close()
+
+    def record(
+        self,
+        request: str,
+        steps: List[Tuple[str, Dict[str, Any]]],
+        iterations: int = 1,
+        schemas: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Optional[Macro]:
+        """
+        Graba (o actualiza) la macro de una petición resuelta
+
+        Args:
+            request: Mensaje del usuario
+            steps: Tool calls ejecutados (nombre, argumentos)
+            iterations: Llamadas al LLM que hicieron falta antes de la respuesta
+            schemas: Propiedades del esquema de parámetros de cada tool
+
+        Returns:
+            Macro grabada o None si la petición no sirve como plantilla
+        """
+        if not steps or not normalize_request(request):
+            return None
+        macro = build_macro(request, steps, iterations, schemas)
+        if macro is None:
+            logger.debug(f"Petición no grabada como macro (argumentos de turnos anteriores): '{request}'")
+            return None
+        with self._lock:
+            existing = self._macros.get(macro.template)
+            if existing is not None:
+                # Misma plantilla: se actualizan los pasos y se conservan las estadísticas
+                existing.steps, existing.slots, existing.name = macro.steps, macro.slots, macro.name
+                existing.failures = 0
+                macro = existing
+            else:
+                self._macros[macro.template] = macro
+                self.stats["recorded"] += 1
+                if len(self._macros) > self.max_macros:
+                    self._remove(min(self._macros.values(), key=lambda m: (m.hits, m.last_used or m.created_at)))
+            self._save(macro)
+        logger.info(f"Macro grabada: {macro.name} <- '{macro.template}'")
+        return macro
+
+    def match(self, request: str) -> Optional[Tuple[Macro, List[Tuple[str, Dict[str, Any]]]]]:
+        """
+        Macro que resuelve la petición
+
+        Una coincidencia exacta (sin parámetros) gana a una de plantilla; entre
+        plantillas, la de menos parámetros.
+
+        Returns:
+            (macro, tool calls con los parámetros sustituidos) o None
+        """
+        with self._lock:
+            self.stats["lookups"] += 1
+            candidates = sorted(self._macros.values(), key=lambda m: (len(m.slots), -m.hits))
+        for macro in candidates:
+            values = macro.match(request)
+            if values is not None:
+                with self._lock:
+                    self.stats["hits"] += 1
+                return macro, macro.bind(values)
+        return None
+
+    def record_result(self, macro: Macro, success: bool):
+        """Resultado de reproducir una macro (se elimina si falla repetidamente)"""
+        with self._lock:
+            macro.last_used = time.time()
+            if success:
+                macro.hits += 1
+                macro.failures = 0
+                self.stats["saved_iterations"] += macro.iterations
+            else:
+                macro.failures += 1
+                self.stats["failures"] += 1
+                if macro.failures >= MAX_FAILURES:
+                    logger.info(f"Macro eliminada tras {macro.failures} fallos: {macro.name}")
+                    self._remove(macro)
+                    return
+            self._save(macro)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [m.to_dict() for m in sorted(self._macros.values(), key=lambda m: -m.hits)]
+
+    def delete(self, name: str) -> bool:
+        """Elimina las macros con ese nombre"""
+        with self._lock:
+            found = [m for m in self._macros.values() if m.name == name]
+            for macro in found:
+                self._remove(macro)
+        return bool(found)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["lookups"]
+        return {
+            **self.stats,
+            "macros": len(self._macros),
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0
+        }
+
+
+_macro_store: Optional[MacroStore] = None
+
+
+def get_macro_store() -> MacroStore:
+    """
+    Almacén de macros del proceso
+
+    Se configura con AGENT_MACRO_DB (por defecto ~/.agent_data/macros.db).
+    """
+    global _macro_store
+
+    if _macro_store is None:
+        _macro_store = MacroStore(db_path=os.getenv("AGENT_MACRO_DB", "~/.agent_data/macros.db"))
+
+    return _macro_store
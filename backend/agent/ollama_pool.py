@@ -0,0 +1,459 @@
+"""
+Ollama Pool - Balanceo de carga entre varios servidores Ollama
+
+Cada petición se envía al servidor con menor latencia esperada según:
+- peticiones en curso en ese servidor
+- latencia media (EWMA) de sus respuestas
+- si tiene el modelo ya cargado en memoria (consultado con /api/ps)
+
+Los servidores que fallan quedan fuera durante un tiempo creciente
+(failover automático). Opcionalmente, si el primer servidor tarda más de
+`hedge_after` segundos en responder (o en dar el primer token en
+streaming), se lanza la misma petición en el segundo y gana el primero.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, AsyncGenerator, Awaitable, Callable, Set
+
+from .llm_provider import (
+    OllamaProvider,
+    OllamaAPIError,
+    LLMResponse,
+    Message,
+    DEFAULT_OLLAMA_URL,
+    aiohttp
+)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_hosts(value: Optional[str]) -> List[str]:
+    """Lista de URLs separadas por coma (env OLLAMA_HOSTS)"""
+    if not value:
+        return []
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+def model_key(name: str) -> str:
+    """Nombre de modelo con tag explícito (llama3.2 -> llama3.2:latest)"""
+    return name if ":" in name else f"{name}:latest"
+
+
+@dataclass
+class OllamaHost:
+    """Estado de un servidor Ollama del pool"""
+    url: str
+    in_flight: int = 0
+    ewma_latency: Optional[float] = None  # segundos por respuesta completa
+    ewma_ttft: Optional[float] = None  # segundos hasta el primer token (streaming)
+    healthy: bool = True
+    consecutive_failures: int = 0
+    retry_at: float = 0.0
+    last_check: Optional[float] = None
+    loaded_models: Optional[Set[str]] = None  # None = desconocido
+    requests: int = 0
+    failures: int = 0
+    last_error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "ewma_ttft_ms": round(self.ewma_ttft * 1000, 1) if self.ewma_ttft is not None else None,
+            "loaded_models": sorted(self.loaded_models) if self.loaded_models is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error
+        }
+
+
+class OllamaPoolProvider(OllamaProvider):
+    """Proveedor Ollama sobre un pool de servidores"""
+
+    def __init__(
+        self,
+        model: str = "llama3.2:latest",
+        base_urls: Optional[List[str]] = None,
+        ewma_alpha: float = 0.3,
+        hedge_after: Optional[float] = None,
+        health_interval: float = 15.0,
+        health_timeout: float = 2.0,
+        cold_start_penalty: float = 5.0,
+        default_latency: float = 1.0,
+        **kwargs
+    ):
+        """
+        Args:
+            model: Modelo de Ollama
+            base_urls: URLs de los servidores (None = env OLLAMA_HOSTS)
+            ewma_alpha: Peso de la última muestra en la latencia media
+            hedge_after: Segundos antes de duplicar la petición en otro
+                         servidor (None = env OLLAMA_HEDGE_AFTER o sin duplicar)
+            health_interval: Segundos entre consultas a /api/ps de cada servidor
+            health_timeout: Timeout de cada consulta de salud
+            cold_start_penalty: Segundos estimados de carga del modelo en un
+                                servidor que no lo tiene en memoria
+            default_latency: Latencia supuesta de un servidor aún sin medir
+        """
+        urls = [url.rstrip("/") for url in (base_urls or parse_hosts(os.getenv("OLLAMA_HOSTS")))]
+        if not urls:
+            urls = [(os.getenv("OLLAMA_BASE_URL") or DEFAULT_OLLAMA_URL).rstrip("/")]
+
+        if hedge_after is None and os.getenv("OLLAMA_HEDGE_AFTER"):
+            hedge_after = float(os.getenv("OLLAMA_HEDGE_AFTER"))
+
+        super().__init__(model=model, base_url=urls[0], **kwargs)
+        self.hosts = [OllamaHost(url) for url in urls]
+        self.ewma_alpha = ewma_alpha
+        self.hedge_after = hedge_after
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.cold_start_penalty = cold_start_penalty
+        self.default_latency = default_latency
+        self.pool_stats = {
+            "requests": 0,
+            "failovers": 0,
+            "hedged": 0,
+            "hedge_wins": 0
+        }
+
+    # ------------------------------------------------------------------
+    # Selección de servidor
+    # ------------------------------------------------------------------
+
+    def expected_latency(self, host: OllamaHost) -> float:
+        """Latencia esperada de una nueva petición en el servidor"""
+        base = host.ewma_latency if host.ewma_latency is not None else self.default_latency
+        cost = base * (host.in_flight + 1)
+        if host.loaded_models is not None and model_key(self.model) not in host.loaded_models:
+            cost += self.cold_start_penalty
+        return cost
+
+    def rank_hosts(self) -> List[OllamaHost]:
+        """
+        Servidores disponibles ordenados por latencia esperada
+
+        Si todos están marcados como caídos se prueban igualmente.
+        """
+        now = time.monotonic()
+        available = [h for h in self.hosts if h.healthy or h.retry_at <= now]
+        return sorted(available or self.hosts, key=self.expected_latency)
+
+    def _mark_up(self, host: OllamaHost):
+        host.healthy = True
+        host.consecutive_failures = 0
+        host.retry_at = 0.0
+
+    def _mark_down(self, host: OllamaHost, error: Exception):
+        host.healthy = False
+        host.failures += 1
+        host.consecutive_failures += 1
+        host.last_error = str(error)
+        # Backoff exponencial hasta 60 s antes de volver a intentarlo
+        host.retry_at = time.monotonic() + min(60.0, 2.0 ** host.consecutive_failures)
+        logger.warning(f"Servidor Ollama {host.url} no disponible: {error}")
+
+    def _record_latency(self, host: OllamaHost, attribute: str, elapsed: float):
+        previous = getattr(host, attribute)
+        value = elapsed if previous is None else self.ewma_alpha * elapsed + (1 - self.ewma_alpha) * previous
+        setattr(host, attribute, value)
+
+    # ------------------------------------------------------------------
+    # Salud y modelos cargados
+    # ------------------------------------------------------------------
+
+    async def refresh_hosts(self, force: bool = False):
+        """Consulta /api/ps en los servidores cuya información caducó"""
+        now = time.monotonic()
+        stale = [
+            h for h in self.hosts
+            if force or h.last_check is None or now - h.last_check >= self.health_interval
+        ]
+        if stale:
+            await asyncio.gather(*(self._check_host(host) for host in stale))
+
+    async def _check_host(self, host: OllamaHost):
+        host.last_check = time.monotonic()
+        try:
+            session = await self._get_session()
+            timeout = aiohttp.ClientTimeout(total=self.health_timeout)
+            async with session.get(f"{host.url}/api/ps", timeout=timeout) as response:
+                if response.status != 200:
+                    raise OllamaAPIError(response.status, await response.text())
+                data = await response.json()
+            host.loaded_models = {
+                model_key(m.get("name") or m.get("model", "")) for m in data.get("models", [])
+            }
+            self._mark_up(host)
+        except Exception as e:
+            self._mark_down(host, e)
+
+    # ------------------------------------------------------------------
+    # Envío de peticiones
+    # ------------------------------------------------------------------
+
+    async def _run_on(self, host: OllamaHost, request: Callable[[OllamaHost], Awaitable[Any]]) -> Any:
+        """Ejecuta una petición en un servidor y actualiza su estado"""
+        host.in_flight += 1
+        host.requests += 1
+        start = time.perf_counter()
+        try:
+            result = await request(host)
+        except asyncio.CancelledError:
+            # Petición duplicada perdedora: no es un fallo del servidor
+            raise
+        except OllamaAPIError as e:
+            host.last_error = str(e)
+            if e.status >= 500:
+                self._mark_down(host, e)
+            raise
+        except Exception as e:
+            self._mark_down(host, e)
+            raise
+        finally:
+            host.in_flight -= 1
+
+        self._record_latency(host, "ewma_latency", time.perf_counter() - start)
+        self._mark_up(host)
+        if host.loaded_models is not None:
+            host.loaded_models.add(model_key(self.model))
+        return result
+
+    async def _hedged(
+        self,
+        primary: OllamaHost,
+        backup: OllamaHost,
+        request: Callable[[OllamaHost], Awaitable[Any]],
+        started: List[OllamaHost]
+    ) -> Any:
+        """
+        Envía al primario y, si tarda más de hedge_after, también al respaldo
+        
+        Args:
+            started: Se agrega el respaldo si llegó a usarse
+        """
+        first = asyncio.ensure_future(self._run_on(primary, request))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if done:
+            return first.result()
+
+        started.append(backup)
+        logger.info(f"Petición duplicada en {backup.url} ({primary.url} tarda más de {self.hedge_after}s)")
+        self.pool_stats["hedged"] += 1
+        second = asyncio.ensure_future(self._run_on(backup, request))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.pool_stats["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _dispatch(self, request: Callable[[OllamaHost], Awaitable[Any]]) -> Any:
+        """Envía la petición al mejor servidor con failover al siguiente"""
+        await self.refresh_hosts()
+        ranked = self.rank_hosts()
+        self.pool_stats["requests"] += 1
+
+        error = None
+        remaining = list(ranked)
+        while remaining:
+            host = remaining.pop(0)
+            started: List[OllamaHost] = []
+            try:
+                if self.hedge_after is not None and remaining:
+                    return await self._hedged(host, remaining[0], request, started)
+                return await self._run_on(host, request)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+                self.pool_stats["failovers"] += 1
+                # El respaldo de una petición duplicada ya se probó
+                remaining = [h for h in remaining if h not in started]
+
+        raise error
+
+    async def chat(
+        self,
+        messages: List[Message],
+        tools: Optional[List[Dict]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000,
+        stream: bool = False
+    ) -> LLMResponse:
+        """Llamada a /api/chat en el mejor servidor del pool"""
+        payload, constrained = self._build_payload(messages, tools, temperature, max_tokens, False)
+        result = await self._dispatch(lambda host: self._post_chat(host.url, payload))
+        return self._parse_chat_result(result, constrained)
+
+    # ------------------------------------------------------------------
+    # Streaming (la petición duplicada cubre el primer token)
+    # ------------------------------------------------------------------
+
+    async def _host_stream(self, host: OllamaHost, payload: Dict) -> AsyncGenerator[str, None]:
+        host.in_flight += 1
+        host.requests += 1
+        try:
+            async for chunk in self._stream_chat(host.url, payload):
+                yield chunk
+        finally:
+            host.in_flight -= 1
+
+    async def _first_chunk(self, host: OllamaHost, stream: AsyncGenerator[str, None]) -> Optional[str]:
+        start = time.perf_counter()
+        try:
+            chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            chunk = None
+        except asyncio.CancelledError:
+            raise
+        except OllamaAPIError as e:
+            host.last_error = str(e)
+            if e.status >= 500:
+                self._mark_down(host, e)
+            raise
+        except Exception as e:
+            self._mark_down(host, e)
+            raise
+        self._record_latency(host, "ewma_ttft", time.perf_counter() - start)
+        self._mark_up(host)
+        return chunk
+
+    async def _open_stream(self, ranked: List[OllamaHost], payload: Dict) -> tuple:
+        """
+        Abre el stream en el mejor servidor (con failover y duplicado)
+
+        Returns:
+            (stream, primer fragmento)
+        """
+        error = None
+        index = 0
+        while index < len(ranked):
+            host = ranked[index]
+            stream = self._host_stream(host, payload)
+            first = asyncio.ensure_future(self._first_chunk(host, stream))
+            candidates = {first: stream}
+
+            if self.hedge_after is not None and index + 1 < len(ranked):
+                done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+                if not done:
+                    backup = ranked[index + 1]
+                    logger.info(f"Stream duplicado en {backup.url} (sin primer token de {host.url})")
+                    self.pool_stats["hedged"] += 1
+                    backup_stream = self._host_stream(backup, payload)
+                    candidates[asyncio.ensure_future(self._first_chunk(backup, backup_stream))] = backup_stream
+                    index += 1
+            index += 1
+
+            pending = set(candidates)
+            winner = None
+            try:
+                while pending and winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None and winner is None:
+                            winner = task
+                        elif task.exception() is not None:
+                            error = error or task.exception()
+            finally:
+                for task in pending:
+                    task.cancel()
+                # El generador no puede cerrarse mientras su __anext__ sigue en curso
+                await asyncio.gather(*pending, return_exceptions=True)
+                for task, task_stream in candidates.items():
+                    if task is not winner:
+                        await task_stream.aclose()
+
+            if winner is not None:
+                if winner is not first:
+                    self.pool_stats["hedge_wins"] += 1
+                return candidates[winner], winner.result()
+            self.pool_stats["failovers"] += 1
+
+        raise error
+
+    async def chat_stream(
+        self,
+        messages: List[Message],
+        tools: Optional[List[Dict]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000
+    ) -> AsyncGenerator[str, None]:
+        """Streaming desde el mejor servidor del pool"""
+        payload, _ = self._build_payload(messages, tools, temperature, max_tokens, True)
+        await self.refresh_hosts()
+        self.pool_stats["requests"] += 1
+
+        try:
+            stream, first = await self._open_stream(self.rank_hosts(), payload)
+        except Exception as e:
+            yield f"Error: {e}"
+            return
+
+        try:
+            if first:
+                yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def adopt_connections(self, other):
+        """Reutiliza la sesión y el estado de los servidores comunes del pool anterior"""
+        super().adopt_connections(other)
+        while not isinstance(other, OllamaProvider) and "provider" in vars(other):
+            other = other.provider
+        previous = {host.url: host for host in getattr(other, "hosts", [])}
+        # Objetos compartidos: las peticiones en curso del anterior siguen contando
+        self.hosts = [previous.get(host.url, host) for host in self.hosts]
+
+    # ------------------------------------------------------------------
+    # Residencia del modelo
+    # ------------------------------------------------------------------
+
+    async def _warm_up_host(self, host: OllamaHost) -> Dict[str, Any]:
+        try:
+            result = await self._warm_up_on(host.url)
+        except Exception as e:
+            self._mark_down(host, e)
+            return {"url": host.url, "model": self.model, "error": str(e)}
+        self._mark_up(host)
+        host.loaded_models = (host.loaded_models or set()) | {model_key(self.model)}
+        return result
+
+    async def warm_up(self) -> List[Dict[str, Any]]:
+        """Precarga el modelo en todos los servidores del pool"""
+        return list(await asyncio.gather(*(self._warm_up_host(host) for host in self.hosts)))
+
+    async def model_status(self) -> Dict[str, Any]:
+        """Estado de carga del modelo en cada servidor del pool"""
+        hosts = await asyncio.gather(*(self._model_status_on(host.url) for host in self.hosts))
+        return self._residency_report(list(hosts))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estado de cada servidor del pool"""
+        return {
+            "ollama_pool": {
+                **self.pool_stats,
+                "hosts": [host.to_dict() for host in self.hosts]
+            }
+        }
@@ -0,0 +1,317 @@
+"""
+Planner - Plan completo como grafo de dependencias y ejecución en paralelo
+
+En modo plan el LLM devuelve de una vez todos los tool calls de la tarea,
+cada uno con sus dependencias. Los argumentos pueden referirse a
+resultados de pasos anteriores:
+- "$s1"            -> resultado completo del paso s1
+- "$s1.items.0.id" -> parte del resultado (claves de dict o índices de lista)
+- "... {{s1.path}} ..." -> referencia dentro de un texto
+
+El ejecutor lanza cada paso en cuanto terminan sus dependencias (orden
+topológico, con un máximo de pasos simultáneos). Si un paso falla, los que
+dependen de él se omiten y el resto del grafo sigue adelante.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Iterable, Set, Callable, Awaitable, AsyncGenerator
+
+from .llm_provider import LLMResponse
+from .tool_call_parser import extract_tool_calls, parse_tool_json
+
+logger = logging.getLogger(__name__)
+
+_STEP_ID = r"[A-Za-z][A-Za-z0-9_\-]*"
+_PATH = r"((?:\.[A-Za-z0-9_\-]+)*)"
+# Valor completo: "$s1.campo"
+_WHOLE_REF = re.compile(rf"^\$({_STEP_ID}){_PATH}$")
+# Dentro de un texto: "{{s1.campo}}"
+_INLINE_REF = re.compile(rf"\{{\{{\s*\$?({_STEP_ID}){_PATH}\s*\}}\}}")
+_FENCED = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+class PlanError(ValueError):
+    """Plan mal formado o no ejecutable"""
+
+
+@dataclass
+class PlanStep:
+    """Un tool call del plan"""
+    id: str
+    tool: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+    depends_on: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "tool": self.tool, "arguments": self.arguments, "depends_on": self.depends_on}
+
+
+@dataclass
+class StepResult:
+    """Estado de un paso: running, ok, error o skipped"""
+    step: PlanStep
+    status: str
+    arguments: Optional[Dict[str, Any]] = None
+    result: Any = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+
+def find_references(value: Any) -> Set[str]:
+    """Pasos a los que se refieren unos argumentos"""
+    if isinstance(value, str):
+        whole = _WHOLE_REF.match(value)
+        if whole:
+            return {whole.group(1)}
+        return {match.group(1) for match in _INLINE_REF.finditer(value)}
+    if isinstance(value, dict):
+        return set().union(*(find_references(v) for v in value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*(find_references(v) for v in value)) if value else set()
+    return set()
+
+
+def _lookup(results: Dict[str, Any], step_id: str, path: str) -> Any:
+    if step_id not in results:
+        raise PlanError(f"Referencia a un paso sin resultado: {step_id}")
+    value = results[step_id]
+    for key in filter(None, path.split(".")):
+        if isinstance(value, dict) and key in value:
+            value = value[key]
+        elif isinstance(value, list) and key.lstrip("-").isdigit() and -len(value) <= int(key) < len(value):
+            value = value[int(key)]
+        else:
+            raise PlanError(f"'{key}' no existe en el resultado de {step_id}{path}")
+    return value
+
+
+def resolve_arguments(value: Any, results: Dict[str, Any]) -> Any:
+    """
+    Sustituye las referencias por los resultados de los pasos
+
+    Args:
+        value: Argumentos del paso (cualquier estructura JSON)
+        results: Resultado de cada paso terminado
+
+    Returns:
+        Argumentos con las referencias resueltas
+    """
+    if isinstance(value, str):
+        whole = _WHOLE_REF.match(value)
+        if whole:
+            return _lookup(results, whole.group(1), whole.group(2))
+
+        def inline(match):
+            part = _lookup(results, match.group(1), match.group(2))
+            return part if isinstance(part, str) else json.dumps(part, ensure_ascii=False, default=str)
+
+        return _INLINE_REF.sub(inline, value)
+    if isinstance(value, dict):
+        return {k: resolve_arguments(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_arguments(v, results) for v in value]
+    return value
+
+
+def topological_levels(steps: List[PlanStep]) -> List[List[str]]:
+    """
+    Niveles del grafo: cada nivel solo depende de los anteriores
+
+    Raises:
+        PlanError: Si hay dependencias circulares
+    """
+    remaining = {step.id: set(step.depends_on) for step in steps}
+    done: Set[str] = set()
+    levels = []
+    while remaining:
+        level = [step_id for step_id, deps in remaining.items() if deps <= done]
+        if not level:
+            raise PlanError(f"Dependencias circulares entre: {', '.join(sorted(remaining))}")
+        levels.append(level)
+        done.update(level)
+        for step_id in level:
+            del remaining[step_id]
+    return levels
+
+
+def parse_plan(data: Any, known_tools: Iterable[str]) -> List[PlanStep]:
+    """
+    Valida un plan ({"steps": [...]}, {"plan": [...]} o la lista de pasos)
+
+    Las dependencias implícitas (referencias en los argumentos) se añaden a
+    depends_on.
+
+    Raises:
+        PlanError: Tool desconocido, ids repetidos, dependencias inexistentes o ciclos
+    """
+    if isinstance(data, dict):
+        data = data.get("steps", data.get("plan"))
+    if not isinstance(data, list):
+        raise PlanError("El plan debe ser una lista de pasos")
+
+    known = known_tools if isinstance(known_tools, (set, dict)) else set(known_tools)
+    steps: List[PlanStep] = []
+    for index, item in enumerate(data, start=1):
+        if not isinstance(item, dict):
+            raise PlanError(f"Paso {index} no es un objeto")
+        step_id = str(item.get("id") or f"s{index}")
+        tool = item.get("tool") or item.get("name")
+        if tool not in known:
+            raise PlanError(f"Tool desconocido en {step_id}: {tool}")
+        arguments = item.get("arguments", item.get("parameters", item.get("args"))) or {}
+        if isinstance(arguments, str):
+            arguments = parse_tool_json(arguments)
+        if not isinstance(arguments, dict):
+            raise PlanError(f"Argumentos no válidos en {step_id}")
+        depends_on = item.get("depends_on") or item.get("after") or []
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        depends_on = list(dict.fromkeys([str(d) for d in depends_on] + sorted(find_references(arguments))))
+        steps.append(PlanStep(step_id, tool, arguments, depends_on))
+
+    ids = [step.id for step in steps]
+    if len(set(ids)) != len(ids):
+        raise PlanError("Ids de paso repetidos")
+    for step in steps:
+        missing = [d for d in step.depends_on if d not in ids]
+        if missing:
+            raise PlanError(f"{step.id} depende de pasos inexistentes: {', '.join(missing)}")
+    topological_levels(steps)
+    return steps
+
+
+def _plan_data(content: str) -> Optional[Any]:
+    """JSON del plan dentro del texto del LLM (None si no hay)"""
+    candidates = [block.strip() for block in _FENCED.findall(content)]
+    start, end = content.find("{"), content.rfind("}")
+    if 0 <= start < end:
+        candidates.append(content[start:end + 1])
+    for candidate in candidates:
+        data = parse_tool_json(candidate)
+        if isinstance(data, dict) and ("steps" in data or "plan" in data):
+            return data
+    return None
+
+
+def plan_from_response(response: LLMResponse, known_tools: Iterable[str]) -> Optional[List[PlanStep]]:
+    """
+    Plan de la respuesta de planificación
+
+    Los tool calls sueltos (nativos o en JSON) se aceptan como un plan de
+    pasos independientes.
+
+    Returns:
+        Pasos del plan o None si el LLM respondió directamente en texto
+
+    Raises:
+        PlanError: Si el plan no es válido o la respuesta está vacía
+    """
+    content = response.content or ""
+    if response.tool_calls:
+        calls = response.tool_calls
+    else:
+        data = _plan_data(content)
+        if data is not None:
+            return parse_plan(data, known_tools)
+        calls, _ = extract_tool_calls(content) if content else ([], [])
+        if not calls:
+            if not content.strip():
+                raise PlanError("Respuesta de planificación vacía")
+            return None
+    return parse_plan(
+        [{"id": f"s{i}", "tool": tc.name, "arguments": tc.arguments} for i, tc in enumerate(calls, start=1)],
+        known_tools
+    )
+
+
+def _failed(result: Any) -> Optional[str]:
+    """Error de un tool que devuelve {"success": False} en lugar de lanzar"""
+    if isinstance(result, dict) and result.get("success") is False:
+        return str(result.get("error") or "El tool indicó un fallo")
+    return None
+
+
+class PlanExecutor:
+    """Ejecuta los pasos de un plan en orden topológico y en paralelo"""
+
+    def __init__(
+        self,
+        steps: List[PlanStep],
+        run_step: Callable[[PlanStep, Dict[str, Any]], Awaitable[Any]],
+        max_parallel: int = 4
+    ):
+        """
+        Args:
+            steps: Pasos validados (parse_plan)
+            run_step: Corrutina que ejecuta un paso con sus argumentos resueltos
+            max_parallel: Pasos simultáneos como máximo
+        """
+        self.steps = steps
+        self.run_step = run_step
+        self.max_parallel = max(1, max_parallel)
+        self.results: Dict[str, StepResult] = {}
+
+    async def run(self) -> AsyncGenerator[StepResult, None]:
+        """
+        Ejecuta el plan
+
+        Yields:
+            StepResult "running" al lanzar cada paso y el estado final de
+            cada uno (ok, error o skipped) al terminar
+        """
+        pending = {step.id: step for step in self.steps}
+        # tarea -> (paso lanzado, inicio)
+        running: Dict[asyncio.Future, tuple] = {}
+        try:
+            while pending or running:
+                # Los dependientes de un paso fallido no se ejecutan
+                for step in list(pending.values()):
+                    failed = [d for d in step.depends_on if d in self.results and self.results[d].status != "ok"]
+                    if failed:
+                        del pending[step.id]
+                        yield self._finish(StepResult(step, "skipped", error=f"Depende de {failed[0]}, que no se completó"))
+
+                outputs = {step_id: r.result for step_id, r in self.results.items() if r.status == "ok"}
+                ready = [s for s in pending.values() if all(d in outputs for d in s.depends_on)]
+                for step in ready[:self.max_parallel - len(running)]:
+                    del pending[step.id]
+                    try:
+                        arguments = resolve_arguments(step.arguments, outputs)
+                    except PlanError as e:
+                        yield self._finish(StepResult(step, "error", error=str(e)))
+                        continue
+                    state = StepResult(step, "running", arguments=arguments)
+                    running[asyncio.ensure_future(self.run_step(step, arguments))] = (state, time.perf_counter())
+                    yield state
+
+                if not running:
+                    if pending and not ready:
+                        break  # no debería ocurrir con un plan validado
+                    continue
+
+                done, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    state, start = running.pop(task)
+                    elapsed = time.perf_counter() - start
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.error(f"Error en el paso {state.step.id} ({state.step.tool}): {e}")
+                        final = StepResult(state.step, "error", state.arguments, error=str(e), elapsed=elapsed)
+                    else:
+                        error = _failed(result)
+                        final = StepResult(state.step, "error" if error else "ok", state.arguments,
+                                           result=result, error=error, elapsed=elapsed)
+                    yield self._finish(final)
+        finally:
+            for task in running:
+                task.cancel()
+
+    def _finish(self, result: StepResult) -> StepResult:
+        self.results[result.step.id] = result
+        return result
@@ -0,0 +1,355 @@
+"""
+Response Cache - Caché de respuestas exactas del LLM
+
+Las peticiones programadas y las de los dashboards envían una y otra vez la
+misma lista de mensajes. Con la caché activada, una petición idéntica
+(proveedor, modelo, mensajes, tools y temperatura) se responde desde memoria
+(LRU) o desde SQLite, con TTL y límite de tamaño.
+
+Solo se usa con temperatura 0 salvo que se fuerce: con muestreo la
+respuesta no es determinista.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, Any, List, Optional, AsyncGenerator
+
+from .llm_provider import LLMProvider, LLMResponse, Message, ToolCall
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_key(
+    provider: str,
+    model: str,
+    messages: List[Message],
+    tools: Optional[List[Dict]],
+    temperature: float
+) -> str:
+    """
+    Hash canónico de una petición al LLM
+
+    Returns:
+        SHA-256 hexadecimal
+    """
+    payload = {
+        "provider": provider,
+        "model": model,
+        "messages": [
+            {
+                "role": m.role,
+                "content": m.content,
+                "tool_calls": m.tool_calls,
+                "tool_call_id": m.tool_call_id
+            }
+            for m in messages
+        ],
+        "tools": tools or [],
+        "temperature": round(float(temperature), 4)
+    }
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _dump_response(response: LLMResponse) -> str:
+    return json.dumps(asdict(response), ensure_ascii=False, default=str)
+
+
+def _load_response(raw: str) -> LLMResponse:
+    data = json.loads(raw)
+    tool_calls = data.get("tool_calls")
+    return LLMResponse(
+        content=data.get("content", ""),
+        tool_calls=[ToolCall(**tc) for tc in tool_calls] if tool_calls else None,
+        finish_reason=data.get("finish_reason", "stop"),
+        usage=data.get("usage")
+    )
+
+
+class ResponseCache:
+    """
+    Caché de dos niveles: LRU en memoria + SQLite persistente
+
+    Las entradas se guardan serializadas; cada acierto reconstruye un
+    LLMResponse nuevo (el agente modifica las respuestas que recibe).
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 5000,
+        ttl_seconds: float = 3600
+    ):
+        """
+        Args:
+            db_path: Archivo SQLite (None = solo memoria)
+            max_memory_entries: Tamaño del LRU en memoria
+            max_disk_entries: Máximo de entradas en SQLite (se expulsan las menos usadas)
+            ttl_seconds: Tiempo de vida de cada entrada
+        """
+        self.db_path = Path(db_path).expanduser() if db_path else None
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, latencia original, respuesta serializada)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "saved_seconds": 0.0
+        }
+
+        if self.db_path:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._init_database()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10.0)
+
+    def _init_database(self):
+        conn = self._get_connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_response_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                latency REAL DEFAULT 0,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used
+            ON llm_response_cache(last_used)
+        ''')
+        conn.commit()
+        conn.close()
+
+    def get(self, key: str) -> Optional[LLMResponse]:
+        """
+        Busca una respuesta (memoria y luego SQLite)
+
+        Returns:
+            LLMResponse nuevo o None si no existe o expiró
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, latency, raw = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._record_hit("memory_hits", latency)
+                    return _load_response(raw)
+                del self._memory[key]
+
+        if self.db_path:
+            conn = self._get_connection()
+            try:
+                row = conn.execute(
+                    "SELECT response, latency, expires_at FROM llm_response_cache WHERE key = ?",
+                    (key,)
+                ).fetchone()
+                if row and row[2] > now:
+                    conn.execute("UPDATE llm_response_cache SET last_used = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                    raw, latency, expires_at = row
+                    with self._lock:
+                        self._remember(key, (expires_at, latency, raw))
+                        self._record_hit("disk_hits", latency)
+                    return _load_response(raw)
+                if row:
+                    conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+                    conn.commit()
+            finally:
+                conn.close()
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, response: LLMResponse, latency: float = 0.0):
+        """
+        Guarda una respuesta
+
+        Args:
+            key: Clave canónica
+            response: Respuesta del LLM
+            latency: Segundos que tardó la llamada original (para estadísticas)
+        """
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        raw = _dump_response(response)
+
+        with self._lock:
+            self._remember(key, (expires_at, latency, raw))
+            self.stats["stores"] += 1
+
+        if self.db_path:
+            conn = self._get_connection()
+            try:
+                conn.execute('''
+                    INSERT OR REPLACE INTO llm_response_cache
+                    (key, response, latency, created_at, expires_at, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (key, raw, latency, now, expires_at, now))
+                conn.execute("DELETE FROM llm_response_cache WHERE expires_at <= ?", (now,))
+                cursor = conn.execute('''
+                    DELETE FROM llm_response_cache WHERE key IN (
+                        SELECT key FROM llm_response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (self.max_disk_entries,))
+                if cursor.rowcount > 0:
+                    with self._lock:
+                        self.stats["evictions"] += cursor.rowcount
+                conn.commit()
+            finally:
+                conn.close()
+
+    def clear(self):
+        """Elimina todas las entradas"""
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            conn = self._get_connection()
+            conn.execute("DELETE FROM llm_response_cache")
+            conn.commit()
+            conn.close()
+
+    def record_bypass(self):
+        with self._lock:
+            self.stats["bypassed"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Tasa de aciertos y latencia ahorrada"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["saved_seconds"] = round(stats["saved_seconds"], 3)
+        return stats
+
+    def _remember(self, key: str, entry: tuple):
+        # Requiere self._lock
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _record_hit(self, level: str, latency: float):
+        # Requiere self._lock
+        self.stats["hits"] += 1
+        self.stats[level] += 1
+        self.stats["saved_seconds"] += latency or 0.0
+
+
+class CachedLLMProvider(LLMProvider):
+    """
+    Envuelve un proveedor y responde desde la caché las peticiones repetidas
+
+    Con temperatura > 0 la caché se omite salvo que `force` sea True.
+    """
+
+    def __init__(self, provider: LLMProvider, cache: ResponseCache, force: bool = False):
+        super().__init__(provider.model, provider.api_key)
+        self.provider = provider
+        self.cache = cache
+        self.force = force
+
+    @property
+    def provider_name(self) -> str:
+        return getattr(self.provider, "provider_name", self.provider.__class__.__name__)
+
+    async def chat(
+        self,
+        messages: List[Message],
+        tools: Optional[List[Dict]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000,
+        stream: bool = False
+    ) -> LLMResponse:
+        """Responde desde la caché o llama al proveedor y guarda el resultado"""
+        if temperature > 0 and not self.force:
+            self.cache.record_bypass()
+            return await self.provider.chat(messages, tools, temperature, max_tokens, stream)
+
+        key = canonical_key(self.provider_name, self.provider.model, messages, tools, temperature)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.debug(f"Respuesta del LLM servida desde caché ({key[:12]})")
+            # Ningún token se evaluó realmente
+            cached.usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cache_hit": 1}
+            return cached
+
+        start = time.perf_counter()
+        response = await self.provider.chat(messages, tools, temperature, max_tokens, stream)
+        self.cache.set(key, response, time.perf_counter() - start)
+        return response
+
+    async def chat_stream(
+        self,
+        messages: List[Message],
+        tools: Optional[List[Dict]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000
+    ) -> AsyncGenerator[str, None]:
+        """El streaming no se cachea"""
+        async for chunk in self.provider.chat_stream(messages, tools, temperature, max_tokens):
+            yield chunk
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas de la caché y del proveedor envuelto"""
+        stats = {}
+        if hasattr(self.provider, "get_stats"):
+            stats.update(self.provider.get_stats())
+        stats["response_cache"] = self.cache.get_stats()
+        return stats
+
+    def __getattr__(self, item):
+        # Atributos propios del proveedor envuelto (base_url, etc.)
+        if item == "provider":
+            raise AttributeError(item)
+        return getattr(self.provider, item)
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Caché compartida del proceso
+
+    Se configura con LLM_CACHE_DIR, LLM_CACHE_TTL, LLM_CACHE_MEMORY_ENTRIES
+    y LLM_CACHE_DISK_ENTRIES.
+    """
+    global _response_cache
+
+    if _response_cache is None:
+        cache_dir = os.getenv("LLM_CACHE_DIR", "~/.agent_data/cache")
+        _response_cache = ResponseCache(
+            db_path=os.path.join(cache_dir, "llm_responses.db"),
+            max_memory_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256")),
+            max_disk_entries=int(os.getenv("LLM_CACHE_DISK_ENTRIES", "5000")),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL", "3600"))
+        )
+
+    return _response_cache
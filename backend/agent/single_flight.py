@@ -0,0 +1,165 @@
+"""
+Single Flight - Agrupa peticiones idénticas concurrentes
+
+Cuando varios operadores abren a la vez la misma conversación o dashboard,
+el agente lanza las mismas llamadas al LLM y a los tools de consulta en
+paralelo (y la GPU local las serializa). Con single flight, las peticiones
+idénticas en curso (misma clave canónica) esperan una única ejecución y
+comparten su resultado.
+
+Cancelación: si un solicitante se desconecta, la ejecución compartida sigue
+para los demás; solo se cancela cuando ya no queda nadie esperando.
+"""
+
+import asyncio
+import copy
+import functools
+import hashlib
+import json
+import logging
+from typing import Dict, Any, List, Optional, AsyncGenerator, Awaitable, Callable
+
+from .llm_provider import LLMProvider, LLMResponse, Message
+from .response_cache import canonical_key
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """Ejecución en curso y número de solicitantes esperándola"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalescencia de llamadas asíncronas por clave"""
+
+    def __init__(self, copy_result: Callable[[Any], Any] = copy.deepcopy):
+        """
+        Args:
+            copy_result: Copia entregada a cada solicitante (el agente
+                         modifica los resultados que recibe)
+        """
+        self.copy_result = copy_result
+        self._calls: Dict[str, _Call] = {}
+        self.stats = {
+            "calls": 0,
+            "coalesced": 0,
+            "cancelled": 0
+        }
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Ejecuta `func` o se une a la ejecución en curso con la misma clave
+
+        Args:
+            key: Clave canónica de la petición
+            func: Función que crea la corrutina a ejecutar
+
+        Returns:
+            Copia del resultado compartido
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(functools.partial(self._forget, key, call))
+            self.stats["calls"] += 1
+        else:
+            self.stats["coalesced"] += 1
+            logger.debug(f"Petición agrupada con una en curso ({key[:12]})")
+
+        call.waiters += 1
+        cancelled = False
+        try:
+            # shield: cancelar a un solicitante no cancela la ejecución compartida
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            call.waiters -= 1
+            if cancelled and call.waiters == 0 and not call.task.done():
+                # Nadie más espera: cancelar y no dejar que nuevas peticiones se unan
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+                self.stats["cancelled"] += 1
+
+        return self.copy_result(result)
+
+    def _forget(self, key: str, call: _Call, task: asyncio.Task):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not task.cancelled():
+            # Marca la excepción como recuperada aunque no quede nadie esperando
+            task.exception()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "in_flight": self.in_flight}
+
+
+def tool_call_key(name: str, arguments: Dict[str, Any]) -> str:
+    """Clave canónica de una llamada a un tool"""
+    raw = json.dumps({"name": name, "arguments": arguments}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlightLLMProvider(LLMProvider):
+    """Envuelve un proveedor y agrupa las llamadas idénticas concurrentes"""
+
+    def __init__(self, provider: LLMProvider, flight: Optional[SingleFlight] = None):
+        super().__init__(provider.model, provider.api_key)
+        self.provider = provider
+        self.flight = flight or SingleFlight()
+
+    @property
+    def provider_name(self) -> str:
+        return getattr(self.provider, "provider_name", self.provider.__class__.__name__)
+
+    async def chat(
+        self,
+        messages: List[Message],
+        tools: Optional[List[Dict]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000,
+        stream: bool = False
+    ) -> LLMResponse:
+        """Llama al proveedor o espera la llamada idéntica en curso"""
+        key = f"{canonical_key(self.provider_name, self.provider.model, messages, tools, temperature)}:{max_tokens}"
+        return await self.flight.do(
+            key,
+            lambda: self.provider.chat(messages, tools, temperature, max_tokens, stream)
+        )
+
+    async def chat_stream(
+        self,
+        messages: List[Message],
+        tools: Optional[List[Dict]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000
+    ) -> AsyncGenerator[str, None]:
+        """El streaming no se agrupa"""
+        async for chunk in self.provider.chat_stream(messages, tools, temperature, max_tokens):
+            yield chunk
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas de coalescencia y del proveedor envuelto"""
+        stats = {}
+        if hasattr(self.provider, "get_stats"):
+            stats.update(self.provider.get_stats())
+        stats["single_flight"] = self.flight.get_stats()
+        return stats
+
+    def __getattr__(self, item):
+        if item == "provider":
+            raise AttributeError(item)
+        return getattr(self.provider, item)
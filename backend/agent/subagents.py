@@ -0,0 +1,296 @@
+"""
+Sub-agents - Investigación en paralelo con contexto y tools acotados
+
+Para peticiones amplias ("¿qué está fallando en producción?") el agente
+puede repartir el trabajo en sub-agentes que se ejecutan a la vez, cada uno
+con su propio contexto y solo los tools de su ámbito (p. ej.
+observability, cloud, git). Cada sub-agente tiene un presupuesto de tokens
+y de tiempo; al agente principal solo le llega un resumen de cada uno, así
+su prompt no crece con los resultados crudos de los tools.
+
+Los sub-agentes no piden aprobaciones: los tools que la requieren quedan
+fuera de su ámbito.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
+
+from .cancellation import current_scope
+from .prompts import SUBAGENT_INSTRUCTIONS
+
+if TYPE_CHECKING:
+    from .core import AgentCore
+
+logger = logging.getLogger(__name__)
+
+SUBAGENT_TOOL_NAME = "delegate_investigation"
+
+
+@dataclass
+class SubAgentTask:
+    """Encargo de un sub-agente"""
+    name: str
+    task: str
+    tools: List[str] = field(default_factory=list)  # nombres o categorías de tools
+
+
+@dataclass
+class SubAgentResult:
+    """Resumen que recibe el agente principal (status: ok, budget, timeout, error)"""
+    name: str
+    status: str
+    summary: str
+    tools_used: List[str] = field(default_factory=list)
+    tokens: int = 0
+    elapsed: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["elapsed"] = round(self.elapsed, 2)
+        return data
+
+
+class SubAgentRunner:
+    """Lanza sub-agentes acotados en paralelo sobre el LLM del agente principal"""
+
+    # Máximo de sub-agentes por petición
+    MAX_TASKS = 6
+
+    def __init__(
+        self,
+        parent: "AgentCore",
+        max_parallel: int = 3,
+        token_budget: int = 8000,
+        timeout: float = 60.0,
+        max_iterations: int = 5,
+        summary_chars: int = 1500
+    ):
+        """
+        Args:
+            parent: Agente principal (aporta LLM, tools y contabilidad de uso)
+            max_parallel: Sub-agentes simultáneos
+            token_budget: Tokens (prompt + respuesta) por sub-agente
+            timeout: Segundos por sub-agente
+            max_iterations: Iteraciones Plan & Act por sub-agente
+            summary_chars: Longitud máxima del resumen de cada sub-agente
+        """
+        self.parent = parent
+        self.max_parallel = max(1, max_parallel)
+        self.token_budget = token_budget
+        self.timeout = timeout
+        self.max_iterations = max_iterations
+        self.summary_chars = summary_chars
+        self.stats = {"runs": 0, "subagents": 0, "budget_exhausted": 0, "timeouts": 0, "errors": 0}
+
+    def scoped_tools(self, selectors: List[str]) -> List[Any]:
+        """
+        Tools del agente principal dentro del ámbito (nombre o categoría)
+
+        Se excluyen los que requieren aprobación y la propia delegación.
+        """
+        wanted = set(selectors)
+        return [
+            tool for name, tool in self.parent.tool_registry.tools.items()
+            if (name in wanted or getattr(tool, "category", None) in wanted)
+            and name != SUBAGENT_TOOL_NAME
+            and not self.parent._requires_approval(name)
+        ]
+
+    async def run(self, tasks: List[SubAgentTask], conversation_id: str) -> List[SubAgentResult]:
+        """
+        Ejecuta los sub-agentes (como mucho max_parallel a la vez)
+
+        Args:
+            tasks: Encargos (se atienden los MAX_TASKS primeros)
+            conversation_id: Conversación del agente principal
+
+        Returns:
+            Un resultado por encargo, en el mismo orden
+        """
+        self.stats["runs"] += 1
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def bounded(task: SubAgentTask) -> SubAgentResult:
+            async with semaphore:
+                return await self._run_one(task, conversation_id)
+
+        return await asyncio.gather(*(bounded(task) for task in tasks[:self.MAX_TASKS]))
+
+    async def _run_one(self, task: SubAgentTask, conversation_id: str) -> SubAgentResult:
+        from .core import AgentCore, AgentConfig
+
+        self.stats["subagents"] += 1
+        start = time.perf_counter()
+        tools = self.scoped_tools(task.tools)
+        if not tools:
+            return SubAgentResult(task.name, "error", f"Sin tools disponibles para el ámbito {task.tools}")
+
+        parent = self.parent
+        # El LLM del padre ya lleva límite de concurrencia, coalescencia y caché
+        child = AgentCore(parent.llm, AgentConfig(
+            autonomy_level="full",
+            max_iterations=self.max_iterations,
+            llm_provider=parent.config.llm_provider,
+            model=parent.config.model,
+            temperature=parent.config.temperature,
+            max_tokens=min(parent.config.max_tokens, self.token_budget),
+            single_flight=False,
+            concurrency_limit=False,
+            tool_selection_top_k=0
+        ))
+        child.system_prompt = parent.system_prompt + "\n\n" + SUBAGENT_INSTRUCTIONS
+        # Las llamadas de los sub-agentes cuentan en el uso del agente principal
+        child.usage_tracker = parent.usage_tracker
+        child.tool_registry.result_cache = parent.tool_registry.result_cache
+        for tool in tools:
+            child.register_tool(tool)
+
+        child_id = f"{conversation_id}:{task.name}"
+        state = {"status": "ok", "summary": "", "results": [], "tools": []}
+
+        def conversation_tokens() -> int:
+            usage = parent.usage_tracker.get_conversation(child_id)
+            return usage["totals"]["total_tokens"] if usage else 0
+
+        # Los totales acumulan todas las delegaciones con el mismo nombre en
+        # la conversación: el presupuesto cuenta solo los de esta ejecución
+        baseline = conversation_tokens()
+
+        def tokens_used() -> int:
+            return conversation_tokens() - baseline
+
+        async def consume():
+            events = child.process_message(task.task, child_id)
+            try:
+                async for event in events:
+                    if event["type"] == "tool_call":
+                        state["tools"].append(event["tool"])
+                    elif event["type"] == "tool_result":
+                        state["results"].append((event["tool"], event.get("result", event.get("error"))))
+                    elif event["type"] == "message":
+                        state["summary"] = event["content"]
+                    elif event["type"] == "error":
+                        state["status"] = "error"
+                        state["summary"] = event.get("message", "Error del sub-agente")
+                    if tokens_used() >= self.token_budget and event["type"] != "done":
+                        state["status"] = "budget"
+                        break
+            finally:
+                await events.aclose()
+
+        try:
+            await asyncio.wait_for(consume(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            state["status"] = "timeout"
+        except Exception as e:
+            logger.error(f"Error en el sub-agente {task.name}: {e}", exc_info=True)
+            state["status"] = "error"
+            state["summary"] = str(e)
+
+        status = state["status"]
+        if status == "budget":
+            self.stats["budget_exhausted"] += 1
+        elif status == "timeout":
+            self.stats["timeouts"] += 1
+        elif status == "error":
+            self.stats["errors"] += 1
+
+        summary = state["summary"] or self._partial_summary(state["results"])
+        logger.info(f"Sub-agente {task.name}: {status} en {time.perf_counter() - start:.1f}s")
+        return SubAgentResult(
+            name=task.name,
+            status=status,
+            summary=self._truncate(summary),
+            tools_used=list(dict.fromkeys(state["tools"])),
+            tokens=tokens_used(),
+            elapsed=time.perf_counter() - start
+        )
+
+    def _partial_summary(self, results: List[tuple]) -> str:
+        """Resumen de los resultados obtenidos cuando no hubo respuesta final"""
+        if not results:
+            return "Sin resultados"
+        per_result = max(100, self.summary_chars // len(results))
+        lines = [f"- {tool}: {self._truncate(str(result), per_result)}" for tool, result in results]
+        return "Resultados parciales (sin conclusión):\n" + "\n".join(lines)
+
+    def _truncate(self, text: str, limit: Optional[int] = None) -> str:
+        limit = limit or self.summary_chars
+        return text if len(text) <= limit else text[:limit - 3] + "..."
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+
+class SubAgentTool:
+    """Tool con el que el LLM reparte una investigación en sub-agentes"""
+
+    name = SUBAGENT_TOOL_NAME
+    category = "agent"
+    read_only = False
+
+    def __init__(self, runner: SubAgentRunner):
+        self.runner = runner
+        self.description = (
+            "Reparte una investigación amplia en sub-agentes que trabajan en paralelo "
+            "(p. ej. monitorización, inventario cloud y git). Cada uno usa solo los tools "
+            "de su ámbito y devuelve un resumen de sus hallazgos."
+        )
+
+    def get_definition(self) -> Dict[str, Any]:
+        categories = sorted({
+            getattr(tool, "category", "") for name, tool in self.runner.parent.tool_registry.tools.items()
+            if name != self.name
+        } - {""})
+        return {
+            "name": self.name,
+            "description": f"{self.description} Ámbitos disponibles: {', '.join(categories) or 'ninguno'}.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "tasks": {
+                        "type": "array",
+                        "description": f"Encargos independientes (máximo {SubAgentRunner.MAX_TASKS})",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "name": {"type": "string", "description": "Nombre corto del encargo"},
+                                "task": {"type": "string", "description": "Qué debe averiguar el sub-agente"},
+                                "tools": {
+                                    "type": "array",
+                                    "items": {"type": "string"},
+                                    "description": "Ámbitos (categorías) o nombres de tools permitidos"
+                                }
+                            },
+                            "required": ["task", "tools"]
+                        }
+                    }
+                },
+                "required": ["tasks"]
+            }
+        }
+
+    async def execute(self, tasks: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        # La conversación de la ejecución en curso (el context_manager es compartido
+        # por los lotes y los jobs concurrentes)
+        scope = current_scope()
+        conversation_id = scope.conversation_id if scope is not None else "default"
+        parsed = []
+        for index, item in enumerate(tasks or [], start=1):
+            if not isinstance(item, dict) or not item.get("task"):
+                continue
+            selectors = item.get("tools") or []
+            if isinstance(selectors, str):
+                selectors = [s.strip() for s in selectors.split(",") if s.strip()]
+            parsed.append(SubAgentTask(str(item.get("name") or f"sub{index}"), item["task"], selectors))
+        if not parsed:
+            return {"success": False, "error": "No se indicó ningún encargo válido"}
+
+        results = await self.runner.run(parsed, conversation_id)
+        return {
+            "success": any(r.status == "ok" for r in results),
+            "findings": [r.to_dict() for r in results]
+        }
@@ -0,0 +1,176 @@
+"""
+Tool Cache - Caché con TTL de los resultados de tools de solo lectura
+
+Cada tool declara si es cacheable (`cache_ttl`), cómo se versiona su
+resultado (`cache_key`) y qué grupos invalida al ejecutarse
+(`invalidates`). Los grupos son las categorías de los tools:
+`write_file` invalida file_operations y git; `execute_command`, todo.
+
+Claves de versión:
+- "file": ruta + mtime + tamaño de esa ruta (un archivo modificado fuera
+  del agente no devuelve el resultado viejo). No cubre lo que hay dentro de
+  un directorio: los listados y búsquedas recursivas no se cachean
+- "git": HEAD, la rama a la que apunta y el mtime del índice. No cubre el
+  árbol de trabajo: solo sirve para consultas del historial (git_log);
+  git_status y git_diff no se cachean
+- None: solo los argumentos (el TTL limita la antigüedad)
+
+Solo se guardan resultados correctos; los errores se vuelven a intentar.
+"""
+
+import copy
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Iterable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Invalida todos los grupos
+ALL_GROUPS = "*"
+
+
+def _stat_version(path: Path) -> tuple:
+    try:
+        stat = path.stat()
+    except OSError:
+        return (str(path), None)
+    return (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+
+
+def file_version(arguments: Dict[str, Any]) -> tuple:
+    """Versión de la ruta del argumento `path`"""
+    return _stat_version(Path(arguments.get("path") or ".").expanduser())
+
+
+def git_version(arguments: Dict[str, Any]) -> tuple:
+    """Versión del repositorio de `path` (HEAD, referencia actual e índice)"""
+    path = Path(arguments.get("path") or ".").expanduser().resolve()
+    for directory in (path, *path.parents):
+        git_dir = directory / ".git"
+        if git_dir.exists():
+            break
+    else:
+        return (str(path), None)
+
+    try:
+        head = (git_dir / "HEAD").read_text().strip()
+    except OSError:
+        return (str(directory), None)
+    ref = head[5:].strip() if head.startswith("ref:") else None
+    return (
+        str(directory),
+        head,
+        _stat_version(git_dir / ref) if ref else None,
+        _stat_version(git_dir / "packed-refs")[1:],
+        _stat_version(git_dir / "index")[1:]
+    )
+
+
+KEY_FUNCTIONS: Dict[str, Callable[[Dict[str, Any]], tuple]] = {
+    "file": file_version,
+    "git": git_version
+}
+
+
+def _succeeded(result: Any) -> bool:
+    return not (isinstance(result, dict) and result.get("success") is False)
+
+
+class ToolResultCache:
+    """LRU en memoria de resultados de tools con TTL e invalidación por grupo"""
+
+    def __init__(self, max_entries: int = 512):
+        """
+        Args:
+            max_entries: Resultados guardados como máximo
+        """
+        self.max_entries = max_entries
+        # key -> (expires_at, grupo, resultado)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.invalidations = 0
+
+    def _tool_stats(self, name: str) -> Dict[str, int]:
+        return self.stats.setdefault(name, {"hits": 0, "misses": 0, "stores": 0, "invalidated": 0})
+
+    def key(self, tool, arguments: Dict[str, Any]) -> str:
+        """Clave del resultado: tool, argumentos y versión de lo que consulta"""
+        key_fn = KEY_FUNCTIONS.get(getattr(tool, "cache_key", None) or "")
+        version = key_fn(arguments) if key_fn else None
+        return json.dumps([tool.name, arguments, version], sort_keys=True, default=str)
+
+    def get(self, tool, arguments: Dict[str, Any]) -> tuple:
+        """
+        Busca un resultado vigente
+
+        Returns:
+            (encontrado, resultado, clave); la clave sirve para set()
+        """
+        key = self.key(tool, arguments)
+        with self._lock:
+            entry = self._entries.get(key)
+            stats = self._tool_stats(tool.name)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                stats["hits"] += 1
+                return True, copy.deepcopy(entry[2]), key
+            if entry is not None:
+                del self._entries[key]
+            stats["misses"] += 1
+        return False, None, key
+
+    def set(self, tool, key: str, result: Any):
+        """Guarda un resultado correcto durante el TTL del tool"""
+        if not _succeeded(result):
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + tool.cache_ttl, getattr(tool, "category", ""), copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            self._tool_stats(tool.name)["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, groups: Iterable[str]) -> int:
+        """
+        Elimina los resultados de los grupos indicados (ALL_GROUPS = todos)
+
+        Returns:
+            Entradas eliminadas
+        """
+        groups = set(groups)
+        with self._lock:
+            stale = [
+                key for key, (_, group, _) in self._entries.items()
+                if ALL_GROUPS in groups or group in groups
+            ]
+            for key in stale:
+                self._tool_stats(json.loads(key)[0])["invalidated"] += 1
+                del self._entries[key]
+            if stale:
+                self.invalidations += 1
+        if stale:
+            logger.debug(f"Caché de tools: {len(stale)} resultados invalidados ({', '.join(sorted(groups))})")
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Aciertos y fallos por tool"""
+        with self._lock:
+            hits = sum(s["hits"] for s in self.stats.values())
+            lookups = hits + sum(s["misses"] for s in self.stats.values())
+            return {
+                "entries": len(self._entries),
+                "hits": hits,
+                "lookups": lookups,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "tools": {name: dict(stats) for name, stats in self.stats.items()}
+            }
@@ -0,0 +1,330 @@
+"""
+Tool Call Parser - Extracción de tool calls escritos como texto
+
+Algunos modelos (sobre todo los pequeños locales) no usan el campo nativo
+`tool_calls` y escriben la llamada como JSON dentro del contenido. Este
+módulo la recupera con un escáner de una sola pasada que respeta las
+comillas, puede alimentarse por fragmentos durante el streaming y emite
+cada tool call en cuanto se cierra su objeto.
+"""
+
+import json
+import re
+import uuid
+from typing import Any, List, Optional, Tuple
+
+from .llm_provider import ToolCall
+
+# Reglas de reparación para JSON mal formado (en orden de aplicación)
+REPAIR_RULES: List[Tuple[re.Pattern, str]] = [
+    # ""clave": -> "clave":
+    (re.compile(r'""([^"]+)":'), r'"\1":'),
+    # 'clave': -> "clave":
+    (re.compile(r"'([^']+)'\s*:"), r'"\1":'),
+    # : 'valor' -> : "valor"
+    (re.compile(r":\s*'([^']*)'"), r': "\1"'),
+    # Comas finales antes de } o ]
+    (re.compile(r",\s*([\]\}])"), r"\1"),
+    # Literales de Python
+    (re.compile(r":\s*True\b"), ": true"),
+    (re.compile(r":\s*False\b"), ": false"),
+    (re.compile(r":\s*None\b"), ": null"),
+]
+
+# Tamaño máximo de un objeto candidato (evita acumular texto sin cerrar)
+MAX_BLOCK_CHARS = 200_000
+
+_NAME_KEYS = ('"name"', "'name'")
+
+# Caracteres que cambian el estado del escáner
+_BLOCK_SPECIAL = re.compile(r"[\"'{}\[\]]")
+_STRING_SPECIAL = {
+    '"': re.compile(r'["\\]'),
+    "'": re.compile(r"['\\]"),
+}
+
+
+def parse_tool_json(block: str) -> Optional[Any]:
+    """
+    Parsea JSON de forma flexible (corrige errores comunes de LLMs pequeños)
+
+    Args:
+        block: Texto de un objeto JSON
+
+    Returns:
+        Objeto parseado o None si no se pudo reparar
+    """
+    try:
+        return json.loads(block)
+    except ValueError:
+        pass
+
+    fixed = block
+    for pattern, replacement in REPAIR_RULES:
+        fixed = pattern.sub(replacement, fixed)
+
+    try:
+        return json.loads(fixed)
+    except ValueError:
+        return None
+
+
+def tool_call_from_data(data: Any) -> Optional[ToolCall]:
+    """
+    Construye un ToolCall desde un objeto parseado
+
+    Acepta `{"name", "arguments"|"parameters"}` y el formato OpenAI
+    `{"function": {"name", "arguments"}}`.
+    """
+    if not isinstance(data, dict):
+        return None
+
+    if "name" not in data and isinstance(data.get("function"), dict):
+        data = data["function"]
+
+    name = data.get("name")
+    if not isinstance(name, str) or not name:
+        return None
+
+    args = data.get("arguments") or data.get("parameters") or {}
+    if isinstance(args, str):
+        args = parse_tool_json(args) or {}
+
+    return ToolCall(
+        id=f"call_{uuid.uuid4().hex[:8]}",
+        name=name,
+        arguments=args if isinstance(args, dict) else {}
+    )
+
+
+class ToolCallStreamParser:
+    """
+    Escáner incremental de objetos JSON de nivel superior
+
+    Cada carácter se examina una sola vez (se salta de un carácter especial
+    al siguiente); las llaves dentro de strings (comillas dobles o simples)
+    no cuentan. Los objetos que contienen una clave `name` se parsean al
+    cerrarse y, si son tool calls, se emiten.
+
+    Uso:
+        parser = ToolCallStreamParser()
+        async for chunk in llm.chat_stream(...):
+            for tool_call in parser.feed(chunk):
+                ...
+        parser.finish()
+    """
+
+    def __init__(self):
+        self.tool_calls: List[ToolCall] = []
+        # Texto original de cada tool call emitido
+        self.blocks: List[str] = []
+        self._text: List[str] = []
+        self._buffer: List[str] = []
+        self._size = 0
+        # Contenedores abiertos ('{' o '[') del objeto actual y su posición
+        self._stack: List[str] = []
+        self._offsets: List[int] = []
+        # Objetos internos ya cerrados (inicio, fin) que no están contenidos
+        # en otro: se recuperan si el objeto exterior nunca se cierra
+        self._inner: List[Tuple[int, int]] = []
+        self._quote: Optional[str] = None
+        self._escape = False
+        self._string_empty = False
+        self._key_string = False
+        self._last_significant = ""
+
+    def feed(self, chunk: str) -> List[ToolCall]:
+        """
+        Procesa un fragmento de texto
+
+        Returns:
+            Tool calls completados en este fragmento
+        """
+        emitted = []
+        stack = self._stack
+        offsets = self._offsets
+        pos = 0
+        end = len(chunk)
+        # Inicio del tramo del fragmento que pertenece al objeto actual
+        segment = 0
+
+        while pos < end:
+            # Fuera de un objeto: saltar hasta la siguiente llave
+            if not stack:
+                start = chunk.find("{", pos)
+                if start < 0:
+                    self._text.append(chunk[pos:])
+                    pos = segment = end
+                    break
+                if start > pos:
+                    self._text.append(chunk[pos:start])
+                stack.append("{")
+                offsets.append(0)
+                segment = start
+                pos = start + 1
+                continue
+
+            # Dentro de un string: solo importan la comilla de cierre y los escapes
+            if self._quote:
+                if self._escape:
+                    self._escape = False
+                    self._string_empty = False
+                    pos += 1
+                    continue
+                match = _STRING_SPECIAL[self._quote].search(chunk, pos)
+                if match is None:
+                    self._string_empty = False
+                    pos = end
+                    break
+                index = match.start()
+                if index > pos:
+                    self._string_empty = False
+                pos = index + 1
+                if chunk[index] == "\\":
+                    self._escape = True
+                elif self._string_empty and self._key_string:
+                    # ""clave": la comilla duplicada no cierra el string
+                    self._string_empty = False
+                else:
+                    self._quote = None
+                continue
+
+            match = _BLOCK_SPECIAL.search(chunk, pos)
+            if match is None:
+                pos = end
+                break
+
+            index = match.start()
+            char = chunk[index]
+            pos = index + 1
+
+            if char == '"' or char == "'":
+                self._quote = char
+                self._string_empty = True
+                self._key_string = (
+                    stack[-1] == "{"
+                    and self._previous_significant(chunk, index, segment) in ("{", ",")
+                )
+            elif char == "{" or char == "[":
+                stack.append(char)
+                offsets.append(self._size + index - segment)
+            elif char == "]":
+                if stack[-1] == "[":
+                    stack.pop()
+                    offsets.pop()
+            else:
+                # '}' cierra también los '[' que quedaron abiertos
+                opened = None
+                while stack:
+                    opened = offsets.pop()
+                    if stack.pop() == "{":
+                        break
+                if stack:
+                    inner = self._inner
+                    while inner and inner[-1][0] > opened:
+                        inner.pop()
+                    inner.append((opened, self._size + pos - segment))
+                else:
+                    self._append(chunk[segment:pos])
+                    segment = pos
+                    tool_call = self._close_block()
+                    if tool_call:
+                        emitted.append(tool_call)
+
+        if stack and segment < end:
+            tail = chunk[segment:end]
+            self._append(tail)
+            tail = tail.rstrip()
+            if tail:
+                self._last_significant = tail[-1]
+
+            if self._size > MAX_BLOCK_CHARS:
+                # Objeto sin cerrar demasiado largo: se conserva como texto
+                self._text.extend(self._buffer)
+                self._reset_block()
+
+        return emitted
+
+    def finish(self) -> List[ToolCall]:
+        """
+        Cierra el stream
+
+        Si queda un objeto sin cerrar (p. ej. una llave en texto libre o una
+        respuesta truncada), se conserva como texto salvo los objetos internos
+        que sí se cerraron, que se evalúan como posibles tool calls.
+
+        Returns:
+            Todos los tool calls emitidos
+        """
+        if self._buffer:
+            pending = "".join(self._buffer)
+            inner = self._inner
+            self._reset_block()
+
+            last = 0
+            for start, end in inner:
+                self._text.append(pending[last:start])
+                self._buffer = [pending[start:end]]
+                self._close_block()
+                last = end
+            self._text.append(pending[last:])
+        return self.tool_calls
+
+    @property
+    def text(self) -> str:
+        """Texto fuera de los tool calls emitidos"""
+        return "".join(self._text)
+
+    def _append(self, segment: str):
+        self._buffer.append(segment)
+        self._size += len(segment)
+
+    def _previous_significant(self, chunk: str, index: int, segment: int) -> str:
+        """Último carácter no blanco del objeto antes de `index`"""
+        k = index - 1
+        while k >= segment and chunk[k].isspace():
+            k -= 1
+        return chunk[k] if k >= segment else self._last_significant
+
+    def _close_block(self) -> Optional[ToolCall]:
+        block = "".join(self._buffer)
+        self._reset_block()
+
+        tool_call = None
+        if any(key in block for key in _NAME_KEYS):
+            tool_call = tool_call_from_data(parse_tool_json(block))
+
+        if tool_call:
+            self.tool_calls.append(tool_call)
+            self.blocks.append(block)
+        else:
+            self._text.append(block)
+        return tool_call
+
+    def _reset_block(self):
+        self._buffer = []
+        self._size = 0
+        self._stack.clear()
+        self._offsets.clear()
+        self._inner = []
+        self._quote = None
+        self._escape = False
+        self._string_empty = False
+        self._key_string = False
+        self._last_significant = ""
+
+
+def extract_tool_calls(content: str) -> Tuple[List[ToolCall], List[str]]:
+    """
+    Extrae los tool calls escritos en un texto completo
+
+    Returns:
+        (tool calls, texto original de cada uno)
+    """
+    if not any(key in content for key in _NAME_KEYS):
+        return [], []
+
+    parser = ToolCallStreamParser()
+    parser.feed(content)
+    parser.finish()
+    return parser.tool_calls, parser.blocks
@@ -0,0 +1,149 @@
+"""
+Tool Selector - Selección de tools relevantes por mensaje
+
+Índice BM25 sobre nombre, categoría, descripción y parámetros de cada tool.
+Permite enviar al LLM solo los tools relacionados con la petición del
+usuario en lugar del catálogo completo (menos tokens de prompt y menos
+confusión en modelos pequeños).
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Any, List, Iterable
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Palabras vacías (español e inglés) tras quitar acentos
+STOPWORDS = frozenset("""
+a al algo como con cual cuales de del donde el ella en entre es esa ese eso esta este esto
+estos estas hay la las le les lo los me mi mis muy no o para pero por que quien se si sin
+sobre su sus te tu tus un una unas uno unos y ya yo puedes puede quiero necesito dame dime
+hola favor porfa gracias ahora cuantos cuantas tengo tiene tienen todo todos todas
+the an and or of to in on for with is are be it this that my me please can you
+usa usalo usala util
+""".split())
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin acentos"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _stem(token: str) -> str:
+    """Singular aproximado: servidores -> servidor, alertas -> alerta"""
+    if len(token) > 4 and token.endswith("es") and token[-3] in "rlnd":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens normalizados para el índice (sin palabras vacías)"""
+    return [
+        _stem(token)
+        for token in _TOKEN_RE.findall(normalize(text))
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def tool_document(definition: Dict[str, Any], category: str = "") -> str:
+    """
+    Texto indexable de un tool
+
+    El nombre y la categoría se repiten para pesar más que la descripción.
+    """
+    name = definition.get("name", "").replace("_", " ")
+    parts = [name, name, category.replace("_", " "), definition.get("description", "")]
+
+    properties = (definition.get("parameters") or {}).get("properties") or {}
+    for param, schema in properties.items():
+        parts.append(param.replace("_", " "))
+        if isinstance(schema, dict):
+            parts.append(schema.get("description", ""))
+            parts.extend(str(v) for v in schema.get("enum", []))
+
+    return " ".join(parts)
+
+
+class ToolSelector:
+    """Índice BM25 de tools"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            k1: Saturación de la frecuencia de término
+            b: Normalización por longitud del documento
+        """
+        self.k1 = k1
+        self.b = b
+        self.names: List[str] = []
+        self._term_freqs: List[Counter] = []
+        self._lengths: List[int] = []
+        self._idf: Dict[str, float] = {}
+        self._avg_length = 0.0
+
+    def index(self, documents: Iterable[tuple]):
+        """
+        Construye el índice
+
+        Args:
+            documents: Pares (nombre, texto) en el orden del registro
+        """
+        self.names = []
+        self._term_freqs = []
+        self._lengths = []
+        doc_freq: Counter = Counter()
+
+        for name, text in documents:
+            tokens = tokenize(text)
+            freqs = Counter(tokens)
+            self.names.append(name)
+            self._term_freqs.append(freqs)
+            self._lengths.append(len(tokens))
+            doc_freq.update(freqs.keys())
+
+        total = len(self.names)
+        self._avg_length = (sum(self._lengths) / total) if total else 0.0
+        self._idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def score(self, query: str) -> Dict[str, float]:
+        """
+        Puntúa cada tool frente a la consulta
+
+        Returns:
+            Nombre -> puntuación (solo tools con puntuación > 0)
+        """
+        terms = [t for t in set(tokenize(query)) if t in self._idf]
+        if not terms:
+            return {}
+
+        scores = {}
+        for name, freqs, length in zip(self.names, self._term_freqs, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_length)
+            total = 0.0
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    total += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            if total > 0:
+                scores[name] = total
+        return scores
+
+    def top(self, query: str, top_k: int) -> List[str]:
+        """
+        Los `top_k` tools con mayor puntuación
+
+        Returns:
+            Nombres ordenados por relevancia (vacío si nada coincide)
+        """
+        scores = self.score(query)
+        order = {name: i for i, name in enumerate(self.names)}
+        ranked = sorted(scores, key=lambda name: (-scores[name], order[name]))
+        return ranked[:top_k]
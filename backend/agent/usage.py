@@ -0,0 +1,202 @@
+"""
+Usage - Contabilidad de tokens y rendimiento de cada llamada al LLM
+
+Cada llamada se normaliza al mismo registro sea cual sea el proveedor:
+tokens de prompt y de respuesta, latencia, tiempo hasta el primer token,
+tokens por segundo y tiempo en cola. Los registros se agregan por
+conversación, por modelo y por iteración del ciclo Plan & Act.
+
+Con Ollama los tiempos salen de las duraciones que informa el servidor
+(load, prompt_eval, eval, total); con los proveedores en la nube solo se
+conoce la latencia total y los tokens por segundo se calculan sobre ella.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+
+def call_usage(usage: Optional[Dict[str, Any]], latency: float) -> Dict[str, Any]:
+    """
+    Registro uniforme de una llamada al LLM
+
+    Args:
+        usage: Uso informado por el proveedor (LLMResponse.usage)
+        latency: Segundos de la llamada medidos por el agente
+
+    Returns:
+        Dict con tokens, latency_ms, queue_ms, ttft_ms y tokens_per_second
+    """
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    latency_ms = latency * 1000
+
+    server_ms = usage.get("server_ms")
+    # Tiempo fuera del servidor: cola (y red) antes de procesar la petición;
+    # sin tiempos del servidor, la espera medida en el limitador de concurrencia
+    if server_ms is not None:
+        queue_ms = max(0.0, latency_ms - server_ms)
+    else:
+        queue_ms = usage.get("queue_ms") or 0.0
+
+    eval_ms = usage.get("eval_ms")
+    if eval_ms is not None:
+        # Primer token tras cargar el modelo y evaluar el prompt
+        ttft_ms = queue_ms + (usage.get("load_ms") or 0.0) + (usage.get("prompt_eval_ms") or 0.0)
+        generation_ms = eval_ms
+    else:
+        ttft_ms = usage.get("ttft_ms")
+        generation_ms = latency_ms - (ttft_ms if ttft_ms is not None else queue_ms)
+
+    tokens_per_second = completion_tokens * 1000 / generation_ms if completion_tokens and generation_ms > 0 else 0.0
+
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "cached_prompt_tokens": usage.get("cached_prompt_tokens") or 0,
+        "cache_hit": usage.get("cache_hit") or 0,
+        "latency_ms": round(latency_ms, 1),
+        "queue_ms": round(queue_ms, 1),
+        "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+        "generation_ms": round(generation_ms, 1),
+        "tokens_per_second": round(tokens_per_second, 2)
+    }
+
+
+class UsageTotals:
+    """
+    Agregado de registros de llamadas
+
+    Acepta también totales ya agregados (to_dict), como los que se guardan
+    con cada mensaje, para volver a sumarlos.
+    """
+
+    COUNTERS = (
+        "prompt_tokens", "completion_tokens", "total_tokens", "cached_prompt_tokens",
+        "cache_hit", "latency_ms", "queue_ms", "generation_ms"
+    )
+
+    def __init__(self):
+        self.calls = 0
+        self.values = {name: 0.0 for name in self.COUNTERS}
+        self.ttft_sum = 0.0
+        self.ttft_calls = 0
+
+    def add(self, record: Dict[str, Any]):
+        calls = record.get("calls", 1)
+        self.calls += calls
+        for name in self.COUNTERS:
+            self.values[name] += record.get(name) or 0
+        self.values["cache_hit"] += record.get("cache_hits") or 0
+        ttft = record.get("ttft_ms", record.get("avg_ttft_ms"))
+        if ttft is not None:
+            self.ttft_sum += ttft * calls
+            self.ttft_calls += calls
+
+    def to_dict(self) -> Dict[str, Any]:
+        values = self.values
+        generation_ms = values["generation_ms"]
+        return {
+            "calls": self.calls,
+            "prompt_tokens": int(values["prompt_tokens"]),
+            "completion_tokens": int(values["completion_tokens"]),
+            "total_tokens": int(values["total_tokens"]),
+            "cached_prompt_tokens": int(values["cached_prompt_tokens"]),
+            "cache_hits": int(values["cache_hit"]),
+            "latency_ms": round(values["latency_ms"], 1),
+            "queue_ms": round(values["queue_ms"], 1),
+            "generation_ms": round(generation_ms, 1),
+            "avg_latency_ms": round(values["latency_ms"] / self.calls, 1) if self.calls else 0.0,
+            "avg_ttft_ms": round(self.ttft_sum / self.ttft_calls, 1) if self.ttft_calls else None,
+            "tokens_per_second": round(values["completion_tokens"] * 1000 / generation_ms, 2) if generation_ms > 0 else 0.0
+        }
+
+
+class UsageTracker:
+    """Registro de uso por conversación, modelo e iteración (en memoria)"""
+
+    def __init__(self, max_conversations: int = 500, max_calls_per_conversation: int = 200):
+        """
+        Args:
+            max_conversations: Conversaciones recientes con detalle por iteración
+            max_calls_per_conversation: Llamadas guardadas por conversación
+        """
+        self.max_conversations = max_conversations
+        self.max_calls_per_conversation = max_calls_per_conversation
+        self.totals = UsageTotals()
+        self.models: Dict[str, UsageTotals] = {}
+        # conversation_id -> (totales, últimas llamadas)
+        self.conversations: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        conversation_id: str,
+        model: str,
+        iteration: int,
+        usage: Optional[Dict[str, Any]],
+        latency: float
+    ) -> Dict[str, Any]:
+        """
+        Registra una llamada al LLM
+
+        Returns:
+            Registro uniforme de la llamada (ver call_usage)
+        """
+        record = call_usage(usage, latency)
+
+        with self._lock:
+            self.totals.add(record)
+            self.models.setdefault(model, UsageTotals()).add(record)
+
+            entry = self.conversations.get(conversation_id)
+            if entry is None:
+                entry = (UsageTotals(), [])
+                self.conversations[conversation_id] = entry
+            self.conversations.move_to_end(conversation_id)
+            totals, calls = entry
+            totals.add(record)
+            calls.append({**record, "model": model, "iteration": iteration, "timestamp": time.time()})
+            del calls[:-self.max_calls_per_conversation]
+
+            while len(self.conversations) > self.max_conversations:
+                self.conversations.popitem(last=False)
+
+        return record
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Totales y llamadas recientes de una conversación (None si no hay datos)"""
+        with self._lock:
+            entry = self.conversations.get(conversation_id)
+            if entry is None:
+                return None
+            totals, calls = entry
+            by_iteration: Dict[int, UsageTotals] = {}
+            for call in calls:
+                by_iteration.setdefault(call["iteration"], UsageTotals()).add(call)
+            return {
+                "conversation_id": conversation_id,
+                "totals": totals.to_dict(),
+                "iterations": {n: t.to_dict() for n, t in sorted(by_iteration.items())},
+                "calls": list(calls)
+            }
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Totales globales y por modelo"""
+        with self._lock:
+            return {
+                "totals": self.totals.to_dict(),
+                "models": {model: t.to_dict() for model, t in self.models.items()},
+                "conversations": len(self.conversations)
+            }
+
+
+def aggregate(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totales de una lista de registros (p. ej. los guardados con los mensajes)"""
+    totals = UsageTotals()
+    for record in records:
+        totals.add(record)
+    return totals.to_dict()
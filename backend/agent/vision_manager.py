@@ -8,113 +8,244 @@ import numpy as np
 from PIL import Image
 import io
 import logging
+import threading
 from typing import Optional, Dict, Any, List
-from datetime import datetime
+from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
-class VisionManager:
+# Sesión usada cuando el cliente no indica ninguna (compatibilidad con un solo móvil)
+DEFAULT_SESSION_ID = "default"
+
+# Lado máximo con el que se guardan los snapshots (igual al usado para el modelo de visión)
+MAX_SNAPSHOT_DIM = 1280
+
+# Tamaño de la miniatura en escala de grises usada para detectar cambios
+THUMB_SIZE = (64, 48)
+
+
+class VisionSession:
     """
-    Gestiona la recepción, almacenamiento y procesamiento de frames de video.
-    Incluye lógica de "Auto-Snapshot" para capturar momentos clave.
+    Estado de visión de una sesión (una conexión WebRTC o una conversación).
+
+    Mantiene un ring buffer acotado de snapshots. Los buffers numpy se
+    reservan una sola vez y se reutilizan en cada captura; los JPEG ya
+    codificados se cachean por slot y se invalidan al sobrescribirlo.
     """
-    
-    _instance = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(VisionManager, cls).__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
-    
-    def __init__(self):
-        if self._initialized:
-            return
-            
+
+    def __init__(self, session_id: str, history_size: int = 15, snapshot_interval_ms: int = 2000):
+        self.session_id = session_id
+        self.history_size = max(1, history_size)
+        self.snapshot_interval_ms = snapshot_interval_ms
+
         self.current_frame: Optional[np.ndarray] = None
         self.last_update: Optional[datetime] = None
-        self.last_snapshot: Optional[np.ndarray] = None
-        self.last_snapshot_time: Optional[datetime] = None
-        
-        # Umbral para auto-snapshot (milisegundos entre capturas)
-        self.snapshot_interval_ms = 2000 
-        
+        self.created_at = datetime.now()
+
+        # Ring buffer (preasignado al conocer la resolución del primer frame)
+        self._frames: List[np.ndarray] = []
+        self._thumbs: List[np.ndarray] = []
+        self._times: List[Optional[datetime]] = [None] * self.history_size
+        self._encoded: List[Dict[int, bytes]] = [{} for _ in range(self.history_size)]
+        self._shape: Optional[tuple] = None
+        self._head = 0  # Próximo slot a escribir
+        self._count = 0
+        self._gray: Optional[np.ndarray] = None
+
         self.annotations: List[Dict[str, Any]] = []
-        self._initialized = True
-        logger.info("VisionManager inicializado con Auto-Snapshot")
-        
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Captura
+    # ------------------------------------------------------------------
+
     def update_frame(self, frame_data: np.ndarray):
         """Actualiza el frame actual y evalúa si debe tomar un snapshot"""
         self.current_frame = frame_data
         self.last_update = datetime.now()
-        
-        # Lógica simple de Auto-Snapshot: Cada X segundos si hay video activo
-        if self.last_snapshot_time is None or \
-           (datetime.now() - self.last_snapshot_time).total_seconds() * 1000 > self.snapshot_interval_ms:
-            logger.info(f"Triggering Auto-Snapshot. Current frame shape: {self.current_frame.shape if self.current_frame is not None else 'None'}")
+
+        last_time = self.last_snapshot_time
+        if last_time is None or \
+           (self.last_update - last_time).total_seconds() * 1000 > self.snapshot_interval_ms:
             self.take_snapshot()
-            
-    def take_snapshot(self):
-        """Captura el frame actual como un snapshot oficial para la IA"""
-        if self.current_frame is not None:
-            self.last_snapshot = self.current_frame.copy()
-            self.last_snapshot_time = datetime.now()
-            logger.info(f"✅ Auto-Snapshot capturado a las {self.last_snapshot_time.strftime('%H:%M:%S')}")
 
-    def get_current_frame_b64(self, use_snapshot: bool = True, quality: int = 80) -> Optional[str]:
-        """Obtiene el frame (o el último snapshot) en formato base64"""
-        frame = self.last_snapshot if use_snapshot else self.current_frame
-        
+    def take_snapshot(self):
+        """Copia el frame actual al siguiente slot del ring buffer"""
+        frame = self.current_frame
         if frame is None:
-            logger.warning("get_current_frame_b64: Frame is None")
-            return None
-            
-        # Log del tamaño del frame original
+            return
+
+        with self._lock:
+            target_shape = self._snapshot_shape(frame)
+            if self._shape != target_shape:
+                self._allocate(target_shape)
+
+            slot = self._head
+            h, w = target_shape[:2]
+            if frame.shape == target_shape:
+                np.copyto(self._frames[slot], frame)
+            else:
+                cv2.resize(frame, (w, h), dst=self._frames[slot], interpolation=cv2.INTER_AREA)
+
+            # Miniatura en gris para comparar snapshots sin decodificar nada
+            cv2.cvtColor(self._frames[slot], cv2.COLOR_BGR2GRAY, dst=self._gray)
+            cv2.resize(self._gray, THUMB_SIZE, dst=self._thumbs[slot], interpolation=cv2.INTER_AREA)
+
+            self._times[slot] = datetime.now()
+            self._encoded[slot].clear()
+            self._head = (slot + 1) % self.history_size
+            self._count = min(self._count + 1, self.history_size)
+
+        logger.debug(f"Snapshot [{self.session_id}] capturado en slot {slot}")
+
+    def _snapshot_shape(self, frame: np.ndarray) -> tuple:
+        """Resolución con la que se guarda el snapshot (máx. MAX_SNAPSHOT_DIM)"""
         h, w = frame.shape[:2]
-        logger.info(f"Processing frame. Original Shape: {w}x{h}")
-            
-        # Redimensionar si es muy grande (max 1280px de ancho/alto)
-        # Esto ayuda a que el modelo de visión responda más rápido y no falle por timeout
-        max_dim = 1280
-        if w > max_dim or h > max_dim:
+        if w > MAX_SNAPSHOT_DIM or h > MAX_SNAPSHOT_DIM:
             if w > h:
-                new_w = max_dim
-                new_h = int(h * (max_dim / w))
+                h, w = int(h * (MAX_SNAPSHOT_DIM / w)), MAX_SNAPSHOT_DIM
             else:
-                new_h = max_dim
-                new_w = int(w * (max_dim / h))
-            frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
-            logger.info(f"Frame resized to: {new_w}x{new_h}")
+                h, w = MAX_SNAPSHOT_DIM, int(w * (MAX_SNAPSHOT_DIM / h))
+        return (h, w, 3)
+
+    def _allocate(self, shape: tuple):
+        """Reserva los buffers del ring (solo al inicio o si cambia la resolución)"""
+        self._frames = [np.empty(shape, dtype=np.uint8) for _ in range(self.history_size)]
+        self._thumbs = [np.empty((THUMB_SIZE[1], THUMB_SIZE[0]), dtype=np.uint8) for _ in range(self.history_size)]
+        self._gray = np.empty(shape[:2], dtype=np.uint8)
+        self._times = [None] * self.history_size
+        self._encoded = [{} for _ in range(self.history_size)]
+        self._shape = shape
+        self._head = 0
+        self._count = 0
+        logger.info(f"VisionSession {self.session_id}: buffers reservados {self.history_size}x{shape[1]}x{shape[0]}")
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def _slots(self) -> List[int]:
+        """Slots ocupados, del más antiguo al más reciente"""
+        start = (self._head - self._count) % self.history_size
+        return [(start + i) % self.history_size for i in range(self._count)]
+
+    @property
+    def last_snapshot_time(self) -> Optional[datetime]:
+        if not self._count:
+            return None
+        return self._times[(self._head - 1) % self.history_size]
+
+    @property
+    def last_snapshot(self) -> Optional[np.ndarray]:
+        if not self._count:
+            return None
+        return self._frames[(self._head - 1) % self.history_size]
+
+    def get_snapshot_jpeg(self, slot: Optional[int] = None, quality: int = 80) -> Optional[bytes]:
+        """JPEG de un slot (por defecto el último snapshot), codificado una sola vez"""
+        with self._lock:
+            if not self._count:
+                return None
+            if slot is None:
+                slot = (self._head - 1) % self.history_size
 
-        # Convertir de BGR (OpenCV) a RGB
+            cached = self._encoded[slot].get(quality)
+            if cached is not None:
+                return cached
+
+            rgb_frame = cv2.cvtColor(self._frames[slot], cv2.COLOR_BGR2RGB)
+            buffer = io.BytesIO()
+            Image.fromarray(rgb_frame).save(buffer, format="JPEG", quality=quality)
+            data = buffer.getvalue()
+            self._encoded[slot][quality] = data
+            return data
+
+    def get_frame_b64(self, use_snapshot: bool = True, quality: int = 80) -> Optional[str]:
+        """Obtiene el último snapshot (o el frame en vivo) en base64"""
+        if use_snapshot:
+            data = self.get_snapshot_jpeg(quality=quality)
+            return base64.b64encode(data).decode('utf-8') if data else None
+
+        frame = self.current_frame
+        if frame is None:
+            return None
+        h, w = self._snapshot_shape(frame)[:2]
+        if (h, w) != frame.shape[:2]:
+            frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(rgb_frame)
-        
-        # Guardar en buffer como JPEG
         buffer = io.BytesIO()
-        img.save(buffer, format="JPEG", quality=quality)
-        
+        Image.fromarray(rgb_frame).save(buffer, format="JPEG", quality=quality)
         return base64.b64encode(buffer.getvalue()).decode('utf-8')
 
+    def get_history(self, seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Snapshots disponibles (más antiguo primero), opcionalmente acotados en el tiempo"""
+        cutoff = datetime.now() - timedelta(seconds=seconds) if seconds else None
+        history = []
+        for slot in self._slots():
+            ts = self._times[slot]
+            if cutoff and ts < cutoff:
+                continue
+            history.append({"slot": slot, "timestamp": ts})
+        return history
+
+    def get_changes(self, seconds: float = 30, threshold: float = 8.0) -> Dict[str, Any]:
+        """
+        Resume cuánto cambió la escena en los últimos `seconds` segundos.
+
+        Compara las miniaturas en gris de snapshots consecutivos (diferencia
+        absoluta media, 0-255) sin volver a tocar los frames completos.
+
+        Returns:
+            Dict con la puntuación de cambio entre cada par de snapshots,
+            el cambio total entre el primero y el último y los slots
+            donde el cambio supera `threshold`.
+        """
+        with self._lock:
+            history = self.get_history(seconds)
+            steps = []
+            for prev, curr in zip(history, history[1:]):
+                score = float(cv2.absdiff(self._thumbs[prev["slot"]], self._thumbs[curr["slot"]]).mean())
+                steps.append({
+                    "from": prev["timestamp"].isoformat(),
+                    "to": curr["timestamp"].isoformat(),
+                    "score": round(score, 2),
+                    "changed": score >= threshold
+                })
+
+            overall = 0.0
+            if len(history) > 1:
+                overall = float(cv2.absdiff(self._thumbs[history[0]["slot"]], self._thumbs[history[-1]["slot"]]).mean())
+
+        return {
+            "session_id": self.session_id,
+            "window_seconds": seconds,
+            "snapshots": len(history),
+            "overall_score": round(overall, 2),
+            "changed": overall >= threshold or any(s["changed"] for s in steps),
+            "steps": steps,
+            "first_slot": history[0]["slot"] if history else None,
+            "last_slot": history[-1]["slot"] if history else None,
+        }
+
+    # ------------------------------------------------------------------
+    # Anotaciones
+    # ------------------------------------------------------------------
+
     def get_active_annotations(self, ttl_seconds: int = 15) -> List[Dict[str, Any]]:
         """Retorna anotaciones que no han expirado y limpia las antiguas"""
         now = datetime.now()
         self.annotations = [a for a in self.annotations if (now - a["timestamp"]).total_seconds() < ttl_seconds]
-        
-        # Eliminar datetime antes de enviar por JSON
+
         safe_annotations = []
         for a in self.annotations:
             clean_a = a.copy()
             clean_a["timestamp"] = clean_a["timestamp"].isoformat()
             safe_annotations.append(clean_a)
-            
+
         return safe_annotations
 
     def add_annotation(self, type: str, x: int, y: int, color: str = "#ff0000", label: str = ""):
-        """
-        Agrega una anotación visual. 
-        x, y deben ser porcentajes (0-100) para ser independientes de la resolución del móvil.
-        """
+        """Agrega una anotación visual (x, y en porcentajes 0-100)"""
         self.annotations.append({
             "type": type,
             "x": x,
@@ -123,20 +254,174 @@ class VisionManager:
             "label": label,
             "timestamp": datetime.now()
         })
-        logger.info(f"📍 Anotación añadida en ({x}%, {y}%): {label}")
-
-    def clear_annotations(self):
-        """Limpia las anotaciones actuales"""
-        self.annotations = []
+        logger.info(f"📍 Anotación [{self.session_id}] en ({x}%, {y}%): {label}")
 
     def get_status(self) -> Dict[str, Any]:
-        """Retorna el estado actual de la visión"""
+        """Estado de la sesión"""
+        last_snapshot_time = self.last_snapshot_time
         return {
+            "session_id": self.session_id,
             "active": self.current_frame is not None,
             "last_update": self.last_update.isoformat() if self.last_update else None,
-            "last_snapshot": self.last_snapshot_time.isoformat() if self.last_snapshot_time else None,
+            "last_snapshot": last_snapshot_time.isoformat() if last_snapshot_time else None,
+            "snapshots": self._count,
             "annotation_count": len(self.annotations)
         }
 
+
+class VisionManager:
+    """
+    Gestiona la recepción, almacenamiento y procesamiento de frames de video.
+    Incluye lógica de "Auto-Snapshot" para capturar momentos clave.
+
+    El estado se guarda por sesión (conexión WebRTC o conversación), de modo
+    que varios móviles transmitiendo a la vez no se pisan entre sí. Al
+    conectarse, el móvil indica su conversación y el agente usa siempre la
+    sesión de esa conversación (session_for). Las llamadas sin `session_id`
+    usan la sesión activa más reciente.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(VisionManager, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # Umbral para auto-snapshot (milisegundos entre capturas)
+        self.snapshot_interval_ms = 2000
+        # Snapshots por sesión (15 x 2s = últimos 30 segundos)
+        self.history_size = 15
+
+        self.sessions: Dict[str, VisionSession] = {}
+        # Conversación -> sesión del móvil conectado para ella
+        self.conversations: Dict[str, str] = {}
+        self._initialized = True
+        logger.info("VisionManager inicializado con Auto-Snapshot por sesión")
+
+    def get_session(self, session_id: Optional[str] = None, create: bool = False) -> Optional[VisionSession]:
+        """
+        Obtiene una sesión
+
+        Args:
+            session_id: ID de la sesión (None = la sesión actualizada más recientemente)
+            create: Crear la sesión si no existe
+        """
+        if session_id is None:
+            if not self.sessions:
+                if not create:
+                    return None
+                session_id = DEFAULT_SESSION_ID
+            else:
+                return max(
+                    self.sessions.values(),
+                    key=lambda s: s.last_update or s.created_at
+                )
+
+        session = self.sessions.get(session_id)
+        if session is None and create:
+            session = VisionSession(
+                session_id,
+                history_size=self.history_size,
+                snapshot_interval_ms=self.snapshot_interval_ms
+            )
+            self.sessions[session_id] = session
+            logger.info(f"Sesión de visión creada: {session_id}")
+        return session
+
+    def bind_conversation(self, conversation_id: str, session_id: str):
+        """Asocia una conversación a la sesión del móvil conectado para ella"""
+        self.conversations[conversation_id] = session_id
+        logger.info(f"Sesión de visión {session_id} asociada a la conversación {conversation_id}")
+
+    def session_for(self, conversation_id: Optional[str]) -> Optional[VisionSession]:
+        """
+        Sesión de visión de una conversación
+
+        La asociada al conectar el móvil o la que se llama como la
+        conversación. Si no hay ninguna, solo se usa la única sesión sin
+        conversación (un solo móvil); con varias no se adivina.
+
+        Args:
+            conversation_id: ID de la conversación (None = la sesión más reciente)
+        """
+        if conversation_id is None:
+            return self.get_session()
+        session = self.sessions.get(self.conversations.get(conversation_id, conversation_id))
+        if session is not None:
+            return session
+        bound = set(self.conversations.values())
+        free = [session for session_id, session in self.sessions.items() if session_id not in bound]
+        return free[0] if len(free) == 1 else None
+
+    def close_session(self, session_id: str):
+        """Elimina una sesión, sus asociaciones y libera sus buffers"""
+        for conversation_id in [c for c, s in self.conversations.items() if s == session_id]:
+            del self.conversations[conversation_id]
+        if self.sessions.pop(session_id, None) is not None:
+            logger.info(f"Sesión de visión cerrada: {session_id}")
+
+    def update_frame(self, frame_data: np.ndarray, session_id: Optional[str] = None):
+        """Actualiza el frame actual de una sesión y evalúa si debe tomar un snapshot"""
+        self.get_session(session_id or DEFAULT_SESSION_ID, create=True).update_frame(frame_data)
+
+    def take_snapshot(self, session_id: Optional[str] = None):
+        """Captura el frame actual como un snapshot oficial para la IA"""
+        session = self.get_session(session_id)
+        if session:
+            session.take_snapshot()
+
+    def get_current_frame_b64(self, use_snapshot: bool = True, quality: int = 80, session_id: Optional[str] = None) -> Optional[str]:
+        """Obtiene el frame (o el último snapshot) en formato base64"""
+        session = self.get_session(session_id)
+        if session is None:
+            logger.warning("get_current_frame_b64: No hay sesiones de visión")
+            return None
+        return session.get_frame_b64(use_snapshot=use_snapshot, quality=quality)
+
+    def get_changes(self, seconds: float = 30, session_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Resumen de cambios recientes de una sesión"""
+        session = self.get_session(session_id)
+        return session.get_changes(seconds) if session else None
+
+    def get_active_annotations(self, ttl_seconds: int = 15, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Retorna anotaciones que no han expirado y limpia las antiguas"""
+        session = self.get_session(session_id)
+        return session.get_active_annotations(ttl_seconds) if session else []
+
+    def add_annotation(self, type: str, x: int, y: int, color: str = "#ff0000", label: str = "", session_id: Optional[str] = None):
+        """
+        Agrega una anotación visual.
+        x, y deben ser porcentajes (0-100) para ser independientes de la resolución del móvil.
+        """
+        self.get_session(session_id, create=True).add_annotation(type, x, y, color=color, label=label)
+
+    def clear_annotations(self, session_id: Optional[str] = None):
+        """Limpia las anotaciones actuales"""
+        targets = [self.sessions.get(session_id)] if session_id else self.sessions.values()
+        for session in targets:
+            if session:
+                session.annotations = []
+
+    def get_status(self, session_id: Optional[str] = None, conversation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Retorna el estado actual de la visión (sesión indicada, la de la conversación o la más reciente)"""
+        session = self.session_for(conversation_id) if conversation_id else self.get_session(session_id)
+        if session is None:
+            status = {
+                "active": False,
+                "last_update": None,
+                "last_snapshot": None,
+                "annotation_count": 0
+            }
+        else:
+            status = session.get_status()
+        status["sessions"] = list(self.sessions.keys())
+        return status
+
 # Instancia global
 vision_manager = VisionManager()
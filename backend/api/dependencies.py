@@ -7,18 +7,30 @@ from fastapi import Depends, HTTPException, status
 import sys
 import os
 import json
+import asyncio
+import logging
 
 # Agregar backend al path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
 
 from agent import AgentCore, AgentConfig, create_llm_provider
+from agent.cascade import parse_cascade
+from agent.jobs import JobRunner, get_job_queue
 from tools import get_all_tools
 from storage import get_storage, ConversationStorage
 
 
+logger = logging.getLogger(__name__)
+
 # Singleton del agente
 _agent_instance: Optional[AgentCore] = None
 
+# Workers de jobs en segundo plano
+_job_runner: Optional[JobRunner] = None
+
+# Tareas en segundo plano (referencia para que no se recolecten)
+_background_tasks = set()
+
 
 def get_agent() -> AgentCore:
     """
@@ -33,7 +45,25 @@ def get_agent() -> AgentCore:
         # Crear configuración
         config = AgentConfig(
             autonomy_level="semi",
-            max_iterations=10
+            max_iterations=10,
+            tool_selection_top_k=int(os.getenv("AGENT_TOOL_TOP_K", "6")),
+            execution_mode=os.getenv("AGENT_EXECUTION_MODE", "react"),
+            plan_max_parallel=int(os.getenv("AGENT_PLAN_MAX_PARALLEL", "4")),
+            subagents=os.getenv("AGENT_SUBAGENTS", "true").lower() in ("1", "true", "yes"),
+            macros=os.getenv("AGENT_MACROS", "true").lower() in ("1", "true", "yes"),
+            subagent_max_parallel=int(os.getenv("AGENT_SUBAGENT_MAX_PARALLEL", "3")),
+            subagent_token_budget=int(os.getenv("AGENT_SUBAGENT_TOKEN_BUDGET", "8000")),
+            subagent_timeout=float(os.getenv("AGENT_SUBAGENT_TIMEOUT", "60")),
+            loop_detection=os.getenv("AGENT_LOOP_DETECTION", "true").lower() in ("1", "true", "yes"),
+            run_max_seconds=float(os.getenv("AGENT_RUN_MAX_SECONDS", "300")),
+            run_max_tokens=int(os.getenv("AGENT_RUN_MAX_TOKENS", "0")),
+            checkpoints=os.getenv("AGENT_CHECKPOINTS", "true").lower() in ("1", "true", "yes"),
+            temperature=float(os.getenv("LLM_TEMPERATURE", "0.7")),
+            response_cache=os.getenv("LLM_RESPONSE_CACHE", "").lower() in ("1", "true", "yes"),
+            response_cache_force=os.getenv("LLM_RESPONSE_CACHE_FORCE", "").lower() in ("1", "true", "yes"),
+            cascade=parse_cascade(os.getenv("LLM_CASCADE")),
+            cascade_routing_tier=int(os.getenv("LLM_CASCADE_ROUTING_TIER", "0")),
+            cascade_synthesis_tier=int(os.getenv("LLM_CASCADE_SYNTHESIS_TIER", "0"))
         )
         
         # Crear LLM (por defecto Ollama)
@@ -52,6 +82,34 @@ def get_agent() -> AgentCore:
     return _agent_instance
 
 
+def get_job_runner() -> JobRunner:
+    """
+    Dependency para obtener el pool de workers de jobs
+    
+    Se configura con AGENT_JOB_WORKERS (por defecto 2), AGENT_JOB_MAX_SECONDS
+    (por defecto 3600) y AGENT_JOBS_DB.
+    Los workers arrancan con la aplicación (start_job_runner).
+    
+    Returns:
+        Instancia del JobRunner
+    """
+    global _job_runner
+    
+    if _job_runner is None:
+        agent = get_agent()
+        storage = get_storage()
+        _job_runner = JobRunner(
+            agent,
+            get_job_queue(),
+            workers=int(os.getenv("AGENT_JOB_WORKERS", "2")),
+            storage=storage,
+            load_history=lambda conversation_id: load_conversation_history(conversation_id, agent, storage),
+            max_seconds=float(os.getenv("AGENT_JOB_MAX_SECONDS", "3600"))
+        )
+    
+    return _job_runner
+
+
 def get_storage_dependency() -> ConversationStorage:
     """
     Dependency para obtener instancia del storage
@@ -106,34 +164,54 @@ def reconfigure_agent(
     """
     Reconfigura el agente con nuevos parámetros
     
+    Cambiar de proveedor o modelo sustituye el LLM en caliente: se
+    conservan las conversaciones cargadas, las aprobaciones pendientes y
+    las conexiones; las ejecuciones en curso terminan con el anterior.
+    
     Args:
         llm_provider: Nuevo proveedor de LLM
         model: Nuevo modelo
         autonomy_level: Nuevo nivel de autonomía
     """
-    global _agent_instance
+    agent = get_agent()
     
     if llm_provider or model:
-        # Crear nuevo LLM
-        llm = create_llm_provider(
-            llm_provider or "ollama",
+        agent.reconfigure_llm(
+            llm_provider or agent.config.llm_provider,
             model=model
         )
-        
-        # Crear nueva configuración
-        config = AgentConfig(
-            autonomy_level=autonomy_level or "semi",
-            max_iterations=10
-        )
-        
-        # Recrear agente
-        _agent_instance = AgentCore(llm, config)
-        
-        # Re-registrar tools
-        for tool in get_all_tools():
-            _agent_instance.register_tool(tool)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            schedule_llm_warm_up(agent)
+    
+    if autonomy_level:
+        agent.config.autonomy_level = autonomy_level
+
+
+def schedule_llm_warm_up(agent: AgentCore) -> Optional[asyncio.Task]:
+    """
+    Precarga en segundo plano el modelo del agente (arranque y reconfiguración)
+    
+    Se desactiva con OLLAMA_WARMUP=false.
+    
+    Returns:
+        Tarea de precarga o None si está desactivada
+    """
+    if os.getenv("OLLAMA_WARMUP", "true").lower() in ("0", "false", "no"):
+        return None
+    
+    async def warm_up():
+        try:
+            results = await agent.warm_up_llm()
+            if results:
+                logger.info(f"Modelo precargado: {results}")
+        except Exception as e:
+            logger.warning(f"Error precargando el modelo: {e}")
     
-    elif autonomy_level:
-        # Solo actualizar configuración
-        if _agent_instance:
-            _agent_instance.config.autonomy_level = autonomy_level
+    task = asyncio.ensure_future(warm_up())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
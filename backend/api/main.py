@@ -21,8 +21,10 @@ logging.basicConfig(
 logging.getLogger("agent").setLevel(logging.DEBUG)
 logging.getLogger("backend.agent").setLevel(logging.DEBUG)
 
-from .routes import chat_router, tools_router, config_router, conversations_router, vision_router
+from .routes import chat_router, tools_router, config_router, conversations_router, vision_router, metrics_router, jobs_router
 from .routes.chat import chat_websocket_endpoint
+from .routes.jobs import job_websocket_endpoint
+from .dependencies import get_agent, get_job_runner, schedule_llm_warm_up
 
 # Tiempo de inicio
 start_time = time.time()
@@ -52,9 +54,29 @@ app.include_router(tools_router)
 app.include_router(config_router)
 app.include_router(conversations_router)
 app.include_router(vision_router)
+app.include_router(metrics_router)
+app.include_router(jobs_router)
 
 # WebSocket
 app.websocket("/ws/chat/{conversation_id}")(chat_websocket_endpoint)
+app.websocket("/ws/jobs/{job_id}")(job_websocket_endpoint)
+
+@app.on_event("startup")
+async def warm_up_model():
+    # La primera petición no paga la carga del modelo en Ollama
+    schedule_llm_warm_up(get_agent())
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    # Los jobs que quedaron en curso al parar vuelven a la cola
+    get_job_runner().start()
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await get_job_runner().stop()
+
 
 @app.get("/health")
 async def health_check():
@@ -2,7 +2,7 @@
 Modelos de API
 """
 
-from .requests import ChatRequest, ConfigUpdate, ConversationCreate
+from .requests import ChatRequest, BatchItem, BatchChatRequest, JobRequest, ConfigUpdate, ConversationCreate
 from .responses import (
     ChatResponse,
     ConversationInfo,
@@ -18,6 +18,9 @@ from .responses import (
 __all__ = [
     # Requests
     "ChatRequest",
+    "BatchItem",
+    "BatchChatRequest",
+    "JobRequest",
     "ConfigUpdate",
     "ConversationCreate",
     
@@ -23,6 +23,47 @@ class ChatRequest(BaseModel):
         }
 
 
+class BatchItem(BaseModel):
+    """Elemento de un lote: un mensaje o las variables de la plantilla"""
+    id: Optional[str] = Field(None, description="Identificador del elemento en la respuesta (por defecto su índice)")
+    message: Optional[str] = Field(None, description="Mensaje del usuario (si no se usa la plantilla)")
+    variables: Dict[str, Any] = Field(default_factory=dict, description="Valores para la plantilla del lote")
+    conversation_id: Optional[str] = Field(None, description="ID de la conversación (se crea si no existe)")
+
+
+class BatchChatRequest(BaseModel):
+    """Request para ejecutar muchos mensajes en paralelo acotado"""
+    items: List[BatchItem] = Field(..., min_length=1, description="Elementos del lote")
+    template: Optional[str] = Field(None, description="Plantilla común con {variables} (str.format)")
+    max_concurrency: Optional[int] = Field(None, ge=1, description="Elementos simultáneos (por defecto AGENT_BATCH_CONCURRENCY)")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "template": "Genera el informe de infraestructura del equipo {team} en {region}",
+                "items": [
+                    {"id": "data", "variables": {"team": "data", "region": "us-east-1"}},
+                    {"id": "web", "variables": {"team": "web", "region": "eu-west-1"}, "conversation_id": "informe_web"}
+                ],
+                "max_concurrency": 4
+            }
+        }
+
+
+class JobRequest(BaseModel):
+    """Request para encolar un mensaje como job en segundo plano"""
+    message: str = Field(..., description="Mensaje del usuario")
+    conversation_id: Optional[str] = Field(None, description="Conversación donde queda el resultado (se crea si no existe)")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "message": "Haz un inventario de instancias en todas las regiones de AWS",
+                "conversation_id": "conv_123"
+            }
+        }
+
+
 class ConfigUpdate(BaseModel):
     """Request para actualizar configuración"""
     llm_provider: Optional[str] = Field(None, description="Proveedor de LLM (openai, anthropic, deepseek, ollama)")
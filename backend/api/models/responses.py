@@ -20,6 +20,7 @@ class ChatResponse(BaseModel):
     message: str = Field(..., description="Respuesta del agente")
     tool_calls: Optional[List[ToolCallInfo]] = Field(None, description="Tools ejecutados")
     iterations: int = Field(..., description="Número de iteraciones del ciclo Plan & Act")
+    usage: Optional[Dict[str, Any]] = Field(None, description="Tokens y tiempos del LLM en esta petición")
     
     class Config:
         json_schema_extra = {
@@ -7,6 +7,8 @@ from .tools import router as tools_router
 from .config import router as config_router
 from .conversations import router as conversations_router
 from .vision import router as vision_router
+from .metrics import router as metrics_router
+from .jobs import router as jobs_router
 
 __all__ = [
     "chat_router",
@@ -14,4 +16,6 @@ __all__ = [
     "config_router",
     "conversations_router",
     "vision_router",
+    "metrics_router",
+    "jobs_router",
 ]
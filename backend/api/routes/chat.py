@@ -3,13 +3,20 @@ Chat Routes - Endpoints para interactuar con el agente
 """
 
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Dict, Any, AsyncGenerator
+from collections import deque
+import asyncio
 import uuid
+import json
 import logging
+import os
+import time
 
-from ..models import ChatRequest, ChatResponse, ToolCallInfo
+from ..models import ChatRequest, BatchChatRequest, ChatResponse, ToolCallInfo
 from ..dependencies import get_agent, get_storage_dependency, load_conversation_history
 from agent import AgentCore
+from agent.cancellation import CANCEL_CLIENT, CANCEL_DISCONNECTED
 from storage import ConversationStorage
 
 logger = logging.getLogger(__name__)
@@ -26,8 +33,17 @@ async def chat_websocket_endpoint(
     agent: AgentCore = Depends(get_agent),
     storage: ConversationStorage = Depends(get_storage_dependency)
 ):
-    """WebSocket para streaming de respuestas"""
+    """
+    WebSocket para streaming de respuestas
+    
+    Mientras el agente trabaja se siguen leyendo mensajes: {"type": "cancel"}
+    o el cierre del socket cancelan la ejecución en curso (llamada al LLM,
+    subprocesos y navegador incluidos). El resto de mensajes se atienden
+    al terminar.
+    """
     await websocket.accept()
+    receiver: Optional[asyncio.Future] = None
+    backlog: deque = deque()
     
     try:
         # Enviar confirmación de conexión
@@ -41,12 +57,23 @@ async def chat_websocket_endpoint(
         
         while True:
             # Recibir mensaje del cliente
-            data = await websocket.receive_json()
+            if backlog:
+                data = backlog.popleft()
+            else:
+                receiver = receiver or asyncio.ensure_future(websocket.receive_json())
+                data = await receiver
+                receiver = None
             msg_type = data.get("type", "message")
             
+            if msg_type == "cancel":
+                # No hay ninguna ejecución en curso
+                await websocket.send_json({"type": "cancelled", "reason": None, "message": "No hay ninguna ejecución en curso"})
+                continue
+            
             if msg_type == "approval_response":
                 approved = data.get("approved", False)
-                generator = agent.process_approval(conversation_id, approved)
+                # tool_call_ids: aprobar solo parte del conjunto pendiente
+                generator = agent.process_approval(conversation_id, approved, data.get("tool_call_ids"))
                 # No guardamos este "mensaje" del usuario en la BD como texto normal
                 # pero el resultado sí se guardará en el bucle de abajo
             else:
@@ -61,89 +88,29 @@ async def chat_websocket_endpoint(
                 agent.context_manager.add_message("user", message, conversation_id)
                 
                 generator = agent.process_message(message, conversation_id)
-
-            # Procesar mensaje y enviar eventos por WebSocket
-            full_response_content = ""
-            tool_calls_list = []
-            iterations = 0
-
-            async for event in generator:
-                event_type = event.get("type")
-
-                if event_type == "tool_call":
-                    tool_call_info = ToolCallInfo(
-                        id=event.get("tool_call_id", ""),
-                        name=event.get("tool", ""),
-                        arguments=event.get("arguments", {})
-                    )
-                    tool_calls_list.append(tool_call_info)
-                    await websocket.send_json({
-                        "type": "tool_call",
-                        "tool": tool_call_info.name,
-                        "arguments": tool_call_info.arguments,
-                        "tool_call_id": tool_call_info.id
-                    })
-                elif event_type == "tool_result":
-                    # Guardar resultado del tool en la base de datos
-                    storage.save_message(
-                        conversation_id,
-                        "tool",
-                        str(event.get("result") or event.get("error", "Error desconocido")),
-                        tool_call_id=event.get("tool_call_id")
-                    )
-                    
-                    await websocket.send_json({
-                        "type": "tool_result",
-                        "tool": event.get("tool"),
-                        "tool_call_id": event.get("tool_call_id"),
-                        "result": event.get("result"),
-                        "error": event.get("error"),
-                        "success": event.get("success", True)
-                    })
-                elif event_type == "message":
-                    content_chunk = event.get("content", "")
-                    full_response_content += content_chunk
-                    await websocket.send_json({
-                        "type": "message_chunk",
-                        "content": content_chunk
-                    })
-                elif event_type == "thinking":
-                    await websocket.send_json({
-                        "type": "thinking",
-                        "message": event.get("message", "Pensando..."),
-                        "content": event.get("content", "")
-                    })
-                elif event_type == "approval_required":
-                    await websocket.send_json({
-                        "type": "approval_required",
-                        "tool": event.get("tool"),
-                        "arguments": event.get("arguments"),
-                        "tool_id": event.get("tool_call_id"),
-                        "message": event.get("message")
-                    })
-                elif event_type == "done":
-                    iterations = event.get("iterations", 0)
-                    await websocket.send_json({
-                        "type": "done",
-                        "iterations": iterations
-                    })
             
-            # Guardar respuesta completa del agente solo si hay contenido real
-            if full_response_content.strip():
-                storage.save_message(
-                    conversation_id,
-                    "assistant",
-                    full_response_content,
-                    tool_calls=[tc.model_dump() for tc in tool_calls_list] if tool_calls_list else None
-                )
-            elif tool_calls_list:
-                # Si solo hubo tool calls, se guardan como assistant con contenido informativo
-                storage.save_message(
-                    conversation_id,
-                    "assistant",
-                    "Ejecutando herramientas...",
-                    tool_calls=[tc.model_dump() for tc in tool_calls_list]
-                )
+            run = asyncio.ensure_future(_stream_run(websocket, generator, conversation_id, storage))
+            try:
+                while not run.done():
+                    receiver = receiver or asyncio.ensure_future(websocket.receive_json())
+                    await asyncio.wait({run, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                    if receiver.done():
+                        # WebSocketDisconnect si el cliente cerró
+                        data = receiver.result()
+                        receiver = None
+                        if data.get("type") == "cancel":
+                            agent.cancel_run(conversation_id, CANCEL_CLIENT)
+                        else:
+                            backlog.append(data)
+                await run
+            finally:
+                if not run.done():
+                    # Cliente desconectado: se libera ya el LLM y los subprocesos
+                    agent.cancel_run(conversation_id, CANCEL_DISCONNECTED)
+                    try:
+                        await run
+                    except Exception:
+                        pass
             
     except WebSocketDisconnect:
         logger.info(f"WebSocket desconectado (normalmente): {conversation_id}")
@@ -154,12 +121,211 @@ async def chat_websocket_endpoint(
         except:
             pass
     finally:
+        if receiver is not None:
+            receiver.cancel()
         try:
             await websocket.close()
         except RuntimeError:
             pass
 
 
+async def _stream_run(
+    websocket: WebSocket,
+    generator: AsyncGenerator[Dict[str, Any], None],
+    conversation_id: str,
+    storage: ConversationStorage
+):
+    """Envía los eventos de una ejecución por el WebSocket y guarda la respuesta"""
+    # Procesar mensaje y enviar eventos por WebSocket
+    full_response_content = ""
+    tool_calls_list = []
+    iterations = 0
+    usage = None
+
+    async for event in generator:
+        event_type = event.get("type")
+
+        if event_type == "tool_call":
+            tool_call_info = ToolCallInfo(
+                id=event.get("tool_call_id", ""),
+                name=event.get("tool", ""),
+                arguments=event.get("arguments", {})
+            )
+            tool_calls_list.append(tool_call_info)
+            await websocket.send_json({
+                "type": "tool_call",
+                "tool": tool_call_info.name,
+                "arguments": tool_call_info.arguments,
+                "tool_call_id": tool_call_info.id
+            })
+        elif event_type == "tool_result":
+            # Guardar resultado del tool en la base de datos
+            storage.save_message(
+                conversation_id,
+                "tool",
+                str(event.get("result") or event.get("error", "Error desconocido")),
+                tool_call_id=event.get("tool_call_id")
+            )
+
+            await websocket.send_json({
+                "type": "tool_result",
+                "tool": event.get("tool"),
+                "tool_call_id": event.get("tool_call_id"),
+                "result": event.get("result"),
+                "error": event.get("error"),
+                "success": event.get("success", True)
+            })
+        elif event_type == "message":
+            content_chunk = event.get("content", "")
+            full_response_content += content_chunk
+            await websocket.send_json({
+                "type": "message_chunk",
+                "content": content_chunk
+            })
+        elif event_type == "thinking":
+            await websocket.send_json({
+                "type": "thinking",
+                "message": event.get("message", "Pensando..."),
+                "content": event.get("content", "")
+            })
+        elif event_type == "approval_required":
+            await websocket.send_json({
+                "type": "approval_required",
+                "tool": event.get("tool"),
+                "arguments": event.get("arguments"),
+                "tool_id": event.get("tool_call_id"),
+                "approvals": event.get("approvals"),
+                "message": event.get("message")
+            })
+        elif event_type == "cancelled":
+            await websocket.send_json({
+                "type": "cancelled",
+                "reason": event.get("reason"),
+                "message": event.get("message")
+            })
+        elif event_type == "done":
+            iterations = event.get("iterations", 0)
+            usage = event.get("usage")
+            await websocket.send_json({
+                "type": "done",
+                "iterations": iterations,
+                "prompt_eval_tokens": event.get("prompt_eval_tokens", []),
+                "usage": usage
+            })
+
+    # Guardar respuesta completa del agente solo si hay contenido real
+    if full_response_content.strip():
+        storage.save_message(
+            conversation_id,
+            "assistant",
+            full_response_content,
+            tool_calls=[tc.model_dump() for tc in tool_calls_list] if tool_calls_list else None,
+            usage=usage
+        )
+    elif tool_calls_list:
+        # Si solo hubo tool calls, se guardan como assistant con contenido informativo
+        storage.save_message(
+            conversation_id,
+            "assistant",
+            "Ejecutando herramientas...",
+            tool_calls=[tc.model_dump() for tc in tool_calls_list],
+            usage=usage
+        )
+
+
+async def _chat_once(
+    agent: AgentCore,
+    storage: ConversationStorage,
+    message: str,
+    conversation_id: str
+) -> ChatResponse:
+    """Ejecuta un mensaje completo y guarda la conversación (REST y lotes)"""
+    # Crear conversación si no existe
+    existing_conv = storage.get_conversation(conversation_id)
+    if not existing_conv:
+        # Crear conversación con título basado en el primer mensaje
+        title = message[:50] if len(message) > 50 else message
+        storage.create_conversation(conversation_id, title=title)
+    
+    # Cargar historial si existe
+    try:
+        load_conversation_history(conversation_id, agent, storage)
+    except Exception as e:
+        print(f"Warning: Could not load history: {e}")
+    
+    # Guardar mensaje del usuario
+    storage.save_message(
+        conversation_id,
+        "user",
+        message
+    )
+    
+    # Procesar mensaje
+    final_message = ""
+    tool_calls_list = []
+    iterations = 0
+    usage = None
+    
+    async for event in agent.process_message(
+        message,
+        conversation_id
+    ):
+        event_type = event.get("type")
+        
+        if event_type == "tool_call":
+            tool_calls_list.append(ToolCallInfo(
+                id=event.get("tool_call_id", ""),
+                name=event.get("tool", ""),
+                arguments=event.get("arguments", {})
+            ))
+        
+        elif event_type == "tool_result":
+            # Guardar resultado del tool en la base de datos
+            storage.save_message(
+                conversation_id,
+                "tool",
+                str(event.get("result") or event.get("error", "Error desconocido")),
+                tool_call_id=event.get("tool_call_id")
+            )
+        
+        elif event_type == "message":
+            final_message = event.get("content", "")
+        
+        elif event_type == "cancelled":
+            final_message = final_message or event.get("message", "")
+        
+        elif event_type == "done":
+            iterations = event.get("iterations", 0)
+            usage = event.get("usage")
+    
+    # Asegurar que tenemos un mensaje
+    if not final_message:
+        final_message = "Procesado sin respuesta"
+    
+    # Guardar respuesta del agente
+    try:
+        storage.save_message(
+            conversation_id,
+            "assistant",
+            final_message,
+            tool_calls=[tc.model_dump() for tc in tool_calls_list] if tool_calls_list else None,
+            usage=usage
+        )
+    except Exception as e:
+        print(f"Warning: Could not save response: {e}")
+    
+    # Crear response
+    response = ChatResponse(
+        conversation_id=conversation_id,
+        message=final_message,
+        tool_calls=tool_calls_list if tool_calls_list else None,
+        iterations=iterations,
+        usage=usage
+    )
+    
+    return response
+
+
 @router.post("/", response_model=ChatResponse)
 async def send_message(
     request: ChatRequest,
@@ -179,83 +345,7 @@ async def send_message(
         # Generar conversation_id si no existe
         conversation_id = request.conversation_id or f"conv_{uuid.uuid4().hex[:8]}"
         
-        # Crear conversación si no existe
-        existing_conv = storage.get_conversation(conversation_id)
-        if not existing_conv:
-            # Crear conversación con título basado en el primer mensaje
-            title = request.message[:50] if len(request.message) > 50 else request.message
-            storage.create_conversation(conversation_id, title=title)
-        
-        # Cargar historial si existe
-        try:
-            load_conversation_history(conversation_id, agent, storage)
-        except Exception as e:
-            print(f"Warning: Could not load history: {e}")
-        
-        # Guardar mensaje del usuario
-        storage.save_message(
-            conversation_id,
-            "user",
-            request.message
-        )
-        
-        # Procesar mensaje
-        final_message = ""
-        tool_calls_list = []
-        iterations = 0
-        
-        async for event in agent.process_message(
-            request.message,
-            conversation_id
-        ):
-            event_type = event.get("type")
-            
-            if event_type == "tool_call":
-                tool_calls_list.append(ToolCallInfo(
-                    id=event.get("tool_call_id", ""),
-                    name=event.get("tool", ""),
-                    arguments=event.get("arguments", {})
-                ))
-            
-            elif event_type == "tool_result":
-                # Guardar resultado del tool en la base de datos
-                storage.save_message(
-                    conversation_id,
-                    "tool",
-                    str(event.get("result") or event.get("error", "Error desconocido")),
-                    tool_call_id=event.get("tool_call_id")
-                )
-            
-            elif event_type == "message":
-                final_message = event.get("content", "")
-            
-            elif event_type == "done":
-                iterations = event.get("iterations", 0)
-        
-        # Asegurar que tenemos un mensaje
-        if not final_message:
-            final_message = "Procesado sin respuesta"
-        
-        # Guardar respuesta del agente
-        try:
-            storage.save_message(
-                conversation_id,
-                "assistant",
-                final_message,
-                tool_calls=[tc.model_dump() for tc in tool_calls_list] if tool_calls_list else None
-            )
-        except Exception as e:
-            print(f"Warning: Could not save response: {e}")
-        
-        # Crear response
-        response = ChatResponse(
-            conversation_id=conversation_id,
-            message=final_message,
-            tool_calls=tool_calls_list if tool_calls_list else None,
-            iterations=iterations
-        )
-        
-        return response
+        return await _chat_once(agent, storage, request.message, conversation_id)
         
     except WebSocketDisconnect:
         logger.info(f"WebSocket desconectado: {conversation_id}")
@@ -269,6 +359,164 @@ async def send_message(
             pass
 
 
+@router.post("/batch")
+async def send_batch(
+    request: BatchChatRequest,
+    agent: AgentCore = Depends(get_agent),
+    storage: ConversationStorage = Depends(get_storage_dependency)
+):
+    """
+    Ejecuta un lote de mensajes con paralelismo acotado
+    
+    - **items**: Elementos del lote (mensaje propio o variables de la plantilla)
+    - **template**: Plantilla común con {variables} (opcional)
+    - **max_concurrency**: Elementos simultáneos (por defecto AGENT_BATCH_CONCURRENCY)
+    
+    Todos los elementos usan el mismo agente: comparten las conexiones al
+    LLM y la caché de tools. La respuesta es NDJSON: una línea por elemento
+    según va terminando y una última con los tiempos del lote.
+    """
+    max_items = int(os.getenv("AGENT_BATCH_MAX_ITEMS", "200"))
+    if len(request.items) > max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"El lote tiene {len(request.items)} elementos (máximo {max_items})"
+        )
+    
+    concurrency = min(
+        request.max_concurrency or int(os.getenv("AGENT_BATCH_CONCURRENCY", "4")),
+        int(os.getenv("AGENT_BATCH_MAX_CONCURRENCY", "16"))
+    )
+    
+    # Resolver los mensajes antes de empezar: los errores son por elemento
+    items = []
+    for index, item in enumerate(request.items):
+        message, error = item.message, None
+        if not message and request.template:
+            try:
+                message = request.template.format_map(item.variables)
+            except (KeyError, IndexError, ValueError) as e:
+                error = f"Plantilla no aplicable: {e}"
+        if not message and not error:
+            error = "Elemento sin mensaje ni plantilla"
+        items.append({
+            "index": index,
+            "id": item.id or str(index),
+            "conversation_id": item.conversation_id or f"conv_{uuid.uuid4().hex[:8]}",
+            "message": message,
+            "error": error
+        })
+    
+    return StreamingResponse(
+        _run_batch(agent, storage, items, max(1, concurrency)),
+        media_type="application/x-ndjson"
+    )
+
+
+async def _run_batch(
+    agent: AgentCore,
+    storage: ConversationStorage,
+    items: List[Dict[str, Any]],
+    concurrency: int
+) -> AsyncGenerator[str, None]:
+    """Ejecuta los elementos de un lote y emite una línea NDJSON por cada uno"""
+    semaphore = asyncio.Semaphore(concurrency)
+    # Los elementos de una misma conversación se ejecutan en orden
+    locks: Dict[str, asyncio.Lock] = {}
+    finished: asyncio.Queue = asyncio.Queue()
+    cache = agent.tool_registry.result_cache
+    cache_hits = cache.get_stats()["hits"]
+    started = time.perf_counter()
+    
+    async def run_item(item: Dict[str, Any]):
+        line = {
+            "type": "item",
+            "index": item["index"],
+            "id": item["id"],
+            "conversation_id": item["conversation_id"]
+        }
+        if item["error"]:
+            line.update(status="error", error=item["error"], elapsed_ms=0.0)
+            await finished.put(line)
+            return
+        
+        queued = time.perf_counter()
+        async with locks.setdefault(item["conversation_id"], asyncio.Lock()):
+            async with semaphore:
+                item_started = time.perf_counter()
+                try:
+                    response = await _chat_once(agent, storage, item["message"], item["conversation_id"])
+                    line.update(
+                        status="ok",
+                        message=response.message,
+                        tool_calls=[tc.name for tc in response.tool_calls or []],
+                        iterations=response.iterations,
+                        usage=response.usage
+                    )
+                except Exception as e:
+                    logger.error(f"Lote: el elemento {item['id']} falló: {e}", exc_info=True)
+                    line.update(status="error", error=str(e))
+                line["queue_ms"] = round((item_started - queued) * 1000, 1)
+                line["elapsed_ms"] = round((time.perf_counter() - item_started) * 1000, 1)
+        await finished.put(line)
+    
+    tasks = [asyncio.ensure_future(run_item(item)) for item in items]
+    elapsed: List[float] = []
+    failed = 0
+    total_tokens = 0
+    try:
+        for _ in tasks:
+            line = await finished.get()
+            if line["status"] == "ok":
+                elapsed.append(line["elapsed_ms"])
+                total_tokens += (line.get("usage") or {}).get("total_tokens") or 0
+            else:
+                failed += 1
+            yield json.dumps(line, ensure_ascii=False, default=str) + "\n"
+        
+        wall_ms = (time.perf_counter() - started) * 1000
+        yield json.dumps({
+            "type": "summary",
+            "items": len(items),
+            "succeeded": len(elapsed),
+            "failed": failed,
+            "concurrency": concurrency,
+            "wall_ms": round(wall_ms, 1),
+            "items_ms": round(sum(elapsed), 1),
+            "avg_item_ms": round(sum(elapsed) / len(elapsed), 1) if elapsed else 0.0,
+            "max_item_ms": max(elapsed) if elapsed else 0.0,
+            # Tiempo secuencial equivalente / tiempo real del lote
+            "speedup": round(sum(elapsed) / wall_ms, 2) if wall_ms else 0.0,
+            "total_tokens": total_tokens,
+            "tool_cache_hits": cache.get_stats()["hits"] - cache_hits
+        }) + "\n"
+    finally:
+        # Cliente desconectado: no seguir ejecutando el resto del lote
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@router.post("/{conversation_id}/cancel")
+async def cancel_run(
+    conversation_id: str,
+    agent: AgentCore = Depends(get_agent)
+):
+    """
+    Cancela la ejecución en curso de una conversación
+    
+    La llamada al LLM, los subprocesos y las acciones del navegador en curso
+    se interrumpen; el cliente recibe un evento cancelled.
+    
+    - **conversation_id**: ID de la conversación
+    """
+    runs = agent.runs.active(conversation_id)
+    cancelled = agent.cancel_run(conversation_id, CANCEL_CLIENT)
+    if not runs:
+        raise HTTPException(status_code=404, detail="No hay ninguna ejecución en curso en esta conversación")
+    return {"conversation_id": conversation_id, "cancelled": cancelled, "runs": runs}
+
+
 @router.get("/{conversation_id}/history")
 async def get_conversation_history(
     conversation_id: str,
@@ -295,6 +543,7 @@ async def get_conversation_history(
                     "role": msg.role,
                     "content": msg.content,
                     "tool_calls": msg.tool_calls,
+                    "usage": json.loads(msg.usage) if msg.usage else None,
                     "created_at": msg.created_at
                 }
                 for msg in messages
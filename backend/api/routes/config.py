@@ -2,12 +2,14 @@
 Config Routes - Endpoints para configuración
 """
 
+import os
 import logging
 from fastapi import APIRouter, Depends, HTTPException
 
 from ..models import ConfigUpdate, ConfigResponse
-from ..dependencies import get_agent, reconfigure_agent, get_storage_dependency
+from ..dependencies import get_agent, reconfigure_agent, get_storage_dependency, schedule_llm_warm_up
 from agent import AgentCore
+from agent.llm_provider import DEFAULT_OLLAMA_URL
 from storage import ConversationStorage
 import aiohttp
 
@@ -35,8 +37,8 @@ async def get_config(agent: AgentCore = Depends(get_agent)):
         llm_provider=provider,
         model=model,
         autonomy_level=agent.config.autonomy_level,
-        temperature=0.7,  # TODO: Obtener de config real
-        max_tokens=4000,  # TODO: Obtener de config real
+        temperature=agent.config.temperature,
+        max_tokens=agent.config.max_tokens,
         tools_count=len(agent.tool_registry.list_tools())
     )
 
@@ -46,9 +48,10 @@ async def get_ollama_models():
     """
     Obtiene los modelos disponibles en la instancia local de Ollama
     """
+    base_url = (os.getenv("OLLAMA_BASE_URL") or DEFAULT_OLLAMA_URL).rstrip("/")
     try:
         async with aiohttp.ClientSession() as session:
-            async with session.get("http://localhost:11434/api/tags") as response:
+            async with session.get(f"{base_url}/api/tags") as response:
                 if response.status != 200:
                     return {"models": ["llama3.2:latest"]} # Fallback
                 
@@ -60,6 +63,33 @@ async def get_ollama_models():
         return {"models": ["llama3.2:latest"], "error": str(e)}
 
 
+@router.get("/ollama-status")
+async def get_ollama_status(agent: AgentCore = Depends(get_agent)):
+    """
+    Estado de residencia del modelo configurado
+    
+    - **loaded**: si el modelo está en memoria en algún servidor
+    - **expected_cold_start_seconds**: coste esperado de la próxima petición
+      si hay que cargarlo (última carga medida; 0 si ya está cargado)
+    - **keep_alive** / **num_ctx**: parámetros enviados en cada petición
+    """
+    status = await agent.get_llm_model_status()
+    if status is None:
+        raise HTTPException(status_code=404, detail="El proveedor actual no es Ollama")
+    return status
+
+
+@router.post("/ollama-warmup")
+async def warm_up_ollama(agent: AgentCore = Depends(get_agent)):
+    """
+    Precarga el modelo configurado y retorna el tiempo empleado por servidor
+    """
+    results = await agent.warm_up_llm()
+    if results is None:
+        raise HTTPException(status_code=404, detail="El proveedor actual no es Ollama")
+    return {"results": results}
+
+
 @router.put("/")
 async def update_config(
     config_update: dict,
@@ -110,6 +140,7 @@ async def update_config(
                 )
                 updated_config["llm_provider"] = provider
                 updated_config["model"] = agent.config.model
+                schedule_llm_warm_up(agent)
                 
             except Exception as e:
                 # Si falla la reconfiguración, solo guardar la preferencia
@@ -152,10 +183,12 @@ async def update_config(
             agent.config.model = config_update["model"]
         
         if "temperature" in config_update:
-            updated_config["temperature"] = config_update["temperature"]
+            agent.config.temperature = float(config_update["temperature"])
+            updated_config["temperature"] = agent.config.temperature
         
         if "max_tokens" in config_update:
-            updated_config["max_tokens"] = config_update["max_tokens"]
+            agent.config.max_tokens = int(config_update["max_tokens"])
+            updated_config["max_tokens"] = agent.config.max_tokens
 
         if "autonomy_level" in config_update:
             level = config_update["autonomy_level"]
@@ -0,0 +1,120 @@
+"""
+Jobs Routes - Ejecuciones del agente en segundo plano
+
+Para tareas que duran más de lo que un navegador espera: se encola el
+mensaje, se obtiene un job_id y los eventos se consultan (polling) o se
+siguen por WebSocket. El resultado queda en la conversación del job.
+"""
+
+import uuid
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+
+from ..models import JobRequest
+from ..dependencies import get_job_runner
+from agent.jobs import JobRunner, JOB_QUEUED
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+@router.post("/", status_code=202)
+async def submit_job(request: JobRequest, jobs: JobRunner = Depends(get_job_runner)):
+    """
+    Encola un mensaje para ejecutarlo en segundo plano
+
+    - **message**: Mensaje del usuario
+    - **conversation_id**: Conversación del resultado (opcional, se crea si no existe)
+
+    Responde al momento con el job_id y su posición en la cola.
+    """
+    conversation_id = request.conversation_id or f"conv_{uuid.uuid4().hex[:8]}"
+    job = jobs.submit(conversation_id, request.message)
+    return {
+        **job.to_dict(),
+        "position": jobs.queue.position(job.id)
+    }
+
+
+@router.get("/")
+async def list_jobs(
+    status: Optional[str] = None,
+    limit: int = 50,
+    jobs: JobRunner = Depends(get_job_runner)
+):
+    """
+    Lista los jobs más recientes
+
+    - **status**: Filtrar por estado (queued, running, done, error, cancelled, approval_required)
+    """
+    return {
+        "jobs": [job.to_dict() for job in jobs.queue.list(status, limit)],
+        "stats": jobs.get_stats()
+    }
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, jobs: JobRunner = Depends(get_job_runner)):
+    """Estado y resultado de un job"""
+    job = jobs.queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job no encontrado: {job_id}")
+    return {
+        **job.to_dict(),
+        "position": jobs.queue.position(job_id) if job.status == JOB_QUEUED else None
+    }
+
+
+@router.get("/{job_id}/events")
+async def get_job_events(job_id: str, after: int = 0, jobs: JobRunner = Depends(get_job_runner)):
+    """
+    Eventos de un job (polling)
+
+    - **after**: Última secuencia ya recibida (se devuelven las posteriores)
+    """
+    job = jobs.queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job no encontrado: {job_id}")
+    return {
+        "job_id": job_id,
+        "status": job.status,
+        "events": jobs.queue.events(job_id, after)
+    }
+
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str, jobs: JobRunner = Depends(get_job_runner)):
+    """Cancela un job en cola o en curso"""
+    if jobs.queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job no encontrado: {job_id}")
+    if not jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail="El job ya terminó")
+    return {"job_id": job_id, "cancelled": True}
+
+
+# WebSocket - se registra en main.py (fuera del router, como el del chat)
+async def job_websocket_endpoint(
+    websocket: WebSocket,
+    job_id: str,
+    after: int = 0,
+    jobs: JobRunner = Depends(get_job_runner)
+):
+    """Eventos de un job en vivo (los anteriores a `after` no se reenvían)"""
+    await websocket.accept()
+    try:
+        job = jobs.queue.get(job_id)
+        if job is None:
+            await websocket.send_json({"type": "error", "message": f"Job no encontrado: {job_id}"})
+            return
+        async for event in jobs.subscribe(job_id, after):
+            await websocket.send_json(event)
+        await websocket.send_json({"type": "job_finished", **jobs.queue.get(job_id).to_dict()})
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket de job desconectado: {job_id}")
+    finally:
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
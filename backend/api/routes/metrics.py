@@ -0,0 +1,70 @@
+"""
+Metrics Routes - Estadísticas de rendimiento del agente
+"""
+
+import json
+from fastapi import APIRouter, Depends, HTTPException
+
+from ..dependencies import get_agent, get_job_runner, get_storage_dependency
+from agent import AgentCore
+from agent.jobs import JobRunner
+from agent.usage import aggregate
+from storage import ConversationStorage
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@router.get("/")
+async def get_metrics(
+    agent: AgentCore = Depends(get_agent),
+    jobs: JobRunner = Depends(get_job_runner)
+):
+    """
+    Métricas del ciclo Plan & Act y de las capas del LLM
+    
+    - **agent**: iteraciones, overhead de preparación, tokens de prompt, selección de tools
+    - **llm**: estadísticas del proveedor (p. ej. aciertos de la caché de respuestas)
+    - **jobs**: profundidad de la cola de jobs, tiempos de espera y workers ocupados
+    """
+    return {
+        "agent": agent.get_loop_stats(),
+        "llm": agent.get_llm_stats(),
+        "jobs": jobs.get_stats()
+    }
+
+
+@router.get("/usage")
+async def get_usage(agent: AgentCore = Depends(get_agent)):
+    """
+    Uso del LLM desde el arranque: totales y desglose por modelo
+    
+    Tokens de prompt y respuesta, latencia, tiempo en cola, tiempo hasta
+    el primer token y tokens por segundo.
+    """
+    return agent.usage_tracker.get_summary()
+
+
+@router.get("/usage/{conversation_id}")
+async def get_conversation_usage(
+    conversation_id: str,
+    agent: AgentCore = Depends(get_agent),
+    storage: ConversationStorage = Depends(get_storage_dependency)
+):
+    """
+    Uso del LLM de una conversación
+    
+    Con detalle por iteración y llamada si se procesó desde el arranque;
+    si no, los totales guardados con cada respuesta del agente.
+    """
+    usage = agent.usage_tracker.get_conversation(conversation_id)
+    if usage is not None:
+        return usage
+    
+    stored = [json.loads(m.usage) for m in storage.get_messages(conversation_id) if m.usage]
+    if not stored:
+        raise HTTPException(status_code=404, detail="Sin datos de uso para la conversación")
+    return {
+        "conversation_id": conversation_id,
+        "totals": aggregate(stored),
+        "messages": stored
+    }
@@ -2,7 +2,7 @@
 Tools Routes - Endpoints para gestionar tools
 """
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from typing import List
 
 from ..models import ToolsList, ToolInfo
@@ -43,6 +43,33 @@ async def list_tools(agent: AgentCore = Depends(get_agent)):
     )
 
 
+@router.get("/macros")
+async def list_macros(agent: AgentCore = Depends(get_agent)):
+    """
+    Lista las macros grabadas (peticiones que se resuelven sin planificar)
+    
+    Incluye la plantilla, los tool calls, los usos y la tasa de aciertos.
+    """
+    if agent.macros is None:
+        raise HTTPException(status_code=404, detail="Macros desactivadas (AGENT_MACROS=false)")
+    return {
+        "macros": agent.macros.list(),
+        "stats": agent.macros.get_stats()
+    }
+
+
+@router.delete("/macros/{name}")
+async def delete_macro(name: str, agent: AgentCore = Depends(get_agent)):
+    """
+    Elimina una macro grabada
+    
+    - **name**: Nombre de la macro (p. ej. aws_list_instances(region))
+    """
+    if agent.macros is None or not agent.macros.delete(name):
+        raise HTTPException(status_code=404, detail=f"Macro '{name}' no encontrada")
+    return {"success": True, "name": name}
+
+
 @router.get("/{tool_name}")
 async def get_tool_info(
     tool_name: str,
@@ -11,6 +11,7 @@ import uuid
 import logging
 import os
 from typing import Dict, Optional
+from urllib.parse import quote
 
 from agent.vision_manager import vision_manager
 
@@ -27,9 +28,10 @@ class VideoTransformTrack(MediaStreamTrack):
     """
     kind = "video"
 
-    def __init__(self, track):
+    def __init__(self, track, session_id: str):
         super().__init__()
         self.track = track
+        self.session_id = session_id
 
     async def recv(self):
         frame = await self.track.recv()
@@ -37,34 +39,42 @@ class VideoTransformTrack(MediaStreamTrack):
         # Convertir frame de aiortc a ndarray de OpenCV
         img = frame.to_ndarray(format="bgr24")
         
-        # Actualizar el VisionManager
-        vision_manager.update_frame(img)
+        # Actualizar la sesión de este peer en el VisionManager
+        vision_manager.update_frame(img, session_id=self.session_id)
         
         return frame
 
 class Offer(BaseModel):
     sdp: str
     type: str
+    session_id: Optional[str] = None  # Conversación o ID propio del móvil
+    conversation_id: Optional[str] = None  # Conversación a la que el móvil da visión
 
 @router.post("/offer")
 async def offer(params: Offer):
     offer = RTCSessionDescription(sdp=params.sdp, type=params.type)
 
+    # Cada peer tiene su propia sesión de visión (por defecto un ID nuevo)
+    session_id = params.session_id or f"peer_{uuid.uuid4().hex[:8]}"
+    if params.conversation_id:
+        vision_manager.bind_conversation(params.conversation_id, session_id)
+
     pc = RTCPeerConnection()
     pcs.add(pc)
 
     @pc.on("connectionstatechange")
     async def on_connectionstatechange():
-        logger.info(f"Connection state is {pc.connectionState}")
+        logger.info(f"Connection state is {pc.connectionState} ({session_id})")
         if pc.connectionState == "failed" or pc.connectionState == "closed":
             await pc.close()
             pcs.discard(pc)
+            vision_manager.close_session(session_id)
 
     @pc.on("track")
     def on_track(track):
-        logger.info(f"Track {track.kind} received")
+        logger.info(f"Track {track.kind} received ({session_id})")
         if track.kind == "video":
-            pc.addTrack(VideoTransformTrack(relay.subscribe(track)))
+            pc.addTrack(VideoTransformTrack(relay.subscribe(track), session_id))
 
     # Manejar la oferta
     await pc.setRemoteDescription(offer)
@@ -73,16 +83,25 @@ async def offer(params: Offer):
 
     return {
         "sdp": pc.localDescription.sdp,
-        "type": pc.localDescription.type
+        "type": pc.localDescription.type,
+        "session_id": session_id
     }
 
 @router.get("/status")
-async def get_status():
-    return vision_manager.get_status()
+async def get_status(session_id: Optional[str] = None):
+    return vision_manager.get_status(session_id)
+
+@router.get("/sessions/{session_id}/changes")
+async def get_changes(session_id: str, seconds: float = 30):
+    """Resumen de lo que cambió en la escena en los últimos `seconds` segundos"""
+    changes = vision_manager.get_changes(seconds, session_id=session_id)
+    if changes is None:
+        raise HTTPException(status_code=404, detail=f"Sesión de visión '{session_id}' no encontrada")
+    return changes
 
 @router.post("/clear-annotations")
-async def clear_annotations():
-    vision_manager.clear_annotations()
+async def clear_annotations(session_id: Optional[str] = None):
+    vision_manager.clear_annotations(session_id)
     return {"status": "cleared"}
 
 import socket
@@ -100,7 +119,7 @@ def get_local_ip():
         return "127.0.0.1"
 
 @router.get("/connection-info")
-async def connection_info():
+async def connection_info(conversation_id: Optional[str] = None):
     # Prioridad: 
     # 1. Variable de entorno VISION_TUNNEL_URL (para túneles HTTPS)
     # 2. IP local (para uso en red local, pero falla en móviles por falta de SSL)
@@ -117,7 +136,11 @@ async def connection_info():
         url = f"http://{ip}:8000/vision.html"
         logger.info(f"Usando IP local: {url} (⚠️ Nota: móviles pueden bloquear cámara en HTTP)")
     
-    qr_api = f"https://api.qrserver.com/v1/create-qr-code/?size=200x200&data={url}"
+    # El móvil que abra el enlace queda asociado a la conversación
+    if conversation_id:
+        url += f"?conversation={quote(conversation_id)}"
+    
+    qr_api = f"https://api.qrserver.com/v1/create-qr-code/?size=200x200&data={quote(url, safe='')}"
     
     return {
         "ip": get_local_ip(),
@@ -127,22 +150,27 @@ async def connection_info():
     }
 
 @router.get("/snapshot")
-async def get_snapshot():
+async def get_snapshot(session_id: Optional[str] = None, conversation_id: Optional[str] = None):
     """Obtiene el último snapshot capturado en base64 para previsualización"""
-    img_b64 = vision_manager.get_current_frame_b64(use_snapshot=True)
+    if conversation_id and not session_id:
+        session = vision_manager.session_for(conversation_id)
+    else:
+        session = vision_manager.get_session(session_id)
+    img_b64 = session.get_frame_b64(use_snapshot=True) if session else None
     if not img_b64:
         return {"image_b64": None, "timestamp": None}
     
     return {
         "image_b64": img_b64,
-        "timestamp": vision_manager.last_snapshot_time.isoformat() if vision_manager.last_snapshot_time else None
+        "session_id": session.session_id,
+        "timestamp": session.last_snapshot_time.isoformat() if session.last_snapshot_time else None
     }
 
 @router.get("/annotations")
-async def get_annotations():
+async def get_annotations(session_id: Optional[str] = None):
     """Obtiene las anotaciones activas para mostrar en el móvil"""
     return {
-        "annotations": vision_manager.get_active_annotations()
+        "annotations": vision_manager.get_active_annotations(session_id=session_id)
     }
 
 class AnnotationData(BaseModel):
@@ -150,6 +178,7 @@ class AnnotationData(BaseModel):
     y: int # Porcentaje 0-100
     label: str = ""
     color: str = "#ff0000"
+    session_id: Optional[str] = None
 
 @router.post("/annotate")
 async def add_annotation(data: AnnotationData):
@@ -159,6 +188,8 @@ async def add_annotation(data: AnnotationData):
         x=data.x,
         y=data.y,
         color=data.color,
-        label=data.label
+        label=data.label,
+        session_id=data.session_id
     )
-    return {"status": "success", "annotation_count": len(vision_manager.annotations)}
+    session = vision_manager.get_session(data.session_id)
+    return {"status": "success", "annotation_count": len(session.annotations) if session else 0}
@@ -21,6 +21,7 @@ class StoredMessage:
     tool_calls: Optional[str]  # JSON string
     tool_call_id: Optional[str]
     created_at: str
+    usage: Optional[str] = None  # JSON string (tokens y tiempos del LLM)
 
 
 @dataclass
@@ -92,6 +93,12 @@ class ConversationStorage:
             # Ya existe la columna
             pass
         
+        # Migración: uso del LLM (tokens, latencia) de cada respuesta
+        try:
+            conn.execute("ALTER TABLE messages ADD COLUMN usage TEXT")
+        except sqlite3.OperationalError:
+            pass
+        
         # Índices para búsquedas rápidas
         conn.execute('''
             CREATE INDEX IF NOT EXISTS idx_messages_conversation 
@@ -138,11 +145,15 @@ class ConversationStorage:
         role: str,
         content: str,
         tool_calls: Optional[List[Dict]] = None,
-        tool_call_id: Optional[str] = None
+        tool_call_id: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None
     ) -> int:
         """
         Guarda un mensaje en la conversación
         
+        Args:
+            usage: Uso del LLM para generar el mensaje (tokens, tiempos)
+        
         Returns:
             ID del mensaje guardado
         """
@@ -159,14 +170,15 @@ class ConversationStorage:
         
         # Serializar tool_calls si existen
         tool_calls_json = json.dumps(tool_calls) if tool_calls else None
+        usage_json = json.dumps(usage) if usage else None
         
         # Insertar mensaje
         cursor = conn.execute(
             """
-            INSERT INTO messages (conversation_id, role, content, tool_calls, tool_call_id)
-            VALUES (?, ?, ?, ?, ?)
+            INSERT INTO messages (conversation_id, role, content, tool_calls, tool_call_id, usage)
+            VALUES (?, ?, ?, ?, ?, ?)
             """,
-            (conversation_id, role, content, tool_calls_json, tool_call_id)
+            (conversation_id, role, content, tool_calls_json, tool_call_id, usage_json)
         )
         
         message_id = cursor.lastrowid
@@ -197,7 +209,7 @@ class ConversationStorage:
         conn.row_factory = sqlite3.Row
         
         query = """
-            SELECT id, conversation_id, role, content, tool_calls, tool_call_id, created_at
+            SELECT id, conversation_id, role, content, tool_calls, tool_call_id, created_at, usage
             FROM messages
             WHERE conversation_id = ?
             ORDER BY created_at ASC
@@ -219,7 +231,8 @@ class ConversationStorage:
                 content=row['content'],
                 tool_calls=row['tool_calls'],
                 tool_call_id=row['tool_call_id'],
-                created_at=row['created_at']
+                created_at=row['created_at'],
+                usage=row['usage']
             ))
         
         return messages
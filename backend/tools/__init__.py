@@ -2,65 +2,25 @@
 Tools Module - Inicialización
 """
 
-# File Operations
-from .file_tools import (
-    ReadFileTool,
-    WriteFileTool,
-    ListDirectoryTool,
-    SearchFilesTool,
-    DeleteFileTool,
-    GetFileInfoTool
+# Los módulos de tools se importan bajo demanda: importar `tools` no carga
+# Playwright ni OpenCV. Las clases siguen disponibles como atributos
+# (`from tools import BrowserTool`) vía __getattr__.
+from .registry import (
+    ToolSpec,
+    LazyTool,
+    TOOL_SPECS,
+    SPECS_BY_CLASS,
+    select_specs,
+    load_tool_class,
 )
 
-# Command Execution
-from .command_tools import (
-    ExecuteCommandTool,
-    RunScriptTool,
-    InstallPackageTool
-)
-
-# Git Operations
-from .git_tools import (
-    GitStatusTool,
-    GitDiffTool,
-    GitCommitTool,
-    GitLogTool
-)
-
-# HTTP Request
-from .http_request import HttpRequestTool
-
-# Browser Navigation
-from .browser_tool import BrowserTool
-
-# Vision
-from .vision_tools import VisionTool, VisionPointTool
-
-# Zabbix
-from .zabbix_tools import ZabbixTool
-
-# Rundeck
-from .rundeck_tools import RundeckTool, RundeckListTool
-
-# Nagios
-from .nagios_tools import NagiosTool
-
-# Analysis
-from .analysis_tools import InfrastructureAnalysisTool
-
-# OCI
-from .oci_tools import OCITool
-
-# AWS
-from .aws_tools import AWSListInstancesTool
-
-# Checkmk
-from .checkmk_tools import CheckmkTool, CheckmkListHostsTool
-
-# Dremio
-from .dremio_tools import DremioQueryTool, DremioCatalogTool
-
 __all__ = [
+    # Registry
+    "ToolSpec",
+    "LazyTool",
+    "TOOL_SPECS",
+    "get_all_tools",
+    
     # File Operations
     "ReadFileTool",
     "WriteFileTool",
@@ -119,67 +79,23 @@ __all__ = [
 ]
 
 
-def get_all_tools():
+def __getattr__(name: str):
+    """Resuelve las clases de tools de forma perezosa (PEP 562)"""
+    spec = SPECS_BY_CLASS.get(name)
+    if spec is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return load_tool_class(spec)
+
+
+def get_all_tools(enabled=None, disabled=None):
     """
-    Retorna instancias de todos los tools disponibles
+    Retorna los tools habilitados como proxies de carga perezosa
+    
+    Args:
+        enabled: Nombres o categorías a incluir (default: env AGENT_ENABLED_TOOLS o todos)
+        disabled: Nombres o categorías a excluir (default: env AGENT_DISABLED_TOOLS)
     
     Returns:
         Lista de tools
     """
-    return [
-        # File Operations
-        ReadFileTool(),
-        WriteFileTool(),
-        ListDirectoryTool(),
-        SearchFilesTool(),
-        DeleteFileTool(),
-        GetFileInfoTool(),
-        
-        # Command Execution
-        ExecuteCommandTool(),
-        RunScriptTool(),
-        InstallPackageTool(),
-        
-        # Git Operations
-        GitStatusTool(),
-        GitDiffTool(),
-        GitCommitTool(),
-        GitLogTool(),
-        
-        # HTTP
-        HttpRequestTool(),
-        
-        # Browser
-        BrowserTool(),
-        
-        # Vision
-        VisionTool(),
-        VisionPointTool(),
-        
-        # Zabbix
-        ZabbixTool(),
-        
-        # Rundeck
-        RundeckTool(),
-        RundeckListTool(),
-        
-        # Nagios
-        NagiosTool(),
-        
-        # Analysis
-        InfrastructureAnalysisTool(),
-        
-        # OCI
-        OCITool(),
-        
-        # AWS
-        AWSListInstancesTool(),
-        
-        # Checkmk
-        CheckmkTool(),
-        CheckmkListHostsTool(),
-        
-        # Dremio
-        DremioQueryTool(),
-        DremioCatalogTool(),
-    ]
+    return [LazyTool(spec) for spec in select_specs(enabled, disabled)]
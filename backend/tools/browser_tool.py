@@ -9,6 +9,8 @@ import asyncio
 import json
 from datetime import datetime
 
+from agent.cancellation import time_left
+
 
 class BrowserTool:
     """Tool para navegar por internet usando Playwright"""
@@ -24,8 +26,8 @@ class BrowserTool:
     _playwright = None
     
     def __init__(self):
+        # El directorio se crea en el primer screenshot, no al registrar el tool
         self.screenshots_dir = Path("~/.agent_data/screenshots").expanduser()
-        self.screenshots_dir.mkdir(parents=True, exist_ok=True)
     
     def get_definition(self) -> Dict[str, Any]:
         """Retorna la definición del tool para el LLM"""
@@ -123,6 +125,11 @@ class BrowserTool:
         Returns:
             Dict con success, data, y mensaje
         """
+        # Acotado al deadline de la ejecución del agente (0 sería sin límite)
+        remaining = time_left()
+        if remaining is not None:
+            timeout = max(1, min(timeout, int(remaining * 1000)))
+        
         try:
             # Asegurar que el navegador esté iniciado (excepto para close)
             if action != "close":
@@ -172,12 +179,25 @@ class BrowserTool:
                     "error": f"Acción desconocida: {action}"
                 }
         
+        except asyncio.CancelledError:
+            # Ejecución cancelada: la página deja de cargar en segundo plano
+            if self._page is not None:
+                asyncio.ensure_future(self._stop_loading(self._page))
+            raise
+        
         except Exception as e:
             return {
                 "success": False,
                 "error": f"Error en acción {action}: {str(e)}"
             }
     
+    async def _stop_loading(self, page: Page):
+        """Detiene la navegación o carga en curso de la página"""
+        try:
+            await page.evaluate("window.stop()")
+        except Exception:
+            pass
+    
     async def _navigate(self, url: str, timeout: int) -> Dict[str, Any]:
         """Navega a una URL"""
         if not url:
@@ -197,6 +217,7 @@ class BrowserTool:
         """Toma un screenshot de la página actual"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"screenshot_{timestamp}.png"
+        self.screenshots_dir.mkdir(parents=True, exist_ok=True)
         filepath = self.screenshots_dir / filename
         
         await self._page.screenshot(path=str(filepath), full_page=True)
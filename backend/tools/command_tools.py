@@ -9,6 +9,8 @@ from typing import Dict, Any, Optional
 from pydantic import BaseModel, Field
 from pathlib import Path
 
+from agent.cancellation import communicate
+
 
 class ExecuteCommandParams(BaseModel):
     """Parámetros para execute_command"""
@@ -70,21 +72,18 @@ class ExecuteCommandTool:
                         "error": f"Directorio no encontrado: {cwd}"
                     }
             
-            # Ejecutar comando
+            # Ejecutar comando (en su propio grupo: al cancelar se matan también los hijos)
             process = await asyncio.create_subprocess_shell(
                 command,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
-                cwd=work_dir
+                cwd=work_dir,
+                start_new_session=True
             )
             
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=timeout
-                )
+                stdout, stderr = await communicate(process, timeout)
             except asyncio.TimeoutError:
-                process.kill()
                 return {
                     "success": False,
                     "error": f"Comando excedió timeout de {timeout}s",
@@ -197,7 +196,7 @@ class RunScriptTool:
                 stderr=asyncio.subprocess.PIPE
             )
             
-            stdout, stderr = await process.communicate()
+            stdout, stderr = await communicate(process)
             
             return {
                 "success": process.returncode == 0,
@@ -297,7 +296,7 @@ class InstallPackageTool:
                 stderr=asyncio.subprocess.PIPE
             )
             
-            stdout, stderr = await process.communicate()
+            stdout, stderr = await communicate(process)
             
             return {
                 "success": process.returncode == 0,
@@ -8,6 +8,8 @@ from typing import Dict, Any, Optional
 from pydantic import BaseModel, Field
 from pathlib import Path
 
+from agent.cancellation import communicate
+
 
 class GitStatusTool:
     """Tool para ver estado de Git"""
@@ -37,7 +39,7 @@ class GitStatusTool:
                 stderr=asyncio.subprocess.PIPE
             )
             
-            stdout, stderr = await process.communicate()
+            stdout, stderr = await communicate(process)
             
             if process.returncode != 0:
                 return {
@@ -133,7 +135,7 @@ class GitDiffTool:
                 stderr=asyncio.subprocess.PIPE
             )
             
-            stdout, stderr = await process.communicate()
+            stdout, stderr = await communicate(process)
             
             if process.returncode != 0:
                 return {
@@ -211,7 +213,7 @@ class GitCommitTool:
                     stdout=asyncio.subprocess.PIPE,
                     stderr=asyncio.subprocess.PIPE
                 )
-                await process.communicate()
+                await communicate(process)
             
             # Git commit
             process = await asyncio.create_subprocess_exec(
@@ -221,7 +223,7 @@ class GitCommitTool:
                 stderr=asyncio.subprocess.PIPE
             )
             
-            stdout, stderr = await process.communicate()
+            stdout, stderr = await communicate(process)
             
             if process.returncode != 0:
                 return {
@@ -298,7 +300,7 @@ class GitLogTool:
                 stderr=asyncio.subprocess.PIPE
             )
             
-            stdout, stderr = await process.communicate()
+            stdout, stderr = await communicate(process)
             
             if process.returncode != 0:
                 return {
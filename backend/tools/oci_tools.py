@@ -9,6 +9,8 @@ import os
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel, Field
 
+from agent.cancellation import communicate
+
 logger = logging.getLogger(__name__)
 
 class OCIListInstancesParams(BaseModel):
@@ -38,7 +40,7 @@ class OCITool:
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
-            stdout, stderr = await process.communicate()
+            stdout, stderr = await communicate(process)
             
             if process.returncode == 0:
                 data = json.loads(stdout.decode())
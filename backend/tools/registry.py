@@ -0,0 +1,252 @@
+"""
+Tool Registry - Carga perezosa de tools
+
+Cada tool se describe con un `ToolSpec` (nombre, módulo, clase, categoría).
+El nombre, la categoría y el schema para el LLM se leen del catálogo
+(`catalog.json`) sin importar la implementación; el módulo se importa y
+el tool se instancia solo en el primer `execute`.
+
+Regenerar el catálogo tras cambiar la definición de un tool:
+
+    python scripts/build_tool_catalog.py
+"""
+
+import importlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = Path(__file__).with_name("catalog.json")
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """Especificación de un tool (sin importar su implementación)"""
+    name: str
+    module: str
+    class_name: str
+    category: str
+    # Solo consulta (sin efectos): llamadas idénticas concurrentes se agrupan
+    read_only: bool = False
+    # Caché de resultados: segundos de vida (0 = sin caché) y versión del
+    # recurso consultado ("file": ruta + mtime, "git": HEAD + índice). Solo
+    # para resultados que dependen únicamente de esa versión: los listados
+    # con tamaños, las búsquedas recursivas y el estado del árbol de trabajo
+    # (git_status, git_diff) no se cachean
+    cache_ttl: float = 0.0
+    cache_key: Optional[str] = None
+    # Categorías cuyos resultados en caché quedan obsoletos al ejecutarlo ("*" = todas)
+    invalidates: Tuple[str, ...] = ()
+
+
+TOOL_SPECS: List[ToolSpec] = [
+    # File Operations
+    ToolSpec("read_file", "file_tools", "ReadFileTool", "file_operations", read_only=True, cache_ttl=300, cache_key="file"),
+    ToolSpec("write_file", "file_tools", "WriteFileTool", "file_operations", invalidates=("file_operations", "git")),
+    ToolSpec("list_directory", "file_tools", "ListDirectoryTool", "file_operations", read_only=True),
+    ToolSpec("search_files", "file_tools", "SearchFilesTool", "file_operations", read_only=True),
+    ToolSpec("delete_file", "file_tools", "DeleteFileTool", "file_operations", invalidates=("file_operations", "git")),
+    ToolSpec("get_file_info", "file_tools", "GetFileInfoTool", "file_operations", read_only=True, cache_ttl=60, cache_key="file"),
+
+    # Command Execution
+    ToolSpec("execute_command", "command_tools", "ExecuteCommandTool", "command_execution", invalidates=("*",)),
+    ToolSpec("run_script", "command_tools", "RunScriptTool", "command_execution", invalidates=("*",)),
+    ToolSpec("install_package", "command_tools", "InstallPackageTool", "command_execution", invalidates=("*",)),
+
+    # Git Operations
+    ToolSpec("git_status", "git_tools", "GitStatusTool", "git", read_only=True),
+    ToolSpec("git_diff", "git_tools", "GitDiffTool", "git", read_only=True),
+    ToolSpec("git_commit", "git_tools", "GitCommitTool", "git", invalidates=("git",)),
+    ToolSpec("git_log", "git_tools", "GitLogTool", "git", read_only=True, cache_ttl=60, cache_key="git"),
+
+    # HTTP
+    ToolSpec("http_request", "http_request", "HttpRequestTool", "http"),
+
+    # Browser (Playwright)
+    ToolSpec("browser", "browser_tool", "BrowserTool", "web"),
+
+    # Vision (cv2/numpy/PIL)
+    ToolSpec("get_visual_context", "vision_tools", "VisionTool", "vision"),
+    ToolSpec("point_to_object", "vision_tools", "VisionPointTool", "vision"),
+
+    # Zabbix
+    ToolSpec("zabbix_get_alerts", "zabbix_tools", "ZabbixTool", "observability", read_only=True, cache_ttl=30),
+
+    # Rundeck
+    ToolSpec("rundeck_run_job", "rundeck_tools", "RundeckTool", "automation", invalidates=("automation", "observability", "cloud")),
+    ToolSpec("rundeck_list_jobs", "rundeck_tools", "RundeckListTool", "automation", read_only=True, cache_ttl=120),
+
+    # Nagios
+    ToolSpec("nagios_get_alerts", "nagios_tools", "NagiosTool", "observability", read_only=True, cache_ttl=30),
+
+    # Analysis
+    ToolSpec("analyze_cloud_resources", "analysis_tools", "InfrastructureAnalysisTool", "analysis"),
+
+    # OCI
+    ToolSpec("oci_list_instances", "oci_tools", "OCITool", "cloud", read_only=True, cache_ttl=60),
+
+    # AWS
+    ToolSpec("aws_list_instances", "aws_tools", "AWSListInstancesTool", "cloud", read_only=True, cache_ttl=60),
+
+    # Checkmk
+    ToolSpec("checkmk_get_alerts", "checkmk_tools", "CheckmkTool", "observability", read_only=True, cache_ttl=30),
+    ToolSpec("checkmk_list_hosts", "checkmk_tools", "CheckmkListHostsTool", "observability", read_only=True, cache_ttl=300),
+
+    # Dremio
+    ToolSpec("dremio_query", "dremio_tools", "DremioQueryTool", "data", invalidates=("data",)),
+    ToolSpec("dremio_list_catalog", "dremio_tools", "DremioCatalogTool", "data", read_only=True, cache_ttl=300),
+]
+
+SPECS_BY_NAME: Dict[str, ToolSpec] = {spec.name: spec for spec in TOOL_SPECS}
+SPECS_BY_CLASS: Dict[str, ToolSpec] = {spec.class_name: spec for spec in TOOL_SPECS}
+
+_catalog: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def load_catalog() -> Dict[str, Dict[str, Any]]:
+    """Carga (una vez) las definiciones precomputadas de los tools"""
+    global _catalog
+
+    if _catalog is None:
+        try:
+            with open(CATALOG_PATH, encoding="utf-8") as f:
+                _catalog = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Catálogo de tools no disponible ({e}); se importarán los módulos")
+            _catalog = {}
+
+    return _catalog
+
+
+def load_tool_class(spec: ToolSpec):
+    """Importa el módulo de un tool y retorna su clase"""
+    module = importlib.import_module(f".{spec.module}", __package__)
+    return getattr(module, spec.class_name)
+
+
+class LazyTool:
+    """
+    Proxy de un tool que difiere el import y la instanciación.
+
+    Expone `name`, `category`, `read_only`, la política de caché, `description` y `get_definition()`
+    desde el spec y el catálogo; cualquier otro acceso (incluido `execute`) resuelve el tool real.
+    """
+
+    def __init__(self, spec: ToolSpec):
+        self.spec = spec
+        self.name = spec.name
+        self.category = spec.category
+        self.read_only = spec.read_only
+        self.cache_ttl = spec.cache_ttl
+        self.cache_key = spec.cache_key
+        self.invalidates = spec.invalidates
+        self._instance = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    @property
+    def description(self) -> str:
+        return self.get_definition()["description"]
+
+    def resolve(self):
+        """Importa e instancia el tool real (solo la primera vez)"""
+        if self._instance is None:
+            logger.info(f"Cargando tool '{self.name}' desde {self.spec.module}")
+            self._instance = load_tool_class(self.spec)()
+        return self._instance
+
+    def get_definition(self) -> Dict[str, Any]:
+        """Retorna definición del tool para el LLM (sin importar el módulo si está en el catálogo)"""
+        definition = load_catalog().get(self.name)
+        if definition is None:
+            return self.resolve().get_definition()
+        return {
+            "name": self.name,
+            "description": definition["description"],
+            "parameters": definition["parameters"]
+        }
+
+    async def execute(self, **kwargs) -> Any:
+        return await self.resolve().execute(**kwargs)
+
+    def __getattr__(self, item):
+        # Solo se llama para atributos que no están en el proxy
+        if item.startswith("__") or item in ("spec", "_instance"):
+            raise AttributeError(item)
+        return getattr(self.resolve(), item)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "lazy"
+        return f"<LazyTool {self.name} ({state})>"
+
+
+def _parse_list(value: Optional[str]) -> Optional[List[str]]:
+    if not value:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def select_specs(
+    enabled: Optional[Iterable[str]] = None,
+    disabled: Optional[Iterable[str]] = None
+) -> List[ToolSpec]:
+    """
+    Filtra los tools habilitados
+
+    Args:
+        enabled: Nombres o categorías a incluir (None = env AGENT_ENABLED_TOOLS o todos)
+        disabled: Nombres o categorías a excluir (None = env AGENT_DISABLED_TOOLS)
+
+    Returns:
+        Specs seleccionados, en el orden del registro
+    """
+    if enabled is None:
+        enabled = _parse_list(os.getenv("AGENT_ENABLED_TOOLS"))
+    if disabled is None:
+        disabled = _parse_list(os.getenv("AGENT_DISABLED_TOOLS"))
+
+    enabled = set(enabled) if enabled else None
+    disabled = set(disabled or [])
+
+    unknown = ((enabled or set()) | disabled) - set(SPECS_BY_NAME) - {s.category for s in TOOL_SPECS}
+    if unknown:
+        logger.warning(f"Tools o categorías desconocidos en la configuración: {sorted(unknown)}")
+
+    return [
+        spec for spec in TOOL_SPECS
+        if (enabled is None or spec.name in enabled or spec.category in enabled)
+        and spec.name not in disabled and spec.category not in disabled
+    ]
+
+
+def build_catalog() -> Dict[str, Dict[str, Any]]:
+    """Importa todos los tools y genera el catálogo de definiciones"""
+    catalog = {}
+    for spec in TOOL_SPECS:
+        definition = load_tool_class(spec)().get_definition()
+        catalog[spec.name] = {
+            "category": spec.category,
+            "description": definition["description"],
+            "parameters": definition["parameters"]
+        }
+    return catalog
+
+
+
+def write_catalog(path: Path = CATALOG_PATH) -> int:
+    """Regenera `catalog.json` y retorna el número de tools"""
+    global _catalog
+
+    catalog = build_catalog()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    _catalog = catalog
+    return len(catalog)
@@ -3,6 +3,7 @@ Vision Tools - Herramientas para que el agente pueda "ver"
 """
 
 import aiohttp
+import base64
 import json
 import logging
 from typing import Dict, Any, Optional
@@ -10,9 +11,18 @@ from pydantic import BaseModel, Field
 
 # Importar el VisionManager para obtener frames
 from agent.vision_manager import vision_manager
+from agent.cancellation import current_scope
 
 logger = logging.getLogger(__name__)
 
+
+def _conversation_session(session_id: Optional[str] = None):
+    """Sesión indicada o, si no, la de la conversación que ejecuta el tool"""
+    if session_id:
+        return vision_manager.get_session(session_id)
+    scope = current_scope()
+    return vision_manager.session_for(scope.conversation_id if scope is not None else None)
+
 class GetVisualContextParams(BaseModel):
     """Parámetros para get_visual_context"""
     prompt: Optional[str] = Field(
@@ -30,54 +40,39 @@ class VisionTool:
     def __init__(self, ollama_url: str = "http://localhost:11434"):
         self.ollama_url = ollama_url
 
-    async def execute(self, prompt: str = "Describe lo que ves en esta imagen detalladamente.") -> Dict[str, Any]:
+    async def execute(
+        self,
+        prompt: str = "Describe lo que ves en esta imagen detalladamente.",
+        since_seconds: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Captura el frame actual y lo envía a un modelo de visión local
+        Captura el frame actual y lo envía a un modelo de visión local.
+        Con `since_seconds` compara los snapshots de esa ventana y describe
+        el primero y el último solo si la escena cambió.
         """
         try:
-            # 1. Obtener imagen en base64 del VisionManager
-            image_b64 = vision_manager.get_current_frame_b64(use_snapshot=True)
+            session = _conversation_session(session_id)
             
-            if not image_b64:
+            if session is None or session.last_snapshot_time is None:
                 return {
                     "success": False,
                     "error": "No hay señal de video activa. Asegúrate de que el móvil esté transmitiendo.",
                     "instruction": "Pide al usuario que active la cámara desde el botón 'Activar Visión' en la interfaz."
                 }
             
-            # 2. Llamar a Ollama con el modelo moondream
-            # Moondream es excelente para descripciones rápidas y precisas
-            payload = {
-                "model": "moondream:latest",
-                "prompt": prompt,
-                "stream": False,
-                "images": [image_b64]
-            }
-            
-            logger.info(f"VisionTool Calling Ollama (moondream) with prompt: '{prompt}' (Image B64 length: {len(image_b64)})")
+            if since_seconds:
+                return await self._describe_changes(session, prompt, since_seconds)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.ollama_url}/api/generate", json=payload) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"Error en Ollama (Vision): {error_text}")
-                        return {
-                            "success": False,
-                            "error": f"Error en el modelo de visión (Ollama): {error_text}"
-                        }
-                    
-                    result = await response.json()
-                    logger.info(f"VisionTool Ollama Raw Response: {json.dumps(result)}")
-                    description = result.get("response", "").strip()
-                    
-                    if not description:
-                        description = "El modelo no proporcionó una descripción de la imagen."
-                        logger.warning("VisionTool: Ollama devolvió una respuesta vacía.")
+            # 1. Obtener imagen en base64 de la sesión (JPEG cacheado por snapshot)
+            image_b64 = session.get_frame_b64(use_snapshot=True)
+            description = await self._describe(image_b64, prompt)
             
             return {
                 "success": True,
                 "description": description,
-                "timestamp": vision_manager.last_snapshot_time.isoformat() if vision_manager.last_snapshot_time else None
+                "session_id": session.session_id,
+                "timestamp": session.last_snapshot_time.isoformat()
             }
             
         except Exception as e:
@@ -87,6 +82,55 @@ class VisionTool:
                 "error": f"Error procesando visión: {str(e)}"
             }
 
+    async def _describe_changes(self, session, prompt: str, since_seconds: float) -> Dict[str, Any]:
+        """Describe qué cambió en la ventana indicada usando el ring buffer de la sesión"""
+        changes = session.get_changes(since_seconds)
+        result = {
+            "success": True,
+            "session_id": session.session_id,
+            "changes": changes
+        }
+        
+        if changes["snapshots"] < 2 or not changes["changed"]:
+            result["description"] = f"Sin cambios significativos en los últimos {since_seconds:g} segundos."
+            return result
+        
+        before = base64.b64encode(session.get_snapshot_jpeg(changes["first_slot"])).decode('utf-8')
+        after = base64.b64encode(session.get_snapshot_jpeg(changes["last_slot"])).decode('utf-8')
+        result["before"] = await self._describe(before, prompt)
+        result["after"] = await self._describe(after, prompt)
+        result["description"] = f"Antes: {result['before']}\nAhora: {result['after']}"
+        return result
+
+    async def _describe(self, image_b64: str, prompt: str) -> str:
+        """Llama a Ollama con el modelo moondream para describir una imagen"""
+        # Moondream es excelente para descripciones rápidas y precisas
+        payload = {
+            "model": "moondream:latest",
+            "prompt": prompt,
+            "stream": False,
+            "images": [image_b64]
+        }
+        
+        logger.info(f"VisionTool Calling Ollama (moondream) with prompt: '{prompt}' (Image B64 length: {len(image_b64)})")
+        
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{self.ollama_url}/api/generate", json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"Error en Ollama (Vision): {error_text}")
+                    raise Exception(f"Error en el modelo de visión (Ollama): {error_text}")
+                
+                result = await response.json()
+                logger.info(f"VisionTool Ollama Raw Response: {json.dumps(result)}")
+                description = result.get("response", "").strip()
+                
+                if not description:
+                    description = "El modelo no proporcionó una descripción de la imagen."
+                    logger.warning("VisionTool: Ollama devolvió una respuesta vacía.")
+        
+        return description
+
     def get_definition(self) -> Dict[str, Any]:
         """Retorna definición del tool para el LLM"""
         return {
@@ -98,6 +142,10 @@ class VisionTool:
                     "prompt": {
                         "type": "string",
                         "description": "Explica qué quieres que la IA busque en la cámara (ej: '¿Hay algún error en mi monitor?', '¿Qué dice este documento?')"
+                    },
+                    "since_seconds": {
+                        "type": "number",
+                        "description": "Opcional. Describe qué cambió en los últimos N segundos (máx. ~30) en lugar del frame actual."
                     }
                 }
             }
@@ -110,18 +158,18 @@ class VisionPointTool:
     description = "Dibuja una marca visual (punto/círculo) en la pantalla del móvil del usuario para señalar un objeto específico."
     category = "vision"
 
-    async def execute(self, x: int, y: int, label: str = "", color: str = "#ff0000", **kwargs) -> Dict[str, Any]:
+    async def execute(self, x: int, y: int, label: str = "", color: str = "#ff0000", session_id: Optional[str] = None, **kwargs) -> Dict[str, Any]:
         """
         Envía una instrucción de dibujo al VisionManager
         """
         try:
-            vision_manager.add_annotation(
-                type="point",
-                x=x,
-                y=y,
-                color=color,
-                label=label
-            )
+            session = _conversation_session(session_id)
+            if session is None:
+                return {
+                    "success": False,
+                    "error": "No hay ningún móvil conectado a esta conversación."
+                }
+            session.add_annotation("point", x, y, color=color, label=label)
             return {
                 "success": True,
                 "message": f"Marcador '{label}' colocado en ({x}%, {y}%)",
@@ -343,6 +343,12 @@ function handleWebSocketMessage(data) {
             messageInput.focus();
             break;
 
+        case 'cancelled':
+            hideThinking();
+            hideToolIndicator();
+            if (data.reason) addMessage('assistant', `⏹️ ${data.message}`);
+            break;
+
         case 'error':
             hideThinking();
             hideToolIndicator();
@@ -431,42 +437,53 @@ function showApprovalRequest(data) {
     }
 
     const contentDiv = currentAssistantMessageDiv.querySelector('.message-content');
+    // Todos los tools del turno que requieren aprobación, en una sola respuesta
+    const approvals = data.approvals || [{ tool: data.tool, arguments: data.arguments, tool_call_id: data.tool_id }];
+    const multiple = approvals.length > 1;
 
     const approvalDiv = document.createElement('div');
     approvalDiv.className = 'approval-request';
     approvalDiv.innerHTML = `
         <div class="approval-header">🛡️ Permiso Requerido</div>
         <div class="approval-message">${escapeHtml(data.message)}</div>
+        ${approvals.map(item => `
         <div class="approval-details">
-            <strong>Herramienta:</strong> <code>${escapeHtml(data.tool)}</code><br>
-            <strong>Argumentos:</strong> <pre><code>${escapeHtml(JSON.stringify(data.arguments, null, 2))}</code></pre>
-        </div>
+            ${multiple ? `<label><input type="checkbox" class="approval-check" value="${escapeHtml(item.tool_call_id)}" checked> ` : ''}<strong>Herramienta:</strong> <code>${escapeHtml(item.tool)}</code>${multiple ? '</label>' : ''}<br>
+            <strong>Argumentos:</strong> <pre><code>${escapeHtml(JSON.stringify(item.arguments, null, 2))}</code></pre>
+        </div>`).join('')}
         <div class="approval-actions">
-            <button class="btn-confirm btn-approve" id="approveBtn">✅ Aprobar Ejecución</button>
-            <button class="btn-confirm btn-reject" id="rejectBtn">❌ Rechazar</button>
+            <button class="btn-confirm btn-approve" id="approveBtn">${multiple ? '✅ Aprobar seleccionadas' : '✅ Aprobar Ejecución'}</button>
+            <button class="btn-confirm btn-reject" id="rejectBtn">${multiple ? '❌ Rechazar todas' : '❌ Rechazar'}</button>
         </div>
     `;
 
     contentDiv.appendChild(approvalDiv);
 
     approvalDiv.querySelector('#approveBtn').onclick = () => {
-        sendApprovalResponse(true);
-        approvalDiv.innerHTML = '<div class="approval-status approved">✅ Acción aprobada. Continuando...</div>';
+        if (multiple) {
+            const selected = [...approvalDiv.querySelectorAll('.approval-check:checked')].map(check => check.value);
+            sendApprovalResponse(selected.length > 0, selected);
+            approvalDiv.innerHTML = `<div class="approval-status approved">✅ ${selected.length} de ${approvals.length} acciones aprobadas. Continuando...</div>`;
+        } else {
+            sendApprovalResponse(true);
+            approvalDiv.innerHTML = '<div class="approval-status approved">✅ Acción aprobada. Continuando...</div>';
+        }
     };
 
     approvalDiv.querySelector('#rejectBtn').onclick = () => {
         sendApprovalResponse(false);
-        approvalDiv.innerHTML = '<div class="approval-status rejected">❌ Acción rechazada.</div>';
+        approvalDiv.innerHTML = `<div class="approval-status rejected">❌ ${multiple ? 'Acciones rechazadas' : 'Acción rechazada'}.</div>`;
     };
 
     scrollToBottom();
 }
 
-function sendApprovalResponse(approved) {
+function sendApprovalResponse(approved, toolCallIds = null) {
     if (ws && ws.readyState === WebSocket.OPEN) {
         ws.send(JSON.stringify({
             type: 'approval_response',
-            approved: approved
+            approved: approved,
+            tool_call_ids: toolCallIds
         }));
 
         // Mostrar indicador de que el agente vuelve a pensar
@@ -1045,6 +1062,13 @@ function setupEventListeners() {
         }
     });
 
+    // Escape cancela la ejecución en curso (LLM, comandos y navegador)
+    document.addEventListener('keydown', (e) => {
+        if (e.key === 'Escape' && sendBtn.disabled && ws && ws.readyState === WebSocket.OPEN) {
+            ws.send(JSON.stringify({ type: 'cancel' }));
+        }
+    });
+
     // Event Listeners para el Modal de Resultados
     const closeResultModalBtn = document.getElementById('closeResultModal');
     const closeResultBtn = document.getElementById('closeResultBtn');
@@ -1076,7 +1100,8 @@ async function openVisionModal() {
     visionUrl.textContent = 'Cargando...';
 
     try {
-        const response = await fetch(`${API_URL}/api/vision/connection-info`);
+        const query = currentConversationId ? `?conversation_id=${encodeURIComponent(currentConversationId)}` : '';
+        const response = await fetch(`${API_URL}/api/vision/connection-info${query}`);
         const data = await response.json();
 
         qrContainer.innerHTML = `<img src="${data.qr_url}" alt="QR Code" width="200" height="200">`;
@@ -1327,7 +1352,8 @@ const closeVisionPreview = document.getElementById('closeVisionPreview');
 
 async function updateVisionPreview() {
     try {
-        const response = await fetch(`${API_URL}/api/vision/snapshot`);
+        const query = currentConversationId ? `?conversation_id=${encodeURIComponent(currentConversationId)}` : '';
+        const response = await fetch(`${API_URL}/api/vision/snapshot${query}`);
         if (!response.ok) return;
 
         const data = await response.json();
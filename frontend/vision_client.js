@@ -12,6 +12,10 @@ const statusOverlay = document.getElementById('statusOverlay');
 const errorBox = document.getElementById('errorBox');
 
 let pc = null;
+// Sesión de visión: ?session=<id> en la URL o la que asigne el backend
+let visionSessionId = new URLSearchParams(window.location.search).get('session');
+// Conversación a la que este móvil da visión (?conversation=<id> en el QR)
+const visionConversationId = new URLSearchParams(window.location.search).get('conversation');
 
 function showError(msg) {
     errorBox.innerHTML = msg;
@@ -71,7 +75,9 @@ async function startStreaming() {
             method: 'POST',
             body: JSON.stringify({
                 sdp: pc.localDescription.sdp,
-                type: pc.localDescription.type
+                type: pc.localDescription.type,
+                session_id: visionSessionId,
+                conversation_id: visionConversationId
             }),
             headers: {
                 'Content-Type': 'application/json',
@@ -92,6 +98,7 @@ async function startStreaming() {
         }
 
         await pc.setRemoteDescription(new RTCSessionDescription(answer));
+        visionSessionId = answer.session_id || visionSessionId;
 
         statusOverlay.textContent = "📡 EN VIVO";
         statusOverlay.style.background = "#10b981";
@@ -134,7 +141,8 @@ resizeCanvas();
 
 async function pollAnnotations() {
     try {
-        const response = await fetch(`${API_URL}/api/vision/annotations`);
+        const query = visionSessionId ? `?session_id=${encodeURIComponent(visionSessionId)}` : '';
+        const response = await fetch(`${API_URL}/api/vision/annotations${query}`);
         if (!response.ok) return;
         
         const data = await response.json();
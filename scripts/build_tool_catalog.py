@@ -0,0 +1,18 @@
+"""
+Regenera backend/tools/catalog.json a partir de las clases de tools.
+
+Ejecutar tras añadir un tool o cambiar su descripción/parámetros:
+
+    python scripts/build_tool_catalog.py
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tools.registry import write_catalog, CATALOG_PATH
+
+if __name__ == "__main__":
+    count = write_catalog()
+    print(f"Catálogo actualizado: {count} tools -> {CATALOG_PATH}")
@@ -0,0 +1,97 @@
+"""
+Benchmark del overhead por iteración del ciclo Plan & Act.
+
+Mide lo que AgentCore hace antes de cada llamada al LLM (ensamblar el
+prompt y el catálogo de tools), sin llamar a ningún modelo.
+
+    python tests/bench_agent_loop.py [iteraciones]
+"""
+
+import sys
+import os
+import time
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+logging.disable(logging.CRITICAL)
+
+from agent.core import AgentCore
+from agent.llm_provider import LLMProvider
+from tools import get_all_tools
+
+
+class NullLLM(LLMProvider):
+    """Proveedor que nunca se llama (solo para construir el agente)"""
+
+    def __init__(self):
+        super().__init__("null")
+
+    async def chat(self, messages, tools=None, temperature=0.7, max_tokens=4000, stream=False):
+        raise NotImplementedError
+
+    async def chat_stream(self, messages, tools=None, temperature=0.7, max_tokens=4000):
+        raise NotImplementedError
+
+
+def legacy_tools(agent: AgentCore):
+    """Reconstrucción completa del catálogo (comportamiento anterior)"""
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": d["name"],
+                "description": d["description"],
+                "parameters": d["parameters"]
+            }
+        }
+        for d in agent.tool_registry.get_all_definitions()
+    ]
+
+
+def main(iterations: int = 2000):
+    agent = AgentCore(NullLLM())
+    for tool in get_all_tools():
+        agent.register_tool(tool)
+
+    conversation_id = "bench"
+    for i in range(20):
+        agent.context_manager.add_message("user", f"mensaje {i} " * 20, conversation_id)
+        agent.context_manager.add_message("assistant", f"respuesta {i} " * 40, conversation_id)
+
+    # Primera iteración: importa vision_manager y serializa el catálogo
+    agent._prepare_messages_for_llm(conversation_id)
+    agent._get_tools_for_llm()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        legacy_tools(agent)
+    legacy_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        agent._get_tools_for_llm()
+    cached_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        agent._get_state_message()
+    prompt_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        agent._prepare_messages_for_llm(conversation_id)
+    prepare_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    rows = [
+        (f"tools reconstruidos ({len(agent.tool_registry.tools)})", legacy_ms),
+        (f"tools cacheados (v{agent.tool_registry.version})", cached_ms),
+        ("mensaje de estado", prompt_ms),
+        ("mensajes preparados (40 msgs)", prepare_ms),
+    ]
+    for label, value in rows:
+        print(f"{label:<32} {value:.4f} ms/iter")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,101 @@
+"""
+Benchmark de la salida restringida (JSON schema) de OllamaProvider.
+
+Envía el conjunto de peticiones etiquetadas de bench_tool_selection a un
+Ollama local, con y sin `format`, y clasifica cada respuesta:
+
+- tool válido: llamada a un tool existente con los argumentos requeridos
+- fallback: tool call recuperado del texto por el parser de AgentCore
+- fallo de parseo: el texto parece un tool call pero no se puede interpretar
+- reintento: la respuesta obligaría a otra iteración (tool inexistente,
+  argumentos incompletos o fallo de parseo)
+
+Requiere Ollama en ejecución:
+
+    python tests/bench_constrained_output.py [modelo] [url]
+"""
+
+import sys
+import os
+import time
+import asyncio
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+logging.disable(logging.CRITICAL)
+
+from agent.core import ToolRegistry
+from agent.llm_provider import OllamaProvider, Message
+from agent.prompts import get_system_prompt
+from agent.tool_call_parser import extract_tool_calls
+from tools import get_all_tools
+from bench_tool_selection import QUERIES
+
+
+def classify(response, definitions):
+    """Clasifica una respuesta del LLM"""
+    tool_calls = response.tool_calls
+    fallback = False
+    if not tool_calls and response.content:
+        tool_calls, _ = extract_tool_calls(response.content)
+        fallback = bool(tool_calls)
+        if not tool_calls and '"name"' in response.content:
+            return "parse_failure"
+
+    if not tool_calls:
+        return "answer"
+
+    for tool_call in tool_calls:
+        definition = definitions.get(tool_call.name)
+        if definition is None:
+            return "unknown_tool"
+        required = definition["parameters"].get("required", [])
+        if any(arg not in (tool_call.arguments or {}) for arg in required):
+            return "missing_arguments"
+    return "fallback" if fallback else "valid_tool"
+
+
+async def run(llm, tools, definitions):
+    counts = {}
+    correct = 0
+    start = time.perf_counter()
+    for query, expected in QUERIES:
+        response = await llm.chat(
+            [Message(role="system", content=get_system_prompt()), Message(role="user", content=query)],
+            tools=tools,
+            temperature=0.0,
+            max_tokens=512
+        )
+        kind = classify(response, definitions)
+        counts[kind] = counts.get(kind, 0) + 1
+        if response.tool_calls and response.tool_calls[0].name == expected:
+            correct += 1
+    return counts, correct, time.perf_counter() - start
+
+
+async def main(model: str = "llama3.2:latest", base_url: str = "http://localhost:11434"):
+    registry = ToolRegistry()
+    for tool in get_all_tools():
+        registry.register(tool)
+    tools = registry.get_llm_tools()
+    definitions = {d["name"]: d for d in registry.get_all_definitions()}
+
+    print(f"{'modo':<14} {'válidos':>8} {'fallback':>9} {'fallos':>7} {'reintentos':>11} {'tool correcto':>14} {'s':>7}")
+    for label, constrained in (("libre", False), ("restringido", True)):
+        llm = OllamaProvider(model=model, base_url=base_url, constrained_output=constrained)
+        try:
+            counts, correct, elapsed = await run(llm, tools, definitions)
+        except Exception as e:
+            print(f"No se pudo consultar Ollama en {base_url}: {e}")
+            return
+        failures = counts.get("parse_failure", 0)
+        retries = failures + counts.get("unknown_tool", 0) + counts.get("missing_arguments", 0)
+        print(
+            f"{label:<14} {counts.get('valid_tool', 0):>8} {counts.get('fallback', 0):>9} "
+            f"{failures:>7} {retries:>11} {correct:>10}/{len(QUERIES)} {elapsed:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*sys.argv[1:3]))
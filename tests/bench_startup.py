@@ -0,0 +1,62 @@
+"""
+Benchmark de arranque: import del módulo de tools y registro en el agente.
+
+Cada medición corre en un intérprete nuevo para que la caché de módulos de
+Python no falsee el resultado.
+
+    python tests/bench_startup.py [repeticiones]
+"""
+
+import os
+import subprocess
+import sys
+import statistics
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+SCENARIOS = {
+    # Registro perezoso: specs + catálogo, sin importar implementaciones
+    "lazy_registry": """
+import tools
+definitions = [tool.get_definition() for tool in tools.get_all_tools()]
+""",
+    # Comportamiento anterior: importar e instanciar todos los tools
+    "eager_import": """
+import tools
+definitions = [tools.load_tool_class(spec)().get_definition() for spec in tools.TOOL_SPECS]
+""",
+}
+
+TIMER = """
+import time, sys, logging
+logging.disable(logging.CRITICAL)
+sys.path.insert(0, {backend!r})
+start = time.perf_counter()
+{body}
+print(time.perf_counter() - start)
+print(len([m for m in ("playwright", "cv2", "numpy", "PIL") if m in sys.modules]))
+"""
+
+
+def run_scenario(body: str) -> tuple:
+    code = TIMER.format(backend=BACKEND_DIR, body=body)
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[0]), int(output[1])
+
+
+def main(repeat: int = 5):
+    print(f"{'escenario':<16} {'mediana (ms)':>14} {'mín (ms)':>10} {'libs pesadas':>14}")
+    for name, body in SCENARIOS.items():
+        samples = []
+        heavy = 0
+        for _ in range(repeat):
+            elapsed, heavy = run_scenario(body)
+            samples.append(elapsed * 1000)
+        print(f"{name:<16} {statistics.median(samples):>14.1f} {min(samples):>10.1f} {heavy:>14}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,154 @@
+"""
+Micro-benchmark del parser de tool calls escritos como texto.
+
+Compara el extractor anterior (busca cada '{' y recorre hasta la llave
+balanceada, cuatro regex por bloque) con el escáner de una pasada sobre
+salidas típicas de llama3.2 cuando no usa el campo nativo `tool_calls`,
+más dos casos largos: código con muchas llaves y una salida truncada en
+la que el modelo repite llamadas sin cerrarlas (cuadrática en el anterior).
+
+    python tests/bench_tool_call_parser.py [repeticiones]
+"""
+
+import sys
+import os
+import re
+import json
+import time
+import uuid
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+logging.disable(logging.CRITICAL)
+
+from agent.llm_provider import ToolCall
+from agent.tool_call_parser import extract_tool_calls, ToolCallStreamParser
+
+# (salida del modelo, tools esperados)
+OUTPUTS = [
+    ('{"name": "execute_command", "parameters": {"command": "aws ec2 describe-instances --region us-east-1"}}',
+     ["execute_command"]),
+    ('<thought>El usuario quiere ver los archivos</thought>\n{"name": "list_directory", "arguments": {"path": "."}}',
+     ["list_directory"]),
+    ("{'name': 'read_file', 'arguments': {'path': '/etc/hosts'}}",
+     ["read_file"]),
+    ('{""name": "git_status", "arguments": {}}',
+     ["git_status"]),
+    ('{"name": "nagios_get_alerts", "parameters": {"host": "web01",}};\n{"name": "zabbix_get_alerts", "parameters": {}}',
+     ["nagios_get_alerts", "zabbix_get_alerts"]),
+    ('Para contar las líneas usaré awk:\n{"name": "execute_command", "arguments": {"command": "awk \'{print $1}\' access.log | sort | uniq -c"}}',
+     ["execute_command"]),
+    ('{"name": "write_file", "arguments": {"path": "run.sh", "content": "if [ -z \\"$1\\" ]; then echo \\"}\\"; fi"}}',
+     ["write_file"]),
+    ('```json\n{"name": "browser", "arguments": {"action": "search", "query": "precio instancias t3.micro"}}\n```',
+     ["browser"]),
+    ('{"name": "http_request", "arguments": {"url": "https://api.example.com", "method": "GET", "verify": False}}',
+     ["http_request"]),
+    ('Claro, aquí tienes el resumen del estado de los servidores. Todo funciona correctamente.',
+     []),
+]
+
+# Respuesta larga: código con muchas llaves antes del tool call
+LONG_OUTPUT = (
+    "Este es el script propuesto:\n```js\n"
+    + "function f(x) { if (x) { return {a: {b: x}}; } }\n" * 400
+    + "```\n"
+    + '{"name": "write_file", "arguments": {"path": "f.js", "content": "function f(x) { return x; }"}}'
+)
+
+# Respuesta truncada (max_tokens) con llamadas repetidas sin cerrar
+TRUNCATED_OUTPUT = '{"name": "execute_command", "arguments": {"command": "ls -la /var/log", ' * 300
+
+
+def legacy_fuzzy_json_parse(s):
+    try:
+        return json.loads(s)
+    except Exception:
+        pass
+    try:
+        fixed = re.sub(r'""([^"]+)":', r'"\1":', s)
+        fixed = re.sub(r"'([^']+)'\s*:", r'"\1":', fixed)
+        fixed = re.sub(r':\s*\'([^\']*)\'', r': "\1"', fixed)
+        fixed = re.sub(r',\s*([\]\}])', r'\1', fixed)
+        return json.loads(fixed)
+    except Exception:
+        return None
+
+
+def legacy_extract(content):
+    """Extractor anterior de AgentCore._extract_tool_calls_from_content"""
+    tool_calls = []
+    potential_blocks = []
+    brace_start_indices = [m.start() for m in re.finditer(r'\{', content)]
+    last_end = -1
+
+    for start in brace_start_indices:
+        if start < last_end:
+            continue
+        snippet = content[start:start + 100]
+        if not ('"name"' in snippet or "'name'" in snippet):
+            continue
+        depth = 0
+        for i in range(start, len(content)):
+            if content[i] == '{':
+                depth += 1
+            elif content[i] == '}':
+                depth -= 1
+                if depth == 0:
+                    potential_blocks.append(content[start:i + 1])
+                    last_end = i + 1
+                    break
+
+    for block in potential_blocks:
+        data = legacy_fuzzy_json_parse(block)
+        if data and isinstance(data, dict) and "name" in data:
+            tool_calls.append(ToolCall(
+                id=f"call_{uuid.uuid4().hex[:8]}",
+                name=data["name"],
+                arguments=data.get("arguments") or data.get("parameters") or {}
+            ))
+    return tool_calls
+
+
+def streamed(content, chunk_size=8):
+    parser = ToolCallStreamParser()
+    for i in range(0, len(content), chunk_size):
+        parser.feed(content[i:i + chunk_size])
+    return parser.finish()
+
+
+def accuracy(extract):
+    hits = 0
+    for output, expected in OUTPUTS:
+        if [tc.name for tc in extract(output)] == expected:
+            hits += 1
+    return hits
+
+
+def timed(func, content, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(content)
+    return (time.perf_counter() - start) * 1e6 / repeat
+
+
+def main(repeat: int = 2000):
+    implementations = [
+        ("anterior", legacy_extract),
+        ("escáner", lambda c: extract_tool_calls(c)[0]),
+        ("escáner (stream 8)", streamed),
+    ]
+
+    print(f"{'parser':<20} {'acierto':>8} {'µs/salida':>10} {'µs código':>10} {'µs truncada':>12}")
+    long_repeat = max(repeat // 200, 3)
+    for label, func in implementations:
+        hits = accuracy(func)
+        per_output = sum(timed(func, output, repeat) for output, _ in OUTPUTS) / len(OUTPUTS)
+        code_us = timed(func, LONG_OUTPUT, long_repeat)
+        truncated_us = timed(func, TRUNCATED_OUTPUT, long_repeat)
+        print(f"{label:<20} {hits:>5}/{len(OUTPUTS)} {per_output:>10.1f} {code_us:>10.1f} {truncated_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,105 @@
+"""
+Benchmark de la selección de tools por petición.
+
+Compara el catálogo completo con el subconjunto elegido por el índice BM25
+para un conjunto de peticiones etiquetadas: tokens de prompt estimados
+(caracteres / 4), latencia de selección y acierto (el tool esperado está
+en el subconjunto enviado).
+
+    python tests/bench_tool_selection.py [top_k]
+"""
+
+import sys
+import os
+import json
+import time
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+logging.disable(logging.CRITICAL)
+
+from agent.core import ToolRegistry, AgentConfig
+from tools import get_all_tools
+
+# (petición, tool esperado)
+QUERIES = [
+    ("lee el archivo config.yaml", "read_file"),
+    ("muéstrame el contenido de /etc/hosts", "read_file"),
+    ("crea un archivo notas.txt con la lista de tareas", "write_file"),
+    ("lista los archivos de la carpeta /tmp", "list_directory"),
+    ("busca todos los archivos *.py del proyecto", "search_files"),
+    ("borra el directorio build", "delete_file"),
+    ("qué tamaño y permisos tiene report.pdf", "get_file_info"),
+    ("ejecuta el script deploy.sh", "run_script"),
+    ("instala el paquete requests con pip", "install_package"),
+    ("cuál es el estado del repositorio git", "git_status"),
+    ("muéstrame los cambios sin commitear", "git_diff"),
+    ("haz commit de los cambios con el mensaje fix", "git_commit"),
+    ("enséñame el historial de commits", "git_log"),
+    ("haz una petición GET a la API https://api.example.com/status", "http_request"),
+    ("visita la página de python.org y toma un screenshot", "browser"),
+    ("qué ves en la cámara", "get_visual_context"),
+    ("señala la taza en la pantalla", "point_to_object"),
+    ("hay alertas activas en Zabbix", "zabbix_get_alerts"),
+    ("lanza el job de backup en Rundeck", "rundeck_run_job"),
+    ("qué jobs hay disponibles en Rundeck", "rundeck_list_jobs"),
+    ("revisa las alertas críticas de Nagios", "nagios_get_alerts"),
+    ("dame recomendaciones de optimización de costos de estas instancias", "analyze_cloud_resources"),
+    ("lista mis instancias de Oracle Cloud", "oci_list_instances"),
+    ("qué servidores EC2 tengo en AWS", "aws_list_instances"),
+    ("servicios con problemas en Checkmk", "checkmk_get_alerts"),
+    ("lista los hosts monitoreados en checkmk", "checkmk_list_hosts"),
+    ("ejecuta la consulta SQL select * from ventas en Dremio", "dremio_query"),
+    ("qué datasets hay en el catálogo de Dremio", "dremio_list_catalog"),
+]
+
+
+def estimate_tokens(tools) -> int:
+    return len(json.dumps(tools, ensure_ascii=False)) // 4
+
+
+def main(top_k: int = 6):
+    registry = ToolRegistry()
+    for tool in get_all_tools():
+        registry.register(tool)
+    core_tools = AgentConfig().core_tools
+
+    full_tokens = estimate_tokens(registry.get_llm_tools())
+    registry.select_tools("warm up", top_k, core_tools)  # construye el índice
+
+    hits = 0
+    misses = 0
+    sent_tokens = 0
+    sent_tools = 0
+    elapsed = 0.0
+    failures = []
+
+    for query, expected in QUERIES:
+        start = time.perf_counter()
+        names = registry.select_tools(query, top_k, core_tools)
+        elapsed += time.perf_counter() - start
+
+        tools = registry.get_llm_tools(names)
+        sent_tokens += estimate_tokens(tools)
+        sent_tools += len(tools)
+        if names is None:
+            misses += 1
+        if names is None or expected in names:
+            hits += 1
+        else:
+            failures.append((query, expected, names))
+
+    total = len(QUERIES)
+    print(f"tools registrados:        {len(registry.tools)} (top_k={top_k}, básicos={len(core_tools)})")
+    print(f"tokens catálogo completo: {full_tokens}")
+    print(f"tokens medios enviados:   {sent_tokens // total} ({sent_tools / total:.1f} tools)")
+    print(f"reducción de prompt:      {100 * (1 - sent_tokens / (full_tokens * total)):.1f}%")
+    print(f"latencia de selección:    {elapsed * 1e6 / total:.1f} µs/petición")
+    print(f"acierto:                  {hits}/{total} ({100 * hits / total:.1f}%), sin coincidencias: {misses}")
+    for query, expected, names in failures:
+        print(f"  fallo: {query!r} -> esperado {expected}, enviado {names}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6)
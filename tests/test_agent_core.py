@@ -0,0 +1,145 @@
+"""
+Tests unitarios de AgentCore con un LLM simulado (sin red)
+"""
+
+import sys
+import os
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.core import AgentCore, AgentConfig, ToolRegistry
+from agent.llm_provider import LLMProvider, LLMResponse, ToolCall
+
+
+class ScriptedLLM(LLMProvider):
+    """LLM que responde con una lista de respuestas predefinidas"""
+
+    def __init__(self, responses=None, model: str = "scripted"):
+        super().__init__(model)
+        self.responses = list(responses or [])
+        self.calls = []
+
+    async def chat(self, messages, tools=None, temperature=0.7, max_tokens=4000, stream=False):
+        self.calls.append({"messages": messages, "tools": tools})
+        if self.responses:
+            return self.responses.pop(0)
+        return LLMResponse(content="listo")
+
+    async def chat_stream(self, messages, tools=None, temperature=0.7, max_tokens=4000):
+        yield "listo"
+
+
+class EchoTool:
+    """Tool mínimo para los tests"""
+
+    category = "test"
+
+    def __init__(self, name: str = "echo"):
+        self.name = name
+        self.description = f"Tool de prueba {name}"
+        self.calls = 0
+
+    async def execute(self, **kwargs):
+        self.calls += 1
+        return {"success": True, "echo": kwargs}
+
+    def get_definition(self):
+        return {
+            "name": self.name,
+            "description": self.description,
+            "parameters": {"type": "object", "properties": {"text": {"type": "string"}}}
+        }
+
+
+async def collect(generator):
+    return [event async for event in generator]
+
+
+def make_agent(responses=None, **config) -> AgentCore:
+    agent = AgentCore(ScriptedLLM(responses), AgentConfig(**config))
+    agent.register_tool(EchoTool())
+    return agent
+
+
+def test_tool_catalog_cached_until_register():
+    """El catálogo serializado se reutiliza hasta el siguiente register"""
+    registry = ToolRegistry()
+    registry.register(EchoTool("a"))
+
+    first = registry.get_llm_tools()
+    assert registry.get_llm_tools() is first
+    assert first[0]["function"]["name"] == "a"
+
+    version = registry.version
+    registry.register(EchoTool("b"))
+    assert registry.version == version + 1
+
+    second = registry.get_llm_tools()
+    assert second is not first
+    assert [t["function"]["name"] for t in second] == ["a", "b"]
+
+
+def test_state_message_reused_between_iterations():
+    """El mensaje de estado no se reconstruye si el estado visual no cambia"""
+    agent = make_agent()
+    assert agent._get_state_message() is agent._get_state_message()
+
+
+@pytest.mark.asyncio
+async def test_prompt_prefix_is_stable_across_iterations():
+    """System prompt e historial forman un prefijo fijo; el estado va al final"""
+    agent = make_agent([
+        LLMResponse(content="", tool_calls=[ToolCall(id="c1", name="echo", arguments={})],
+                    usage={"prompt_tokens": 900, "completion_tokens": 10, "total_tokens": 910}),
+        LLMResponse(content="Hecho", usage={"prompt_tokens": 40, "completion_tokens": 5, "total_tokens": 45}),
+    ], autonomy_level="full")
+
+    events = await collect(agent.process_message("hola", "conv_prefix"))
+    first, second = [call["messages"] for call in agent.llm.calls]
+
+    assert first[0].content == agent.system_prompt
+    assert first[-1].role == "system" and "Estado Visual" in first[-1].content
+    # Todo lo enviado en la 1ª llamada (salvo el estado final) es prefijo de la 2ª
+    assert [(m.role, m.content) for m in first[:-1]] == [(m.role, m.content) for m in second[:len(first) - 1]]
+
+    assert events[-1]["prompt_eval_tokens"] == [900, 40]
+    assert agent.get_loop_stats()["last_prompt_eval_tokens"] == 40
+
+
+@pytest.mark.asyncio
+async def test_tool_call_then_answer():
+    """Ciclo Plan & Act: tool call, resultado y respuesta final"""
+    agent = make_agent([
+        LLMResponse(content="", tool_calls=[ToolCall(id="c1", name="echo", arguments={"text": "hola"})]),
+        LLMResponse(content="Hecho"),
+    ], autonomy_level="full")
+
+    events = await collect(agent.process_message("di hola", "conv_1"))
+    types = [e["type"] for e in events]
+
+    assert "tool_result" in types
+    assert events[-2]["type"] == "message"
+    assert events[-2]["content"] == "Hecho"
+    assert events[-1]["iterations"] == 2
+    assert agent.get_loop_stats()["iterations"] == 2
+
+
+@pytest.mark.asyncio
+async def test_tools_subset_per_turn_with_fallback():
+    """Se envían solo los tools relevantes; si el LLM pide otro, el resto del turno va completo"""
+    agent = make_agent([
+        LLMResponse(content="", tool_calls=[ToolCall(id="c1", name="other", arguments={})]),
+        LLMResponse(content="Hecho"),
+    ], autonomy_level="full", tool_selection_top_k=1, core_tools=[])
+    agent.register_tool(EchoTool("other"))
+    agent.register_tool(EchoTool("third"))
+
+    await collect(agent.process_message("usa el tool de prueba echo", "conv_sel"))
+    first, second = [call["tools"] for call in agent.llm.calls]
+
+    assert [t["function"]["name"] for t in first] == ["echo"]
+    assert len(second) == 3
+    stats = agent.get_loop_stats()
+    assert stats["tool_selection_misses"] == 1
+    assert stats["last_tools_sent"] == 3
@@ -0,0 +1,107 @@
+"""
+Tests de las aprobaciones en conjunto (varios tools pendientes en un turno)
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.llm_provider import LLMResponse, ToolCall
+from test_agent_core import EchoTool, collect, make_agent
+
+
+class SlowTool(EchoTool):
+    """Tool con metadatos de efectos que tarda y cuenta ejecuciones simultáneas"""
+
+    running = 0
+    max_running = 0
+
+    def __init__(self, name: str, category: str, read_only: bool = False, invalidates=()):
+        super().__init__(name)
+        self.category = category
+        self.read_only = read_only
+        self.invalidates = invalidates
+
+    async def execute(self, **kwargs):
+        self.calls += 1
+        SlowTool.running += 1
+        SlowTool.max_running = max(SlowTool.max_running, SlowTool.running)
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            SlowTool.running -= 1
+        return {"success": True, "tool": self.name}
+
+
+def make_supervised_agent(responses):
+    SlowTool.running = SlowTool.max_running = 0
+    agent = make_agent(responses, autonomy_level="supervised")
+    agent.register_tool(SlowTool("aws_list", "cloud", read_only=True))
+    agent.register_tool(SlowTool("nagios_alerts", "observability", read_only=True))
+    agent.register_tool(SlowTool("rundeck_run", "automation", invalidates=("automation", "observability")))
+    agent.register_tool(SlowTool("run_command", "command_execution", invalidates=("*",)))
+    return agent
+
+
+def call(call_id, name):
+    return ToolCall(id=call_id, name=name, arguments={"id": call_id})
+
+
+@pytest.mark.asyncio
+async def test_gated_calls_are_approved_as_one_set_and_run_concurrently():
+    agent = make_supervised_agent([
+        LLMResponse(content="", tool_calls=[call("c1", "aws_list"), call("c2", "nagios_alerts"), call("c3", "aws_list")]),
+        LLMResponse(content="Todo en orden")
+    ])
+
+    events = await collect(agent.process_message("estado de la plataforma", "c1"))
+    approval = [e for e in events if e["type"] == "approval_required"]
+    assert len(approval) == 1
+    assert [item["tool_call_id"] for item in approval[0]["approvals"]] == ["c1", "c2", "c3"]
+
+    events = await collect(agent.process_approval("c1", True))
+    assert [e["tool_call_id"] for e in events if e["type"] == "tool_result"] == ["c1", "c2", "c3"]
+    assert events[-2]["content"] == "Todo en orden"
+    # Una respuesta y dos llamadas al LLM en total (antes: una por tool)
+    assert len(agent.llm.calls) == 2
+    assert SlowTool.max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_partial_approval_rejects_the_rest():
+    agent = make_supervised_agent([
+        LLMResponse(content="", tool_calls=[call("c1", "run_command"), call("c2", "rundeck_run"), call("c3", "aws_list")]),
+        LLMResponse(content="Solo se consultó AWS")
+    ])
+
+    await collect(agent.process_message("reinicia y consulta", "c1"))
+    events = await collect(agent.process_approval("c1", True, tool_call_ids=["c3"]))
+
+    results = {e["tool_call_id"]: e["success"] for e in events if e["type"] == "tool_result"}
+    assert results == {"c1": False, "c2": False, "c3": True}
+    assert agent.tool_registry.get("run_command").calls == 0
+    assert agent.tool_registry.get("rundeck_run").calls == 0
+    assert agent.tool_registry.get("aws_list").calls == 1
+    tool_messages = [m for m in agent.llm.calls[-1]["messages"] if m.role == "tool"]
+    assert [m.tool_call_id for m in tool_messages] == ["c1", "c2", "c3"]
+
+
+def test_only_independent_approved_calls_share_a_wave():
+    agent = make_supervised_agent([])
+    calls = [
+        call("c1", "aws_list"), call("c2", "nagios_alerts"),  # consultas: juntas
+        call("c3", "rundeck_run"),  # invalida observability: después de c2
+        call("c4", "aws_list"),  # cloud no se ve afectado por rundeck_run
+        call("c5", "run_command"),  # invalida todo: sola
+        call("c6", "echo")  # efectos sin declarar: sola
+    ]
+    approvals = {tc.id: True for tc in calls}
+
+    waves = agent._approved_waves(calls, approvals)
+    assert [[tc.id for tc in wave] for wave in waves] == [["c1", "c2"], ["c3", "c4"], ["c5"], ["c6"]]
+
+    # Sin aprobación explícita (tools no protegidos) todo va en orden
+    assert len(agent._approved_waves(calls, {})) == len(calls)
@@ -0,0 +1,106 @@
+"""
+Tests del endpoint de lotes (POST /api/chat/batch)
+"""
+
+import sys
+import os
+import json
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from fastapi import HTTPException
+from api.models import BatchChatRequest
+from api.routes.chat import send_batch
+from agent.llm_provider import LLMResponse
+from storage import ConversationStorage
+from test_agent_core import ScriptedLLM, make_agent
+
+
+class SlowEchoLLM(ScriptedLLM):
+    """Tarda `delay` segundos y responde con el último mensaje del usuario"""
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def chat(self, messages, tools=None, temperature=0.7, max_tokens=4000, stream=False):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        last = [m for m in messages if m.role == "user"][-1]
+        return LLMResponse(content=f"informe: {last.content}")
+
+
+async def run_batch(body, agent, storage):
+    response = await send_batch(BatchChatRequest(**body), agent, storage)
+    assert response.media_type == "application/x-ndjson"
+    return [json.loads(line) async for line in response.body_iterator]
+
+
+@pytest.mark.asyncio
+async def test_batch_runs_template_items_concurrently(tmp_path):
+    agent = make_agent()
+    agent.llm = SlowEchoLLM(0.1)
+    storage = ConversationStorage(base_dir=str(tmp_path))
+
+    lines = await run_batch({
+        "template": "Informe del equipo {team}",
+        "items": [{"id": team, "variables": {"team": team}} for team in "abcdef"],
+        "max_concurrency": 3
+    }, agent, storage)
+
+    items, summary = lines[:-1], lines[-1]
+    assert sorted(line["id"] for line in items) == list("abcdef")
+    assert all(line["status"] == "ok" for line in items)
+    assert {line["message"] for line in items} == {f"informe: Informe del equipo {t}" for t in "abcdef"}
+    assert agent.llm.max_in_flight == 3
+
+    assert summary["type"] == "summary"
+    assert summary["succeeded"] == 6 and summary["failed"] == 0
+    # 6 elementos de 100 ms con 3 en paralelo: ~200 ms, no 600
+    assert summary["wall_ms"] < 450
+    assert summary["speedup"] > 1.5
+
+    conversation_id = items[0]["conversation_id"]
+    assert [m.role for m in storage.get_messages(conversation_id)] == ["user", "assistant"]
+
+
+@pytest.mark.asyncio
+async def test_batch_item_errors_and_shared_conversation_order(tmp_path):
+    agent = make_agent()
+    agent.llm = SlowEchoLLM(0.01)
+    storage = ConversationStorage(base_dir=str(tmp_path))
+
+    lines = await run_batch({
+        "template": "Región {region}",
+        "items": [
+            {"message": "primero", "conversation_id": "shared"},
+            {"variables": {"equipo": "x"}},
+            {"message": "segundo", "conversation_id": "shared"}
+        ]
+    }, agent, storage)
+
+    by_index = {line["index"]: line for line in lines[:-1]}
+    assert by_index[1]["status"] == "error" and "region" in by_index[1]["error"]
+    assert lines[-1]["failed"] == 1 and lines[-1]["succeeded"] == 2
+    # Los elementos de una misma conversación se ejecutan en orden
+    assert [m.content for m in storage.get_messages("shared") if m.role == "user"] == ["primero", "segundo"]
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_too_many_items(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_BATCH_MAX_ITEMS", "2")
+    with pytest.raises(HTTPException) as error:
+        await send_batch(
+            BatchChatRequest(items=[{"message": "a"}] * 3),
+            make_agent(),
+            ConversationStorage(base_dir=str(tmp_path))
+        )
+    assert error.value.status_code == 413
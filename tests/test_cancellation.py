@@ -0,0 +1,118 @@
+"""
+Tests de la cancelación de ejecuciones y el deadline propagado
+"""
+
+import sys
+import os
+import asyncio
+import time
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.cancellation import RunScope, time_left, CANCEL_CLIENT
+from agent.llm_provider import LLMResponse, ToolCall
+from tools.command_tools import ExecuteCommandTool
+from test_agent_core import ScriptedLLM, collect, make_agent
+
+
+class HangingLLM(ScriptedLLM):
+    """LLM que no responde hasta que se cancela la llamada"""
+
+    def __init__(self, responses=None):
+        super().__init__(responses)
+        self.started = asyncio.Event()
+        self.interrupted = False
+
+    async def chat(self, messages, tools=None, temperature=0.7, max_tokens=4000, stream=False):
+        if self.responses:
+            return await super().chat(messages, tools, temperature, max_tokens, stream)
+        self.started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.interrupted = True
+            raise
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.asyncio
+async def test_cancel_interrupts_llm_call_and_consumer_continues():
+    agent = make_agent()
+    agent.llm = HangingLLM()
+
+    run = asyncio.ensure_future(collect(agent.process_message("hola", "c1")))
+    await asyncio.wait_for(agent.llm.started.wait(), 1)
+    assert agent.runs.active("c1")[0]["conversation_id"] == "c1"
+
+    assert agent.cancel_run("c1") == 1
+    events = await asyncio.wait_for(run, 1)
+
+    assert agent.llm.interrupted
+    assert events[-2] == {"type": "cancelled", "reason": CANCEL_CLIENT, "message": "Ejecución cancelada por el usuario"}
+    assert events[-1]["cancelled"] and events[-1]["iterations"] == 1
+    assert agent.runs.active() == []
+    assert agent.get_loop_stats()["runs"]["cancelled"] == 1
+    # La tarea consumidora no queda cancelada
+    assert not run.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_cancel_kills_command_subprocess_group(tmp_path):
+    pidfile = tmp_path / "pid"
+    command = f"sleep 30 & echo $! > {pidfile}; wait"
+    agent = make_agent([
+        LLMResponse(content="", tool_calls=[ToolCall(id="c1", name="execute_command", arguments={"command": command})])
+    ], autonomy_level="full", require_approval_for=[])
+    agent.register_tool(ExecuteCommandTool())
+
+    run = asyncio.ensure_future(collect(agent.process_message("duerme", "c1")))
+    for _ in range(100):
+        if pidfile.exists() and pidfile.read_text().strip():
+            break
+        await asyncio.sleep(0.02)
+    pid = int(pidfile.read_text())
+    assert process_alive(pid)
+
+    agent.cancel_run("c1")
+    events = await asyncio.wait_for(run, 2)
+
+    assert events[-2]["type"] == "cancelled"
+    await asyncio.sleep(0.1)
+    assert not process_alive(pid)
+
+
+@pytest.mark.asyncio
+async def test_time_left_follows_scope_deadline():
+    async def left(*args):
+        return time_left(*args)
+
+    assert time_left(5) == 5
+    scope = RunScope("c1", deadline=None)
+    assert await scope.step(left(5)) == 5 and await scope.step(left()) is None
+
+    scope = RunScope("c1", deadline=time.monotonic() + 1)
+    assert await scope.step(left(30)) <= 1
+    assert await scope.step(left(0.5)) == 0.5
+    assert time_left() is None
+
+
+@pytest.mark.asyncio
+async def test_cancel_interrupts_only_the_step_task():
+    scope = RunScope("c1")
+    asyncio.get_running_loop().call_later(0.01, scope.cancel)
+
+    with pytest.raises(asyncio.CancelledError):
+        await scope.step(asyncio.sleep(3600))
+    assert scope.task is None
+    # La tarea que consume no queda cancelada (sin Task.uncancel, Python 3.10)
+    await asyncio.sleep(0.01)
+    if hasattr(asyncio.Task, "cancelling"):
+        assert asyncio.current_task().cancelling() == 0
@@ -0,0 +1,108 @@
+"""
+Tests de la cascada de modelos (modelo rápido primero, escalado si falla)
+"""
+
+import sys
+import os
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.core import AgentCore, AgentConfig
+from agent.llm_provider import LLMResponse, ToolCall
+from agent.cascade import ModelCascade, escalation_reason, parse_cascade
+from test_agent_core import ScriptedLLM, EchoTool, collect
+
+
+def tool_call(name="echo"):
+    return LLMResponse(content="", tool_calls=[ToolCall(id="c1", name=name, arguments={"text": "x"})])
+
+
+def cascade_agent(small, big, **config):
+    agent = AgentCore(small, AgentConfig(autonomy_level="full", single_flight=False, concurrency_limit=False, **config))
+    agent.register_tool(EchoTool())
+    agent.cascade = ModelCascade(
+        [big],
+        routing_tier=config.get("cascade_routing_tier", 0),
+        synthesis_tier=config.get("cascade_synthesis_tier", 0)
+    )
+    return agent
+
+
+def test_escalation_reasons():
+    known = {"echo"}
+    assert escalation_reason(tool_call(), known) is None
+    assert escalation_reason(LLMResponse(content="La respuesta es 4"), known) is None
+    assert escalation_reason(tool_call("inventado"), known) == "unknown_tool"
+    assert escalation_reason(LLMResponse(content='{"name": "echo", "arguments": {'), known) == "unparsed_tool_call"
+    assert escalation_reason(LLMResponse(content='{"name": "otro", "arguments": {}}'), known) == "unknown_tool"
+    assert escalation_reason(LLMResponse(content="  "), known) == "empty"
+    assert escalation_reason(LLMResponse(content="No estoy seguro de qué hacer"), known) == "low_confidence"
+
+
+def test_parse_cascade_keeps_model_tags():
+    assert parse_cascade("ollama:qwen2.5:14b, openai:gpt-4o,") == [
+        {"provider": "ollama", "model": "qwen2.5:14b"},
+        {"provider": "openai", "model": "gpt-4o"}
+    ]
+    assert parse_cascade(None) == []
+
+
+@pytest.mark.asyncio
+async def test_unknown_tool_escalates_and_records_usage_per_model():
+    small = ScriptedLLM([tool_call("inventado"), LLMResponse(content="hecho")], model="small")
+    big = ScriptedLLM([tool_call("echo")], model="big")
+    agent = cascade_agent(small, big)
+
+    events = await collect(agent.process_message("eco", "conv"))
+
+    escalation = next(e for e in events if e["type"] == "escalation")
+    assert escalation["from"] == "small" and escalation["to"] == "big"
+    assert escalation["reason"] == "unknown_tool"
+    assert escalation["phase"] == "routing"
+    assert agent.tool_registry.get("echo").calls == 1
+    message = next(e for e in events if e["type"] == "message")
+    assert message["model"] == "small"  # la síntesis vuelve al nivel 0
+    assert events[-1]["usage"]["calls"] == 3
+
+    models = agent.usage_tracker.get_summary()["models"]
+    assert models["small"]["calls"] == 2 and models["big"]["calls"] == 1
+
+    stats = agent.get_llm_stats()["cascade"]
+    assert stats["iterations"] == {"routing": 1, "synthesis": 1}
+    assert stats["escalation_rate"] == 0.5
+    small_tier, big_tier = stats["tiers"]
+    assert small_tier["model"] == "small"
+    assert small_tier["reasons"] == {"unknown_tool": 1}
+    assert big_tier["accepted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_synthesis_can_start_on_larger_model():
+    small = ScriptedLLM([tool_call("echo")], model="small")
+    big = ScriptedLLM([LLMResponse(content="resumen final")], model="big")
+    agent = cascade_agent(small, big, cascade_synthesis_tier=1)
+
+    events = await collect(agent.process_message("eco", "conv"))
+
+    assert not [e for e in events if e["type"] == "escalation"]
+    message = next(e for e in events if e["type"] == "message")
+    assert message["content"] == "resumen final"
+    assert message["model"] == "big"
+    assert len(small.calls) == 1 and len(big.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_provider_error_escalates_and_last_tier_is_accepted():
+    class Broken(ScriptedLLM):
+        async def chat(self, *args, **kwargs):
+            raise ConnectionError("caído")
+
+    big = ScriptedLLM([LLMResponse(content="")], model="big")
+    agent = cascade_agent(Broken(model="small"), big)
+
+    events = await collect(agent.process_message("hola", "conv"))
+
+    assert [e["reason"] for e in events if e["type"] == "escalation"] == ["error"]
+    assert not [e for e in events if e["type"] == "error"]
+    assert agent.get_llm_stats()["cascade"]["tiers"][0]["errors"] == 1
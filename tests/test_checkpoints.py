@@ -0,0 +1,125 @@
+"""
+Tests de los checkpoints: aprobaciones y reinicios continúan donde se pararon
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.checkpoints import CheckpointStore, CHECKPOINT_APPROVAL, CHECKPOINT_RUNNING
+from agent.llm_provider import LLMResponse, ToolCall
+from test_agent_core import EchoTool, collect, make_agent
+
+
+class HangingTool(EchoTool):
+    """Tool que se queda colgado la primera vez (el proceso se para)"""
+
+    def __init__(self, name: str = "slow"):
+        super().__init__(name)
+        self.started = asyncio.Event()
+        self.hang = True
+
+    async def execute(self, **kwargs):
+        self.calls += 1
+        if self.hang:
+            self.started.set()
+            await asyncio.sleep(3600)
+        return {"success": True, "slow": kwargs}
+
+
+def gated_turn():
+    return LLMResponse(content="", tool_calls=[
+        ToolCall(id="c1", name="echo", arguments={"text": "a"}),
+        ToolCall(id="c2", name="danger", arguments={"text": "rm"}),
+        ToolCall(id="c3", name="echo", arguments={"text": "b"})
+    ])
+
+
+def make_gated_agent(responses, store):
+    agent = make_agent(responses, require_approval_for=["danger"])
+    agent.checkpoints = store
+    agent.register_tool(EchoTool("danger"))
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_approval_resumes_turn_without_extra_llm_call():
+    agent = make_gated_agent([gated_turn(), LLMResponse(content="Hecho")], CheckpointStore())
+    echo, danger = agent.tool_registry.get("echo"), agent.tool_registry.get("danger")
+
+    events = await collect(agent.process_message("limpia el directorio", "c1"))
+    assert [e["type"] for e in events] == ["thinking", "tool_call", "tool_result", "approval_required", "done"]
+    # La ejecución se pausa: ninguna llamada al LLM con el tool sin resultado
+    assert len(agent.llm.calls) == 1
+    assert agent.checkpoints.list(CHECKPOINT_APPROVAL)[0]["pending"] == ["danger", "echo"]
+
+    events = await collect(agent.process_approval("c1", True))
+    results = [e["tool_call_id"] for e in events if e["type"] == "tool_result"]
+    assert results == ["c2", "c3"]
+    assert events[-2]["content"] == "Hecho"
+    assert events[-1]["iterations"] == 2
+
+    assert len(agent.llm.calls) == 2
+    assert (echo.calls, danger.calls) == (2, 1)
+    # Sin mensaje vacío del usuario ni tool calls sin resultado
+    messages = agent.context_manager.get_messages("c1")
+    assert [m.content for m in messages if m.role == "user"] == ["limpia el directorio"]
+    assert [m.tool_call_id for m in messages if m.role == "tool"] == ["c1", "c2", "c3"]
+    assert agent.checkpoints.list() == []
+    assert "c1" not in agent.pending_approvals
+
+
+@pytest.mark.asyncio
+async def test_pending_approval_survives_restart(tmp_path):
+    db = str(tmp_path / "checkpoints.db")
+    before = make_gated_agent([gated_turn()], CheckpointStore(db))
+    await collect(before.process_message("limpia el directorio", "c1"))
+
+    # Proceso nuevo: contexto vacío y checkpoint solo en SQLite
+    after = make_gated_agent([LLMResponse(content="No se ha borrado nada")], CheckpointStore(db))
+    events = await collect(after.process_approval("c1", False))
+
+    rejected = next(e for e in events if e["type"] == "tool_result")
+    assert rejected["success"] is False and rejected["tool_call_id"] == "c2"
+    assert events[-2]["content"] == "No se ha borrado nada"
+    sent = after.llm.calls[0]["messages"]
+    assert [m.role for m in sent[1:-1]] == ["user", "assistant", "tool", "tool", "tool"]
+    assert after.tool_registry.get("echo").calls == 1  # solo "b"
+    assert after.tool_registry.get("danger").calls == 0
+    assert after.checkpoints.get_stats()["restored"] == 1
+    assert CheckpointStore(db).list() == []
+
+
+@pytest.mark.asyncio
+async def test_interrupted_run_resumes_without_repeating_tools(tmp_path):
+    db = str(tmp_path / "checkpoints.db")
+    turn = LLMResponse(content="", tool_calls=[
+        ToolCall(id="c1", name="echo", arguments={"text": "a"}),
+        ToolCall(id="c2", name="slow", arguments={"text": "b"})
+    ])
+    before = make_agent([turn], autonomy_level="full")
+    before.checkpoints = CheckpointStore(db)
+    before.register_tool(HangingTool())
+
+    run = asyncio.ensure_future(collect(before.process_message("inventario", "c1")))
+    await asyncio.wait_for(before.tool_registry.get("slow").started.wait(), 1)
+    run.cancel()  # el proceso se para con "slow" en curso
+    await asyncio.gather(run, return_exceptions=True)
+
+    after = make_agent([LLMResponse(content="Inventario listo")], autonomy_level="full")
+    after.checkpoints = CheckpointStore(db)
+    slow = HangingTool()
+    slow.hang = False
+    after.register_tool(slow)
+
+    assert after.has_checkpoint("c1", "inventario")
+    events = await collect(after.resume_run("c1"))
+
+    assert [e["tool_call_id"] for e in events if e["type"] == "tool_result"] == ["c2"]
+    assert events[-2]["content"] == "Inventario listo"
+    assert after.tool_registry.get("echo").calls == 0
+    assert len(after.llm.calls) == 1
+    assert after.checkpoints.load("c1", CHECKPOINT_RUNNING) is None
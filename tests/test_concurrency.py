@@ -0,0 +1,153 @@
+"""
+Tests del límite de concurrencia por proveedor, la cola por prioridad y los reintentos
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.core import AgentCore, AgentConfig
+from agent.llm_provider import LLMResponse, Message
+from agent.concurrency import (
+    PriorityLimiter,
+    LimitedLLMProvider,
+    LLMRateLimitError,
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    background_priority,
+    retry_after_seconds
+)
+from test_agent_core import ScriptedLLM, collect
+
+
+class Overloaded(Exception):
+    """Error con la forma de los SDK (status_code + response.headers)"""
+
+    def __init__(self, status_code=429, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": retry_after} if retry_after is not None else {}
+        self.response = type("Response", (), {"headers": headers})()
+
+
+class FlakyLLM(ScriptedLLM):
+    """Falla con los errores indicados y luego responde"""
+
+    def __init__(self, errors):
+        super().__init__()
+        self.errors = list(errors)
+
+    async def chat(self, messages, tools=None, temperature=0.7, max_tokens=4000, stream=False):
+        self.calls.append(messages)
+        if self.errors:
+            raise self.errors.pop(0)
+        return LLMResponse(content="ok", usage={"prompt_tokens": 1, "completion_tokens": 1})
+
+
+def prompt():
+    return [Message(role="user", content="hola")]
+
+
+@pytest.mark.asyncio
+async def test_interactive_requests_jump_background_queue():
+    limiter = PriorityLimiter(1)
+    order = []
+
+    async def worker(name, priority):
+        async with limiter.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    holder = asyncio.ensure_future(worker("primero", PRIORITY_INTERACTIVE))
+    await asyncio.sleep(0)
+    waiting = [asyncio.ensure_future(worker(name, priority)) for name, priority in (
+        ("fondo-1", PRIORITY_BACKGROUND),
+        ("fondo-2", PRIORITY_BACKGROUND),
+        ("usuario-1", PRIORITY_INTERACTIVE),
+        ("usuario-2", PRIORITY_INTERACTIVE)
+    )]
+    await asyncio.sleep(0)
+    stats = limiter.get_stats()
+    assert stats["queue_depth"] == 4
+    assert stats["queue_by_priority"] == {PRIORITY_INTERACTIVE: 2, PRIORITY_BACKGROUND: 2}
+
+    await asyncio.gather(holder, *waiting)
+    assert order == ["primero", "usuario-1", "usuario-2", "fondo-1", "fondo-2"]
+    assert limiter.get_stats()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_slot():
+    limiter = PriorityLimiter(1)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.sleep(0)
+
+    limiter.release()
+    assert limiter.active == 0
+    assert await asyncio.wait_for(limiter.acquire(), 0.1) == pytest.approx(0, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_background_priority_from_context():
+    limiter = PriorityLimiter(1)
+    await limiter.acquire()
+
+    async def queued():
+        async with limiter.slot():
+            pass
+
+    with background_priority():
+        task = asyncio.ensure_future(queued())
+    await asyncio.sleep(0)
+    assert limiter.get_stats()["queue_by_priority"] == {PRIORITY_BACKGROUND: 1}
+    limiter.release()
+    await task
+
+
+@pytest.mark.asyncio
+async def test_retries_overload_honouring_retry_after():
+    inner = FlakyLLM([Overloaded(429, retry_after="0.05"), Overloaded(503)])
+    llm = LimitedLLMProvider(inner, PriorityLimiter(2), base_delay=0.01)
+
+    response = await llm.chat(prompt())
+
+    assert response.content == "ok"
+    assert len(inner.calls) == 3
+    assert response.usage["queue_ms"] >= 50
+    stats = llm.get_stats()["concurrency"]
+    assert stats["retries"] == 2 and stats["overloaded"] == 2
+    assert retry_after_seconds(Overloaded(retry_after="Wed, 21 Oct 2015 07:28:00 GMT")) is None
+
+
+@pytest.mark.asyncio
+async def test_gives_up_with_rate_limit_error():
+    inner = FlakyLLM([Overloaded(429)] * 3)
+    llm = LimitedLLMProvider(inner, PriorityLimiter(1), max_retries=2, base_delay=0.001)
+    with pytest.raises(LLMRateLimitError):
+        await llm.chat(prompt())
+    assert len(inner.calls) == 3
+
+    # Errores que no son de sobrecarga no se reintentan
+    bad = FlakyLLM([Overloaded(400)])
+    with pytest.raises(Overloaded):
+        await LimitedLLMProvider(bad, PriorityLimiter(1)).chat(prompt())
+    assert len(bad.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_agent_reports_overload_and_exposes_queue_stats():
+    agent = AgentCore(FlakyLLM([Overloaded(429)] * 2), AgentConfig(llm_max_retries=1))
+    # SingleFlight -> límite de concurrencia -> proveedor
+    agent.llm.provider.base_delay = 0.001
+
+    events = await collect(agent.process_message("hola", "c1"))
+
+    error = next(e for e in events if e["type"] == "error")
+    assert "sobrecargado" in error["message"]
+    assert "concurrency" in agent.get_llm_stats()
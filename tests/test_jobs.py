@@ -0,0 +1,102 @@
+"""
+Tests de los jobs en segundo plano (cola persistente y workers)
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.cancellation import time_left
+from agent.concurrency import current_priority, PRIORITY_BACKGROUND
+from agent.jobs import JobQueue, JobRunner, JOB_QUEUED, JOB_DONE, JOB_CANCELLED
+from agent.llm_provider import LLMResponse, ToolCall
+from storage import ConversationStorage
+from test_agent_core import ScriptedLLM, collect, make_agent
+
+
+class PriorityLLM(ScriptedLLM):
+    """Registra la prioridad y el deadline con los que se llama al LLM"""
+
+    def __init__(self, responses=None):
+        super().__init__(responses)
+        self.priorities = []
+        self.deadlines = []
+
+    async def chat(self, messages, tools=None, temperature=0.7, max_tokens=4000, stream=False):
+        self.priorities.append(current_priority())
+        self.deadlines.append(time_left())
+        return await super().chat(messages, tools, temperature, max_tokens, stream)
+
+
+def test_queue_survives_restart_in_order(tmp_path):
+    db = str(tmp_path / "jobs.db")
+    queue = JobQueue(db)
+    first = queue.submit("c1", "inventario de AWS")
+    second = queue.submit("c2", "extracción de Dremio")
+    assert queue.position(second.id) == 2
+
+    claimed = queue.claim()
+    assert claimed.id == first.id and claimed.wait_seconds >= 0
+    queue.add_event(claimed, {"type": "thinking"})
+
+    # El proceso se para con el job en curso: al arrancar vuelve a la cola
+    restarted = JobQueue(db)
+    assert restarted.requeue_interrupted() == 1
+    assert restarted.get_stats()["queue_depth"] == 2
+    assert restarted.events(first.id) == []
+    assert restarted.claim().id == first.id
+
+    assert restarted.cancel_queued(second.id)
+    assert restarted.get(second.id).status == JOB_CANCELLED
+    assert restarted.claim() is None
+
+
+@pytest.mark.asyncio
+async def test_runner_executes_with_background_priority_and_saves_result(tmp_path):
+    agent = make_agent([
+        LLMResponse(content="", tool_calls=[ToolCall(id="c1", name="echo", arguments={"text": "us-east-1"})]),
+        LLMResponse(content="3 instancias en us-east-1")
+    ], autonomy_level="full", run_max_seconds=300)
+    agent.llm = PriorityLLM(agent.llm.responses)
+    storage = ConversationStorage(base_dir=str(tmp_path / "data"))
+    runner = JobRunner(agent, JobQueue(str(tmp_path / "jobs.db")), workers=1, storage=storage, max_seconds=0)
+
+    job = runner.submit("inv1", "inventario de instancias")
+    subscription = asyncio.ensure_future(collect(runner.subscribe(job.id)))
+    runner.start()
+    events = await asyncio.wait_for(subscription, 2)
+    await runner.stop()
+
+    assert [e["seq"] for e in events] == list(range(1, len(events) + 1))
+    assert events[-1]["type"] == "done"
+    assert agent.llm.priorities == [PRIORITY_BACKGROUND, PRIORITY_BACKGROUND]
+    # El job no hereda el tiempo máximo de las peticiones interactivas
+    assert agent.llm.deadlines == [None, None]
+
+    finished = runner.queue.get(job.id)
+    assert finished.status == JOB_DONE and finished.result == "3 instancias en us-east-1"
+    assert [m.role for m in storage.get_messages("inv1")] == ["user", "tool", "assistant"]
+
+    # Polling después de terminar: mismos eventos
+    assert runner.queue.events(job.id, after=len(events) - 1) == [events[-1]]
+    stats = runner.get_stats()
+    assert stats["completed"] == 1 and stats["queue_depth"] == 0
+    assert stats["by_status"] == {JOB_DONE: 1}
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_job_ends_subscription(tmp_path):
+    runner = JobRunner(make_agent(), JobQueue(str(tmp_path / "jobs.db")))
+    job = runner.submit("c1", "tarea larga")
+    subscription = asyncio.ensure_future(collect(runner.subscribe(job.id)))
+    await asyncio.sleep(0)
+
+    assert runner.cancel(job.id)
+    assert await asyncio.wait_for(subscription, 1) == []
+    assert runner.queue.get(job.id).status == JOB_CANCELLED
+    assert not runner.cancel(job.id)
+    assert runner.get_stats()["by_status"] == {JOB_CANCELLED: 1}
+    assert runner.queue.list(JOB_QUEUED) == []
@@ -0,0 +1,87 @@
+"""
+Tests de la reconfiguración en caliente del proveedor de LLM
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.core import AgentCore, AgentConfig
+from agent.llm_provider import LLMResponse, OllamaProvider
+from test_agent_core import ScriptedLLM, EchoTool, collect
+
+
+class GatedLLM(ScriptedLLM):
+    """LLM que espera una señal antes de responder y registra su cierre"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+        self.closed = False
+
+    async def chat(self, messages, tools=None, temperature=0.7, max_tokens=4000, stream=False):
+        self.calls.append({"messages": messages, "tools": tools})
+        await self.release.wait()
+        return LLMResponse(content="respuesta del anterior")
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_in_flight_run_finishes_on_old_provider():
+    old = GatedLLM()
+    agent = AgentCore(old, AgentConfig(single_flight=False, concurrency_limit=False))
+    agent.register_tool(EchoTool())
+    agent.pending_approvals["c1"] = {"tool_call": None}
+
+    run = asyncio.ensure_future(collect(agent.process_message("hola", "c1")))
+    while not old.calls:
+        await asyncio.sleep(0)
+
+    agent.reconfigure_llm("ollama", model="qwen2.5:7b")
+    assert isinstance(agent.llm, OllamaProvider)
+    assert not old.closed  # aún tiene una ejecución en curso
+
+    old.release.set()
+    events = await run
+    await asyncio.sleep(0)
+
+    messages = [e["content"] for e in events if e["type"] == "message"]
+    assert messages == ["respuesta del anterior"]
+    assert old.closed
+    # Conversaciones y aprobaciones pendientes se conservan
+    assert "c1" in agent.context_manager.conversations
+    assert "c1" in agent.pending_approvals
+    assert agent.config.model == "qwen2.5:7b"
+    await agent.llm.close()
+
+
+def test_failed_reconfigure_keeps_current_provider():
+    agent = AgentCore(ScriptedLLM(), AgentConfig())
+    current = agent.llm
+
+    with pytest.raises(ValueError):
+        agent.reconfigure_llm("openai", model="gpt-4")
+    with pytest.raises(ValueError):
+        agent.reconfigure_llm("desconocido")
+
+    assert agent.llm is current
+    assert agent.config.llm_provider == "ollama"
+
+
+@pytest.mark.asyncio
+async def test_ollama_swap_reuses_http_session():
+    agent = AgentCore(OllamaProvider(model="llama3.2", base_url="http://127.0.0.1:9"), AgentConfig())
+    session = await agent.llm._get_session()
+
+    agent.reconfigure_llm("ollama", model="qwen2.5:7b")
+    await asyncio.sleep(0)
+
+    assert agent.llm.provider is not None and agent.llm.model == "qwen2.5:7b"
+    assert await agent.llm._get_session() is session
+    assert not session.closed
+    await agent.llm.close()
@@ -0,0 +1,92 @@
+"""
+Tests de la detección de bucles y el presupuesto por ejecución
+"""
+
+import sys
+import os
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.llm_provider import LLMResponse, ToolCall
+from agent.loop_guard import LoopGuard, CYCLE_WARN, STOP_CYCLE, STOP_TOKENS
+from test_agent_core import collect, make_agent
+
+
+def call(name, text, call_id="c"):
+    return LLMResponse(content="", tool_calls=[ToolCall(id=call_id, name=name, arguments={"text": text})])
+
+
+def test_guard_detects_ping_pong_and_budget():
+    guard = LoopGuard(max_tokens=100)
+    a = [ToolCall(id="1", name="a", arguments={})]
+    b = [ToolCall(id="2", name="b", arguments={"x": 1})]
+
+    assert guard.end_iteration(a) is None
+    assert guard.end_iteration(b) is None
+    assert guard.end_iteration(a) is None
+    assert guard.end_iteration(b) == CYCLE_WARN
+    assert guard.end_iteration(a) == STOP_CYCLE
+
+    assert guard.budget_exceeded(99) is None
+    assert guard.budget_exceeded(100) == STOP_TOKENS
+
+
+def test_mutating_tool_resets_repeats():
+    guard = LoopGuard()
+    read = ToolCall(id="1", name="read", arguments={"path": "a"})
+    guard.record(read, {"success": True, "content": "x"}, read_only=True)
+    assert guard.lookup(read) == (True, {"success": True, "content": "x"})
+
+    guard.record(ToolCall(id="2", name="write", arguments={}), {"success": True}, read_only=False)
+    assert guard.lookup(read) == (False, None)
+
+
+@pytest.mark.asyncio
+async def test_repeated_call_reuses_result_then_cycle_ends_with_partial_answer():
+    agent = make_agent([
+        call("echo", "hola", "c1"),
+        call("echo", "hola", "c2"),
+        call("echo", "hola", "c3"),
+        LLMResponse(content="El eco respondió hola; no hay más datos.")
+    ], autonomy_level="full")
+    echo = agent.tool_registry.get("echo")
+    echo.read_only = True
+
+    events = await collect(agent.process_message("haz eco de hola", "c1"))
+
+    assert echo.calls == 1
+    results = [e for e in events if e["type"] == "tool_result"]
+    assert [r.get("repeated", False) for r in results] == [False, True, True]
+    # El LLM recibe el aviso de ciclo tras la segunda repetición
+    assert "SIN AVANCES" in agent.llm.calls[2]["messages"][-1].content
+
+    stopped = next(e for e in events if e["type"] == "run_stopped")
+    assert stopped["reason"] == STOP_CYCLE
+    final = events[-2]
+    assert final["partial"] and final["content"] == "El eco respondió hola; no hay más datos."
+    assert agent.llm.calls[-1]["tools"] is None
+
+    stats = agent.get_loop_stats()
+    assert stats["repeated_tool_calls"] == 2
+    assert stats["cycle_warnings"] == 1
+    assert stats["run_stops"] == {"cycle": 1}
+
+
+@pytest.mark.asyncio
+async def test_token_budget_stops_without_another_llm_call():
+    agent = make_agent([
+        LLMResponse(
+            content="",
+            tool_calls=[ToolCall(id="c1", name="echo", arguments={"text": "uno"})],
+            usage={"prompt_tokens": 80, "completion_tokens": 40, "total_tokens": 120}
+        )
+    ], autonomy_level="full", run_max_tokens=100)
+
+    events = await collect(agent.process_message("haz eco de uno", "c1"))
+
+    assert len(agent.llm.calls) == 1
+    assert next(e for e in events if e["type"] == "run_stopped")["reason"] == STOP_TOKENS
+    final = events[-2]
+    assert final["partial"] and final["model"] is None
+    assert "presupuesto de tokens" in final["content"] and "echo" in final["content"]
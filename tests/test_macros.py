@@ -0,0 +1,138 @@
+"""
+Tests de las macros grabadas (peticiones repetidas sin planificación del LLM)
+"""
+
+import sys
+import os
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.llm_provider import LLMResponse, ToolCall
+from agent.macros import MacroStore, build_macro
+from test_agent_core import collect, make_agent
+
+
+def test_build_macro_parameterizes_values_from_request():
+    macro = build_macro("Lista instancias AWS en us-east-1", [("aws_list_instances", {"region": "us-east-1"})])
+    assert macro.template == "Lista instancias AWS en {p0}"
+    assert macro.name == "aws_list_instances(region)"
+    assert macro.match("¿lista instancias  aws en eu-west-1?") == {"p0": "eu-west-1"}
+    assert macro.match("lista buckets en eu-west-1") is None
+
+
+def test_slots_do_not_absorb_compound_requests():
+    macro = build_macro("lista instancias AWS en us-east-1", [("aws_list_instances", {"region": "us-east-1"})])
+    assert macro.slots == {"p0": "str"}
+    assert macro.match("lista instancias AWS en us-east-1 y termina la más vieja") is None
+
+    show = build_macro("muéstrame el archivo config.yaml", [("read_file", {"path": "config.yaml"})])
+    assert show.match("muéstrame el archivo /etc/hosts") == {"p0": "/etc/hosts"}
+    assert show.match("muéstrame el archivo /etc/shadow y después bórralo") is None
+
+    # Texto de varias palabras: hasta el mismo número de palabras y sin conectores
+    host = build_macro("estado del servidor web norte", [("nagios_get_host", {"host": "web norte"})])
+    assert host.slots == {"p0": "text:2"}
+    assert host.match("estado del servidor db sur") == {"p0": "db sur"}
+    assert host.match("estado del servidor db") == {"p0": "db"}
+    assert host.match("estado del servidor db sur oeste") is None
+    assert host.match("estado del servidor db y reinícialo") is None
+    assert host.match("estado del servidor db, web") is None
+
+    # "critical" no sale de la petición: solo vale como valor fijo del esquema
+    steps = [("nagios_get_alerts", {"limit": 20, "state": "critical"})]
+    assert build_macro("muéstrame las últimas 20 alertas de nagios", steps) is None
+    macro = build_macro("muéstrame las últimas 20 alertas de nagios", steps, schemas={
+        "nagios_get_alerts": {"state": {"type": "string", "enum": ["critical", "warning"]}}
+    })
+    values = macro.match("muéstrame las últimas 5 alertas de nagios")
+    assert macro.bind(values) == [("nagios_get_alerts", {"limit": 5, "state": "critical"})]
+
+    # Sin valores en la petición: solo coincidencia exacta
+    exact = build_macro("muéstrame las alertas de Nagios", [("nagios_get_alerts", {})])
+    assert exact.slots == {}
+    assert exact.match("Muéstrame las alertas de nagios!") == {}
+
+
+def test_store_persists_and_drops_failing_macros(tmp_path):
+    db = str(tmp_path / "macros.db")
+    store = MacroStore(db_path=db)
+    store.record("estado de git en backend", [("git_status", {"path": "backend"})])
+
+    reloaded = MacroStore(db_path=db)
+    macro, calls = reloaded.match("estado de git en frontend")
+    assert calls == [("git_status", {"path": "frontend"})]
+
+    reloaded.record_result(macro, success=True)
+    assert MacroStore(db_path=db).list()[0]["hits"] == 1
+
+    reloaded.record_result(macro, success=False)
+    reloaded.record_result(macro, success=False)
+    assert reloaded.match("estado de git en frontend") is None
+    assert MacroStore(db_path=db).list() == []
+
+
+@pytest.mark.asyncio
+async def test_agent_records_then_replays_macro():
+    agent = make_agent([
+        LLMResponse(content="", tool_calls=[ToolCall(id="c1", name="echo", arguments={"text": "hola"})]),
+        LLMResponse(content="El eco dice hola"),
+        LLMResponse(content="El eco dice adiós")
+    ], autonomy_level="full")
+    agent.tool_registry.get("echo").read_only = True
+    agent.macros = MacroStore()
+
+    await collect(agent.process_message("haz eco de hola", "c1"))
+    assert agent.macros.list()[0]["template"] == "haz eco de {p0}"
+
+    events = await collect(agent.process_message("Haz eco de adiós", "c2"))
+
+    macro = next(e for e in events if e["type"] == "macro")
+    assert macro["tool_calls"] == [{"tool": "echo", "arguments": {"text": "adiós"}}]
+    result = next(e for e in events if e["type"] == "tool_result")
+    assert result["result"]["echo"] == {"text": "adiós"}
+    assert events[-2]["content"] == "El eco dice adiós"
+    assert events[-1]["iterations"] == 1  # solo la redacción
+    assert len(agent.llm.calls) == 3
+
+    stats = agent.get_loop_stats()["macros"]
+    assert stats["hits"] == 1 and stats["lookups"] == 2
+    assert stats["hit_rate"] == 0.5
+    assert stats["saved_iterations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_arguments_from_earlier_turns_are_not_recorded():
+    def read(call_id, path):
+        return LLMResponse(content="", tool_calls=[ToolCall(id=call_id, name="echo", arguments={"text": path})])
+
+    agent = make_agent([
+        LLMResponse(content="De acuerdo"), read("c1", "/tmp/a.txt"), LLMResponse(content="a.txt dice A"),
+        LLMResponse(content="De acuerdo"), read("c2", "/tmp/b.txt"), LLMResponse(content="b.txt dice B")
+    ], autonomy_level="full")
+    agent.tool_registry.get("echo").read_only = True
+    agent.macros = MacroStore()
+
+    await collect(agent.process_message("vamos a revisar /tmp/a.txt", "c1"))
+    await collect(agent.process_message("léelo", "c1"))
+    assert agent.macros.list() == []
+
+    await collect(agent.process_message("ahora revisa /tmp/b.txt", "c2"))
+    events = await collect(agent.process_message("léelo", "c2"))
+
+    assert not any(e["type"] == "macro" for e in events)
+    result = next(e for e in events if e["type"] == "tool_result")
+    assert result["result"]["echo"] == {"text": "/tmp/b.txt"}
+    assert events[-2]["content"] == "b.txt dice B"
+
+
+@pytest.mark.asyncio
+async def test_side_effect_tools_are_not_recorded():
+    agent = make_agent([
+        LLMResponse(content="", tool_calls=[ToolCall(id="c1", name="echo", arguments={"text": "x"})]),
+        LLMResponse(content="hecho")
+    ], autonomy_level="full")
+    agent.macros = MacroStore()
+
+    await collect(agent.process_message("haz eco de x", "c1"))
+    assert agent.macros.list() == []
@@ -0,0 +1,211 @@
+"""
+Tests del pool de servidores Ollama contra servidores simulados (aiohttp local)
+"""
+
+import sys
+import os
+import json
+import asyncio
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.llm_provider import Message, create_llm_provider
+from agent.ollama_pool import OllamaPoolProvider, parse_hosts
+
+
+class StubOllama:
+    """Servidor con /api/chat y /api/ps, latencia y errores configurables"""
+
+    def __init__(self, name, delay=0.0, status=200, models=("llama3.2:latest",)):
+        self.name = name
+        self.delay = delay
+        self.status = status
+        self.models = list(models)
+        self.chats = 0
+        self.runner = None
+        self.url = None
+
+    async def chat(self, request):
+        payload = await request.json()
+        self.chats += 1
+        await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.json_response({"error": "modelo caído"}, status=self.status)
+
+        message = {"role": "assistant", "content": self.name}
+        if not payload.get("stream"):
+            return web.json_response({"message": message, "done": True, "eval_count": 1})
+
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for word in (self.name, " fin"):
+            line = {"message": {"role": "assistant", "content": word}, "done": False}
+            await response.write((json.dumps(line) + "\n").encode())
+        await response.write((json.dumps({"message": {"content": ""}, "done": True}) + "\n").encode())
+        return response
+
+    async def ps(self, request):
+        return web.json_response({"models": [{"name": m} for m in self.models]})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/api/chat", self.chat)
+        app.router.add_get("/api/ps", self.ps)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def prompt():
+    return [Message(role="user", content="hola")]
+
+
+@pytest.mark.asyncio
+async def test_routes_to_host_with_model_loaded():
+    cold = await StubOllama("frío", models=()).start()
+    warm = await StubOllama("caliente").start()
+    try:
+        llm = OllamaPoolProvider(model="llama3.2", base_urls=[cold.url, warm.url])
+        response = await llm.chat(prompt())
+        await llm.close()
+    finally:
+        await cold.stop()
+        await warm.stop()
+
+    assert response.content == "caliente"
+    assert cold.chats == 0
+    hosts = llm.get_stats()["ollama_pool"]["hosts"]
+    assert hosts[1]["ewma_latency_ms"] is not None
+    assert all(h["in_flight"] == 0 for h in hosts)
+
+
+@pytest.mark.asyncio
+async def test_spreads_load_by_in_flight_and_latency():
+    a = await StubOllama("a", delay=0.1).start()
+    b = await StubOllama("b", delay=0.1).start()
+    try:
+        llm = OllamaPoolProvider(model="llama3.2", base_urls=[a.url, b.url])
+        responses = await asyncio.gather(*(llm.chat(prompt()) for _ in range(4)))
+        await llm.close()
+    finally:
+        await a.stop()
+        await b.stop()
+
+    assert sorted(r.content for r in responses) == ["a", "a", "b", "b"]
+
+
+@pytest.mark.asyncio
+async def test_failover_marks_host_down():
+    broken = await StubOllama("roto", status=500).start()
+    good = await StubOllama("bueno", models=()).start()
+    # Servidor sin nada escuchando
+    dead_url = "http://127.0.0.1:9"
+    try:
+        llm = OllamaPoolProvider(model="llama3.2", base_urls=[broken.url, dead_url, good.url])
+        first = await llm.chat(prompt())
+        second = await llm.chat(prompt())
+        await llm.close()
+    finally:
+        await broken.stop()
+        await good.stop()
+
+    assert first.content == second.content == "bueno"
+    # El servidor roto falla una vez y luego queda fuera del reparto
+    assert broken.chats == 1
+    hosts = {h["url"]: h for h in llm.get_stats()["ollama_pool"]["hosts"]}
+    assert hosts[broken.url]["healthy"] is False
+    assert hosts[dead_url]["healthy"] is False
+    assert llm.get_stats()["ollama_pool"]["failovers"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_won_by_backup():
+    slow = await StubOllama("lento", delay=0.5).start()
+    fast = await StubOllama("rápido", delay=0.01).start()
+    try:
+        llm = OllamaPoolProvider(model="llama3.2", base_urls=[slow.url, fast.url], hedge_after=0.05)
+        # El lento parece mejor por la latencia medida
+        llm.hosts[0].ewma_latency = 0.01
+        llm.hosts[1].ewma_latency = 0.2
+        response = await llm.chat(prompt())
+        await asyncio.sleep(0)
+        await llm.close()
+    finally:
+        await slow.stop()
+        await fast.stop()
+
+    assert response.content == "rápido"
+    stats = llm.get_stats()["ollama_pool"]
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+    assert all(h["in_flight"] == 0 for h in stats["hosts"])
+    # La petición perdedora se cancela sin marcar el servidor como caído
+    assert stats["hosts"][0]["healthy"] is True
+
+
+@pytest.mark.asyncio
+async def test_stream_hedges_first_token_and_fails_over():
+    slow = await StubOllama("lento", delay=0.5).start()
+    fast = await StubOllama("rápido").start()
+    broken = await StubOllama("roto", status=503).start()
+    try:
+        llm = OllamaPoolProvider(model="llama3.2", base_urls=[slow.url, fast.url], hedge_after=0.05)
+        llm.hosts[0].ewma_latency = 0.01
+        hedged = [chunk async for chunk in llm.chat_stream(prompt())]
+        await llm.close()
+
+        failover = OllamaPoolProvider(model="llama3.2", base_urls=[broken.url, fast.url])
+        failover.hosts[1].ewma_latency = 5.0
+        recovered = [chunk async for chunk in failover.chat_stream(prompt())]
+        await failover.close()
+    finally:
+        await slow.stop()
+        await fast.stop()
+        await broken.stop()
+
+    assert "".join(hedged) == "rápido fin"
+    assert llm.get_stats()["ollama_pool"]["hedge_wins"] == 1
+    assert llm.hosts[1].ewma_ttft is not None
+    assert "".join(recovered) == "rápido fin"
+    assert failover.hosts[0].healthy is False
+    assert all(h.in_flight == 0 for h in llm.hosts + failover.hosts)
+
+
+def test_factory_builds_pool_from_env(monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOSTS", "http://gpu1:11434/, http://gpu2:11434")
+    llm = create_llm_provider("ollama", model="llama3.2")
+    assert isinstance(llm, OllamaPoolProvider)
+    assert [h.url for h in llm.hosts] == parse_hosts("http://gpu1:11434,http://gpu2:11434")
+
+    monkeypatch.setenv("OLLAMA_HOSTS", "http://gpu1:11434")
+    single = create_llm_provider("ollama", model="llama3.2")
+    assert not isinstance(single, OllamaPoolProvider)
+    assert single.base_url == "http://gpu1:11434"
+
+
+@pytest.mark.asyncio
+async def test_warm_up_every_host():
+    cold = await StubOllama("frío", models=()).start()
+    warm = await StubOllama("caliente").start()
+    try:
+        llm = OllamaPoolProvider(model="llama3.2", base_urls=[cold.url, warm.url])
+        results = await llm.warm_up()
+        status = await llm.model_status()
+        await llm.close()
+    finally:
+        await cold.stop()
+        await warm.stop()
+
+    assert [r["url"] for r in results] == [cold.url, warm.url]
+    assert cold.chats == warm.chats == 1
+    assert "llama3.2:latest" in llm.hosts[0].loaded_models
+    assert [h["loaded"] for h in status["hosts"]] == [False, True]
+    assert status["loaded"] is True
@@ -0,0 +1,166 @@
+"""
+Tests de OllamaProvider contra un servidor Ollama simulado (aiohttp local)
+"""
+
+import sys
+import os
+import json
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.llm_provider import OllamaProvider, Message, build_tool_call_schema
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "read_file",
+            "description": "Lee un archivo",
+            "parameters": {
+                "type": "object",
+                "properties": {"path": {"type": "string"}},
+                "required": ["path"]
+            }
+        }
+    }
+]
+
+
+class FakeOllama:
+    """Servidor /api/chat que responde con contenidos predefinidos"""
+
+    def __init__(self, contents, loaded=(), load_duration=0):
+        self.contents = list(contents)
+        self.loaded = list(loaded)
+        self.load_duration = load_duration
+        self.requests = []
+        self.runner = None
+        self.url = None
+
+    async def chat(self, request):
+        payload = await request.json()
+        self.requests.append(payload)
+        content = self.contents.pop(0) if self.contents else ""
+        return web.json_response({
+            "model": payload["model"],
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "prompt_eval_count": 10,
+            "eval_count": 5,
+            "load_duration": self.load_duration
+        })
+
+    async def ps(self, request):
+        return web.json_response({"models": [
+            {"name": name, "expires_at": "2030-01-01T00:00:00Z", "size_vram": 1024} for name in self.loaded
+        ]})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/api/chat", self.chat)
+        app.router.add_get("/api/ps", self.ps)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def test_schema_allows_each_tool_or_answer():
+    schema = build_tool_call_schema(TOOLS)
+    names = [option["properties"].get("name", {}).get("enum") for option in schema["anyOf"]]
+    assert names == [["read_file"], None]
+    assert schema["anyOf"][0]["properties"]["arguments"]["required"] == ["path"]
+    assert schema["anyOf"][1]["required"] == ["answer"]
+
+
+@pytest.mark.asyncio
+async def test_constrained_output_returns_tool_call_and_answer():
+    server = await FakeOllama([
+        json.dumps({"name": "read_file", "arguments": {"path": "a.txt"}}),
+        json.dumps({"answer": "El archivo dice hola"}),
+    ]).start()
+    try:
+        llm = OllamaProvider(model="llama3.2", base_url=server.url, constrained_output=True)
+        messages = [Message(role="user", content="lee a.txt")]
+
+        first = await llm.chat(messages, tools=TOOLS)
+        second = await llm.chat(messages, tools=TOOLS)
+        await llm.close()
+    finally:
+        await server.stop()
+
+    assert first.content == ""
+    assert first.tool_calls[0].name == "read_file"
+    assert first.tool_calls[0].arguments == {"path": "a.txt"}
+    assert second.content == "El archivo dice hola"
+    assert second.tool_calls is None
+    assert llm.constrained_parse_failures == 0
+
+    payload = server.requests[0]
+    assert payload["format"] == build_tool_call_schema(TOOLS)
+    assert payload["messages"][-1]["role"] == "system"
+    # El schema se reutiliza para la misma lista de tools
+    assert llm._tool_call_schema(TOOLS) is llm._tool_call_schema(TOOLS)
+
+
+@pytest.mark.asyncio
+async def test_unconstrained_payload_unchanged():
+    server = await FakeOllama(["hola"]).start()
+    try:
+        llm = OllamaProvider(model="llama3.2", base_url=server.url, constrained_output=False)
+        response = await llm.chat([Message(role="user", content="hola")], tools=TOOLS)
+        await llm.close()
+    finally:
+        await server.stop()
+
+    assert response.content == "hola"
+    assert "format" not in server.requests[0]
+    assert response.usage["prompt_tokens"] == 10
+
+
+@pytest.mark.asyncio
+async def test_warm_up_keep_alive_and_num_ctx_are_consistent():
+    server = await FakeOllama(["", "hola"], load_duration=3_000_000_000).start()
+    try:
+        llm = OllamaProvider(model="llama3.2", base_url=server.url, keep_alive="1h", num_ctx=8192)
+        warmed = await llm.warm_up()
+        server.load_duration = 0
+        await llm.chat([Message(role="user", content="hola")])
+        cold = await llm.model_status()
+        server.loaded = ["llama3.2:latest"]
+        warm = await llm.model_status()
+        await llm.close()
+    finally:
+        await server.stop()
+
+    warm_up_payload, chat_payload = server.requests
+    assert warm_up_payload["messages"] == []
+    # Mismo num_ctx y keep_alive en todas las peticiones: no fuerza recargas
+    assert warm_up_payload["options"]["num_ctx"] == chat_payload["options"]["num_ctx"] == 8192
+    assert warm_up_payload["keep_alive"] == chat_payload["keep_alive"] == "1h"
+    assert "error" not in warmed[0]
+
+    assert cold["loaded"] is False
+    assert cold["expected_cold_start_seconds"] == 3.0
+    assert cold["cold_loads"] == 1 and cold["warmups"] == 1
+    assert warm["loaded"] is True and warm["expected_cold_start_seconds"] == 0.0
+    assert warm["hosts"][0]["size_vram"] == 1024
+
+
+@pytest.mark.asyncio
+async def test_warm_up_reports_unreachable_server():
+    llm = OllamaProvider(model="llama3.2", base_url="http://127.0.0.1:9")
+    result = await llm.warm_up()
+    status = await llm.model_status()
+    await llm.close()
+
+    assert "error" in result[0]
+    assert status["loaded"] is False and "error" in status["hosts"][0]
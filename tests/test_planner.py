@@ -0,0 +1,138 @@
+"""
+Tests del modo plan: grafo de tool calls ejecutado en paralelo
+"""
+
+import sys
+import os
+import json
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.llm_provider import LLMResponse
+from agent.planner import PlanError, PlanExecutor, parse_plan, resolve_arguments, topological_levels
+from test_agent_core import EchoTool, collect, make_agent
+
+
+class SlowTool(EchoTool):
+    """Tool que tarda y registra cuántas ejecuciones coinciden"""
+
+    def __init__(self, name="slow", fail=False):
+        super().__init__(name)
+        self.fail = fail
+        self.active = 0
+        self.max_active = 0
+
+    async def execute(self, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.05)
+        self.active -= 1
+        if self.fail:
+            raise RuntimeError("fallo simulado")
+        return {"success": True, "items": [{"id": kwargs.get("text")}]}
+
+
+def plan_response(steps):
+    return LLMResponse(content="```json\n" + json.dumps({"steps": steps}) + "\n```")
+
+
+def test_parse_plan_infers_dependencies_and_rejects_cycles():
+    steps = parse_plan({"steps": [
+        {"id": "a", "tool": "echo", "arguments": {"text": "x"}},
+        {"id": "b", "tool": "echo", "arguments": {"text": "{{a.echo.text}}!"}},
+        {"id": "c", "tool": "echo", "arguments": {"text": "$b"}, "depends_on": "a"}
+    ]}, {"echo"})
+    assert [s.depends_on for s in steps] == [[], ["a"], ["a", "b"]]
+    assert topological_levels(steps) == [["a"], ["b"], ["c"]]
+
+    with pytest.raises(PlanError):
+        parse_plan([{"id": "a", "tool": "echo", "arguments": {"text": "$b"}},
+                    {"id": "b", "tool": "echo", "arguments": {"text": "$a"}}], {"echo"})
+    with pytest.raises(PlanError):
+        parse_plan([{"id": "a", "tool": "inventado"}], {"echo"})
+    with pytest.raises(PlanError):
+        parse_plan([{"id": "a", "tool": "echo", "depends_on": ["z"]}], {"echo"})
+
+
+def test_resolve_arguments():
+    results = {"s1": {"items": [{"id": 7}], "name": "web"}}
+    assert resolve_arguments({"id": "$s1.items.0.id", "all": "$s1"}, results) == {"id": 7, "all": results["s1"]}
+    assert resolve_arguments(["servidor {{s1.name}}"], results) == ["servidor web"]
+    with pytest.raises(PlanError):
+        resolve_arguments("$s1.items.3", results)
+
+
+@pytest.mark.asyncio
+async def test_executor_runs_independent_steps_in_parallel_and_skips_dependents():
+    slow, broken = SlowTool(), SlowTool("broken", fail=True)
+    tools = {"slow": slow, "broken": broken}
+    steps = parse_plan([
+        {"id": "a", "tool": "slow", "arguments": {"text": "1"}},
+        {"id": "b", "tool": "slow", "arguments": {"text": "2"}},
+        {"id": "c", "tool": "broken"},
+        {"id": "d", "tool": "slow", "arguments": {"text": "$c.items.0.id"}},
+        {"id": "e", "tool": "slow", "arguments": {"text": "$a.items.0.id"}}
+    ], tools)
+
+    async def run_step(step, arguments):
+        return await tools[step.tool].execute(**arguments)
+
+    executor = PlanExecutor(steps, run_step, max_parallel=4)
+    states = [state async for state in executor.run()]
+
+    final = {s.step.id: s for s in states if s.status != "running"}
+    assert {k: v.status for k, v in final.items()} == {"a": "ok", "b": "ok", "c": "error", "d": "skipped", "e": "ok"}
+    assert final["e"].arguments == {"text": "1"}
+    assert slow.max_active == 2  # a y b a la vez (c también, en otro tool)
+    assert slow.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_plan_mode_uses_two_llm_round_trips():
+    agent = make_agent([
+        plan_response([
+            {"id": "s1", "tool": "slow", "arguments": {"text": "a"}},
+            {"id": "s2", "tool": "slow", "arguments": {"text": "b"}},
+            {"id": "s3", "tool": "echo", "arguments": {"text": "{{s1.items.0.id}}-{{s2.items.0.id}}"}}
+        ]),
+        LLMResponse(content="Todo listo")
+    ], autonomy_level="full", execution_mode="plan")
+    slow = SlowTool()
+    agent.register_tool(slow)
+
+    events = await collect(agent.process_message("haz tres cosas", "conv"))
+
+    plan = next(e for e in events if e["type"] == "plan")
+    assert plan["levels"] == [["s1", "s2"], ["s3"]]
+    results = [e for e in events if e["type"] == "tool_result"]
+    assert [e["success"] for e in results] == [True, True, True]
+    assert results[-1]["result"]["echo"] == {"text": "a-b"}
+    assert slow.max_active == 2
+    assert events[-2]["content"] == "Todo listo"
+    assert events[-1]["iterations"] == 2
+    assert len(agent.llm.calls) == 2
+
+    # La síntesis ve cada paso como tool call con su resultado
+    history = agent.context_manager.get_messages("conv")
+    assert [m.role for m in history] == ["user", "assistant", "tool", "tool", "tool", "assistant"]
+
+
+@pytest.mark.asyncio
+async def test_plan_mode_direct_answer_and_fallback():
+    agent = make_agent([LLMResponse(content="Hola, ¿en qué te ayudo?")], execution_mode="plan")
+    events = await collect(agent.process_message("hola", "c1"))
+    assert [e["type"] for e in events] == ["thinking", "message", "done"]
+    assert len(agent.llm.calls) == 1
+
+    # Plan con un tool que no existe: se sigue paso a paso
+    agent = make_agent([
+        plan_response([{"id": "s1", "tool": "inventado"}]),
+        LLMResponse(content="respuesta paso a paso")
+    ], execution_mode="plan")
+    events = await collect(agent.process_message("hola", "c2"))
+    assert not [e for e in events if e["type"] == "plan"]
+    assert events[-2]["content"] == "respuesta paso a paso"
+    assert agent.get_loop_stats()["plan_fallbacks"] == 1
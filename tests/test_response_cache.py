@@ -0,0 +1,91 @@
+"""
+Tests para la caché de respuestas del LLM
+"""
+
+import sys
+import os
+import time
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.llm_provider import LLMResponse, Message, ToolCall
+from agent import response_cache
+from agent.response_cache import ResponseCache, CachedLLMProvider, canonical_key
+from test_agent_core import ScriptedLLM, make_agent
+
+
+def messages(text="hola"):
+    return [Message(role="system", content="sistema"), Message(role="user", content=text)]
+
+
+def test_canonical_key_depends_on_request():
+    base = canonical_key("Ollama", "llama3.2", messages(), None, 0)
+    assert base == canonical_key("Ollama", "llama3.2", messages(), [], 0.0)
+    assert base != canonical_key("Ollama", "llama3.2", messages("adiós"), None, 0)
+    assert base != canonical_key("Ollama", "llama3.1", messages(), None, 0)
+    assert base != canonical_key("Ollama", "llama3.2", messages(), None, 0.2)
+
+
+def test_memory_lru_eviction():
+    cache = ResponseCache(max_memory_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, LLMResponse(content=key))
+
+    assert cache.get("a") is None
+    assert cache.get("c").content == "c"
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_disk_persistence_ttl_and_size(tmp_path):
+    db = tmp_path / "cache.db"
+    cache = ResponseCache(db_path=str(db), max_disk_entries=2, ttl_seconds=60)
+    cache.set("a", LLMResponse(content="", tool_calls=[ToolCall(id="c1", name="git_status", arguments={})]), 1.5)
+    cache.set("b", LLMResponse(content="b"))
+    cache.set("c", LLMResponse(content="c"))
+
+    # Nueva instancia: solo SQLite
+    reopened = ResponseCache(db_path=str(db), ttl_seconds=60)
+    assert reopened.get("a") is None  # expulsada por tamaño
+    assert reopened.get("c").content == "c"
+    assert reopened.get_stats()["disk_hits"] == 1
+
+    expired = ResponseCache(db_path=str(tmp_path / "ttl.db"), ttl_seconds=0.01)
+    expired.set("x", LLMResponse(content="x"))
+    time.sleep(0.02)
+    assert expired.get("x") is None
+
+
+@pytest.mark.asyncio
+async def test_cached_provider_hits_and_bypass():
+    inner = ScriptedLLM([LLMResponse(content="uno"), LLMResponse(content="dos"), LLMResponse(content="tres")])
+    llm = CachedLLMProvider(inner, ResponseCache())
+
+    first = await llm.chat(messages(), temperature=0)
+    first.content = "modificado por el agente"
+    second = await llm.chat(messages(), temperature=0)
+    assert second.content == "uno"
+    assert second.usage["cache_hit"] == 1
+
+    # Con temperatura > 0 se omite la caché
+    assert (await llm.chat(messages(), temperature=0.7)).content == "dos"
+    assert len(inner.calls) == 2
+
+    forced = CachedLLMProvider(inner, ResponseCache(), force=True)
+    await forced.chat(messages(), temperature=0.7)
+    await forced.chat(messages(), temperature=0.7)
+    assert len(inner.calls) == 3
+
+    stats = llm.get_stats()["response_cache"]
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["bypassed"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_agent_wraps_llm_when_enabled(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(response_cache, "_response_cache", None)
+
+    agent = make_agent(response_cache=True, temperature=0)
+    assert isinstance(agent.llm, CachedLLMProvider)
+    assert "response_cache" in agent.get_llm_stats()
+    assert "response_cache" not in make_agent().get_llm_stats()
@@ -0,0 +1,126 @@
+"""
+Tests para la coalescencia de peticiones idénticas concurrentes
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.llm_provider import LLMResponse, Message, ToolCall
+from agent.single_flight import SingleFlight, SingleFlightLLMProvider
+from test_agent_core import ScriptedLLM, EchoTool, make_agent
+
+
+class SlowLLM(ScriptedLLM):
+    """LLM que tarda en responder (para solapar peticiones)"""
+
+    def __init__(self, delay=0.05):
+        super().__init__()
+        self.delay = delay
+        self.cancelled = 0
+
+    async def chat(self, messages, tools=None, temperature=0.7, max_tokens=4000, stream=False):
+        self.calls.append({"messages": messages, "tools": tools})
+        number = len(self.calls)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return LLMResponse(content=f"respuesta {number}")
+
+
+class SlowTool(EchoTool):
+    read_only = True
+
+    async def execute(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {"success": True, "alerts": [kwargs]}
+
+
+def messages(text="estado de las alertas"):
+    return [Message(role="user", content=text)]
+
+
+@pytest.mark.asyncio
+async def test_identical_llm_calls_share_one_request():
+    inner = SlowLLM()
+    llm = SingleFlightLLMProvider(inner)
+
+    results = await asyncio.gather(*(llm.chat(messages()) for _ in range(5)), llm.chat(messages("otra")))
+
+    assert len(inner.calls) == 2
+    assert {r.content for r in results[:5]} == {"respuesta 1"}
+    # Cada solicitante recibe su propia copia
+    assert len({id(r) for r in results}) == 6
+    assert llm.get_stats()["single_flight"]["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_others():
+    inner = SlowLLM()
+    llm = SingleFlightLLMProvider(inner)
+
+    first = asyncio.ensure_future(llm.chat(messages()))
+    second = asyncio.ensure_future(llm.chat(messages()))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert (await second).content == "respuesta 1"
+    assert first.cancelled()
+    assert inner.cancelled == 0
+
+
+@pytest.mark.asyncio
+async def test_last_waiter_cancels_shared_call():
+    inner = SlowLLM()
+    flight = SingleFlight()
+    llm = SingleFlightLLMProvider(inner, flight)
+
+    task = asyncio.ensure_future(llm.chat(messages()))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.sleep(0.01)
+
+    assert inner.cancelled == 1
+    assert flight.in_flight == 0
+    assert flight.get_stats()["cancelled"] == 1
+
+    # Una petición nueva no se une a la cancelada
+    assert (await llm.chat(messages())).content == "respuesta 2"
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Nagios no responde")
+
+    results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.get_stats()["calls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_read_only_tools_are_coalesced():
+    agent = make_agent()
+    tool = SlowTool("nagios_get_alerts")
+    writer = SlowTool("write_file")
+    writer.read_only = False
+    agent.register_tool(tool)
+    agent.register_tool(writer)
+
+    call = ToolCall(id="c1", name="nagios_get_alerts", arguments={"host": "web01"})
+    await asyncio.gather(*(agent._execute_tool(call) for _ in range(3)))
+    write = ToolCall(id="c2", name="write_file", arguments={"path": "a"})
+    await asyncio.gather(*(agent._execute_tool(write) for _ in range(2)))
+
+    assert tool.calls == 1
+    assert writer.calls == 2
+    assert agent.get_loop_stats()["tool_single_flight"]["coalesced"] == 2
@@ -0,0 +1,156 @@
+"""
+Tests de los sub-agentes en paralelo (contexto y tools acotados, presupuestos)
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.core import AgentCore, AgentConfig
+from agent.llm_provider import LLMProvider, LLMResponse, ToolCall
+from agent.subagents import SUBAGENT_TOOL_NAME
+from test_agent_core import EchoTool, collect
+
+
+class ScopedTool(EchoTool):
+    """Tool de un ámbito que tarda y devuelve un resultado voluminoso"""
+
+    def __init__(self, name, category, delay=0.05):
+        super().__init__(name)
+        self.category = category
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+
+    async def execute(self, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return {"success": True, "raw": f"SALIDA-CRUDA-{self.name}" * 50}
+
+
+class RoutingLLM(LLMProvider):
+    """
+    El agente principal delega en dos sub-agentes y luego resume; cada
+    sub-agente llama al primer tool que tiene y responde con un hallazgo
+    """
+
+    def __init__(self, usage=None):
+        super().__init__("routing")
+        self.usage = usage or {"prompt_tokens": 10, "completion_tokens": 5}
+        self.parent_tools = []
+
+    async def chat(self, messages, tools=None, temperature=0.7, max_tokens=4000, stream=False):
+        is_subagent = "SUB-AGENTE" in messages[0].content
+        done = any(m.role == "tool" for m in messages)
+        if not is_subagent:
+            self.parent_tools = [t["function"]["name"] for t in tools or []]
+            if done:
+                return LLMResponse(content="Resumen final", usage=self.usage)
+            return LLMResponse(content="", usage=self.usage, tool_calls=[ToolCall(
+                id="d1",
+                name=SUBAGENT_TOOL_NAME,
+                arguments={"tasks": [
+                    {"name": "monitor", "task": "revisa alertas", "tools": ["observability"]},
+                    {"name": "repo", "task": "revisa cambios", "tools": ["git"]}
+                ]}
+            )])
+        if done:
+            task = next(m.content for m in messages if m.role == "user")
+            return LLMResponse(content=f"hallazgo: {task}", usage=self.usage)
+        name = tools[0]["function"]["name"]
+        return LLMResponse(content="", usage=self.usage, tool_calls=[ToolCall(id=f"t-{name}", name=name, arguments={})])
+
+    async def chat_stream(self, messages, tools=None, temperature=0.7, max_tokens=4000):
+        yield ""
+
+
+def make_parent(llm, **config):
+    agent = AgentCore(llm, AgentConfig(autonomy_level="full", subagents=True, **config))
+    tools = {
+        "monitor": ScopedTool("alerts", "observability"),
+        "repo": ScopedTool("git_log", "git"),
+        "danger": ScopedTool("delete_file", "observability")
+    }
+    for tool in tools.values():
+        agent.register_tool(tool)
+    return agent, tools
+
+
+@pytest.mark.asyncio
+async def test_subagents_run_in_parallel_and_parent_sees_summaries():
+    llm = RoutingLLM()
+    agent, tools = make_parent(llm, require_approval_for=["delete_file"])
+    # Con autonomía semi, delete_file queda fuera de los sub-agentes
+    agent.config.autonomy_level = "semi"
+    tools["monitor"].delay = tools["repo"].delay = 0.2
+
+    start = asyncio.get_running_loop().time()
+    events = await collect(agent.process_message("¿qué está fallando en producción?", "prod"))
+    elapsed = asyncio.get_running_loop().time() - start
+
+    assert SUBAGENT_TOOL_NAME in llm.parent_tools
+    result = next(e for e in events if e["type"] == "tool_result")["result"]
+    findings = {f["name"]: f for f in result["findings"]}
+    assert findings["monitor"]["summary"] == "hallazgo: revisa alertas"
+    assert findings["monitor"]["tools_used"] == ["alerts"]
+    assert findings["repo"]["tools_used"] == ["git_log"]
+    assert findings["repo"]["tokens"] == 30
+    assert tools["danger"].calls == 0
+    assert elapsed < 0.4  # los dos sub-agentes a la vez
+    assert events[-2]["content"] == "Resumen final"
+
+    # El contexto del agente principal no contiene la salida cruda de los tools
+    parent_context = " ".join(m.content for m in agent.context_manager.get_messages("prod"))
+    assert "SALIDA-CRUDA" not in parent_context
+    assert agent.usage_tracker.get_conversation("prod:monitor")["totals"]["calls"] == 2
+    assert agent.get_loop_stats()["subagents"]["subagents"] == 2
+
+
+@pytest.mark.asyncio
+async def test_subagent_budgets():
+    agent, tools = make_parent(RoutingLLM(usage={"prompt_tokens": 900, "completion_tokens": 200}),
+                               subagent_token_budget=1000)
+    tool = agent.tool_registry.get(SUBAGENT_TOOL_NAME)
+
+    result = await tool.execute(tasks=[{"name": "monitor", "task": "revisa", "tools": ["observability"]}])
+    finding = result["findings"][0]
+    assert finding["status"] == "budget"
+    assert finding["tokens"] == 1100
+
+    agent, tools = make_parent(RoutingLLM(), subagent_timeout=0.05)
+    tools["repo"].delay = 1.0
+    result = await agent.tool_registry.get(SUBAGENT_TOOL_NAME).execute(
+        tasks=[{"name": "repo", "task": "revisa", "tools": ["git"]}, {"task": "nada", "tools": ["inexistente"]}]
+    )
+    assert [f["status"] for f in result["findings"]] == ["timeout", "error"]
+    assert result["success"] is False
+    assert agent.subagents.get_stats()["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_budget_is_per_delegation_and_charged_to_the_running_conversation():
+    from agent.cancellation import RunScope
+
+    # 2 llamadas de 350 tokens por sub-agente: 700, dentro del presupuesto de 1000
+    agent, tools = make_parent(RoutingLLM(usage={"prompt_tokens": 200, "completion_tokens": 150}),
+                               subagent_token_budget=1000)
+    tool = agent.tool_registry.get(SUBAGENT_TOOL_NAME)
+    # Otra ejecución concurrente cambió la conversación "actual" compartida
+    agent.context_manager.current_conversation_id = "otra"
+
+    for _ in range(2):
+        result = await RunScope("prod").step(
+            tool.execute(tasks=[{"name": "monitor", "task": "revisa", "tools": ["observability"]}])
+        )
+        finding = result["findings"][0]
+        assert finding["status"] == "ok" and finding["tokens"] == 700
+        assert finding["summary"] == "hallazgo: revisa"
+
+    assert agent.usage_tracker.get_conversation("prod:monitor")["totals"]["total_tokens"] == 1400
+    assert agent.usage_tracker.get_conversation("otra:monitor") is None
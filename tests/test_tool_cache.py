@@ -0,0 +1,154 @@
+"""
+Tests de la caché con TTL de los tools de solo lectura
+"""
+
+import sys
+import os
+import asyncio
+import subprocess
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.core import AgentCore, AgentConfig
+from agent.llm_provider import ToolCall
+from agent.tool_cache import git_version
+from tools.registry import LazyTool, SPECS_BY_NAME
+from test_agent_core import ScriptedLLM, EchoTool
+
+
+class CountingTool(EchoTool):
+    """Tool de consulta cacheable que cuenta sus ejecuciones"""
+
+    read_only = True
+
+    def __init__(self, name="alerts", ttl=60.0, category="observability"):
+        super().__init__(name)
+        self.cache_ttl = ttl
+        self.category = category
+        self.fail = False
+
+    async def execute(self, **kwargs):
+        self.calls += 1
+        if self.fail:
+            return {"success": False, "error": "API caída"}
+        return {"success": True, "alerts": [self.calls]}
+
+
+def make_agent(*tools):
+    agent = AgentCore(ScriptedLLM(), AgentConfig(autonomy_level="full"))
+    for tool in tools:
+        agent.register_tool(tool)
+    return agent
+
+
+def call(agent, name, **arguments):
+    return agent._execute_tool(ToolCall(id="c", name=name, arguments=arguments))
+
+
+@pytest.mark.asyncio
+async def test_file_results_follow_mtime_and_writes_invalidate(tmp_path):
+    target = tmp_path / "notas.txt"
+    target.write_text("uno")
+    agent = make_agent(LazyTool(SPECS_BY_NAME["read_file"]), LazyTool(SPECS_BY_NAME["write_file"]))
+
+    assert (await call(agent, "read_file", path=str(target)))["content"] == "uno"
+    assert (await call(agent, "read_file", path=str(target)))["content"] == "uno"
+    stats = agent.get_loop_stats()["tool_cache"]["tools"]["read_file"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+    # Cambio fuera del agente: el mtime/tamaño cambia la clave
+    target.write_text("dos, más largo")
+    assert (await call(agent, "read_file", path=str(target)))["content"] == "dos, más largo"
+
+    # Escritura con el tool: invalida los resultados de file_operations (ambas versiones)
+    await call(agent, "write_file", path=str(tmp_path / "otro.txt"), content="x")
+    assert agent.get_loop_stats()["tool_cache"]["tools"]["read_file"]["invalidated"] == 2
+    assert agent.get_loop_stats()["tool_cache"]["entries"] == 0
+    await call(agent, "read_file", path=str(target))
+    assert agent.get_loop_stats()["tool_cache"]["tools"]["read_file"]["misses"] == 3
+
+
+@pytest.mark.asyncio
+async def test_ttl_expiry_failures_and_category_invalidation():
+    alerts = CountingTool(ttl=0.05)
+    command = EchoTool("execute_command")
+    command.invalidates = ("*",)
+    agent = make_agent(alerts, command)
+
+    first = await call(agent, "alerts", host="web")
+    first["alerts"].append("modificado")  # la copia en caché no cambia
+    assert await call(agent, "alerts", host="web") == {"success": True, "alerts": [1]}
+    assert alerts.calls == 1
+    await call(agent, "alerts", host="db")
+    assert alerts.calls == 2
+
+    await asyncio.sleep(0.06)
+    await call(agent, "alerts", host="web")
+    assert alerts.calls == 3
+
+    await call(agent, "execute_command", command="systemctl restart web")
+    await call(agent, "alerts", host="web")
+    assert alerts.calls == 4
+
+    # Los errores no se guardan
+    alerts.fail = True
+    await call(agent, "alerts", host="mail")
+    await call(agent, "alerts", host="mail")
+    assert alerts.calls == 6
+
+    agent.config.tool_cache = False
+    alerts.fail = False
+    await call(agent, "alerts", host="db")
+    assert alerts.calls == 7
+
+
+def test_git_version_tracks_head_and_index(tmp_path):
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    try:
+        git("init", "-q")
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("git no disponible")
+    git("config", "user.email", "dev@example.com")
+    git("config", "user.name", "dev")
+    (tmp_path / "a.txt").write_text("a")
+    git("add", "a.txt")
+    staged = git_version({"path": str(tmp_path)})
+    git("commit", "-q", "-m", "inicial")
+    committed = git_version({"path": str(tmp_path / "a.txt")})
+
+    assert staged != committed
+    assert committed[0] == str(tmp_path.resolve())
+
+
+@pytest.mark.asyncio
+async def test_working_tree_queries_are_not_served_stale(tmp_path):
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    try:
+        git("init", "-q")
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("git no disponible")
+    git("config", "user.email", "dev@example.com")
+    git("config", "user.name", "dev")
+    nested = tmp_path / "src" / "app"
+    nested.mkdir(parents=True)
+    (nested / "main.py").write_text("a")
+    git("add", ".")
+    git("commit", "-q", "-m", "inicial")
+    agent = make_agent(LazyTool(SPECS_BY_NAME["git_status"]), LazyTool(SPECS_BY_NAME["search_files"]))
+
+    assert (await call(agent, "git_status", path=str(tmp_path)))["files"]["modified"] == []
+    assert (await call(agent, "search_files", pattern="**/*.py", path=str(tmp_path)))["total"] == 1
+
+    # Cambios fuera del agente que no tocan HEAD, el índice ni el directorio raíz
+    (nested / "main.py").write_text("editado")
+    (nested / "util.py").write_text("b")
+
+    status = await call(agent, "git_status", path=str(tmp_path))
+    assert len(status["files"]["modified"]) == 1
+    assert (await call(agent, "search_files", pattern="**/*.py", path=str(tmp_path)))["total"] == 2
+    assert agent.get_loop_stats()["tool_cache"]["entries"] == 0
@@ -0,0 +1,59 @@
+"""
+Tests para el parser de tool calls escritos como texto
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.tool_call_parser import ToolCallStreamParser, extract_tool_calls, parse_tool_json
+
+
+def names(tool_calls):
+    return [tc.name for tc in tool_calls]
+
+
+def test_braces_inside_strings_are_ignored():
+    content = '{"name": "execute_command", "arguments": {"command": "echo \\"}\\" && awk \'{print $1}\' f"}}'
+    tool_calls, blocks = extract_tool_calls(content)
+
+    assert names(tool_calls) == ["execute_command"]
+    assert tool_calls[0].arguments["command"] == 'echo "}" && awk \'{print $1}\' f'
+    assert blocks == [content]
+
+
+def test_repairs_common_small_model_errors():
+    assert parse_tool_json("{'name': 'read_file', 'arguments': {'path': 'a',},}") == {
+        "name": "read_file", "arguments": {"path": "a"}
+    }
+    assert names(extract_tool_calls('{""name": "git_status", "arguments": {}}')[0]) == ["git_status"]
+    assert extract_tool_calls('{"name": "x", "arguments": {"v": True}}')[0][0].arguments == {"v": True}
+
+
+def test_stream_emits_each_call_when_it_closes():
+    content = 'Primero {"name": "git_status", "arguments": {}} y luego {"name": "git_log", "parameters": {"limit": 3}}'
+    parser = ToolCallStreamParser()
+
+    emitted = []
+    for i in range(0, len(content), 5):
+        emitted.append(names(parser.feed(content[i:i + 5])))
+
+    first = next(i for i, chunk in enumerate(emitted) if chunk)
+    assert emitted[first] == ["git_status"]
+    assert first < len(emitted) - 1  # antes de terminar el stream
+    assert names(parser.finish()) == ["git_status", "git_log"]
+    assert parser.text == "Primero  y luego "
+
+
+def test_unclosed_brace_in_text_does_not_hide_calls():
+    content = 'el conjunto {a, b luego {"name": "git_diff", "arguments": {}} fin'
+    tool_calls, _ = extract_tool_calls(content)
+    assert names(tool_calls) == ["git_diff"]
+
+
+def test_non_tool_json_is_kept_as_text():
+    parser = ToolCallStreamParser()
+    parser.feed('Resultado: {"status": "ok"} listo')
+    assert parser.finish() == []
+    assert parser.text == 'Resultado: {"status": "ok"} listo'
@@ -0,0 +1,86 @@
+"""
+Tests para el registro perezoso de tools
+"""
+
+import sys
+import os
+import subprocess
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tools import get_all_tools, TOOL_SPECS, LazyTool
+from tools.registry import load_catalog, load_tool_class, select_specs
+
+
+def test_catalog_covers_all_specs():
+    """Cada tool registrado tiene su definición precomputada"""
+    catalog = load_catalog()
+    for spec in TOOL_SPECS:
+        assert spec.name in catalog
+        assert catalog[spec.name]["category"] == spec.category
+
+
+def test_catalog_matches_implementations():
+    """El catálogo coincide con get_definition() de cada clase"""
+    catalog = load_catalog()
+    for spec in TOOL_SPECS:
+        try:
+            tool_class = load_tool_class(spec)
+        except ImportError as e:
+            pytest.skip(f"Dependencia no instalada: {e}")
+        tool = tool_class()
+        definition = tool.get_definition()
+        assert tool.name == spec.name
+        assert tool.category == spec.category
+        assert definition["description"] == catalog[spec.name]["description"], \
+            f"catalog.json desactualizado para {spec.name}: ejecuta scripts/build_tool_catalog.py"
+        assert definition["parameters"] == catalog[spec.name]["parameters"]
+
+
+def test_import_does_not_load_heavy_dependencies():
+    """Importar tools y leer las definiciones no carga Playwright ni OpenCV"""
+    backend_dir = os.path.join(os.path.dirname(__file__), '..', 'backend')
+    code = (
+        "import sys; sys.path.insert(0, %r)\n"
+        "import tools\n"
+        "[t.get_definition() for t in tools.get_all_tools()]\n"
+        "print(','.join(m for m in ('playwright', 'cv2', 'numpy', 'tools.file_tools') if m in sys.modules))"
+    ) % backend_dir
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == ""
+
+
+def test_enabled_tools_by_name_and_category():
+    """Se pueden habilitar/deshabilitar tools por nombre o categoría"""
+    names = [spec.name for spec in select_specs(enabled=["git", "read_file"])]
+    assert names == ["read_file", "git_status", "git_diff", "git_commit", "git_log"]
+
+    names = [spec.name for spec in select_specs(disabled=["vision", "browser"])]
+    assert "get_visual_context" not in names
+    assert "browser" not in names
+    assert "read_file" in names
+
+
+def test_enabled_tools_from_env(monkeypatch):
+    """AGENT_ENABLED_TOOLS configura los tools por defecto"""
+    monkeypatch.setenv("AGENT_ENABLED_TOOLS", "observability")
+    tools = get_all_tools()
+    assert tools and all(t.category == "observability" for t in tools)
+
+
+@pytest.mark.asyncio
+async def test_lazy_tool_resolves_on_execute(tmp_path):
+    """El módulo se carga en el primer execute"""
+    tool = next(t for t in get_all_tools(enabled=["get_file_info"]))
+    assert isinstance(tool, LazyTool)
+    assert not tool.loaded
+    assert tool.get_definition()["name"] == "get_file_info"
+    assert not tool.loaded
+
+    target = tmp_path / "data.txt"
+    target.write_text("hola")
+    result = await tool.execute(path=str(target))
+
+    assert tool.loaded
+    assert result["success"] is True
@@ -0,0 +1,61 @@
+"""
+Tests para la selección de tools por relevancia (BM25)
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.core import ToolRegistry
+from agent.tool_selector import ToolSelector, tokenize
+from tools import get_all_tools
+
+
+def make_registry() -> ToolRegistry:
+    registry = ToolRegistry()
+    for tool in get_all_tools():
+        registry.register(tool)
+    return registry
+
+
+def test_tokenize_normalizes_accents_and_plurals():
+    """Acentos, mayúsculas, plurales y palabras vacías no afectan al índice"""
+    assert tokenize("Lista los Servidores de la cámara") == ["lista", "servidor", "camara"]
+    assert tokenize("alertas") == tokenize("alerta")
+
+
+def test_selector_ranks_by_relevance():
+    selector = ToolSelector()
+    selector.index([
+        ("git_log", "git log historial de commits"),
+        ("read_file", "read file lee el contenido de un archivo"),
+    ])
+    assert selector.top("historial de commits", 1) == ["git_log"]
+    assert selector.top("nada que ver", 2) == []
+
+
+def test_select_tools_keeps_core_and_registry_order():
+    registry = make_registry()
+    names = registry.select_tools("revisa las alertas críticas de Nagios", 2, ["execute_command"])
+
+    assert "nagios_get_alerts" in names
+    assert "execute_command" in names
+    assert len(names) <= 3
+    assert names == [n for n in registry.list_tools() if n in names]
+
+
+def test_select_tools_miss_returns_full_set():
+    """Sin coincidencias se usa el catálogo completo"""
+    registry = make_registry()
+    assert registry.select_tools("hola", 4) is None
+    assert registry.get_llm_tools(None) is registry.get_llm_tools()
+
+
+def test_subset_lists_are_cached():
+    registry = make_registry()
+    names = registry.select_tools("haz commit de los cambios", 3)
+    subset = registry.get_llm_tools(names)
+
+    assert registry.get_llm_tools(list(names)) is subset
+    assert [t["function"]["name"] for t in subset] == names
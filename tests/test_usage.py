@@ -0,0 +1,104 @@
+"""
+Tests de la contabilidad de uso del LLM (tokens, latencia, throughput)
+"""
+
+import sys
+import os
+import json
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.llm_provider import LLMResponse, ToolCall, OllamaProvider
+from agent.usage import UsageTracker, call_usage, aggregate
+from storage import ConversationStorage
+from test_agent_core import collect, make_agent
+
+
+def test_ollama_durations_give_queue_ttft_and_throughput():
+    llm = OllamaProvider(model="llama3.2", base_url="http://127.0.0.1:9")
+    response = llm._parse_chat_result({
+        "message": {"content": "hola"},
+        "prompt_eval_count": 100,
+        "eval_count": 50,
+        "load_duration": 200_000_000,
+        "prompt_eval_duration": 300_000_000,
+        "eval_duration": 1_000_000_000,
+        "total_duration": 1_500_000_000
+    }, constrained=False)
+
+    record = call_usage(response.usage, latency=1.6)
+    assert record["total_tokens"] == 150
+    assert record["queue_ms"] == 100.0
+    assert record["ttft_ms"] == 600.0  # cola + carga + prompt
+    assert record["tokens_per_second"] == 50.0
+
+
+def test_cloud_usage_uses_measured_latency():
+    record = call_usage({"prompt_tokens": 10, "completion_tokens": 20, "cached_prompt_tokens": 4}, latency=2.0)
+    assert record["ttft_ms"] is None
+    assert record["queue_ms"] == 0.0
+    assert record["tokens_per_second"] == 10.0
+    assert record["cached_prompt_tokens"] == 4
+    # Sin datos del proveedor (p. ej. un acierto de caché sin usage)
+    assert call_usage(None, 0.01)["total_tokens"] == 0
+
+
+def test_tracker_aggregates_by_conversation_model_and_iteration():
+    tracker = UsageTracker(max_conversations=2)
+    usage = {"prompt_tokens": 10, "completion_tokens": 5}
+    tracker.record("c1", "llama3.2", 1, usage, 0.5)
+    tracker.record("c1", "llama3.2", 2, usage, 0.5)
+    tracker.record("c2", "gpt-4", 1, usage, 1.0)
+
+    conversation = tracker.get_conversation("c1")
+    assert conversation["totals"]["calls"] == 2
+    assert conversation["totals"]["total_tokens"] == 30
+    assert sorted(conversation["iterations"]) == [1, 2]
+
+    summary = tracker.get_summary()
+    assert summary["models"]["llama3.2"]["calls"] == 2
+    assert summary["models"]["gpt-4"]["avg_latency_ms"] == 1000.0
+    assert summary["totals"]["calls"] == 3
+
+    tracker.record("c3", "gpt-4", 1, usage, 1.0)
+    assert tracker.get_conversation("c1") is None  # la más antigua sale
+
+
+@pytest.mark.asyncio
+async def test_agent_reports_usage_per_call_and_run():
+    agent = make_agent([
+        LLMResponse(content="", tool_calls=[ToolCall(id="c1", name="echo", arguments={"text": "x"})],
+                    usage={"prompt_tokens": 100, "completion_tokens": 10}),
+        LLMResponse(content="listo", usage={"prompt_tokens": 120, "completion_tokens": 20})
+    ], autonomy_level="full")
+
+    events = await collect(agent.process_message("eco", "conv"))
+    message = next(e for e in events if e["type"] == "message")
+    done = events[-1]
+
+    assert message["usage"]["total_tokens"] == 140
+    assert done["usage"]["calls"] == 2
+    assert done["usage"]["prompt_tokens"] == 220
+    usage = agent.usage_tracker.get_conversation("conv")
+    assert list(usage["iterations"]) == [1, 2]
+    assert agent.usage_tracker.get_summary()["models"]["scripted"]["completion_tokens"] == 30
+
+
+def test_usage_stored_with_messages(tmp_path):
+    storage = ConversationStorage(base_dir=str(tmp_path))
+    tracker = UsageTracker()
+    tracker.record("c1", "m", 1, {"prompt_tokens": 10, "completion_tokens": 5}, 0.5)
+    run = tracker.get_conversation("c1")["totals"]
+
+    storage.save_message("c1", "user", "hola")
+    storage.save_message("c1", "assistant", "respuesta", usage=run)
+    storage.save_message("c1", "assistant", "otra", usage=run)
+
+    messages = storage.get_messages("c1")
+    assert messages[0].usage is None
+    stored = [json.loads(m.usage) for m in messages if m.usage]
+    totals = aggregate(stored)
+    assert totals["calls"] == 2
+    assert totals["total_tokens"] == 30
+    assert totals["tokens_per_second"] == run["tokens_per_second"]
@@ -0,0 +1,148 @@
+"""
+Tests para VisionManager (sesiones y ring buffer de snapshots)
+"""
+
+import sys
+import os
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from agent.vision_manager import VisionManager, VisionSession
+
+
+def _frame(value: int, w: int = 320, h: int = 240) -> np.ndarray:
+    return np.full((h, w, 3), value, dtype=np.uint8)
+
+
+def test_ring_buffer_is_bounded_and_reuses_buffers():
+    """El ring buffer no crece y reutiliza los mismos arrays"""
+    session = VisionSession("s1", history_size=3)
+
+    session.current_frame = _frame(10)
+    session.take_snapshot()
+    buffers = [id(b) for b in session._frames]
+
+    for value in range(20, 80, 10):
+        session.current_frame = _frame(value)
+        session.take_snapshot()
+
+    assert len(session.get_history()) == 3
+    assert [id(b) for b in session._frames] == buffers
+    assert int(session.last_snapshot[0, 0, 0]) == 70
+
+
+def test_large_frames_are_downscaled():
+    """Los snapshots se guardan con lado máximo 1280"""
+    session = VisionSession("s1", history_size=2)
+    session.current_frame = _frame(0, w=1920, h=1080)
+    session.take_snapshot()
+
+    assert session.last_snapshot.shape == (720, 1280, 3)
+
+
+def test_encoded_snapshot_is_cached_per_slot():
+    """El JPEG se codifica una sola vez y se invalida al sobrescribir el slot"""
+    session = VisionSession("s1", history_size=1)
+    session.current_frame = _frame(50)
+    session.take_snapshot()
+
+    first = session.get_snapshot_jpeg()
+    assert session.get_snapshot_jpeg() is first
+
+    session.current_frame = _frame(200)
+    session.take_snapshot()
+    assert session.get_snapshot_jpeg() is not first
+
+
+def test_changes_detected_between_snapshots():
+    """get_changes detecta cambios de escena en la ventana"""
+    session = VisionSession("s1", history_size=5)
+    for value in (10, 10, 200):
+        session.current_frame = _frame(value)
+        session.take_snapshot()
+
+    changes = session.get_changes(seconds=30)
+
+    assert changes["snapshots"] == 3
+    assert changes["changed"] is True
+    assert changes["steps"][0]["changed"] is False
+    assert changes["steps"][1]["changed"] is True
+
+
+def test_sessions_do_not_overwrite_each_other():
+    """Dos móviles transmitiendo a la vez mantienen estados separados"""
+    manager = VisionManager()
+    manager.sessions.clear()
+
+    manager.update_frame(_frame(10), session_id="phone_a")
+    manager.update_frame(_frame(240), session_id="phone_b")
+
+    assert int(manager.get_session("phone_a").last_snapshot[0, 0, 0]) == 10
+    assert int(manager.get_session("phone_b").last_snapshot[0, 0, 0]) == 240
+    assert manager.get_session().session_id == "phone_b"
+
+    manager.add_annotation("point", 10, 10, session_id="phone_a")
+    assert manager.get_status("phone_a")["annotation_count"] == 1
+    assert manager.get_status("phone_b")["annotation_count"] == 0
+
+    manager.close_session("phone_a")
+    assert manager.get_status()["sessions"] == ["phone_b"]
+    manager.sessions.clear()
+
+
+def test_conversations_use_their_own_phone():
+    """Con dos móviles, cada conversación ve solo el suyo"""
+    manager = VisionManager()
+    manager.sessions.clear()
+    manager.conversations.clear()
+
+    manager.bind_conversation("conv_a", "peer_a")
+    manager.bind_conversation("conv_b", "peer_b")
+    manager.update_frame(_frame(10), session_id="peer_a")
+    manager.update_frame(_frame(240), session_id="peer_b")
+
+    assert manager.session_for("conv_a").session_id == "peer_a"
+    assert manager.get_status(conversation_id="conv_a")["active"]
+    # Conversación sin móvil: no usa el de otra
+    assert manager.session_for("conv_c") is None
+    assert not manager.get_status(conversation_id="conv_c")["active"]
+
+    manager.close_session("peer_b")
+    assert "conv_b" not in manager.conversations
+    assert manager.session_for("conv_b") is None
+
+    # Un solo móvil sin conversación asociada sigue funcionando
+    manager.update_frame(_frame(90), session_id="peer_free")
+    assert manager.session_for("conv_c").session_id == "peer_free"
+    manager.sessions.clear()
+    manager.conversations.clear()
+
+
+@pytest.mark.asyncio
+async def test_agent_vision_follows_the_running_conversation():
+    """El tool y el estado del prompt usan la cámara de la conversación"""
+    from agent.cancellation import RunScope
+    from tools.vision_tools import _conversation_session
+    from test_agent_core import make_agent
+
+    manager = VisionManager()
+    manager.sessions.clear()
+    manager.conversations.clear()
+    manager.bind_conversation("conv_a", "peer_a")
+    manager.bind_conversation("conv_b", "peer_b")
+    manager.update_frame(_frame(10), session_id="peer_a")
+
+    async def resolve():
+        session = _conversation_session()
+        return session.session_id if session else None
+
+    assert await RunScope("conv_a").step(resolve()) == "peer_a"
+    assert await RunScope("conv_b").step(resolve()) is None
+
+    agent = make_agent()
+    assert agent._get_state_message("conv_a").content != agent._get_state_message("conv_b").content
+    assert agent._get_state_message("conv_a") is agent._get_state_message("conv_a")
+    manager.sessions.clear()
+    manager.conversations.clear()